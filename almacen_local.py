@@ -0,0 +1,51 @@
+# almacen_local.py
+"""
+Almacenamiento local compartido por los workers: cachés en disco y bases SQLite.
+
+- escribir_atomico() deja el archivo completo o no lo deja: escribe en un temporal propio en la
+  misma carpeta y lo renombra encima. Dos hilos o workers que guardan la misma clave a la vez no
+  comparten el temporal, y un lector nunca ve un archivo a medio escribir.
+- conexion() abre la base SQLite en modo WAL (los workers leen mientras otro escribe) para una sola
+  operación: commit al salir sin error, rollback si falla, y la conexión se cierra siempre.
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+
+def escribir_atomico(ruta: str, datos: bytes):
+    """Escribe datos en ruta (creando la carpeta) con un temporal y os.replace. Propaga OSError."""
+    carpeta = os.path.dirname(ruta)
+    os.makedirs(carpeta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def conectar(ruta_db: str, **opciones) -> sqlite3.Connection:
+    """Conexión a ruta_db en modo WAL (opciones: las de sqlite3.connect). La cierra quien la pide."""
+    con = sqlite3.connect(ruta_db, timeout=10, **opciones)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+    except BaseException:
+        con.close()
+        raise
+    return con
+
+
+@contextmanager
+def conexion(ruta_db: str):
+    """Conexión para una operación: una transacción que se confirma al salir sin error."""
+    con = conectar(ruta_db)
+    try:
+        with con:
+            yield con
+    finally:
+        con.close()
@@ -0,0 +1,488 @@
+# asgi.py
+"""
+Modo de servicio asíncrono (ASGI), alternativo a gunicorn + Flask con hilos.
+
+Los endpoints que pasan casi todo el tiempo esperando a Drive o a Gemini se atienden
+con asyncio, así cientos de peticiones en espera comparten un solo proceso:
+- POST /api/list-images: listado y búsqueda de archivos en Drive en paralelo (httpx).
+- POST /api/analyze-image: descargas en paralelo y llamada a Gemini con generate_content_async.
+- POST /api/generate-report: el armado del .docx (CPU) corre en un pool de hilos aparte.
+Todo lo demás (save-description, fill-table, lote, etc.) se delega a la app Flask de main.py,
+ejecutándola en un pool de hilos; el estado (informe_data, cachés, plantillas) es el mismo.
+
+Uso:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+"""
+
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote
+
+import codec_json
+import coalescencia
+import compresion_http
+import indice_paraderos
+import main
+import metricas
+from drive_async import DriveAsync, ErrorDrive
+
+# Hilos para construir informes (CPU) y para atender las rutas Flask delegadas
+ASGI_CPU_WORKERS = int(os.environ.get('ASGI_CPU_WORKERS', '4'))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+_pool_cpu = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix='asgi-cpu')
+_pool_wsgi = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+_drive = None
+_vuelos = {}
+
+
+def obtener_drive_async():
+    """(DriveAsync, client_email) compartido por el proceso; (None, None) si faltan las credenciales."""
+    global _drive
+    creds = main._credenciales_drive()
+    if creds is None:
+        return None, None
+    if _drive is None:
+        _drive = DriveAsync(creds[0])
+    return _drive, creds[1]
+
+
+async def _una_vez(nombre, payload, fabrica):
+    """Coalescencia dentro del proceso: peticiones idénticas en curso esperan el mismo resultado."""
+    clave = f"{nombre}:{coalescencia.clave_canonica(payload)}"
+    futuro = _vuelos.get(clave)
+    if futuro is not None:
+        print(f"🔁 [{nombre}] Petición idéntica en curso; esperando su resultado.")
+        return await asyncio.shield(futuro)
+    futuro = _vuelos[clave] = asyncio.get_running_loop().create_future()
+    try:
+        resultado = await fabrica()
+        futuro.set_result(resultado)
+        return resultado
+    except BaseException as e:
+        futuro.set_exception(e)
+        futuro.exception()  # marcada como leída aunque nadie más espere
+        raise
+    finally:
+        _vuelos.pop(clave, None)
+
+
+class _Peticion:
+    """Query string y cabeceras de la petición, como las lee main.py en request.args / request.headers."""
+
+    def __init__(self, scope):
+        consulta = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        self.args = {clave: valores[0] for clave, valores in consulta.items()}
+        self.cabeceras = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+
+# --- ENDPOINTS ASÍNCRONOS ---
+async def list_images(data, peticion):
+    print(f"[/api/list-images] payload: {data}")
+    info_proyecto = (data.get("info_proyecto") or {})
+    folder_name = (info_proyecto.get("folder_name") or data.get("folder_name") or "").strip()
+    folder_id = data.get("folder_id")
+
+    drive, sa_email = obtener_drive_async()
+    if not drive:
+        return 500, {"error": "No se pudo autenticar con Drive."}
+
+    if not folder_id:
+        if not folder_name:
+            return 400, {"error": "Falta 'folder_name' o 'folder_id'."}
+        folder_id = (await asyncio.to_thread(main.vigia.carpeta_por_nombre, folder_name)
+                     or await drive.primer_id(main.Q_CARPETA.format(folder_name) + " and trashed = false"))
+        if not folder_id:
+            return 404, {"error": f"No se encontró la carpeta '{folder_name}' (o la SA no tiene permisos)."}
+
+    # Manifiesto del vigía de Drive (SQLite y, la primera vez, el listado completo con el cliente síncrono)
+    archivos = await asyncio.to_thread(
+        lambda: main.vigia.archivos_carpeta(main.authenticate_google_drive()[0], folder_id, folder_name or None))
+    if archivos is not None:
+        images = [main.imagen_para_front(f) for f in archivos if (f.get("mimeType") or "").startswith("image/")]
+        await asyncio.to_thread(main.indice.recordar_md5, {f["id"]: f.get("md5Checksum") for f in archivos})
+        ids = main.ids_por_nombre(archivos, main.archivos_proyecto())
+        print(f"[/api/list-images] OK folder_id={folder_id} tablas_id={ids['tablas_id']} imgs={len(images)}")
+        return 200, {
+            "ok": True,
+            "folder_id": folder_id,
+            "service_account": sa_email,
+            "images": images,
+            "drive_file_ids": ids,
+            "tablas": ids["tablas_id"],  # <-- alias legacy
+            "validacion_tablas": await asyncio.to_thread(
+                main.validacion_tablas, main.authenticate_google_drive()[0], ids["tablas_id"]),
+        }
+
+    # Vigía desactivado: imágenes y archivos estáticos se consultan todos a la vez
+    parent_q = f"'{folder_id}' in parents and trashed = false"
+    buscar = main.archivos_proyecto()
+    claves = list(buscar)
+    resultados = await asyncio.gather(
+        drive.listar(main.Q_IMAGENES.format(folder_id), fields=main.CAMPOS_IMAGENES, max_paginas=100),
+        *(drive.primer_id_de([f"{parent_q} and name = '{n}'" for n in buscar[c]]) for c in claves),
+    )
+    images = [main.imagen_para_front(f) for f in resultados[0]]
+    await asyncio.to_thread(main.indice.recordar_md5, {f["id"]: f.get("md5Checksum") for f in resultados[0]})
+    ids = {**dict.fromkeys(main.ARCHIVOS_PROYECTO), **dict(zip(claves, resultados[1:]))}
+    print(f"[/api/list-images] OK folder_id={folder_id} tablas_id={ids['tablas_id']} imgs={len(images)}")
+    return 200, {
+        "ok": True,
+        "folder_id": folder_id,
+        "service_account": sa_email,
+        "images": images,
+        "drive_file_ids": ids,
+        "tablas": ids["tablas_id"],  # <-- alias legacy
+        "validacion_tablas": await asyncio.to_thread(
+            main.validacion_tablas, main.authenticate_google_drive()[0], ids["tablas_id"]),
+    }
+
+
+async def _parte_imagen(drive, img_id):
+    """
+    Descarga una imagen y la deja como parte inline para Gemini (sin recomprimirla).
+    Devuelve (descarga, parte), o (None, None) si falla; la descarga mantiene su reserva en el
+    presupuesto de memoria hasta que se cierra (ver _descargar_partes).
+    """
+    try:
+        descarga = await drive.descargar(img_id)
+    except (ErrorDrive, OSError) as e:
+        print(f"❌ Error descargando {img_id}: {e}")
+        return None, None
+    # leer() puede esperar cupo en el presupuesto y leer el temporal en disco: fuera del loop de eventos
+    parte = main.parte_imagen(await asyncio.to_thread(descarga.leer), img_id)
+    if parte:
+        print(f"✅ Imagen {img_id} descargada.")
+    return descarga, parte
+
+
+async def _descargar_partes(drive, image_ids):
+    """Equivalente asíncrono de main.descargar_partes: (descargas abiertas, partes), todas a la vez."""
+    resultados = await asyncio.gather(*(_parte_imagen(drive, i) for i in image_ids))
+    return [d for d, _ in resultados if d], [p for _, p in resultados if p]
+
+
+async def _huella_imagenes(drive, image_ids):
+    """Equivalente asíncrono de main.huella_imagenes: los md5 que falten se consultan a Drive a la vez."""
+    md5s = await asyncio.to_thread(main.indice.md5_vigentes, image_ids)
+    faltantes = list(set(image_ids) - set(md5s))
+    try:
+        metas = await asyncio.gather(*(drive.metadatos(i, fields="md5Checksum") for i in faltantes))
+    except (ErrorDrive, OSError) as e:
+        print(f"❌ No se pudo leer el md5 de las imágenes: {e}")
+        return None
+    nuevos = {i: m.get("md5Checksum") for i, m in zip(faltantes, metas)}
+    if not all(nuevos.values()):
+        return None
+    await asyncio.to_thread(main.indice.recordar_md5, nuevos)
+    return indice_paraderos.huella_de({**md5s, **nuevos}.values())
+
+
+async def analyze_image(data, peticion):
+    print("\n--- Petición en /api/analyze-image (asgi) ---")
+    image_ids = data.get('image_ids', [])
+    prompt_type = data.get('prompt_type')
+    codigo_paradero = data.get('codigo_paradero', 'No especificado')
+    if not image_ids or not prompt_type:
+        return 400, {'error': 'Faltan image_ids o prompt_type'}
+    selected_prompt = main.prompt_analisis(prompt_type, codigo_paradero)
+
+    drive, _ = obtener_drive_async()
+    if not drive:
+        return 500, {'error': 'Fallo en la autenticación con Google Drive'}
+    huella = await _huella_imagenes(drive, image_ids)
+    respuesta, extra = await asyncio.to_thread(
+        main.analisis_desde_indice, huella, prompt_type, selected_prompt, codigo_paradero,
+        not data.get('reanalizar'))
+    if main.quiere_streaming(data, peticion.cabeceras.get("accept")):
+        eventos = _analisis_en_vivo(drive, respuesta, extra, image_ids, prompt_type, selected_prompt,
+                                    codigo_paradero, huella)
+        return 200, eventos, [(b"content-type", b"text/event-stream; charset=utf-8"),
+                              (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    if respuesta:
+        return 200, respuesta
+
+    async def analizar():
+        abiertas, partes = await _descargar_partes(drive, image_ids)
+        try:
+            if not partes:
+                raise main.ErrorInforme('No se pudieron descargar las imágenes seleccionadas', 500)
+            try:
+                model, textos, con_contexto = await asyncio.to_thread(main.modelo_analisis, selected_prompt,
+                                                                      prompt_type, codigo_paradero)
+                t0 = time.perf_counter()
+                with metricas.span("gemini"):
+                    response = await model.generate_content_async(textos + partes)
+                main.contextos.registrar(response, con_contexto, time.perf_counter() - t0)
+                print("✅ Descripción de IA generada.")
+                description = response.text
+            except Exception as e:
+                print(f"❌ Error en la API de IA: {e}")
+                return f"Error al generar descripción: {e}"
+        finally:
+            partes.clear()
+            for descarga in abiertas:
+                descarga.cerrar()
+        await asyncio.to_thread(main.indice.guardar_analisis, huella, prompt_type, selected_prompt,
+                                main.MODELO_ANALISIS, description, codigo_paradero, image_ids)
+        return description
+
+    try:
+        description = await _una_vez(
+            'analyze-image', {"image_ids": image_ids, "prompt": selected_prompt, "codigo_paradero": codigo_paradero},
+            analizar)
+    except main.ErrorInforme as e:
+        return e.status, {'error': str(e)}
+    return 200, {'description': description, **extra}
+
+
+async def _analisis_en_vivo(drive, respuesta, extra, image_ids, prompt_type, selected_prompt, codigo_paradero, huella):
+    """Equivalente asíncrono de main.analisis_en_vivo (mismos eventos)."""
+    yield main.evento_sse("inicio", extra)
+    if respuesta:
+        yield main.evento_sse("fragmento", {"texto": respuesta["description"]})
+        yield main.evento_sse("fin", respuesta)
+        return
+    abiertas, partes = await _descargar_partes(drive, image_ids)
+    fragmentos = []
+    try:
+        if not partes:
+            yield main.evento_sse("error", {"error": "No se pudieron descargar las imágenes seleccionadas",
+                                            "parcial": ""})
+            return
+        # modelo_analisis puede consultar SQLite o crear el contexto en Gemini: fuera del loop de eventos
+        model, textos, con_contexto = await asyncio.to_thread(main.modelo_analisis, selected_prompt, prompt_type,
+                                                              codigo_paradero)
+        t0 = time.perf_counter()
+        with metricas.span("gemini"):
+            response = await model.generate_content_async(textos + partes, stream=True)
+            async for fragmento in response:
+                if not fragmento.text:
+                    continue
+                if not fragmentos:
+                    metricas.observar("gemini_primer_fragmento", time.perf_counter() - t0)
+                fragmentos.append(fragmento.text)
+                yield main.evento_sse("fragmento", {"texto": fragmento.text})
+        main.contextos.registrar(response, con_contexto, time.perf_counter() - t0)
+    except Exception as e:
+        print(f"❌ Error en la API de IA (streaming): {e}")
+        yield main.evento_sse("error", {"error": f"Error al generar descripción: {e}", "parcial": "".join(fragmentos)})
+        return
+    finally:
+        partes.clear()
+        for descarga in abiertas:
+            descarga.cerrar()
+    print("✅ Descripción de IA generada (streaming).")
+    description = "".join(fragmentos)
+    await asyncio.to_thread(main.indice.guardar_analisis, huella, prompt_type, selected_prompt,
+                            main.MODELO_ANALISIS, description, codigo_paradero, image_ids)
+    yield main.evento_sse("fin", {"description": description, **extra})
+
+
+async def generate_report(data, peticion):
+    print("Solicitud para generar informe recibida (asgi).")
+    if not data:
+        return 400, {'error': 'No se recibieron datos para generar el informe.'}
+    try:
+        await asyncio.to_thread(main.resolver_paraderos, data)
+    except main.ErrorInforme as e:
+        return e.status, {'error': str(e)}
+    main.mezclar_analisis_guardado(data)
+    a_drive = main.quiere_subir_a_drive(data, peticion.args.get("destino"))
+    perfilar = main.quiere_perfilar(data, peticion.cabeceras.get("x-perfilar"))
+
+    def construir():
+        service_drive, _ = main.authenticate_google_drive()
+        return main.construir_informe_docx(data, service_drive)
+
+    loop = asyncio.get_running_loop()
+    try:
+        # Misma coalescencia que el modo gunicorn (también entre procesos), en el pool de CPU
+        # copy_context: los tramos medidos en el hilo quedan en la traza de esta petición
+        nombre_archivo, contenido, perfil_id = await loop.run_in_executor(
+            _pool_cpu, contextvars.copy_context().run, main.construir_informe, data, construir, perfilar)
+    except main.ErrorInforme as e:
+        return e.status, {'error': str(e)}
+    except Exception as e:
+        print(f"❌ Error en /api/generate-report: {e}")
+        return 500, {'error': str(e)}
+
+    if a_drive:
+        try:
+            cuerpo = await asyncio.to_thread(main.subir_informe_a_drive, data, nombre_archivo, contenido)
+        except main.ErrorInforme as e:
+            return e.status, {'error': str(e)}
+        if perfil_id:
+            cuerpo["perfil"] = main.enlaces_perfil(perfil_id)
+        return 202, cuerpo
+
+    print(f"✅ Enviando el archivo '{nombre_archivo}' para descarga.")
+    ascii_nombre = nombre_archivo.encode('ascii', 'replace').decode().replace('"', '')
+    cabeceras = [
+        (b"content-type", main.DOCX_MIMETYPE.encode()),
+        (b"content-disposition",
+         f"attachment; filename=\"{ascii_nombre}\"; filename*=UTF-8''{quote(nombre_archivo)}".encode()),
+    ]
+    if perfil_id:
+        cabeceras += [(b"x-perfil", perfil_id.encode()), (b"access-control-expose-headers", b"X-Perfil")]
+    return 200, contenido, cabeceras
+
+
+RUTAS = {
+    '/api/list-images': list_images,
+    '/api/analyze-image': analyze_image,
+    '/api/generate-report': generate_report,
+}
+
+
+# --- PROTOCOLO ASGI ---
+async def _leer_cuerpo(receive):
+    partes = []
+    while True:
+        mensaje = await receive()
+        partes.append(mensaje.get("body", b""))
+        if not mensaje.get("more_body"):
+            return b"".join(partes)
+
+
+async def _responder(send, status, cuerpo, cabeceras, scope, t0, token_traza):
+    total = time.perf_counter() - t0
+    metricas.observar_http(scope["path"], scope["method"], status, total)
+    en_vivo = hasattr(cuerpo, "__aiter__")
+    cabeceras = list(cabeceras) + [(b"access-control-allow-origin", b"*")]
+    if not en_vivo:
+        cabeceras.append((b"content-length", str(len(cuerpo)).encode()))
+    if token_traza is not None:
+        traza = metricas.terminar_traza(token_traza)
+        cabeceras += [
+            (b"server-timing", metricas.server_timing(traza, total).encode()),
+            (b"timing-allow-origin", b"*"),
+            (b"access-control-expose-headers", b"Server-Timing"),
+        ]
+    await send({"type": "http.response.start", "status": status, "headers": cabeceras})
+    if not en_vivo:
+        await send({"type": "http.response.body", "body": cuerpo})
+        return
+    # Server-sent events: cada evento sale apenas se genera (el Server-Timing cubre hasta el inicio)
+    async for evento in cuerpo:
+        await send({"type": "http.response.body", "body": evento.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _atender_async(handler, scope, receive, send):
+    t0 = time.perf_counter()
+    token_traza = None
+    if main.METRICAS_SERVER_TIMING or (b"x-server-timing", b"1") in scope.get("headers", []):
+        token_traza = metricas.iniciar_traza()
+    cuerpo = await _leer_cuerpo(receive)
+    cabeceras_peticion = dict(scope.get("headers", []))
+    try:
+        cuerpo = compresion_http.descomprimir(cuerpo, cabeceras_peticion.get(b"content-encoding", b"").decode("latin-1"))
+        data = codec_json.loads(cuerpo or b"{}") or {}
+        if not isinstance(data, dict):
+            raise ValueError("se esperaba un objeto JSON")
+    except compresion_http.ErrorCompresion as e:
+        resultado = (e.status, {"error": str(e)})
+    except ValueError as e:
+        resultado = (400, {"error": f"JSON inválido: {e}"})
+    else:
+        try:
+            resultado = await handler(data, _Peticion(scope))
+        except Exception as e:
+            print(f"❌ {scope['path']} error: {e}")
+            resultado = (500, {"error": str(e)})
+    if len(resultado) == 3:
+        status, cuerpo, cabeceras = resultado
+    else:
+        status, datos = resultado
+        cuerpo = codec_json.dumps(datos)
+        cabeceras = [(b"content-type", b"application/json")]
+        if compresion_http.acepta_gzip(cabeceras_peticion.get(b"accept-encoding", b"").decode("latin-1")) \
+                and compresion_http.comprimible("application/json", len(cuerpo)):
+            cuerpo = compresion_http.comprimir(cuerpo)
+            cabeceras += [(b"content-encoding", b"gzip"), (b"vary", b"Accept-Encoding")]
+    await _responder(send, status, cuerpo, cabeceras, scope, t0, token_traza)
+
+
+async def _atender_wsgi(scope, receive, send):
+    """Ejecuta la app Flask (WSGI) en el pool de hilos, enviando la respuesta a medida que se genera."""
+    cuerpo = await _leer_cuerpo(receive)
+    servidor = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(cuerpo)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope.get("headers", []):
+        nombre = nombre.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nombre == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = valor
+        elif nombre != "CONTENT_LENGTH":
+            clave = f"HTTP_{nombre}"
+            environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+
+    inicio = {}
+
+    def start_response(status, headers, exc_info=None):
+        inicio["status"] = int(status.split(" ", 1)[0])
+        inicio["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    loop = asyncio.get_running_loop()
+    resultado = await loop.run_in_executor(_pool_wsgi, main.app, environ, start_response)
+    iterador = iter(resultado)
+    try:
+        await send({"type": "http.response.start", "status": inicio["status"], "headers": inicio["headers"]})
+        fin = object()
+        while True:
+            parte = await loop.run_in_executor(_pool_wsgi, next, iterador, fin)
+            if parte is fin:
+                break
+            if parte:
+                await send({"type": "http.response.body", "body": parte, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(resultado, "close"):
+            await loop.run_in_executor(_pool_wsgi, resultado.close)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                if _drive is not None:
+                    await _drive.cerrar()
+                _pool_cpu.shutdown(wait=False)
+                _pool_wsgi.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    handler = RUTAS.get(scope["path"].rstrip("/") or "/")
+    if handler is not None and scope["method"] == "POST":
+        await _atender_async(handler, scope, receive, send)
+    else:
+        # Preflight CORS y el resto de las rutas las resuelve Flask
+        await _atender_wsgi(scope, receive, send)
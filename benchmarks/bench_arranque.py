@@ -0,0 +1,106 @@
+# benchmarks/bench_arranque.py
+"""
+Mide el costo de arranque del servicio:
+
+1. Tiempo de importación de cada módulo relevante (python -X importtime, proceso nuevo por módulo).
+2. Tiempo hasta la primera respuesta con gunicorn, con y sin --preload:
+   - primera petición liviana (GET /api/coalescencia)
+   - primera petición pesada (POST /api/generate-report, sin Drive: no hace falta red)
+
+Uso:
+    python -m benchmarks.bench_arranque [--sin-gunicorn]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.comun import RAIZ, payload_sintetico, puerto_libre
+
+MODULOS = [
+    "main", "flask", "googleapiclient.discovery", "google.generativeai", "PIL.Image",
+    "report_generator", "docx", "pandas", "openpyxl",
+]
+
+
+def tiempo_importacion(modulo):
+    """Tiempo acumulado (s) de importar 'modulo' en un proceso nuevo, según -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": RAIZ},
+    )
+    total = 0
+    for linea in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s?( *)(\S+)", linea)
+        if m and not m.group(2):  # sólo módulos de primer nivel
+            total += int(m.group(1))
+    return total / 1e6
+
+
+def _esperar(url, datos=None, limite=60):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < limite:
+        try:
+            req = urllib.request.Request(url, data=datos, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=limite) as r:
+                r.read()
+                return True
+        except OSError:
+            time.sleep(0.02)
+    return False
+
+
+def primera_respuesta_gunicorn(preload):
+    """Segundos desde que se lanza gunicorn hasta la primera respuesta liviana y la primera pesada."""
+    puerto = puerto_libre()
+    cmd = [sys.executable, "-m", "gunicorn", "main:app", "--bind", f"127.0.0.1:{puerto}",
+           "--workers", "2", "--threads", "8", "--timeout", "120"]
+    if preload:
+        cmd.append("--preload")
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_CREDENTIALS"}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{puerto}"
+        ok = _esperar(f"{base}/api/coalescencia")
+        t_liviana = time.perf_counter() - t0
+        payload = payload_sintetico(1)
+        payload["drive_file_ids"] = {"tablas_id": None}
+        t1 = time.perf_counter()
+        ok = ok and _esperar(f"{base}/api/generate-report", json.dumps(payload).encode())
+        t_pesada = time.perf_counter() - t1
+        return (t_liviana, t_pesada) if ok else (None, None)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sin-gunicorn", action="store_true", help="sólo medir tiempos de importación")
+    args = parser.parse_args()
+
+    print("Tiempo de importación (proceso nuevo, acumulado):")
+    for modulo in MODULOS:
+        print(f"  {modulo:28} {tiempo_importacion(modulo):8.3f} s")
+
+    if args.sin_gunicorn:
+        return
+    print("\nTiempo hasta la primera respuesta (gunicorn, 2 workers x 8 hilos):")
+    print(f"  {'modo':14} {'1ª liviana (desde arranque)':>28} {'1ª generate-report':>20}")
+    for preload in (False, True):
+        liviana, pesada = primera_respuesta_gunicorn(preload)
+        nombre = "--preload" if preload else "perezoso"
+        if liviana is None:
+            print(f"  {nombre:14} {'sin respuesta':>28}")
+        else:
+            print(f"  {nombre:14} {liviana:>26.3f} s {pesada:>18.3f} s")
+
+
+if __name__ == "__main__":
+    main()
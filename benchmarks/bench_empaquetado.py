@@ -0,0 +1,68 @@
+# benchmarks/bench_empaquetado.py
+"""
+Compara el guardado del .docx con document.save() de python-docx (deflate 6 en todas las partes)
+contra empaquetado_docx.guardar() (fotos sin recomprimir, XML con deflate de nivel configurable),
+sobre un informe de N paraderos con F fotos JPEG por paradero.
+
+Uso:
+    python -m benchmarks.bench_empaquetado --paraderos 50 --fotos 6 --niveles 1 3 6 --repeticiones 3
+"""
+
+import argparse
+import io
+import statistics
+
+from docx.shared import Inches
+
+import empaquetado_docx
+from benchmarks.comun import cargar_report_generator, payload_sintetico, silencio, cronometrar
+from benchmarks.fixtures import FOTOS_DISTINTAS, jpeg_sintetico
+
+
+def informe_con_fotos(n_paraderos, fotos_por_paradero, lado):
+    rg = cargar_report_generator()
+    with silencio():
+        document = rg.crear_informe_paraderos(payload_sintetico(n_paraderos), None)
+    # Cada foto es distinta (python-docx deduplica imágenes idénticas por SHA1): sufijo propio tras el fin del JPEG
+    bases = [jpeg_sintetico(lado, semilla=s) for s in range(FOTOS_DISTINTAS)]
+    for i in range(n_paraderos * fotos_por_paradero):
+        foto = bases[i % FOTOS_DISTINTAS] + f"#{i}".encode()
+        document.add_picture(io.BytesIO(foto), width=Inches(3))
+    return document
+
+
+def medir(guardar, document, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        buffer = io.BytesIO()
+        _, t = cronometrar(guardar, document, buffer)
+        tiempos.append(t)
+    return statistics.median(tiempos), buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paraderos", type=int, default=50)
+    parser.add_argument("--fotos", type=int, default=6, help="fotos por paradero")
+    parser.add_argument("--lado", type=int, default=1600, help="lado de cada foto en px")
+    parser.add_argument("--niveles", type=int, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    document = informe_con_fotos(args.paraderos, args.fotos, args.lado)
+    variantes = [("python-docx (deflate 6 en todo)", lambda d, b: d.save(b))]
+    variantes += [(f"medios sin comprimir, XML nivel {n}", lambda d, b, n=n: empaquetado_docx.guardar(d, b, nivel=n))
+                  for n in args.niveles]
+
+    print(f"Informe de {args.paraderos} paraderos x {args.fotos} fotos de {args.lado} px, "
+          f"mediana de {args.repeticiones} repeticiones")
+    print(f"{'variante':40}{'guardado_s':>12}{'MB':>10}{'aceleración':>13}")
+    base = None
+    for nombre, guardar in variantes:
+        t, tamano = medir(guardar, document, args.repeticiones)
+        base = base or t
+        print(f"{nombre:40}{t:>12.3f}{tamano / 1e6:>10.2f}{base / t:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_estilos.py
+"""
+Compara el informe con estilos con nombre (registro ESTILOS_MHO) contra una versión anterior
+del generador con formato directo por run/párrafo.
+
+Uso:
+    python -m benchmarks.bench_estilos --referencia <commit> --paraderos 50 --repeticiones 3
+"""
+
+import argparse
+import io
+import statistics
+
+from docx.oxml.ns import qn
+
+from benchmarks.comun import cargar_report_generator, payload_sintetico, silencio, cronometrar, tamano_document_xml
+
+
+def medir(rg, datos, repeticiones):
+    construccion, guardado = [], []
+    for _ in range(repeticiones):
+        with silencio():
+            document, t_build = cronometrar(rg.crear_informe_paraderos, datos, None)
+        buffer = io.BytesIO()
+        _, t_save = cronometrar(document.save, buffer)
+        construccion.append(t_build)
+        guardado.append(t_save)
+    body = document.element.body
+    return {
+        "construccion_s": statistics.median(construccion),
+        "guardado_s": statistics.median(guardado),
+        "document_xml_bytes": tamano_document_xml(buffer.getvalue()),
+        "nodos_xml": sum(1 for _ in body.iter()),
+        "nodos_rPr": sum(1 for _ in body.iter(qn("w:rPr"))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--referencia", default="ebebaeb", help="commit con el formato directo (por defecto, la línea base)")
+    parser.add_argument("--paraderos", type=int, default=50)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    datos = payload_sintetico(args.paraderos)
+    resultados = {
+        f"formato directo ({args.referencia})": medir(cargar_report_generator(args.referencia), datos, args.repeticiones),
+        "estilos MHO (árbol actual)": medir(cargar_report_generator(), datos, args.repeticiones),
+    }
+
+    print(f"Informe de {args.paraderos} paraderos, mediana de {args.repeticiones} repeticiones")
+    claves = list(next(iter(resultados.values())).keys())
+    print(f"{'variante':32}" + "".join(f"{k:>20}" for k in claves))
+    for nombre, r in resultados.items():
+        print(f"{nombre:32}" + "".join(f"{r[k]:>20.3f}" if isinstance(r[k], float) else f"{r[k]:>20}" for k in claves))
+
+
+if __name__ == "__main__":
+    main()
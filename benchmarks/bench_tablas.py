@@ -0,0 +1,61 @@
+# benchmarks/bench_tablas.py
+"""
+Compara el motor de tablas (motor_tablas, XML en una pasada) contra la construcción
+con document.add_table()/add_row() de una versión anterior del generador.
+
+Uso:
+    python -m benchmarks.bench_tablas --referencia <commit> --filas 10 100 1000 10000
+"""
+
+import argparse
+import io
+
+import pandas as pd
+
+from benchmarks.comun import cargar_report_generator, silencio, cronometrar
+
+HEADERS = ["Código", "Dirección", "Servicios", "Destino", "Observación"]
+
+
+def filas_sinteticas(n):
+    return [[f"PA{i:05d}", f"Av. Siempre Viva {i}", f"{i % 50}, {i % 7}0{i % 3}", "Centro", "Sin observación"] for i in range(n)]
+
+
+def medir_tabla(rg, filas, como_df=False):
+    document = rg.Document() if not hasattr(rg, "obtener_documento_base") else rg.obtener_documento_base()
+    estado = {"capitulo": 4, "cuadro": 1}
+    with silencio():
+        if como_df:
+            df = pd.DataFrame(filas, columns=HEADERS)
+            _, t = cronometrar(rg.agregar_tabla_desde_df, document, df, "Paradas", estado, "Fuente")
+        else:
+            _, t = cronometrar(rg.agregar_tabla_formateada, document, "Paradas", estado, "Fuente", headers=HEADERS, rows=filas)
+    _, t_save = cronometrar(document.save, io.BytesIO())
+    return t, t_save
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--referencia", default="ebebaeb", help="commit con la construcción fila por fila (por defecto, la línea base)")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--max-filas-referencia", type=int, default=5000,
+                        help="no medir la referencia por encima de este tamaño (es lenta)")
+    args = parser.parse_args()
+
+    ref = cargar_report_generator(args.referencia)
+    actual = cargar_report_generator()
+
+    print(f"{'filas':>7} {'camino':>18} {'ref construir_s':>16} {'motor construir_s':>18} {'aceleración':>12} {'motor guardar_s':>16}")
+    for n in args.filas:
+        filas = filas_sinteticas(n)
+        for como_df, camino in ((False, "headers/rows"), (True, "DataFrame")):
+            t_motor, t_save = medir_tabla(actual, filas, como_df)
+            if n <= args.max_filas_referencia:
+                t_ref, _ = medir_tabla(ref, filas, como_df)
+                print(f"{n:>7} {camino:>18} {t_ref:>16.3f} {t_motor:>18.4f} {t_ref / t_motor:>11.1f}x {t_save:>16.3f}")
+            else:
+                print(f"{n:>7} {camino:>18} {'-':>16} {t_motor:>18.4f} {'-':>12} {t_save:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# benchmarks/carga.py
+"""
+Generador de carga para encontrar el punto de saturación del servicio.
+
+Levanta la app conectada a Drive y Gemini falsos (benchmarks.servidor_falso) con la configuración
+de workers/hilos indicada y simula inspectores concurrentes. Cada inspector repite una sesión
+como la del front:
+    list-images -> por paradero: (analyze-image + save-description) x 3 secciones, fill-table
+    -> generate-report con los paraderos de la sesión
+La concurrencia sube por escalones (--escalones). En cada escalón se reportan:
+- throughput (peticiones completadas por segundo)
+- latencias p50/p95/p99, en total y por endpoint
+- tasa de error (respuestas no 2xx y timeouts del cliente)
+- memoria RSS máxima de cada worker (muestreada desde /proc)
+Al final se indica el primer escalón saturado: tasa de error > 1 %, p95 por sobre --slo-p95,
+o un throughput que no crece al menos un 10 % respecto del escalón anterior.
+
+Uso:
+    python -m benchmarks.carga [--modo gunicorn|uvicorn] [--workers 2] [--threads 8] [--timeout 120]
+        [--escalones 2 4 8 16 32 64] [--duracion 30] [--paraderos-por-sesion 5]
+        [--latencia-gemini 3] [--latencia-drive 0.05] [--reutilizar-analisis] [--slo-p95 60]
+        [--json resultados.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.comun import RAIZ, puerto_libre
+from benchmarks.e2e import _tabla_desde_fill
+from benchmarks.fakes import CARPETA_PROYECTO
+from benchmarks.fixtures import SECCIONES
+
+ORDEN_ENDPOINTS = ["list-images", "analyze-image", "save-description", "fill-table", "generate-report"]
+
+
+# --- Servidor ---
+def comando_servidor(args, puerto):
+    if args.modo == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "benchmarks.servidor_falso:asgi_app", "--host", "127.0.0.1",
+                "--port", str(puerto), "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    cmd = [sys.executable, "-m", "gunicorn", "benchmarks.servidor_falso:app", "--bind", f"127.0.0.1:{puerto}",
+           "--workers", str(args.workers), "--threads", str(args.threads), "--timeout", str(args.timeout)]
+    if args.preload:
+        cmd.append("--preload")
+    return cmd
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _hijos(pid):
+    hijos = []
+    for entrada in os.listdir("/proc"):
+        if entrada.isdigit():
+            try:
+                with open(f"/proc/{entrada}/stat") as f:
+                    # El nombre del proceso va entre paréntesis y puede tener espacios
+                    campos = f.read().rsplit(")", 1)[1].split()
+                if int(campos[1]) == pid:
+                    hijos.append(int(entrada))
+            except (OSError, IndexError, ValueError):
+                pass
+    return hijos
+
+
+class MuestreoMemoria(threading.Thread):
+    """Guarda el RSS máximo de cada worker (o del proceso, si no tiene hijos) mientras corre."""
+
+    def __init__(self, pid, intervalo_s=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo_s = intervalo_s
+        self.maximos = {}
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            for pid in _hijos(self.pid) or [self.pid]:
+                rss = _rss_mb(pid)
+                if rss is not None:
+                    self.maximos[pid] = max(self.maximos.get(pid, 0), rss)
+            self._parar.wait(self.intervalo_s)
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+        return self.maximos
+
+
+# --- Inspectores simulados ---
+class Registro:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+
+
+async def _post(cliente, registro, endpoint, payload):
+    t0 = time.perf_counter()
+    try:
+        r = await cliente.post(f"/api/{endpoint}", json=payload)
+        ok = 200 <= r.status_code < 300
+    except httpx.HTTPError:
+        r, ok = None, False
+    registro.latencias[endpoint].append(time.perf_counter() - t0)
+    if not ok:
+        registro.errores[endpoint] += 1
+    return r if ok else None
+
+
+async def sesion(cliente, registro, inspector, fin, args, rng):
+    """Sesiones de un inspector hasta que se acabe el tiempo del escalón."""
+    n_sesion = 0
+    while time.monotonic() < fin:
+        n_sesion += 1
+        r = await _post(cliente, registro, "list-images", {"folder_name": CARPETA_PROYECTO})
+        if r is None:
+            continue
+        listado = r.json()
+        fotos = [img["id"] for img in listado["images"] if img["name"].startswith("PA")]
+        paraderos = []
+        for k in range(args.paraderos_por_sesion):
+            if time.monotonic() >= fin:
+                return
+            # Código único por inspector/sesión: la coalescencia no junta peticiones de inspectores distintos
+            codigo = f"I{inspector:03d}-S{n_sesion}-P{k}"
+            analisis = {}
+            for seccion in SECCIONES:
+                ids = rng.sample(fotos, min(2, len(fotos)))
+                r = await _post(cliente, registro, "analyze-image",
+                                {"image_ids": ids, "prompt_type": seccion, "codigo_paradero": codigo})
+                texto = r.json().get("description", "") if r is not None else ""
+                await _post(cliente, registro, "save-description",
+                            {"prompt_type": seccion, "description": texto, "image_ids": ids})
+                analisis[seccion] = {"description": texto, "image_ids": ids}
+            r = await _post(cliente, registro, "fill-table", {})
+            paraderos.append({"info_paradero": {"codigo": codigo, "ubicacion": f"Av. Siempre Viva {100 + k}"},
+                              "analisis": analisis, "tabla": _tabla_desde_fill(r.json() if r is not None else {})})
+        await _post(cliente, registro, "generate-report", {
+            "info_proyecto": {"proyecto": f"Carga {inspector}-{n_sesion}", "comuna": "Santiago"},
+            "drive_file_ids": listado["drive_file_ids"],
+            "paraderos": paraderos,
+        })
+
+
+def _percentil(valores, p):
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def escalon(base, concurrencia, args, semilla):
+    limites = httpx.Limits(max_connections=concurrencia * 2, max_keepalive_connections=concurrencia * 2)
+    registro = Registro()
+    async with httpx.AsyncClient(base_url=base, timeout=args.timeout + 10, limits=limites) as cliente:
+        t0 = time.monotonic()
+        fin = t0 + args.duracion
+        await asyncio.gather(*(sesion(cliente, registro, i, fin, args, random.Random(semilla + i))
+                               for i in range(concurrencia)))
+        return registro, time.monotonic() - t0
+
+
+async def _esperar_listo(base, limite=120):
+    t0 = time.monotonic()
+    async with httpx.AsyncClient(base_url=base, timeout=limite) as cliente:
+        while time.monotonic() - t0 < limite:
+            try:
+                if (await cliente.post("/api/list-images", json={"folder_name": CARPETA_PROYECTO})).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("el servidor no respondió")
+
+
+def resumir(registro, duracion, memoria):
+    todas = [x for lat in registro.latencias.values() for x in lat]
+    total = len(todas)
+    errores = sum(registro.errores.values())
+    return {
+        "peticiones": total,
+        "throughput_rps": round(total / duracion, 2),
+        "p50_s": round(_percentil(todas, 50), 3),
+        "p95_s": round(_percentil(todas, 95), 3),
+        "p99_s": round(_percentil(todas, 99), 3),
+        "tasa_error": round(errores / total, 4) if total else 1.0,
+        "por_endpoint": {
+            e: {"n": len(registro.latencias[e]), "p50_s": round(statistics.median(registro.latencias[e]), 3),
+                "p95_s": round(_percentil(registro.latencias[e], 95), 3), "errores": registro.errores[e]}
+            for e in ORDEN_ENDPOINTS if registro.latencias[e]
+        },
+        "rss_workers_mb": sorted(round(v) for v in memoria.values()),
+    }
+
+
+def saturado(actual, anterior, args):
+    """Motivo por el que el escalón se considera saturado, o None."""
+    if actual["tasa_error"] > 0.01:
+        return f"tasa de error {actual['tasa_error']:.1%}"
+    if actual["p95_s"] > args.slo_p95:
+        return f"p95 {actual['p95_s']:.1f}s > {args.slo_p95:.0f}s"
+    if anterior and actual["throughput_rps"] < anterior["throughput_rps"] * 1.10:
+        return f"throughput {anterior['throughput_rps']} -> {actual['throughput_rps']} req/s (<10 % más)"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--preload", action="store_true")
+    parser.add_argument("--escalones", type=int, nargs="+", default=[2, 4, 8, 16, 32, 64])
+    parser.add_argument("--duracion", type=float, default=30, help="segundos por escalón")
+    parser.add_argument("--paraderos-por-sesion", type=int, default=5)
+    parser.add_argument("--latencia-gemini", type=float, default=3.0)
+    parser.add_argument("--latencia-drive", type=float, default=0.05)
+    parser.add_argument("--reutilizar-analisis", action="store_true",
+                        help="deja que analyze-image responda desde el índice de paraderos")
+    parser.add_argument("--slo-p95", type=float, default=60.0, help="p95 máximo aceptable (s)")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    puerto = puerto_libre()
+    base = f"http://127.0.0.1:{puerto}"
+    # Las sesiones repiten fotos del mismo conjunto: sin --reutilizar-analisis cada análisis llama al modelo
+    env = {**os.environ, "PYTHONPATH": RAIZ, "FALSO_LATENCIA_GEMINI": str(args.latencia_gemini),
+           "FALSO_LATENCIA_DRIVE": str(args.latencia_drive),
+           "INDICE_REUTILIZAR_ANALISIS": "1" if args.reutilizar_analisis else "0"}
+    env.pop("GOOGLE_CREDENTIALS", None)
+    proc = subprocess.Popen(comando_servidor(args, puerto), cwd=RAIZ, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    config = (f"{args.modo} {args.workers} workers" + (f" x {args.threads} hilos" if args.modo == "gunicorn" else "")
+              + f", timeout {args.timeout}s; Gemini {args.latencia_gemini}s, Drive {args.latencia_drive}s")
+    print(f"Carga contra {config}")
+    print(f"  {'inspect.':>8} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'error':>7}  {'RSS por worker (MB)'}")
+    resultados, anterior, punto = [], None, None
+    try:
+        asyncio.run(_esperar_listo(base))
+        for concurrencia in args.escalones:
+            memoria = MuestreoMemoria(proc.pid)
+            memoria.start()
+            registro, duracion = asyncio.run(escalon(base, concurrencia, args, semilla=concurrencia * 1000))
+            r = resumir(registro, duracion, memoria.detener())
+            r["inspectores"] = concurrencia
+            resultados.append(r)
+            print(f"  {concurrencia:>8} {r['throughput_rps']:>7.1f} {r['p50_s']:>6.2f}s {r['p95_s']:>6.2f}s "
+                  f"{r['p99_s']:>6.2f}s {r['tasa_error']:>7.1%}  {r['rss_workers_mb']}")
+            motivo = saturado(r, anterior, args)
+            if motivo and punto is None:
+                punto = (concurrencia, motivo)
+            anterior = r
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print("\nLatencias por endpoint en el último escalón (p50 / p95):")
+    for e, d in resultados[-1]["por_endpoint"].items():
+        print(f"  {e:18} n={d['n']:<6} {d['p50_s']:>6.2f}s / {d['p95_s']:>6.2f}s  errores={d['errores']}")
+    if punto:
+        print(f"\nSaturación a partir de {punto[0]} inspectores concurrentes: {punto[1]}.")
+    else:
+        print(f"\nSin saturación hasta {args.escalones[-1]} inspectores concurrentes.")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"configuracion": vars(args), "escalones": resultados,
+                       "saturacion": {"inspectores": punto[0], "motivo": punto[1]} if punto else None},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
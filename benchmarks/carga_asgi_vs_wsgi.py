@@ -0,0 +1,129 @@
+# benchmarks/carga_asgi_vs_wsgi.py
+"""
+Prueba de carga: gunicorn (2 workers x 8 hilos, el modo actual) contra uvicorn (asgi.py, 1 proceso),
+ambos con Drive y Gemini falsos (ver servidor_falso.py), sin red.
+
+Cada petición de /api/analyze-image usa un código de paradero distinto, así la coalescencia
+no las junta: se mide concurrencia real. Se reporta throughput y latencias p50/p95/p99.
+
+Uso:
+    python -m benchmarks.carga_asgi_vs_wsgi [--peticiones 300] [--concurrencia 10 50 150]
+        [--latencia-gemini 1.0] [--latencia-drive 0.05] [--endpoint analyze-image|list-images]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.comun import RAIZ, puerto_libre
+from benchmarks.fakes import CARPETA_PROYECTO
+
+SERVIDORES = {
+    "gunicorn 2x8": ["-m", "gunicorn", "benchmarks.servidor_falso:app", "--workers", "2", "--threads", "8",
+                     "--timeout", "300", "--bind"],
+    "uvicorn asgi": ["-m", "uvicorn", "benchmarks.servidor_falso:asgi_app", "--log-level", "warning",
+                     "--no-access-log", "--bind"],
+}
+
+
+def _comando(nombre, puerto):
+    cmd = [sys.executable] + SERVIDORES[nombre]
+    if nombre.startswith("uvicorn"):
+        return cmd[:-1] + ["--host", "127.0.0.1", "--port", str(puerto)]
+    return cmd + [f"127.0.0.1:{puerto}"]
+
+
+async def _esperar_listo(cliente, limite=60):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < limite:
+        try:
+            r = await cliente.post("/api/list-images", json={"folder_name": CARPETA_PROYECTO})
+            if r.status_code == 200:
+                return r.json()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("el servidor no respondió")
+
+
+async def _carga(base, endpoint, peticiones, concurrencia):
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=base, timeout=600, limits=limites) as cliente:
+        listado = await _esperar_listo(cliente)
+        fotos = [img["id"] for img in listado["images"]]
+
+        def payload(i):
+            if endpoint == "list-images":
+                return {"folder_name": CARPETA_PROYECTO}
+            return {"image_ids": fotos[(i * 3) % len(fotos):][:3] or fotos[:3], "prompt_type": "general",
+                    "codigo_paradero": f"PA{i:05d}"}
+
+        latencias, errores = [], 0
+        cola = asyncio.Queue()
+        for i in range(peticiones):
+            cola.put_nowait(i)
+
+        async def trabajador():
+            nonlocal errores
+            while not cola.empty():
+                i = cola.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await cliente.post(f"/api/{endpoint}", json=payload(i))
+                    if r.status_code != 200:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        return time.perf_counter() - t0, latencias, errores
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def medir(nombre, args, concurrencia):
+    puerto = puerto_libre()
+    env = {**os.environ, "PYTHONPATH": RAIZ, "FALSO_LATENCIA_GEMINI": str(args.latencia_gemini),
+           "FALSO_LATENCIA_DRIVE": str(args.latencia_drive)}
+    env.pop("GOOGLE_CREDENTIALS", None)
+    proc = subprocess.Popen(_comando(nombre, puerto), cwd=RAIZ, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        return asyncio.run(_carga(f"http://127.0.0.1:{puerto}", args.endpoint, args.peticiones, concurrencia))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=300)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[10, 50, 150])
+    parser.add_argument("--latencia-gemini", type=float, default=1.0)
+    parser.add_argument("--latencia-drive", type=float, default=0.05)
+    parser.add_argument("--endpoint", default="analyze-image", choices=["analyze-image", "list-images"])
+    args = parser.parse_args()
+
+    print(f"/api/{args.endpoint}: {args.peticiones} peticiones, Gemini {args.latencia_gemini}s, "
+          f"Drive {args.latencia_drive}s por llamada")
+    print(f"  {'servidor':14} {'conc.':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errores':>8}")
+    for concurrencia in args.concurrencia:
+        for nombre in SERVIDORES:
+            total, lat, errores = medir(nombre, args, concurrencia)
+            print(f"  {nombre:14} {concurrencia:>6} {len(lat) / total:>8.1f} {statistics.median(lat):>7.2f}s "
+                  f"{_percentil(lat, 95):>7.2f}s {_percentil(lat, 99):>7.2f}s {errores:>8}")
+
+
+if __name__ == "__main__":
+    main()
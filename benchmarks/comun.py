@@ -0,0 +1,97 @@
+# benchmarks/comun.py
+"""Utilidades compartidas por los benchmarks (payloads sintéticos y carga de versiones anteriores)."""
+
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import io
+from contextlib import contextmanager, redirect_stdout
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+CARACTERISTICAS = [
+    "Posee refugio", "Estándar del refugio", "Estado de conservación del refugio", "Posee basurero",
+    "Posee señal de parada", "Señal cumple norma gráfica", "Estado de conservación de la señal",
+    "Iluminación", "Posee andén", "Estado de conservación del andén", "Posee conexión a la vereda",
+    "Posee huella podo táctil al borde del andén", "Demarcación del cajón de parada",
+]
+
+
+def payload_sintetico(n_paraderos=50, fotos_por_seccion=0):
+    """Payload de /api/generate-report con n paraderos, 3 descripciones y la tabla de 13 características."""
+    paraderos = []
+    for i in range(1, n_paraderos + 1):
+        analisis = {}
+        for seccion in ("general", "refugio_anden", "senal"):
+            analisis[seccion] = {
+                "description": f"Descripción técnica de {seccion} para el paradero PA{i:04d}. " * 4,
+                "image_ids": [f"img-{i:04d}-{seccion}-{k}" for k in range(fotos_por_seccion)],
+            }
+        paraderos.append({
+            "info_paradero": {"codigo": f"PA{i:04d}", "ubicacion": f"Av. Siempre Viva {100 + i}"},
+            "analisis": analisis,
+            "tabla": [
+                {"caracteristica": c, "cumplimiento": "Sí" if (i + k) % 3 else "No", "observacion": "Sin observación"}
+                for k, c in enumerate(CARACTERISTICAS)
+            ],
+        })
+    return {
+        "info_proyecto": {
+            "proyecto": "Proyecto Benchmark", "comuna": "Santiago", "estudio": "IMIV", "mitigacion": "N°1",
+            "resolucion": "1234", "fecha": "01/01/2025", "medida_mitigacion": "Mejoramiento de paradas.",
+            "ubi_proyecto": "Av. Principal 123", "region": "Región Metropolitana",
+        },
+        "paraderos": paraderos,
+    }
+
+
+def cargar_report_generator(ref=None):
+    """
+    Importa report_generator del árbol de trabajo (ref=None) o de un commit de git (ref),
+    como módulo independiente para poder comparar versiones en el mismo proceso.
+    """
+    if ref is None:
+        import report_generator
+        return report_generator
+    codigo = subprocess.check_output(["git", "show", f"{ref}:report_generator.py"], cwd=RAIZ)
+    ruta = os.path.join(tempfile.mkdtemp(prefix="rg_"), "report_generator.py")
+    with open(ruta, "wb") as f:
+        f.write(codigo)
+    spec = importlib.util.spec_from_file_location(f"report_generator_{ref}", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    with redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(modulo)
+    return modulo
+
+
+@contextmanager
+def silencio():
+    """Oculta los print del generador mientras se mide."""
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def puerto_libre():
+    """Un puerto TCP libre en 127.0.0.1 para levantar un servidor de prueba."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cronometrar(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    resultado = fn(*args, **kwargs)
+    return resultado, time.perf_counter() - t0
+
+
+def tamano_document_xml(docx_bytes):
+    """Tamaño en bytes de word/document.xml dentro del .docx."""
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z:
+        return z.getinfo("word/document.xml").file_size
@@ -0,0 +1,210 @@
+# benchmarks/e2e.py
+"""
+Benchmark de punta a punta sin servicios de Google: Drive y Gemini falsos (benchmarks.fakes)
+sirviendo una campaña sintética en disco (benchmarks.fixtures).
+
+Por cada escenario (N paraderos x M fotos) se recorre el flujo del front con el cliente de pruebas de Flask:
+    list-images -> por paradero: analyze-image + save-description (x3 secciones) y fill-table
+    -> generate-report
+y se registran el tiempo total y por endpoint, el pico de memoria (RSS) y el tamaño del .docx.
+Cada escenario corre en un proceso nuevo, para que el pico de RSS sea sólo suyo.
+
+Los resultados se comparan con la línea base guardada (linea_base_e2e.json) y el comando termina
+con código 1 si alguna métrica empeora más que la tolerancia. La línea base depende de la máquina:
+regenérala con --actualizar-linea-base al cambiar de equipo o después de una mejora intencional.
+
+Uso:
+    python -m benchmarks.e2e [--escenarios chica mediana [grande]] [--latencia-gemini 0]
+        [--latencia-drive 0] [--tolerancia-tiempo 0.25] [--tolerancia-rss 0.20]
+        [--tolerancia-tamano 0.10] [--actualizar-linea-base]
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import redirect_stdout
+
+from benchmarks.comun import RAIZ
+
+ESCENARIOS = {
+    "chica": (5, 6),
+    "mediana": (20, 6),
+    "grande": (50, 9),
+}
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_e2e.json")
+
+
+def _tabla_desde_fill(datos):
+    """Respuesta de /api/fill-table -> filas 'tabla' del payload de generate-report."""
+    filas = []
+    for caracteristica, valor in datos.items():
+        if isinstance(valor, dict):
+            filas.append({"caracteristica": caracteristica, "cumplimiento": valor.get("seleccion", ""),
+                          "observacion": valor.get("comentario", "")})
+        else:
+            filas.append({"caracteristica": caracteristica, "cumplimiento": valor, "observacion": ""})
+    return filas
+
+
+def correr_campana(n_paraderos, fotos, latencia_gemini=0.0, latencia_drive=0.0):
+    """Ejecuta la campaña en este proceso y devuelve las métricas."""
+    from benchmarks import fakes
+    from benchmarks.fixtures import SECCIONES, generar_campana
+
+    drive = fakes.DriveFalso.desde_carpeta(generar_campana(n_paraderos, fotos))
+    gemini = fakes.GeminiFalso(latencia_s=latencia_gemini)
+    main = fakes.instalar(drive, gemini, latencia_drive_s=latencia_drive)
+    cliente = main.app.test_client()
+    tiempos = defaultdict(float)
+    llamadas = defaultdict(int)
+
+    def post(ruta, payload):
+        t0 = time.perf_counter()
+        r = cliente.post(f"/api/{ruta}", json=payload)
+        tiempos[ruta] += time.perf_counter() - t0
+        llamadas[ruta] += 1
+        if r.status_code != 200:
+            raise RuntimeError(f"/api/{ruta} respondió {r.status_code}: {r.data[:200]!r}")
+        return r
+
+    t_inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        listado = post("list-images", {"folder_name": fakes.CARPETA_PROYECTO}).get_json()
+        fotos_por = defaultdict(list)
+        for img in listado["images"]:
+            if not img["name"].startswith("PA"):
+                continue  # logo y figuras de ubicación
+            codigo, resto = img["name"].split("_", 1)
+            seccion = resto.rsplit("_", 1)[0]
+            fotos_por[(codigo, seccion)].append(img["id"])
+
+        paraderos = []
+        for i in range(1, n_paraderos + 1):
+            codigo = f"PA{i:04d}"
+            analisis = {}
+            for seccion in SECCIONES:
+                ids = fotos_por.get((codigo, seccion), [])
+                if not ids:
+                    continue
+                texto = post("analyze-image", {"image_ids": ids, "prompt_type": seccion,
+                                               "codigo_paradero": codigo}).get_json()["description"]
+                post("save-description", {"prompt_type": seccion, "description": texto, "image_ids": ids})
+                analisis[seccion] = {"description": texto, "image_ids": ids}
+            tabla = post("fill-table", {}).get_json()
+            paraderos.append({"info_paradero": {"codigo": codigo, "ubicacion": f"Av. Siempre Viva {100 + i}"},
+                              "analisis": analisis, "tabla": _tabla_desde_fill(tabla)})
+        main.informe_data.clear()
+
+        payload = {
+            "info_proyecto": {"proyecto": "Proyecto Benchmark", "comuna": "Santiago", "estudio": "IMIV",
+                              "mitigacion": "N°1", "resolucion": "1234", "fecha": "01/01/2025",
+                              "medida_mitigacion": "Mejoramiento de paradas.", "ubi_proyecto": "Av. Principal 123",
+                              "region": "Región Metropolitana"},
+            "drive_file_ids": listado["drive_file_ids"],
+            "paraderos": paraderos,
+        }
+        docx = post("generate-report", payload).data
+    total = time.perf_counter() - t_inicio
+
+    return {
+        "paraderos": n_paraderos,
+        "fotos": fotos,
+        "tiempo_total_s": round(total, 3),
+        "tiempo_por_endpoint_s": {k: round(v, 3) for k, v in tiempos.items()},
+        "llamadas": dict(llamadas),
+        "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "docx_bytes": len(docx),
+        "drive_bytes_servidos": drive.bytes_servidos,
+    }
+
+
+def medir_escenario(nombre, args):
+    """Corre un escenario en un proceso hijo y devuelve sus métricas."""
+    n, m = ESCENARIOS[nombre]
+    cmd = [sys.executable, "-m", "benchmarks.e2e", "--hijo", str(n), str(m),
+           "--latencia-gemini", str(args.latencia_gemini), "--latencia-drive", str(args.latencia_drive)]
+    # Índice de paraderos, manifiesto del vigía y contextos de Gemini vacíos en cada corrida: con los de una corrida
+    # anterior no se llamaría al modelo (o se usaría un contexto que el Gemini falso ya no tiene)
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = subprocess.run(cmd, cwd=RAIZ, capture_output=True, text=True,
+                                env={**os.environ, "PYTHONPATH": RAIZ,
+                                     "INDICE_PARADEROS_DB": os.path.join(tmp, "indice.sqlite"),
+                                     "VIGIA_DB": os.path.join(tmp, "vigia.sqlite"),
+                                     "GEMINI_CONTEXTO_DB": os.path.join(tmp, "contextos.sqlite")})
+    if salida.returncode != 0:
+        raise RuntimeError(f"El escenario '{nombre}' falló:\n{salida.stderr[-2000:]}")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def comparar(nombre, actual, base, args):
+    """Lista de regresiones (texto) de 'actual' respecto de 'base'."""
+    regresiones = []
+    reglas = [("tiempo_total_s", args.tolerancia_tiempo, "más lento"),
+              ("rss_pico_mb", args.tolerancia_rss, "más memoria")]
+    for metrica, tolerancia, texto in reglas:
+        if actual[metrica] > base[metrica] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: {metrica} {base[metrica]} -> {actual[metrica]} "
+                               f"({actual[metrica] / base[metrica] - 1:+.0%}, {texto}; tolerancia {tolerancia:.0%})")
+    # El tamaño del informe no debería cambiar sin querer, ni hacia arriba ni hacia abajo
+    if abs(actual["docx_bytes"] / base["docx_bytes"] - 1) > args.tolerancia_tamano:
+        regresiones.append(f"{nombre}: docx_bytes {base['docx_bytes']} -> {actual['docx_bytes']} "
+                           f"({actual['docx_bytes'] / base['docx_bytes'] - 1:+.0%}; tolerancia ±{args.tolerancia_tamano:.0%})")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escenarios", nargs="+", default=["chica", "mediana"], choices=list(ESCENARIOS))
+    parser.add_argument("--latencia-gemini", type=float, default=0.0)
+    parser.add_argument("--latencia-drive", type=float, default=0.0)
+    parser.add_argument("--tolerancia-tiempo", type=float, default=0.25)
+    parser.add_argument("--tolerancia-rss", type=float, default=0.20)
+    parser.add_argument("--tolerancia-tamano", type=float, default=0.10)
+    parser.add_argument("--actualizar-linea-base", action="store_true")
+    parser.add_argument("--hijo", nargs=2, type=int, metavar=("N", "M"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(correr_campana(*args.hijo, args.latencia_gemini, args.latencia_drive)))
+        return 0
+
+    base = {}
+    if os.path.exists(LINEA_BASE):
+        with open(LINEA_BASE, encoding="utf-8") as f:
+            base = json.load(f)
+
+    resultados, regresiones = {}, []
+    print(f"  {'escenario':10} {'paraderos x fotos':>18} {'total':>9} {'generate-report':>16} {'RSS pico':>10} {'docx':>10}")
+    for nombre in args.escenarios:
+        r = resultados[nombre] = medir_escenario(nombre, args)
+        print(f"  {nombre:10} {r['paraderos']:>10} x {r['fotos']:<5} {r['tiempo_total_s']:>8.2f}s "
+              f"{r['tiempo_por_endpoint_s']['generate-report']:>15.2f}s {r['rss_pico_mb']:>7.0f} MB "
+              f"{r['docx_bytes'] / 1e6:>7.1f} MB")
+        if nombre in base and not args.actualizar_linea_base:
+            regresiones += comparar(nombre, r, base[nombre], args)
+
+    if args.actualizar_linea_base:
+        base.update(resultados)
+        with open(LINEA_BASE, "w", encoding="utf-8") as f:
+            json.dump(base, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Línea base actualizada: {LINEA_BASE}")
+        return 0
+    if regresiones:
+        print("\n❌ Regresiones respecto de la línea base:")
+        for r in regresiones:
+            print(f"  - {r}")
+        return 1
+    print("\n✅ Sin regresiones respecto de la línea base." if base else "\n(No hay línea base: usa --actualizar-linea-base)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
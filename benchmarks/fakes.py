@@ -0,0 +1,476 @@
+# benchmarks/fakes.py
+"""
+Reemplazos locales de Google Drive y Gemini para medir sin red ni credenciales.
+
+- DriveFalso: árbol de carpetas/archivos en memoria que responde a la API REST de Drive v3
+  (files.list con las queries que usa la app, metadatos, alt=media con Range y el feed
+  changes.getStartPageToken/changes.list, alimentado por reemplazar/renombrar/eliminar, y
+  subidas reanudables con files.generateIds; fallos_subida=n hace fallar con 503 los n tramos siguientes;
+  las imágenes traen thumbnailLink, servido en JPEG al tamaño del sufijo =s<lado>).
+  Se expone como http de googleapiclient (HttpDriveFalso, para build('drive', 'v3', http=...))
+  y como transporte de httpx (transporte_async, para drive_async.DriveAsync).
+- GeminiFalso: sustituto del módulo google.generativeai con latencia y respuesta configurables,
+  count_tokens (1 token cada 4 caracteres) y caché de contexto (caching.CachedContent y
+  GenerativeModel.from_cached_content; usage_metadata informa los tokens servidos desde la caché).
+- instalar(): conecta ambos a main (y a asgi, si se usa).
+"""
+
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+
+MIME_CARPETA = "application/vnd.google-apps.folder"
+CARPETA_PROYECTO = "Proyecto Benchmark"
+MIMES = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+_CLAUSULAS = [
+    (re.compile(r"^name\s*=\s*'(.*)'$"), lambda a, v: a["name"] == v),
+    (re.compile(r"^mimeType\s*=\s*'(.*)'$"), lambda a, v: a["mimeType"] == v),
+    (re.compile(r"^mimeType\s+contains\s+'(.*)'$"), lambda a, v: v in a["mimeType"]),
+    (re.compile(r"^'(.*)'\s+in\s+parents$"), lambda a, v: v in a["parents"]),
+    (re.compile(r"^trashed\s*=\s*false$"), lambda a, v: not a.get("trashed")),
+]
+
+
+class DriveFalso:
+    """Archivos en memoria con ids deterministas (mismo árbol => mismos ids en todos los procesos)."""
+
+    def __init__(self):
+        self.archivos = {}
+        self._lock = threading.Lock()
+        self.llamadas = {"list": 0, "get": 0, "media": 0, "changes": 0, "upload": 0, "thumbnail": 0}
+        self.sesiones = {}  # upload_id -> {"file_id", "meta", "datos", "existente"}
+        self.fallos_subida = 0
+        self._generados = 0
+        self.cambios = []  # fileIds en orden; el pageToken del feed es una posición en esta lista
+        self.bytes_servidos = 0
+
+    # --- Construcción del árbol ---
+    def agregar_carpeta(self, nombre, padre=None):
+        return self._agregar(nombre, MIME_CARPETA, b"", padre)
+
+    def agregar_archivo(self, nombre, contenido, padre, mime=None):
+        mime = mime or MIMES.get(os.path.splitext(nombre)[1].lower(), "application/octet-stream")
+        return self._agregar(nombre, mime, contenido, padre)
+
+    def _agregar(self, nombre, mime, contenido, padre, file_id=None):
+        with self._lock:
+            file_id = file_id or f"f{len(self.archivos):06d}"
+            self.archivos[file_id] = {
+                "id": file_id, "name": nombre, "mimeType": mime, "parents": [padre] if padre else [],
+                "contenido": contenido, "size": str(len(contenido)),
+                "webViewLink": f"https://drive.falso/{file_id}/view",
+                "md5Checksum": hashlib.md5(contenido).hexdigest(),
+            }
+            if mime.startswith("image/"):
+                self.archivos[file_id]["thumbnailLink"] = f"https://lh3.drive.falso/thumb/{file_id}=s220"
+            self.cambios.append(file_id)
+        return file_id
+
+    # --- Cambios (aparecen en changes.list) ---
+    def reemplazar(self, file_id, contenido):
+        """Sube una nueva versión del archivo (mismo id, md5 distinto)."""
+        with self._lock:
+            self.archivos[file_id].update(contenido=contenido, size=str(len(contenido)),
+                                          md5Checksum=hashlib.md5(contenido).hexdigest())
+            self.cambios.append(file_id)
+
+    def renombrar(self, file_id, nombre):
+        with self._lock:
+            self.archivos[file_id]["name"] = nombre
+            self.cambios.append(file_id)
+
+    def eliminar(self, file_id):
+        """Manda el archivo a la papelera."""
+        with self._lock:
+            self.archivos[file_id]["trashed"] = True
+            self.cambios.append(file_id)
+
+    @classmethod
+    def desde_carpeta(cls, ruta):
+        """Carga un árbol de disco: cada subcarpeta es una carpeta de Drive y cada archivo, un archivo."""
+        drive = cls()
+        ids = {os.path.abspath(ruta): None}
+        for raiz, carpetas, archivos in os.walk(ruta):
+            padre = ids[os.path.abspath(raiz)]
+            for nombre in sorted(carpetas):
+                ids[os.path.abspath(os.path.join(raiz, nombre))] = drive.agregar_carpeta(nombre, padre)
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                with open(os.path.join(raiz, nombre), "rb") as f:
+                    drive.agregar_archivo(nombre, f.read(), padre)
+        return drive
+
+    # --- API REST ---
+    def buscar(self, q):
+        """Evalúa las queries de files.list que usa la app (cláusulas unidas con 'and')."""
+        condiciones = []
+        for clausula in re.split(r"\s+and\s+", q.strip()):
+            clausula = clausula.strip().strip("()").strip()
+            for patron, prueba in _CLAUSULAS:
+                m = patron.match(clausula)
+                if m:
+                    condiciones.append((prueba, m.group(1) if m.groups() else None))
+                    break
+            else:
+                raise ValueError(f"Cláusula no soportada por DriveFalso: {clausula!r}")
+        return [a for a in self.archivos.values() if all(p(a, v) for p, v in condiciones)]
+
+    @staticmethod
+    def _campos(archivo, fields):
+        m = re.search(r"files\((.*?)\)", fields or "")
+        nombres = [c.strip() for c in m.group(1).split(",")] if m else ["id", "name"]
+        return {c: archivo[c] for c in nombres if c in archivo}
+
+    def responder(self, metodo, url, cabeceras=None, cuerpo=None):
+        """(status, cabeceras, cuerpo) para una petición a la API de Drive."""
+        partes = urlsplit(url)
+        params = {k: v[0] for k, v in parse_qs(partes.query).items()}
+        ruta = partes.path.split("/drive/v3", 1)[-1]
+        if partes.path.startswith("/thumb/"):
+            return self._responder_miniatura(partes.path)
+        if ruta.startswith("/changes"):
+            return self._responder_cambios(ruta, params)
+        if partes.path.startswith("/upload/"):
+            return self._responder_subida(metodo, ruta, params, cabeceras or {}, cuerpo)
+        if ruta.rstrip("/") == "/files/generateIds":
+            with self._lock:
+                n = int(params.get("count", 10))
+                ids = [f"g{i:06d}" for i in range(self._generados, self._generados + n)]
+                self._generados += n
+            return 200, {"content-type": "application/json"}, json.dumps({"ids": ids, "space": "drive"}).encode()
+        if ruta.rstrip("/") == "/files":
+            with self._lock:
+                self.llamadas["list"] += 1
+            inicio, tamano = int(params.get("pageToken", 0)), int(params.get("pageSize", 100))
+            encontrados = self.buscar(params.get("q", ""))
+            cuerpo = {"files": [self._campos(a, params.get("fields")) for a in encontrados[inicio:inicio + tamano]]}
+            if inicio + tamano < len(encontrados):
+                cuerpo["nextPageToken"] = str(inicio + tamano)
+            return 200, {"content-type": "application/json"}, json.dumps(cuerpo).encode()
+        m = re.match(r"^/files/([^/]+)$", ruta)
+        archivo = self.archivos.get(m.group(1)) if m else None
+        if archivo is None:
+            return 404, {"content-type": "application/json"}, b'{"error": {"code": 404, "message": "File not found"}}'
+        if params.get("alt") != "media":
+            with self._lock:
+                self.llamadas["get"] += 1
+            datos = {k: v for k, v in archivo.items() if k != "contenido"}
+            return 200, {"content-type": "application/json"}, json.dumps(datos).encode()
+
+        contenido = archivo["contenido"]
+        rango = {k.lower(): v for k, v in (cabeceras or {}).items()}.get("range")
+        with self._lock:
+            self.llamadas["media"] += 1
+        if rango:
+            a, b = rango.split("=", 1)[1].split("-")
+            a, b = int(a), min(int(b or len(contenido) - 1), len(contenido) - 1)
+            parte = contenido[a:b + 1]
+            with self._lock:
+                self.bytes_servidos += len(parte)
+            return 206, {"content-range": f"bytes {a}-{b}/{len(contenido)}",
+                         "content-type": archivo["mimeType"]}, parte
+        with self._lock:
+            self.bytes_servidos += len(contenido)
+        return 200, {"content-type": archivo["mimeType"]}, contenido
+
+
+    def _responder_cambios(self, ruta, params):
+        with self._lock:
+            self.llamadas["changes"] += 1
+            total = len(self.cambios)
+            if ruta.rstrip("/") == "/changes/startPageToken":
+                cuerpo = {"startPageToken": str(total)}
+            else:
+                inicio, tamano = int(params.get("pageToken", 0)), int(params.get("pageSize", 100))
+                cambios = []
+                for file_id in self.cambios[inicio:inicio + tamano]:
+                    archivo = {k: v for k, v in self.archivos[file_id].items() if k != "contenido"}
+                    cambios.append({"fileId": file_id, "removed": False, "file": {"trashed": False, **archivo}})
+                cuerpo = {"changes": cambios}
+                if inicio + tamano < total:
+                    cuerpo["nextPageToken"] = str(inicio + tamano)
+                else:
+                    cuerpo["newStartPageToken"] = str(total)
+        return 200, {"content-type": "application/json"}, json.dumps(cuerpo).encode()
+
+
+    def _responder_miniatura(self, ruta):
+        from PIL import Image
+
+        file_id, lado = re.match(r"^/thumb/([^=]+)=s(\d+)$", ruta).groups()
+        archivo = self.archivos.get(file_id)
+        if archivo is None:
+            return 404, {"content-type": "text/plain"}, b"Not found"
+        with self._lock:
+            self.llamadas["thumbnail"] += 1
+        with Image.open(io.BytesIO(archivo["contenido"])) as img:
+            img.thumbnail((int(lado), int(lado)))
+            salida = io.BytesIO()
+            img.convert("RGB").save(salida, "JPEG", quality=85)
+        return 200, {"content-type": "image/jpeg"}, salida.getvalue()
+
+
+    def _responder_subida(self, metodo, ruta, params, cabeceras, cuerpo):
+        json_ = {"content-type": "application/json"}
+        cabeceras = {k.lower(): v for k, v in cabeceras.items()}
+        if hasattr(cuerpo, "read"):
+            cuerpo = cuerpo.read()
+        if isinstance(cuerpo, str):
+            cuerpo = cuerpo.encode()
+        if "upload_id" not in params:
+            # Inicio de sesión: POST (archivo nuevo) o PATCH /files/<id> (versión nueva)
+            m = re.match(r"^/files/([^/]+)$", ruta)
+            meta = json.loads(cuerpo or b"{}")
+            file_id = m.group(1) if m else meta.get("id")
+            with self._lock:
+                upload_id = f"u{len(self.sesiones):06d}"
+                self.sesiones[upload_id] = {"file_id": file_id, "meta": meta, "datos": bytearray(), "existente": bool(m)}
+            return 200, {**json_, "location": f"https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"}, b"{}"
+
+        sesion = self.sesiones[params["upload_id"]]
+        with self._lock:
+            self.llamadas["upload"] += 1
+            if self.fallos_subida > 0:
+                self.fallos_subida -= 1
+                return 503, json_, b'{"error": {"code": 503, "message": "Backend Error"}}'
+        inicio, total = re.match(r"bytes (\*|\d+)-?\d*/(\d+|\*)", cabeceras.get("content-range", "bytes */*")).groups()
+        if inicio != "*" and int(inicio) == len(sesion["datos"]):
+            sesion["datos"].extend(cuerpo or b"")
+        if total != "*" and len(sesion["datos"]) >= int(total):
+            contenido = bytes(sesion["datos"])
+            with self._lock:
+                if sesion["existente"]:
+                    self.archivos[sesion["file_id"]].update(
+                        contenido=contenido, size=str(len(contenido)), md5Checksum=hashlib.md5(contenido).hexdigest())
+                    self.cambios.append(sesion["file_id"])
+            if not sesion["existente"]:
+                meta = sesion["meta"]
+                padres = meta.get("parents") or [None]
+                self._agregar(meta.get("name"), MIMES.get(os.path.splitext(meta.get("name") or "")[1].lower(),
+                                                          "application/octet-stream"), contenido, padres[0],
+                              file_id=sesion["file_id"])
+            archivo = self.archivos[sesion["file_id"]]
+            return 200, json_, json.dumps({k: archivo[k] for k in ("id", "name", "webViewLink")}).encode()
+        rango = {"range": f"bytes=0-{len(sesion['datos']) - 1}"} if sesion["datos"] else {}
+        return 308, {**json_, **rango}, b""
+
+
+class HttpDriveFalso:
+    """Objeto 'http' (interfaz de httplib2) para googleapiclient; agrega latencia por petición."""
+
+    def __init__(self, drive, latencia_s=0.0):
+        self.drive = drive
+        self.latencia_s = latencia_s
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        status, cabeceras, cuerpo = self.drive.responder(method, uri, headers, body)
+        return httplib2.Response({"status": str(status), **cabeceras}), cuerpo
+
+
+def servicio_drive(drive, latencia_s=0.0):
+    """Cliente googleapiclient real (discovery incluido en el paquete) sobre el Drive falso."""
+    from googleapiclient.discovery import build
+    return build("drive", "v3", http=HttpDriveFalso(drive, latencia_s), cache_discovery=False, static_discovery=True)
+
+
+def transporte_async(drive, latencia_s=0.0):
+    """Transporte httpx que responde con el Drive falso, con latencia asíncrona por petición."""
+    import httpx
+
+    async def manejar(request):
+        if latencia_s:
+            await asyncio.sleep(latencia_s)
+        status, cabeceras, cuerpo = drive.responder(request.method, str(request.url), dict(request.headers), request.content)
+        return httpx.Response(status, headers=cabeceras, content=cuerpo)
+
+    return httpx.MockTransport(manejar)
+
+
+# --- Gemini ---
+def respuesta_por_defecto(contenido):
+    """JSON de características para fill-table; una descripción de un párrafo para analyze-image."""
+    prompt = contenido if isinstance(contenido, str) else str(contenido[0])
+    if "objeto JSON" in prompt:
+        from benchmarks.comun import CARACTERISTICAS
+        datos = {c: "Sí" for c in CARACTERISTICAS}
+        datos["Estado de conservación del refugio"] = {"seleccion": "Bueno", "comentario": "Estructura en buen estado"}
+        return "```json\n" + json.dumps(datos, ensure_ascii=False) + "\n```"
+    return ("El paradero cuenta con refugio en buen estado, andén continuo, señal de parada vigente y "
+            "demarcación visible; no se observa huella podo táctil. " * 3).strip()
+
+
+def _tokens(contenido):
+    textos = [contenido] if isinstance(contenido, str) else [c for c in contenido if isinstance(c, str)]
+    return sum(len(t) for t in textos) // 4
+
+
+class _Respuesta:
+    def __init__(self, text, uso=None):
+        self.text = text
+        self.usage_metadata = uso
+
+
+class _RespuestaEnVivo:
+    """Respuesta con stream=True: el primer trozo tarda primer_fragmento_s y el resto se reparte la latencia."""
+
+    def __init__(self, gemini, texto, uso=None):
+        self.gemini = gemini
+        self.usage_metadata = uso
+        palabras = texto.split(" ")
+        paso = max(1, len(palabras) // 12)
+        self.trozos = [" ".join(palabras[i:i + paso]) + (" " if i + paso < len(palabras) else "")
+                       for i in range(0, len(palabras), paso)]
+        self.text = texto
+
+    def _esperas(self):
+        primero = min(self.gemini.primer_fragmento_s, self.gemini.latencia_s)
+        resto = (self.gemini.latencia_s - primero) / max(1, len(self.trozos) - 1)
+        return [primero] + [resto] * (len(self.trozos) - 1)
+
+    def __iter__(self):
+        for espera, trozo in zip(self._esperas(), self.trozos):
+            if espera:
+                time.sleep(espera)
+            yield _Respuesta(trozo)
+
+    async def __aiter__(self):
+        for espera, trozo in zip(self._esperas(), self.trozos):
+            if espera:
+                await asyncio.sleep(espera)
+            yield _Respuesta(trozo)
+
+
+class _ModeloFalso:
+    def __init__(self, gemini, model_name=None, contexto=None, **_):
+        self.gemini = gemini
+        self.model_name = model_name
+        self.contexto = contexto
+
+    def _responder(self, contenido):
+        with self.gemini._lock:
+            self.gemini.llamadas += 1
+        en_cache = 0
+        if self.contexto is not None:
+            contenido = [self.contexto.system_instruction] + ([contenido] if isinstance(contenido, str) else list(contenido))
+            en_cache = _tokens(self.contexto.system_instruction)
+        uso = SimpleNamespace(prompt_token_count=_tokens(contenido), cached_content_token_count=en_cache)
+        return _Respuesta(self.gemini.respuesta(contenido), uso)
+
+    def count_tokens(self, contenido):
+        return SimpleNamespace(total_tokens=_tokens(contenido))
+
+    def generate_content(self, contenido, stream=False, **_):
+        if stream:
+            respuesta = self._responder(contenido)
+            return _RespuestaEnVivo(self.gemini, respuesta.text, respuesta.usage_metadata)
+        if self.gemini.latencia_s:
+            time.sleep(self.gemini.latencia_s)
+        return self._responder(contenido)
+
+    async def generate_content_async(self, contenido, stream=False, **_):
+        if stream:
+            respuesta = self._responder(contenido)
+            return _RespuestaEnVivo(self.gemini, respuesta.text, respuesta.usage_metadata)
+        if self.gemini.latencia_s:
+            await asyncio.sleep(self.gemini.latencia_s)
+        return self._responder(contenido)
+
+
+class _FabricaModelos:
+    """GeminiFalso.GenerativeModel: se llama como la clase real y tiene from_cached_content."""
+
+    def __init__(self, gemini):
+        self.gemini = gemini
+
+    def __call__(self, model_name=None, **kwargs):
+        return _ModeloFalso(self.gemini, model_name, **kwargs)
+
+    def from_cached_content(self, cached_content, **_):
+        return _ModeloFalso(self.gemini, cached_content.model, contexto=cached_content)
+
+
+class _ContextoFalso:
+    def __init__(self, name, model, system_instruction, ttl):
+        self.name, self.model, self.system_instruction = name, model, system_instruction
+        self.update(ttl=ttl)
+
+    def update(self, ttl=None, **_):
+        self.expire_time = datetime.datetime.now(datetime.timezone.utc) + ttl
+
+
+class _CachedContentFalso:
+    """GeminiFalso.caching.CachedContent: contextos en memoria (create/get)."""
+
+    def __init__(self, gemini):
+        self.gemini = gemini
+
+    def create(self, model, display_name=None, system_instruction=None, ttl=None, **_):
+        with self.gemini._lock:
+            contexto = _ContextoFalso(f"cachedContents/c{len(self.gemini.contextos):04d}", model,
+                                      system_instruction, ttl)
+            self.gemini.contextos[contexto.name] = contexto
+        return contexto
+
+    def get(self, name):
+        return self.gemini.contextos[name]
+
+
+class GeminiFalso:
+    """Imita lo que la app usa de google.generativeai: configure(), GenerativeModel() y caching."""
+
+    def __init__(self, latencia_s=0.0, respuesta=respuesta_por_defecto, primer_fragmento_s=None):
+        self.latencia_s = latencia_s
+        # Con stream=True: cuánto tarda el primer trozo de texto (por omisión, una décima de la latencia)
+        self.primer_fragmento_s = latencia_s / 10 if primer_fragmento_s is None else primer_fragmento_s
+        self.respuesta = respuesta if callable(respuesta) else (lambda _c, r=respuesta: r)
+        self.llamadas = 0
+        self.contextos = {}
+        self._lock = threading.Lock()
+        self.GenerativeModel = _FabricaModelos(self)  # noqa: N815 (mismo nombre que la API real)
+        self.caching = SimpleNamespace(CachedContent=_CachedContentFalso(self))
+
+    def configure(self, **_):
+        pass
+
+
+def instalar(drive, gemini, latencia_drive_s=0.0):
+    """Hace que main (y asgi) usen el Drive y el Gemini falsos. Devuelve el módulo main."""
+    import main
+    local = threading.local()
+
+    def authenticate_google_drive():
+        if getattr(local, "service", None) is None:
+            local.service = servicio_drive(drive, latencia_drive_s)
+        return local.service, "benchmark@drive.falso"
+
+    main.authenticate_google_drive = authenticate_google_drive
+    main.obtener_genai = lambda: gemini
+
+    import asgi
+    from drive_async import DriveAsync
+    compartido = {}
+
+    def obtener_drive_async():
+        if "drive" not in compartido:
+            compartido["drive"] = DriveAsync(transport=transporte_async(drive, latencia_drive_s))
+        return compartido["drive"], "benchmark@drive.falso"
+
+    asgi.obtener_drive_async = obtener_drive_async
+    return main
@@ -0,0 +1,101 @@
+# benchmarks/fixtures.py
+"""
+Carpetas de proyecto sintéticas en disco, para servirlas con benchmarks.fakes.DriveFalso.desde_carpeta().
+
+Una campaña de N paraderos x M fotos queda como:
+    <raíz>/Proyecto Benchmark/
+        PA0001_general_0.jpg, PA0001_refugio_anden_1.jpg, PA0001_senal_2.jpg, ...
+        logo2.jpg, ubicacion.png, ubicacion_paraderos.png, Tablas.xlsx (hojas Paradas y Resumen)
+Las fotos tienen tamaño de foto de celular (por defecto 2048x1536, ~1 MB) y se generan una sola
+vez por combinación de parámetros (quedan en BENCH_FIXTURES_DIR).
+"""
+
+import io
+import os
+import tempfile
+
+from benchmarks.fakes import CARPETA_PROYECTO
+
+SECCIONES = ("general", "refugio_anden", "senal")
+FIXTURES_DIR = os.environ.get("BENCH_FIXTURES_DIR") or os.path.join(tempfile.gettempdir(), "paraderos_fixtures")
+# Fotos base que se generan; cada archivo les agrega un sufijo propio después del fin del JPEG
+# (los lectores lo ignoran), así todas son distintas para Drive y para el .docx sin generar cientos
+FOTOS_DISTINTAS = 12
+
+
+def jpeg_sintetico(lado, semilla, calidad=85, ruido=20):
+    """JPEG con ruido y degradado: comprime parecido a una foto real."""
+    from PIL import Image
+    import numpy as np
+    rng = np.random.default_rng(semilla)
+    alto = lado * 3 // 4
+    base = np.linspace(0, 255, lado, dtype=np.float32)[None, :, None]
+    pixeles = np.clip(base + rng.normal(0, ruido, (alto, lado, 3)), 0, 255).astype("uint8")
+    salida = io.BytesIO()
+    Image.fromarray(pixeles).save(salida, "JPEG", quality=calidad)
+    return salida.getvalue()
+
+
+def png_sintetico(ancho, alto):
+    """PNG tipo plano (colores planos con líneas), como las figuras de ubicación."""
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (ancho, alto), (235, 235, 225))
+    dibujo = ImageDraw.Draw(img)
+    for k in range(0, ancho, 40):
+        dibujo.line([(k, 0), (ancho - k, alto)], fill=(180, 180, 170), width=3)
+    salida = io.BytesIO()
+    img.save(salida, "PNG")
+    return salida.getvalue()
+
+
+def tablas_xlsx(n_paraderos, servicios=8):
+    """Tablas.xlsx con la hoja Paradas (encabezado de dos filas combinado) y la hoja Resumen."""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Paradas"
+    ws.append(["Código", "Ubicación"] + ["Servicios"] * servicios)
+    ws.append(["", ""] + [f"Servicio {k + 1}" for k in range(servicios)])
+    ws.merge_cells("A1:A2")
+    ws.merge_cells("B1:B2")
+    ws.merge_cells(start_row=1, start_column=3, end_row=1, end_column=2 + servicios)
+    for i in range(1, n_paraderos + 1):
+        ws.append([f"PA{i:04d}", f"Av. Siempre Viva {100 + i}"] + [f"{100 + (i * 7 + k) % 500}" for k in range(servicios)])
+    ws.column_dimensions["B"].width = 30
+    r = wb.create_sheet("Resumen")
+    r.append(["Paradero", "Refugio", "Señal", "Andén", "Demarcación", "% cumplimiento"])
+    for i in range(1, n_paraderos + 1):
+        r.append([f"PA{i:04d}", "Bueno", "Regular", "Bueno" if i % 2 else "Deficiente", "Sí posee", (i % 10) / 10])
+        r.cell(row=r.max_row, column=6).number_format = "0%"
+    salida = io.BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+def generar_campana(n_paraderos, fotos_por_paradero, lado=2048, raiz=FIXTURES_DIR):
+    """Crea (o reutiliza) la carpeta de la campaña y devuelve la ruta raíz para DriveFalso.desde_carpeta()."""
+    ruta = os.path.join(raiz, f"campana_{n_paraderos}x{fotos_por_paradero}_{lado}")
+    carpeta = os.path.join(ruta, CARPETA_PROYECTO)
+    marca = os.path.join(ruta, ".completa")
+    if os.path.exists(marca):
+        return ruta
+    os.makedirs(carpeta, exist_ok=True)
+    fotos = [jpeg_sintetico(lado, s) for s in range(min(FOTOS_DISTINTAS, n_paraderos * fotos_por_paradero))]
+    k = 0
+    for i in range(1, n_paraderos + 1):
+        for j in range(fotos_por_paradero):
+            seccion = SECCIONES[j % len(SECCIONES)]
+            with open(os.path.join(carpeta, f"PA{i:04d}_{seccion}_{j}.jpg"), "wb") as f:
+                f.write(fotos[k % len(fotos)] + f"PA{i:04d}-{j}".encode())
+            k += 1
+    archivos = {
+        "logo2.jpg": jpeg_sintetico(400, 999, calidad=90),
+        "ubicacion.png": png_sintetico(1600, 1000),
+        "ubicacion_paraderos.png": png_sintetico(1600, 1000),
+        "Tablas.xlsx": tablas_xlsx(n_paraderos),
+    }
+    for nombre, contenido in archivos.items():
+        with open(os.path.join(carpeta, nombre), "wb") as f:
+            f.write(contenido)
+    open(marca, "w").close()
+    return ruta
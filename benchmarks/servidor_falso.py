@@ -0,0 +1,27 @@
+# benchmarks/servidor_falso.py
+"""
+La app (Flask y ASGI) conectada a Drive y Gemini falsos, para pruebas de carga.
+
+    gunicorn benchmarks.servidor_falso:app ...
+    uvicorn benchmarks.servidor_falso:asgi_app ...
+
+Parámetros por variables de entorno:
+    FALSO_LATENCIA_DRIVE (s por petición a Drive, 0.05), FALSO_LATENCIA_GEMINI (s, 1.0),
+    FALSO_PARADEROS (10), FALSO_FOTOS (3 por paradero), FALSO_LADO_FOTO (px, 640).
+"""
+
+import os
+
+from benchmarks import fakes
+from benchmarks.fixtures import generar_campana
+
+ruta = generar_campana(int(os.environ.get("FALSO_PARADEROS", "10")), int(os.environ.get("FALSO_FOTOS", "3")),
+                       int(os.environ.get("FALSO_LADO_FOTO", "640")))
+drive = fakes.DriveFalso.desde_carpeta(ruta)
+gemini = fakes.GeminiFalso(latencia_s=float(os.environ.get("FALSO_LATENCIA_GEMINI", "1.0")))
+main = fakes.instalar(drive, gemini, latencia_drive_s=float(os.environ.get("FALSO_LATENCIA_DRIVE", "0.05")))
+
+import asgi  # noqa: E402
+
+app = main.app
+asgi_app = asgi.app
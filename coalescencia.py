@@ -0,0 +1,206 @@
+# coalescencia.py
+"""
+Coalescencia de peticiones idénticas ("single-flight").
+
+Cuando llegan varias peticiones iguales a la vez (doble clic en "Generar informe",
+reintentos de /api/analyze-image), sólo la primera ejecuta el trabajo; las demás esperan
+y reciben el mismo resultado.
+
+- Dentro de un worker: las peticiones se enganchan al vuelo en curso (threading.Event).
+- Entre workers: un lease en un archivo SQLite local marca quién está calculando cada clave.
+  Los workers que esperan se anotan en el lease, y sólo si hay alguno el resultado se deja
+  ahí unos segundos para que lo lean (un informe sin duplicados no escribe su .docx en SQLite).
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict
+
+import almacen_local
+
+DB_POR_DEFECTO = os.environ.get("COALESCENCIA_DB") or os.path.join(tempfile.gettempdir(), "paraderos_singleflight.sqlite")
+
+
+def clave_canonica(payload: Any) -> str:
+    """Hash estable del payload (claves ordenadas, sin espacios), independiente del orden de los dicts."""
+    texto = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """
+    Ejecuta fn una sola vez por clave entre todas las llamadas concurrentes.
+
+    - nombre: prefijo de las claves (separa endpoints) y etiqueta de las estadísticas.
+    - ruta_db: archivo SQLite compartido entre workers (None desactiva la coalescencia entre workers).
+    - lease_s: tiempo máximo que se respeta un lease ajeno (si el worker murió, otro toma el trabajo).
+    - retencion_s: cuánto tiempo queda disponible el resultado para los workers que estaban esperando.
+    - max_bytes_compartidos: resultados más grandes no se comparten entre workers.
+    Sólo se comparten entre workers resultados de tipos básicos (str, bytes, tuplas, dicts, listas).
+    """
+
+    def __init__(self, nombre: str, ruta_db: str = DB_POR_DEFECTO, lease_s: float = 300,
+                 retencion_s: float = 10, intervalo_s: float = 0.2, max_bytes_compartidos: int = 64 * 1024 * 1024):
+        self.nombre = nombre
+        self.ruta_db = ruta_db
+        self.lease_s = lease_s
+        self.retencion_s = retencion_s
+        self.intervalo_s = intervalo_s
+        self.max_bytes_compartidos = max_bytes_compartidos
+        self._sufijo = uuid.uuid4().hex[:8]
+        self._vuelos: Dict[str, _Vuelo] = {}
+        self._lock = threading.Lock()
+        self._stats = {"llamadas": 0, "ejecutadas": 0, "coalescidas_worker": 0, "coalescidas_entre_workers": 0}
+        if self.ruta_db:
+            try:
+                self._inicializar_db()
+            except sqlite3.Error as e:
+                print(f"❌ Coalescencia '{nombre}': SQLite no disponible ({e}); sólo dentro del worker.")
+                self.ruta_db = None
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def ejecutar(self, payload: Any, fn: Callable[[], Any]) -> Any:
+        """Devuelve fn() o, si ya hay una ejecución idéntica en curso, su resultado."""
+        clave = f"{self.nombre}:{clave_canonica(payload)}"
+        with self._lock:
+            self._stats["llamadas"] += 1
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+            else:
+                vuelo.esperando += 1
+                self._stats["coalescidas_worker"] += 1
+
+        if not lider:
+            print(f"🔁 [{self.nombre}] Petición idéntica en curso; esperando su resultado.")
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = self._ejecutar_entre_workers(clave, fn)
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.listo.set()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["en_curso"] = len(self._vuelos)
+        stats["coalescidas"] = stats["coalescidas_worker"] + stats["coalescidas_entre_workers"]
+        return stats
+
+    # ------------------------------------------------------------------
+    # Coordinación entre workers (SQLite)
+    # ------------------------------------------------------------------
+    @property
+    def _dueno(self):
+        # Incluye el pid actual: con --preload el objeto se crea antes del fork y lo heredan todos los workers
+        return f"{os.getpid()}-{self._sufijo}"
+
+    def _conectar(self):
+        # Sin transacción implícita: los BEGIN IMMEDIATE / COMMIT del lease son explícitos
+        return almacen_local.conectar(self.ruta_db, isolation_level=None)
+
+    def _inicializar_db(self):
+        con = self._conectar()
+        try:
+            con.execute("CREATE TABLE IF NOT EXISTS leases (clave TEXT PRIMARY KEY, dueno TEXT, expira REAL, "
+                        "esperando INTEGER NOT NULL DEFAULT 0)")
+            con.execute("CREATE TABLE IF NOT EXISTS resultados (clave TEXT PRIMARY KEY, valor BLOB, expira REAL)")
+        finally:
+            con.close()
+
+    def _tomar_lease(self, con, clave) -> bool:
+        ahora = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            fila = con.execute("SELECT dueno, expira FROM leases WHERE clave = ?", (clave,)).fetchone()
+            if fila and fila[1] > ahora and fila[0] != self._dueno:
+                con.execute("COMMIT")
+                return False
+            con.execute("INSERT OR REPLACE INTO leases (clave, dueno, expira, esperando) VALUES (?, ?, ?, 0)",
+                        (clave, self._dueno, ahora + self.lease_s))
+            con.execute("DELETE FROM resultados WHERE clave = ? OR expira < ?", (clave, ahora))
+            con.execute("COMMIT")
+            return True
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    def _ejecutar_entre_workers(self, clave, fn):
+        if not self.ruta_db:
+            return self._calcular(fn)
+
+        try:
+            con = self._conectar()
+        except sqlite3.Error:
+            return self._calcular(fn)
+        try:
+            while True:
+                if self._tomar_lease(con, clave):
+                    break
+                # Otro worker lo está calculando: esperamos su resultado o que suelte el lease
+                print(f"🔁 [{self.nombre}] Petición idéntica en otro worker; esperando su resultado.")
+                con.execute("UPDATE leases SET esperando = esperando + 1 WHERE clave = ?", (clave,))
+                while True:
+                    time.sleep(self.intervalo_s)
+                    # Se mira el lease antes que el resultado: el dueño guarda el resultado y luego suelta el lease
+                    lease = con.execute("SELECT expira FROM leases WHERE clave = ?", (clave,)).fetchone()
+                    fila = con.execute("SELECT valor FROM resultados WHERE clave = ?", (clave,)).fetchone()
+                    if fila is not None:
+                        with self._lock:
+                            self._stats["coalescidas_entre_workers"] += 1
+                        return marshal.loads(fila[0])
+                    if lease is None or lease[0] <= time.time():
+                        break  # terminó sin resultado compartido (error o muy grande) o murió: lo intentamos nosotros
+
+            try:
+                resultado = self._calcular(fn)
+                # Sólo se comparte si algún worker se anotó a esperarlo (uno que llegue después lo calcula él)
+                fila = con.execute("SELECT esperando FROM leases WHERE clave = ? AND dueno = ?",
+                                   (clave, self._dueno)).fetchone()
+                if not fila or not fila[0]:
+                    return resultado
+                # marshal sólo admite tipos básicos (str, bytes, tuplas, dicts...) y no ejecuta código al leer
+                try:
+                    valor = marshal.dumps(resultado)
+                except ValueError:
+                    valor = None
+                if valor is not None and len(valor) <= self.max_bytes_compartidos:
+                    con.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?)",
+                                (clave, valor, time.time() + self.retencion_s))
+                return resultado
+            finally:
+                con.execute("DELETE FROM leases WHERE clave = ? AND dueno = ?", (clave, self._dueno))
+        finally:
+            con.close()
+
+    def _calcular(self, fn):
+        with self._lock:
+            self._stats["ejecutadas"] += 1
+        return fn()
@@ -0,0 +1,106 @@
+# compresion_http.py
+"""
+Compresión gzip de peticiones y respuestas de la API.
+
+- Peticiones con "Content-Encoding: gzip" (p. ej. el payload de una campaña grande): el cuerpo se
+  descomprime antes de llegar a la vista, como mucho GZIP_MAX_DESCOMPRIMIDO_MB (413 si lo supera,
+  400 si el gzip está dañado, 415 con otra codificación).
+- Respuestas: si el cliente envía "Accept-Encoding: gzip", las de tipo texto/JSON de más de
+  GZIP_MIN_BYTES salen comprimidas con nivel GZIP_NIVEL. No se tocan los .docx, ZIP e imágenes (ya
+  vienen comprimidos), ni las respuestas en streaming (server-sent events, lotes, archivos).
+
+DescompresionGzip envuelve la app WSGI (app.wsgi_app) y comprimir_respuesta() va en un after_request
+de Flask; el modo ASGI usa descomprimir() y comprimir() directamente.
+"""
+
+import gzip
+import io
+import json
+import os
+import zlib
+from http import HTTPStatus
+from typing import Optional
+
+NIVEL = int(os.environ.get("GZIP_NIVEL", "5"))
+MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
+MAX_DESCOMPRIMIDO = int(float(os.environ.get("GZIP_MAX_DESCOMPRIMIDO_MB", "256")) * 1024 * 1024)
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class ErrorCompresion(Exception):
+    """Cuerpo de petición que no se pudo descomprimir, con el código HTTP que corresponde."""
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def descomprimir(cuerpo: bytes, codificacion: Optional[str]) -> bytes:
+    """Cuerpo de la petición según su Content-Encoding (sin codificación o identity: tal cual)."""
+    codificacion = (codificacion or "").strip().lower()
+    if codificacion in ("", "identity"):
+        return cuerpo
+    if codificacion not in ("gzip", "x-gzip"):
+        raise ErrorCompresion(f"Content-Encoding '{codificacion}' no soportado; use gzip.", 415)
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        datos = d.decompress(cuerpo, MAX_DESCOMPRIMIDO)
+    except zlib.error as e:
+        raise ErrorCompresion(f"Cuerpo gzip inválido: {e}", 400)
+    if d.unconsumed_tail:
+        raise ErrorCompresion(f"El cuerpo descomprimido supera {MAX_DESCOMPRIMIDO // (1024 * 1024)} MB.", 413)
+    return datos
+
+
+def acepta_gzip(accept_encoding: Optional[str]) -> bool:
+    for opcion in (accept_encoding or "").lower().split(","):
+        nombre, _, parametros = opcion.strip().partition(";")
+        if nombre.strip() in ("gzip", "*"):
+            return parametros.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def comprimible(mimetype: Optional[str], tamano: int) -> bool:
+    mimetype = (mimetype or "").lower()
+    return (tamano >= MIN_BYTES and mimetype.startswith(TIPOS_COMPRIMIBLES)
+            and not mimetype.startswith("text/event-stream"))
+
+
+def comprimir(cuerpo: bytes) -> bytes:
+    return gzip.compress(cuerpo, compresslevel=NIVEL, mtime=0)
+
+
+def comprimir_respuesta(respuesta, accept_encoding: Optional[str]):
+    """after_request de Flask: comprime la respuesta si el cliente acepta gzip y vale la pena."""
+    if (respuesta.direct_passthrough or respuesta.is_streamed or respuesta.status_code < 200
+            or respuesta.status_code in (204, 304) or "Content-Encoding" in respuesta.headers):
+        return respuesta
+    respuesta.vary.add("Accept-Encoding")
+    if not acepta_gzip(accept_encoding) or not comprimible(respuesta.mimetype, respuesta.content_length or 0):
+        return respuesta
+    respuesta.set_data(comprimir(respuesta.get_data()))
+    respuesta.headers["Content-Encoding"] = "gzip"
+    return respuesta
+
+
+class DescompresionGzip:
+    """Middleware WSGI: descomprime el cuerpo de las peticiones con Content-Encoding: gzip."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        codificacion = environ.get("HTTP_CONTENT_ENCODING")
+        if not codificacion:
+            return self.app(environ, start_response)
+        largo = int(environ.get("CONTENT_LENGTH") or 0)
+        cuerpo = environ["wsgi.input"].read(largo) if largo else environ["wsgi.input"].read()
+        try:
+            cuerpo = descomprimir(cuerpo, codificacion)
+        except ErrorCompresion as e:
+            mensaje = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+            start_response(f"{e.status} {HTTPStatus(e.status).phrase}",
+                           [("Content-Type", "application/json"), ("Content-Length", str(len(mensaje)))])
+            return [mensaje]
+        environ = {**environ, "wsgi.input": io.BytesIO(cuerpo), "CONTENT_LENGTH": str(len(cuerpo))}
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        return self.app(environ, start_response)
@@ -0,0 +1,173 @@
+# contexto_gemini.py
+"""
+Caché de contexto de Gemini para los prefijos fijos de los prompts.
+
+Los preámbulos de PROMPTS_ANALISIS y el catálogo de opciones de /api/fill-table son idénticos en
+todas las llamadas y son la mayor parte de los tokens de texto. Con la caché de contexto se
+registran una vez en Gemini (system_instruction de un CachedContent) y cada llamada envía sólo la
+parte variable: fotos, código del paradero o descripciones del paradero.
+
+- Clave: modelo + nombre del prefijo + versión (hash del texto; si se edita un prompt, se crea un
+  contexto nuevo y el anterior vence solo).
+- El nombre del contexto y su vencimiento quedan en SQLite, compartidos por los workers. Cuando le
+  quedan menos de GEMINI_CONTEXTO_REFRESCO_S, la llamada siguiente le extiende el TTL.
+- Gemini exige un mínimo de tokens por contexto (GEMINI_CONTEXTO_MIN_TOKENS; 32.768 en los modelos
+  1.5) y un modelo con versión fija (no los alias -latest). Si el prefijo no llega al mínimo se usa el
+  prompt completo de siempre; si Gemini rechaza el contexto, también, y se reintenta pasados
+  GEMINI_CONTEXTO_REINTENTO_S.
+- estadisticas(): llamadas con y sin contexto, tokens de entrada y tokens servidos desde la caché,
+  y la latencia media de cada grupo (expuesto en /api/metrics).
+"""
+
+import datetime
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import almacen_local
+import metricas
+
+ACTIVO = os.environ.get("GEMINI_CONTEXTO", "1") == "1"
+DB_POR_DEFECTO = os.environ.get("GEMINI_CONTEXTO_DB") or os.path.join(tempfile.gettempdir(), "paraderos_contextos.sqlite")
+TTL_S = float(os.environ.get("GEMINI_CONTEXTO_TTL_S", "3600"))
+REFRESCO_S = float(os.environ.get("GEMINI_CONTEXTO_REFRESCO_S", "600"))
+MIN_TOKENS = int(os.environ.get("GEMINI_CONTEXTO_MIN_TOKENS", "32768"))
+REINTENTO_S = float(os.environ.get("GEMINI_CONTEXTO_REINTENTO_S", "900"))
+MARGEN_S = 60  # un contexto a punto de vencer no se usa: la llamada podría llegar tarde
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS contextos (
+    clave TEXT PRIMARY KEY, nombre TEXT, tokens INTEGER, expira REAL, estado TEXT NOT NULL,
+    error TEXT, actualizado REAL NOT NULL);
+"""
+
+
+def version(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:12]
+
+
+class ContextosGemini:
+    """Contextos en caché de Gemini por (modelo, prefijo, versión), con su estado en SQLite."""
+
+    def __init__(self, ruta_db: Optional[str] = DB_POR_DEFECTO):
+        self.ruta_db = ruta_db if ACTIVO else None
+        self._objetos: Dict[str, Any] = {}  # nombre -> CachedContent, por proceso
+        self._lock = threading.Lock()
+        self._stats = {"llamadas_con_contexto": 0, "llamadas_sin_contexto": 0, "tokens_entrada": 0,
+                       "tokens_en_cache": 0, "segundos_con_contexto": 0.0, "segundos_sin_contexto": 0.0}
+        if self.ruta_db:
+            with almacen_local.conexion(self.ruta_db) as con:
+                con.executescript(_ESQUEMA)
+
+    def _guardar(self, clave: str, estado: str, nombre=None, tokens=None, expira=None, error=None):
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute("INSERT OR REPLACE INTO contextos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (clave, nombre, tokens, expira, estado, error, time.time()))
+
+    def preparar(self, genai, modelo: str, prefijo: str, fijo: Optional[str], variable: Optional[str],
+                 completo: str) -> Tuple[Any, List[str], bool]:
+        """
+        (GenerativeModel, textos, con_contexto) para una llamada. Con el contexto en caché los textos
+        son sólo la parte variable; sin él, el prompt completo (fijo=None: nunca se usa contexto).
+        """
+        contexto = self._contexto(genai, modelo, prefijo, fijo) if fijo and self.ruta_db else None
+        if contexto is None:
+            return genai.GenerativeModel(modelo), [completo], False
+        return genai.GenerativeModel.from_cached_content(cached_content=contexto), [variable] if variable else [], True
+
+    def _contexto(self, genai, modelo: str, prefijo: str, fijo: str):
+        clave = f"{modelo}|{prefijo}|{version(fijo)}"
+        with almacen_local.conexion(self.ruta_db) as con:
+            fila = con.execute("SELECT nombre, expira, estado, actualizado FROM contextos WHERE clave = ?",
+                               (clave,)).fetchone()
+        ahora = time.time()
+        if fila:
+            nombre, expira, estado, actualizado = fila
+            if estado == "bajo_minimo":
+                return None
+            if estado == "error" and ahora - actualizado < REINTENTO_S:
+                return None
+            if estado == "activo" and expira - ahora > MARGEN_S:
+                try:
+                    contexto = self._objeto(genai, nombre)
+                    if expira - ahora < REFRESCO_S:
+                        self._extender(clave, contexto, expira)
+                    return contexto
+                except Exception as e:
+                    print(f"⚠️ El contexto de Gemini '{prefijo}' ya no está disponible ({e}); se crea otro.")
+        return self._crear(genai, modelo, prefijo, fijo, clave)
+
+    def _objeto(self, genai, nombre: str):
+        with self._lock:
+            contexto = self._objetos.get(nombre)
+        if contexto is None:
+            contexto = genai.caching.CachedContent.get(nombre)
+            with self._lock:
+                self._objetos[nombre] = contexto
+        return contexto
+
+    def _extender(self, clave: str, contexto, expira: float):
+        # Un solo worker extiende el TTL: el que logra mover el vencimiento registrado
+        nuevo = time.time() + TTL_S
+        with almacen_local.conexion(self.ruta_db) as con:
+            tomado = con.execute("UPDATE contextos SET expira = ?, actualizado = ? WHERE clave = ? AND expira = ?",
+                                 (nuevo, time.time(), clave, expira)).rowcount
+        if not tomado:
+            return
+        try:
+            contexto.update(ttl=datetime.timedelta(seconds=TTL_S))
+            print(f"🔄 Contexto de Gemini {contexto.name} extendido {TTL_S:.0f} s.")
+        except Exception as e:
+            print(f"⚠️ No se pudo extender el contexto de Gemini {contexto.name}: {e}")
+            with almacen_local.conexion(self.ruta_db) as con:
+                con.execute("UPDATE contextos SET expira = ? WHERE clave = ?", (expira, clave))
+
+    def _crear(self, genai, modelo: str, prefijo: str, fijo: str, clave: str):
+        tokens = None
+        try:
+            tokens = genai.GenerativeModel(modelo).count_tokens(fijo).total_tokens
+            if tokens < MIN_TOKENS:
+                print(f"ℹ️ Prefijo '{prefijo}' de {tokens} tokens, bajo el mínimo de {MIN_TOKENS} para "
+                      f"la caché de contexto de Gemini; se envía completo en cada llamada.")
+                self._guardar(clave, "bajo_minimo", tokens=tokens)
+                return None
+            with metricas.span("gemini_contexto"):
+                contexto = genai.caching.CachedContent.create(
+                    model=modelo, display_name=f"paraderos-{prefijo}"[:128], system_instruction=fijo,
+                    ttl=datetime.timedelta(seconds=TTL_S))
+        except Exception as e:
+            print(f"❌ No se pudo crear el contexto de Gemini '{prefijo}': {e}")
+            self._guardar(clave, "error", tokens=tokens, error=str(e))
+            return None
+        vence = getattr(contexto, "expire_time", None)
+        expira = vence.timestamp() if hasattr(vence, "timestamp") else time.time() + TTL_S
+        self._guardar(clave, "activo", nombre=contexto.name, tokens=tokens, expira=expira)
+        with self._lock:
+            self._objetos[contexto.name] = contexto
+        print(f"✅ Contexto de Gemini '{prefijo}' creado ({tokens} tokens, {contexto.name}).")
+        return contexto
+
+    def registrar(self, respuesta, con_contexto: bool, segundos: float):
+        """Suma los tokens de la respuesta (usage_metadata) y la latencia de la llamada."""
+        uso = getattr(respuesta, "usage_metadata", None)
+        sufijo = "con_contexto" if con_contexto else "sin_contexto"
+        with self._lock:
+            self._stats[f"llamadas_{sufijo}"] += 1
+            self._stats[f"segundos_{sufijo}"] += segundos
+            self._stats["tokens_entrada"] += getattr(uso, "prompt_token_count", 0) or 0
+            self._stats["tokens_en_cache"] += getattr(uso, "cached_content_token_count", 0) or 0
+        metricas.observar(f"gemini_{sufijo}", segundos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores del worker, con la latencia media de cada grupo y la diferencia entre ambas."""
+        with self._lock:
+            stats = dict(self._stats)
+        for sufijo in ("con_contexto", "sin_contexto"):
+            n = stats[f"llamadas_{sufijo}"]
+            stats[f"latencia_media_{sufijo}_s"] = stats[f"segundos_{sufijo}"] / n if n else None
+        con, sin = stats["latencia_media_con_contexto_s"], stats["latencia_media_sin_contexto_s"]
+        stats["latencia_ahorrada_s"] = sin - con if con is not None and sin is not None else None
+        return stats
@@ -0,0 +1,215 @@
+# descargas.py
+"""
+Descargas de Drive con memoria acotada por worker.
+
+- Cada descarga se pide en tramos de DESCARGA_CHUNK_MB (MediaIoBaseDownload usa 100 MB por omisión,
+  o sea, una foto entera por petición) y cada tramo reserva antes su tamaño en un presupuesto de
+  bytes compartido por el worker (DESCARGAS_PRESUPUESTO_MB). Si el presupuesto está agotado, el
+  hilo espera a que otra descarga lo devuelva, como mucho DESCARGA_ESPERA_MAX_S; pasado ese plazo
+  sigue igual (mejor una petición lenta que una trabada) y queda contado como "excedido".
+- Un archivo que supera DESCARGA_UMBRAL_DISCO_MB se pasa a un temporal en disco y deja de contar
+  contra el presupuesto mientras se lee por abrir(); si se trae entero a memoria con leer(), su
+  tamaño se vuelve a reservar.
+- La reserva se mantiene mientras la Descarga esté abierta: se devuelve con cerrar() (o al salir
+  del with), apenas se consumió el contenido. Quien se queda con los bytes más allá (la caché de
+  imágenes de report_generator) toma la reserva con ceder() y la devuelve al soltarlos.
+- Cuando falta presupuesto, antes de esperar se llama a los liberadores registrados con
+  liberar_con() (p. ej. la caché de imágenes suelta sus entradas más antiguas).
+- drive_async descarga con el mismo presupuesto (ver DriveAsync.descargar).
+
+Las esperas quedan en el histograma de la etapa "presupuesto_descargas_espera" y en
+estadisticas() (expuesto en /api/metrics).
+"""
+
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import metricas
+
+MB = 1024 * 1024
+CHUNK_BYTES = max(256 * 1024, int(float(os.environ.get("DESCARGA_CHUNK_MB", "4")) * MB))
+PRESUPUESTO_BYTES = int(float(os.environ.get("DESCARGAS_PRESUPUESTO_MB", "192")) * MB)
+UMBRAL_DISCO_BYTES = int(float(os.environ.get("DESCARGA_UMBRAL_DISCO_MB", "16")) * MB)
+ESPERA_MAX_S = float(os.environ.get("DESCARGA_ESPERA_MAX_S", "30"))
+
+
+class PresupuestoMemoria:
+    """Semáforo de bytes: tomar(n) bloquea mientras no quepan n bytes más en el total."""
+
+    def __init__(self, total: int, espera_max_s: float = ESPERA_MAX_S):
+        self.total = total
+        self.espera_max_s = espera_max_s
+        self.en_uso = 0
+        self._cond = threading.Condition()
+        self._liberadores = []
+        self._stats = {"reservas": 0, "esperas": 0, "excedidos": 0, "segundos_espera": 0.0, "pico_bytes": 0}
+
+    def liberar_con(self, liberador: Callable[[int], None]):
+        """Registra liberador(faltan): se llama (sin locks tomados) antes de esperar por falta de cupo."""
+        self._liberadores.append(liberador)
+
+    def tomar(self, n: int) -> int:
+        """Reserva n bytes (a lo más el total) y devuelve cuántos quedaron reservados."""
+        n = min(n, self.total)
+        t0 = time.perf_counter()
+        with self._cond:
+            faltan = self.en_uso + n - self.total
+        if faltan > 0:
+            for liberador in self._liberadores:
+                liberador(faltan)
+        with self._cond:
+            esperado = self.en_uso + n > self.total
+            if esperado:
+                cupo = self._cond.wait_for(lambda: self.en_uso + n <= self.total, timeout=self.espera_max_s)
+                if not cupo:
+                    self._stats["excedidos"] += 1
+                    print(f"⚠️ Presupuesto de descargas agotado tras {self.espera_max_s:.0f} s; se continúa igual.")
+            self.en_uso += n
+            self._stats["reservas"] += 1
+            self._stats["pico_bytes"] = max(self._stats["pico_bytes"], self.en_uso)
+            if esperado:
+                espera = time.perf_counter() - t0
+                self._stats["esperas"] += 1
+                self._stats["segundos_espera"] += espera
+        if esperado:
+            metricas.observar("presupuesto_descargas_espera", espera)
+        return n
+
+    def devolver(self, n: int):
+        if n <= 0:
+            return
+        with self._cond:
+            self.en_uso = max(0, self.en_uso - n)
+            self._cond.notify_all()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self._stats, "en_uso_bytes": self.en_uso, "total_bytes": self.total}
+
+
+presupuesto = PresupuestoMemoria(PRESUPUESTO_BYTES)
+
+
+class Reserva:
+    """Bytes reservados en un presupuesto que pasaron a otro dueño (ver Descarga.ceder)."""
+
+    def __init__(self, n: int, limite: PresupuestoMemoria):
+        self.n = n
+        self._limite = limite
+
+    def devolver(self):
+        self._limite.devolver(self.n)
+        self.n = 0
+
+
+class Destino:
+    """Destino de MediaIoBaseDownload (y de DriveAsync.descargar): BytesIO hasta el umbral, después un temporal en disco."""
+
+    def __init__(self, umbral: int):
+        self.umbral = umbral
+        self.archivo = io.BytesIO()
+        self.en_disco = False
+
+    def write(self, datos):
+        self.archivo.write(datos)
+        if not self.en_disco and self.archivo.tell() > self.umbral:
+            temporal = tempfile.TemporaryFile(prefix="paraderos_descarga_")
+            temporal.write(self.archivo.getbuffer())
+            self.archivo.close()
+            self.archivo, self.en_disco = temporal, True
+        return len(datos)
+
+
+class Descarga:
+    """Archivo descargado. Usar como context manager (o llamar a cerrar()) para devolver la memoria."""
+
+    def __init__(self, file_id: str, destino: Destino, reservado: int, limite: PresupuestoMemoria):
+        self.file_id = file_id
+        self._destino = destino
+        self._reservado = reservado
+        self._limite = limite
+        self.tamano = destino.archivo.tell()
+        self._leida = False
+
+    @property
+    def en_disco(self) -> bool:
+        return self._destino.en_disco
+
+    def abrir(self):
+        """Archivo (en memoria o en disco) posicionado al inicio, para lectores que aceptan un file object."""
+        self._destino.archivo.seek(0)
+        return self._destino.archivo
+
+    def leer(self) -> bytes:
+        """
+        Contenido completo en memoria. Si la descarga estaba en disco, su tamaño se reserva ahora:
+        los bytes cuentan contra el presupuesto hasta cerrar() (o hasta que los tome otro dueño con ceder()).
+        """
+        if not self.en_disco:
+            contenido = self._destino.archivo.getvalue()
+            # BytesIO(bytes) comparte el buffer: el original se suelta y abrir() sigue sirviendo sin otra copia
+            self._destino.archivo.close()
+            self._destino.archivo = io.BytesIO(contenido)
+            return contenido
+        if not self._leida:
+            self._reservado += self._limite.tomar(self.tamano)
+            self._leida = True
+        return self.abrir().read()
+
+    def ceder(self) -> Reserva:
+        """Cierra la descarga y entrega su reserva a quien se queda con los bytes de leer()."""
+        reserva = Reserva(self._reservado, self._limite)
+        self._reservado = 0
+        self.cerrar()
+        return reserva
+
+    def cerrar(self):
+        self._destino.archivo.close()
+        self._limite.devolver(self._reservado)
+        self._reservado = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def descargar(service, file_id: str, chunk_bytes: int = CHUNK_BYTES, umbral_disco: int = UMBRAL_DISCO_BYTES,
+              limite: Optional[PresupuestoMemoria] = None) -> Descarga:
+    """Descarga file_id por tramos, reservando memoria tramo a tramo. Propaga los errores de Drive."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    limite = limite or presupuesto
+    destino = Destino(umbral_disco)
+    reservado = 0
+    try:
+        with metricas.span("drive_download"):
+            downloader = MediaIoBaseDownload(destino, service.files().get_media(fileId=file_id), chunksize=chunk_bytes)
+            done = False
+            while not done:
+                if not destino.en_disco:
+                    reservado += limite.tomar(chunk_bytes)
+                status, done = downloader.next_chunk()
+                # Se ajusta la reserva a lo que realmente ocupa el archivo en memoria (nada, si ya pasó a disco)
+                sobrante = reservado if destino.en_disco else max(0, reservado - destino.archivo.tell())
+                limite.devolver(sobrante)
+                reservado -= sobrante
+    except BaseException:
+        destino.archivo.close()
+        limite.devolver(reservado)
+        raise
+    return terminada(file_id, destino, reservado, limite)
+
+
+def terminada(file_id: str, destino: Destino, reservado: int, limite: PresupuestoMemoria) -> Descarga:
+    """Descarga completa en 'destino' (con 'reservado' bytes tomados de 'limite'), con sus métricas."""
+    descarga = Descarga(file_id, destino, reservado, limite)
+    metricas.sumar_bytes("drive_descarga", descarga.tamano)
+    if descarga.en_disco:
+        metricas.sumar_bytes("drive_descarga_a_disco", descarga.tamano)
+    return descarga
@@ -0,0 +1,132 @@
+# drive_async.py
+"""
+Cliente asíncrono mínimo de la API REST de Google Drive v3 (httpx), para el modo ASGI.
+
+Cubre sólo lo que usan los endpoints: listar archivos, buscar el primer id de una query
+y descargar el contenido de un archivo (con el presupuesto de memoria de descargas.py). Usa las mismas credenciales del Service Account
+que el cliente síncrono (main._credenciales_drive); el token se refresca en un hilo
+aparte para no bloquear el event loop.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import descargas
+import metricas
+
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+
+
+class ErrorDrive(Exception):
+    """Respuesta de error de la API de Drive."""
+    def __init__(self, mensaje, status=500):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class DriveAsync:
+    """
+    Una instancia por proceso: el AsyncClient mantiene un pool de conexiones HTTP/1.1
+    keep-alive compartido por todas las peticiones en vuelo.
+    - credentials: google.oauth2 Credentials (None sólo con un transporte de pruebas).
+    - max_conexiones: tope de conexiones simultáneas hacia Drive.
+    - transport: transporte httpx alternativo (p. ej. httpx.MockTransport en benchmarks).
+    """
+
+    def __init__(self, credentials=None, max_conexiones: int = 100, timeout_s: float = 60,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.credentials = credentials
+        self._lock_token = asyncio.Lock()
+        self._cliente = httpx.AsyncClient(
+            base_url=DRIVE_API,
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones),
+            transport=transport,
+        )
+
+    async def cerrar(self):
+        await self._cliente.aclose()
+
+    async def _cabeceras(self) -> Dict[str, str]:
+        if self.credentials is None:
+            return {}
+        if not self.credentials.valid:
+            async with self._lock_token:
+                if not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def _get(self, ruta: str, params: Dict[str, Any], etapa: str) -> httpx.Response:
+        with metricas.span(etapa):
+            resp = await self._cliente.get(ruta, params=params, headers=await self._cabeceras())
+        if resp.status_code >= 400:
+            raise ErrorDrive(f"Drive respondió {resp.status_code}: {resp.text[:200]}", resp.status_code)
+        return resp
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    async def listar(self, q: str, fields: str = "files(id,name)", page_size: int = 200,
+                     todas_las_unidades: bool = True, max_paginas: int = 1) -> List[Dict[str, Any]]:
+        """files.list con la query q; recorre hasta max_paginas páginas."""
+        params = {"q": q, "fields": f"nextPageToken,{fields}", "pageSize": page_size, "spaces": "drive"}
+        if todas_las_unidades:
+            params.update(supportsAllDrives="true", includeItemsFromAllDrives="true", corpora="allDrives")
+        archivos = []
+        for _ in range(max_paginas):
+            datos = (await self._get("/files", params, "drive_list")).json()
+            archivos.extend(datos.get("files", []))
+            token = datos.get("nextPageToken")
+            if not token:
+                break
+            params["pageToken"] = token
+        return archivos
+
+    async def primer_id(self, q: str, todas_las_unidades: bool = True) -> Optional[str]:
+        """Equivalente asíncrono de main.find_drive_id (excluye la papelera)."""
+        q_final = f"({q}) and trashed = false" if "trashed" not in q.lower() else q
+        archivos = await self.listar(q_final, page_size=1, todas_las_unidades=todas_las_unidades)
+        return archivos[0]["id"] if archivos else None
+
+    async def primer_id_de(self, queries: List[str]) -> Optional[str]:
+        """Lanza todas las queries a la vez y devuelve el id de la primera (en orden) que encuentre algo."""
+        ids = await asyncio.gather(*(self.primer_id(q) for q in queries))
+        return next((i for i in ids if i), None)
+
+    async def metadatos(self, file_id: str, fields: str = "id,name,mimeType") -> Dict[str, Any]:
+        """files.get sin contenido (sólo los campos pedidos)."""
+        params = {"fields": fields, "supportsAllDrives": "true"}
+        return (await self._get(f"/files/{file_id}", params, "drive_metadata")).json()
+
+    async def descargar(self, file_id: str, limite: Optional[descargas.PresupuestoMemoria] = None) -> descargas.Descarga:
+        """
+        Contenido del archivo (alt=media) como descargas.Descarga, con el mismo presupuesto de memoria
+        que el cliente síncrono: cada tramo reserva su tamaño (la espera va en un hilo) y un archivo
+        grande pasa a disco. Hay que cerrarla (cerrar() o with) cuando ya no se usan sus bytes.
+        """
+        limite = limite or descargas.presupuesto
+        destino = descargas.Destino(descargas.UMBRAL_DISCO_BYTES)
+        reservado = 0
+        params = {"alt": "media", "supportsAllDrives": "true"}
+        try:
+            with metricas.span("drive_download"):
+                async with self._cliente.stream("GET", f"/files/{file_id}", params=params,
+                                                headers=await self._cabeceras()) as resp:
+                    if resp.status_code >= 400:
+                        await resp.aread()
+                        raise ErrorDrive(f"Drive respondió {resp.status_code}: {resp.text[:200]}", resp.status_code)
+                    async for tramo in resp.aiter_bytes(descargas.CHUNK_BYTES):
+                        if not destino.en_disco:
+                            reservado += await asyncio.to_thread(limite.tomar, len(tramo))
+                        destino.write(tramo)
+                        if destino.en_disco and reservado:
+                            limite.devolver(reservado)
+                            reservado = 0
+        except BaseException:
+            destino.archivo.close()
+            limite.devolver(reservado)
+            raise
+        return descargas.terminada(file_id, destino, reservado, limite)
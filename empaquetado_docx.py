@@ -0,0 +1,53 @@
+# empaquetado_docx.py
+"""
+Guardado del .docx sin recomprimir las fotos.
+
+document.save() de python-docx pasa todas las partes del zip por deflate, también los JPEG y PNG
+que ya vienen comprimidos: en un informe con muchas fotos eso es casi todo el tiempo de guardado
+y el archivo apenas se achica. guardar() escribe el mismo paquete OPC (mismas partes, mismo orden)
+con dos criterios:
+
+- Medios ya comprimidos (EXTENSIONES_COMPRIMIDAS): se guardan tal cual (ZIP_STORED).
+- XML y el resto: deflate con nivel DOCX_DEFLATE_NIVEL. Por omisión 6, como zlib: el XML del informe
+  pesa poco y los niveles más bajos ahorran milisegundos a cambio de un archivo más grande
+  (ver benchmarks/bench_empaquetado.py).
+
+Cada parte se serializa y se escribe en el zip una por una, sin armar antes el paquete completo.
+Con DOCX_EMPAQUETADO=python-docx se usa document.save() de siempre.
+"""
+
+import os
+import zipfile
+
+EXTENSIONES_COMPRIMIDAS = {"jpeg", "jpg", "png", "gif", "webp", "zip", "docx", "xlsx", "pptx"}
+NIVEL_DEFLATE = int(os.environ.get("DOCX_DEFLATE_NIVEL", "6"))
+MODO = os.environ.get("DOCX_EMPAQUETADO", "medios_sin_comprimir")
+
+
+def _escribir(zf: zipfile.ZipFile, nombre: str, contenido: bytes, nivel: int):
+    if nombre.rsplit(".", 1)[-1].lower() in EXTENSIONES_COMPRIMIDAS:
+        zf.writestr(nombre, contenido, compress_type=zipfile.ZIP_STORED)
+    else:
+        zf.writestr(nombre, contenido, compress_type=zipfile.ZIP_DEFLATED, compresslevel=nivel)
+
+
+def guardar(document, destino, nivel: int = NIVEL_DEFLATE):
+    """Como document.save(destino) (ruta o archivo), con los medios sin recomprimir."""
+    if MODO == "python-docx":
+        document.save(destino)
+        return
+    from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+    from docx.opc.pkgwriter import _ContentTypesItem
+
+    paquete = document.part.package
+    partes = list(paquete.parts)
+    for parte in partes:
+        parte.before_marshal()
+    # Mismo orden que PackageWriter: [Content_Types].xml, _rels/.rels y después cada parte con sus rels
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        _escribir(zf, CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(partes).blob, nivel)
+        _escribir(zf, PACKAGE_URI.rels_uri.membername, paquete.rels.xml, nivel)
+        for parte in partes:
+            _escribir(zf, parte.partname.membername, parte.blob, nivel)
+            if len(parte.rels):
+                _escribir(zf, parte.partname.rels_uri.membername, parte.rels.xml, nivel)
@@ -0,0 +1,10 @@
+# gunicorn.conf.py
+# gunicorn lo carga automáticamente desde el directorio de trabajo.
+# Los parámetros de bind/workers/threads/timeout siguen en el comando (Procfile / Dockerfile).
+
+
+def when_ready(server):
+    """Con --preload la app ya está importada en el maestro: se calienta el estado compartido antes del fork."""
+    if server.cfg.preload_app:
+        import main
+        main.precargar()
@@ -0,0 +1,511 @@
+# hojas_excel.py
+"""
+Renderizado nativo de hojas de Tablas.xlsx ("Paradas", "Resumen") como tablas de Word.
+
+- Conserva las celdas combinadas, el ancho de las columnas y los formatos numéricos del libro.
+- Las hojas anchas se dividen en tramos de columnas (repitiendo las columnas fijas) o
+  se marcan para ir en una sección horizontal.
+- El resultado se guarda como fragmentos XML (<w:tbl>) en caché, por revisión del libro y
+  nombre de hoja: los informes siguientes los reutilizan sin descargar ni volver a procesar el Excel.
+- El libro se lee una sola vez por revisión (ingerir(), al listar la carpeta en /api/list-images):
+  las hojas normalizadas quedan en una caché columnar en disco (tablas_columnares) y se validan
+  (validar()). Los informes arman los fragmentos que falten desde esa caché, sin descargar el Excel.
+"""
+
+import datetime as dt
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import coalescencia
+import descargas
+import metricas
+import motor_tablas
+import tablas_columnares
+
+# Ancho útil (dxa) en carta vertical (6.5") y horizontal (9")
+ANCHO_VERTICAL_DXA = motor_tablas.ANCHO_UTIL_DXA
+ANCHO_HORIZONTAL_DXA = 12960
+MAX_COLUMNAS = int(os.environ.get("TABLAS_MAX_COLUMNAS", "8"))
+ANCHO_EXCEL_DEFECTO = 8.43  # ancho de columna por defecto de Excel, en caracteres
+
+CACHE_DIR = os.environ.get("CACHE_TABLAS_DIR") or os.path.join(tempfile.gettempdir(), "paraderos_tablas")
+MAX_FRAGMENTOS_MEMORIA = 64
+VERSION = 1  # subir si cambia el XML que arma renderizar_filas, para invalidar los fragmentos en caché
+
+_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+# ===================================================================
+# FORMATOS NUMÉRICOS
+# ===================================================================
+def _numero_es_cl(valor: float, decimales: int, miles: bool) -> str:
+    """Formatea con separador de miles '.' y decimal ',' (convención chilena)."""
+    texto = f"{valor:,.{decimales}f}" if miles else f"{valor:.{decimales}f}"
+    return texto.replace(",", "\0").replace(".", ",").replace("\0", ".")
+
+
+def formatear_valor(valor, formato: str = "General") -> str:
+    """Aplica (de forma aproximada) el formato numérico de Excel de la celda."""
+    if valor is None:
+        return ""
+    if isinstance(valor, (dt.datetime, dt.date)):
+        if isinstance(valor, dt.datetime) and (valor.hour or valor.minute) and "h" in (formato or "").lower():
+            return valor.strftime("%d/%m/%Y %H:%M")
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, dt.time):
+        return valor.strftime("%H:%M")
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return str(valor).strip()
+
+    formato = (formato or "General").split(";")[0]
+    if formato == "General" or formato == "@":
+        return motor_tablas.texto_celda(valor)
+    # Decimales: cantidad de '0' después del punto decimal del formato
+    parte_decimal = formato.split(".")[1] if "." in formato else ""
+    decimales = sum(1 for c in parte_decimal if c in "0#")
+    if "%" in formato:
+        return _numero_es_cl(valor * 100, decimales, False) + "%"
+    return _numero_es_cl(float(valor), decimales, "," in formato.split(".")[0])
+
+
+# ===================================================================
+# LECTURA DE LA HOJA
+# ===================================================================
+def _leer_hoja(ws):
+    """
+    Devuelve (valores, combinaciones, anchos_excel, n_encabezado) del rango usado de la hoja,
+    con coordenadas relativas a la esquina superior izquierda del rango.
+    """
+    # Rango usado, recortando filas/columnas vacías al final
+    filas = []
+    for row in ws.iter_rows(min_row=ws.min_row, max_row=ws.max_row, min_col=ws.min_column, max_col=ws.max_column):
+        filas.append([formatear_valor(c.value, c.number_format) for c in row])
+    while filas and not any(filas[-1]):
+        filas.pop()
+    n_cols = max((max((j + 1 for j, v in enumerate(f) if v), default=0) for f in filas), default=0)
+    filas = [f[:n_cols] for f in filas]
+    fila0, col0 = ws.min_row, ws.min_column
+
+    combinaciones = []
+    for rango in ws.merged_cells.ranges:
+        i, j = rango.min_row - fila0, rango.min_col - col0
+        if i >= len(filas) or j >= n_cols:
+            continue
+        n_f = min(rango.max_row - fila0 + 1, len(filas)) - i
+        n_c = min(rango.max_col - col0 + 1, n_cols) - j
+        if n_f > 1 or n_c > 1:
+            combinaciones.append((i, j, n_f, n_c))
+
+    # Encabezado: la primera fila más las filas que abarcan sus celdas combinadas
+    n_encabezado = 1 if filas else 0
+    for (i, j, n_f, n_c) in combinaciones:
+        if i == 0:
+            n_encabezado = max(n_encabezado, n_f)
+
+    from openpyxl.utils import get_column_letter
+
+    anchos = []
+    for j in range(n_cols):
+        dim = ws.column_dimensions.get(get_column_letter(col0 + j))
+        anchos.append((dim.width if dim is not None and dim.width else ANCHO_EXCEL_DEFECTO))
+    return filas, combinaciones, anchos, n_encabezado
+
+
+def _anchos_dxa(anchos_excel: List[float], ancho_total: int) -> List[int]:
+    """Convierte anchos de Excel (caracteres) a twips y los escala para caber en ancho_total."""
+    dxa = [w * 7 * 15 for w in anchos_excel]  # ~7 px por carácter, 15 twips por px
+    escala = min(1.0, ancho_total / sum(dxa)) if dxa else 1.0
+    if sum(dxa) * escala < ancho_total * 0.6:
+        escala = ancho_total * 0.6 / sum(dxa)  # evita tablas diminutas en hojas angostas
+    return [int(w * escala) for w in dxa]
+
+
+def _tramos_columnas(n_cols: int, max_columnas: int, fijas: int) -> List[List[int]]:
+    """Divide las columnas en tramos de a lo más max_columnas, repitiendo las 'fijas' primeras."""
+    if n_cols <= max_columnas:
+        return [list(range(n_cols))]
+    por_tramo = max(1, max_columnas - fijas)
+    resto = list(range(fijas, n_cols))
+    return [list(range(fijas)) + resto[k:k + por_tramo] for k in range(0, len(resto), por_tramo)]
+
+
+def _recortar_combinaciones(combinaciones, columnas: List[int]):
+    """Ajusta las combinaciones a un tramo de columnas (las que cruzan el borde se recortan)."""
+    posicion = {c: k for k, c in enumerate(columnas)}
+    resultado = []
+    for (i, j, n_f, n_c) in combinaciones:
+        visibles = [posicion[c] for c in range(j, j + n_c) if c in posicion]
+        if not visibles:
+            continue
+        # Sólo columnas contiguas en el tramo
+        inicio, fin = visibles[0], visibles[0]
+        while fin + 1 in visibles:
+            fin += 1
+        if n_f > 1 or fin > inicio:
+            resultado.append((i, inicio, n_f, fin - inicio + 1))
+    return resultado
+
+
+def renderizar_hoja(ws, modo_ancho: str = "dividir", max_columnas: int = MAX_COLUMNAS,
+                    columnas_fijas: int = 1, estilos: Optional[Dict[str, str]] = None) -> List[dict]:
+    """
+    Renderiza una hoja de openpyxl como uno o más fragmentos {'xml': <w:tbl>, 'horizontal': bool}.
+    modo_ancho: 'dividir' (tramos de columnas) o 'rotar' (una sola tabla en sección horizontal).
+    """
+    return renderizar_filas(*_leer_hoja(ws), modo_ancho, max_columnas, columnas_fijas, estilos)
+
+
+def renderizar_filas(filas, combinaciones, anchos_excel, n_enc, modo_ancho: str = "dividir",
+                     max_columnas: int = MAX_COLUMNAS, columnas_fijas: int = 1,
+                     estilos: Optional[Dict[str, str]] = None) -> List[dict]:
+    """Como renderizar_hoja, desde una hoja ya leída por _leer_hoja (o de la caché columnar)."""
+    if not filas:
+        return []
+    n_cols = len(filas[0]) if filas else 0
+    estilos = estilos or {}
+
+    horizontal = modo_ancho == "rotar" and n_cols > max_columnas
+    if horizontal:
+        tramos = [list(range(n_cols))]
+    else:
+        tramos = _tramos_columnas(n_cols, max_columnas, columnas_fijas)
+
+    fragmentos = []
+    for columnas in tramos:
+        sub = [[f[c] if c < len(f) else "" for c in columnas] for f in filas]
+        # Si el tramo corta una combinación, su texto se repite en la primera celda visible
+        for (i, j, n_f, n_c) in combinaciones:
+            if j not in columnas:
+                visibles = [k for k, c in enumerate(columnas) if j < c < j + n_c]
+                if visibles:
+                    sub[i][visibles[0]] = filas[i][j]
+        xml = motor_tablas.construir_tabla_xml(
+            headers=sub[:n_enc],
+            filas=sub[n_enc:],
+            anchos=_anchos_dxa([anchos_excel[c] for c in columnas], ANCHO_HORIZONTAL_DXA if horizontal else ANCHO_VERTICAL_DXA),
+            combinaciones=_recortar_combinaciones(combinaciones, columnas),
+            **estilos,
+        )
+        fragmentos.append({"xml": xml, "horizontal": horizontal})
+    return fragmentos
+
+
+# ===================================================================
+# VALIDACIÓN
+# ===================================================================
+HOJAS_INFORME = ("Paradas", "Resumen")
+_TITULOS_CODIGO = ("codigo", "paradero", "parada")
+_TITULOS_LAT = ("lat", "latitud")
+_TITULOS_LON = ("lon", "lng", "long", "longitud")
+MAX_FILAS_MENSAJE = 10  # filas citadas por problema en los mensajes de validación
+
+
+def _titulos(encabezado: List[List[str]], n_cols: int) -> List[str]:
+    """Título de cada columna: el texto más bajo del encabezado (las combinaciones dejan vacías las de abajo)."""
+    titulos = []
+    for j in range(n_cols):
+        textos = [f[j].strip() for f in encabezado if j < len(f) and f[j].strip()]
+        titulos.append(textos[-1] if textos else "")
+    return titulos
+
+
+def _normalizar_titulo(texto: str) -> str:
+    return texto.strip().lower().translate(str.maketrans("áéíóú", "aeiou"))
+
+
+def _columna_excel(j: int, col0: int) -> str:
+    from openpyxl.utils import get_column_letter
+    return get_column_letter(col0 + j)
+
+
+def _citar(filas_excel) -> str:
+    filas_excel = list(filas_excel)
+    texto = ", ".join(str(f) for f in filas_excel[:MAX_FILAS_MENSAJE])
+    return texto + (f" y {len(filas_excel) - MAX_FILAS_MENSAJE} más" if len(filas_excel) > MAX_FILAS_MENSAJE else "")
+
+
+def _numeros(columna):
+    """Valores de una columna de textos formateados como números (NaN donde no lo son), vectorizado."""
+    import pandas as pd
+    texto = columna.str.strip().str.rstrip("%").str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce")
+
+
+def validar(hojas: Dict[str, dict], hojas_libro: List[str]) -> Dict[str, object]:
+    """
+    Revisa las hojas normalizadas de Tablas.xlsx ({nombre: {"filas", "n_encabezado", "fila0", "col0", ...}}).
+    Errores: falta una hoja del informe, la hoja no tiene datos, filas de "Paradas" sin código,
+    latitud/longitud no numéricas o fuera de rango. Avisos: códigos repetidos, columnas sin título
+    o vacías, porcentajes no numéricos y hojas que el informe dividirá en tramos.
+    Devuelve {"ok", "errores", "avisos", "hojas": {nombre: {"filas", "columnas"}}}; las filas y
+    columnas de los mensajes son las del Excel.
+    """
+    import pandas as pd
+
+    errores, avisos, resumen = [], [], {}
+    for nombre in HOJAS_INFORME:
+        if nombre not in hojas_libro:
+            errores.append(f"Falta la hoja '{nombre}'.")
+            continue
+        hoja = hojas[nombre]
+        filas, n_enc = hoja["filas"], hoja["n_encabezado"]
+        n_cols = len(filas[0]) if filas else 0
+        datos = pd.DataFrame(filas[n_enc:], columns=range(n_cols), dtype=object)
+        datos.index = datos.index + hoja["fila0"] + n_enc  # índice = fila del Excel
+        datos = datos[datos.ne("").any(axis=1)]
+        resumen[nombre] = {"filas": len(datos), "columnas": n_cols}
+        if datos.empty:
+            errores.append(f"La hoja '{nombre}' no tiene datos.")
+            continue
+
+        titulos = _titulos(filas[:n_enc], n_cols)
+        col0 = hoja["col0"]
+        normalizados = [_normalizar_titulo(t) for t in titulos]
+        vacias = datos.eq("").all(axis=0)
+        sin_titulo = [_columna_excel(j, col0) for j, t in enumerate(titulos) if not t and not vacias[j]]
+        if sin_titulo:
+            avisos.append(f"'{nombre}': columnas con datos sin título ({', '.join(sin_titulo)}).")
+        if vacias.any():
+            avisos.append(f"'{nombre}': columnas sin datos ({', '.join(_columna_excel(j, col0) for j in vacias[vacias].index)}).")
+        if n_cols > MAX_COLUMNAS:
+            avisos.append(f"'{nombre}' tiene {n_cols} columnas: en el informe se divide en tramos de {MAX_COLUMNAS} "
+                          f"(o va en una sección horizontal con modo_tablas_anchas='rotar').")
+        for j in (j for j, t in enumerate(titulos) if "%" in t):
+            columna = datos[j].str.strip()
+            malos = columna.ne("") & _numeros(columna).isna()
+            if malos.any():
+                avisos.append(f"'{nombre}', columna '{titulos[j]}': valores no numéricos en las filas {_citar(datos.index[malos])}.")
+
+        if nombre != "Paradas":
+            continue
+        col_cod = next((j for j, t in enumerate(normalizados) if t in _TITULOS_CODIGO), 0)
+        codigos = datos[col_cod].str.strip()
+        if codigos.eq("").any():
+            errores.append(f"'Paradas': filas sin código en la columna '{titulos[col_cod] or _columna_excel(col_cod, col0)}' "
+                           f"({_citar(datos.index[codigos.eq('')])}).")
+        repetidos = codigos[codigos.ne("") & codigos.duplicated(keep=False)].unique()
+        if len(repetidos):
+            avisos.append(f"'Paradas': códigos repetidos ({_citar(repetidos)}).")
+        for titulo, aceptados, limite in (("latitud", _TITULOS_LAT, 90), ("longitud", _TITULOS_LON, 180)):
+            j = next((j for j, t in enumerate(normalizados) if t in aceptados), None)
+            if j is None:
+                continue
+            columna = datos[j].str.strip()
+            valores = _numeros(columna)
+            no_numericas = columna.ne("") & valores.isna()
+            fuera = valores.abs().gt(limite)
+            if no_numericas.any():
+                errores.append(f"'Paradas': {titulo} no numérica en las filas {_citar(datos.index[no_numericas])}.")
+            if fuera.any():
+                errores.append(f"'Paradas': {titulo} fuera de rango en las filas {_citar(datos.index[fuera])}.")
+    return {"ok": not errores, "errores": errores, "avisos": avisos, "hojas": resumen}
+
+
+# ===================================================================
+# CACHÉ POR REVISIÓN DEL LIBRO
+# ===================================================================
+def revision_archivo(service, file_id) -> Optional[str]:
+    """Identificador de la versión actual del archivo en Drive (headRevisionId, md5 o fecha de modificación)."""
+    try:
+        with metricas.span("drive_metadata"):
+            meta = service.files().get(
+                fileId=file_id, fields="headRevisionId,md5Checksum,modifiedTime", supportsAllDrives=True
+            ).execute()
+        return meta.get("headRevisionId") or meta.get("md5Checksum") or meta.get("modifiedTime")
+    except Exception as e:
+        print(f"   ✗ No se pudo obtener la revisión de {file_id}: {e}")
+        return None
+
+
+def _clave(file_id, revision, hoja, opciones) -> str:
+    base = json.dumps([file_id, revision, hoja, opciones], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def _leer_cache(clave):
+    with _CACHE_LOCK:
+        if clave in _CACHE:
+            _CACHE.move_to_end(clave)
+            metricas.cache("tablas_memoria", True)
+            return _CACHE[clave]
+    metricas.cache("tablas_memoria", False)
+    ruta = os.path.join(CACHE_DIR, f"{clave}.json")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            fragmentos = json.load(f)
+    except (OSError, ValueError):
+        metricas.cache("tablas_disco", False)
+        return None
+    metricas.cache("tablas_disco", True)
+    _guardar_memoria(clave, fragmentos)
+    return fragmentos
+
+
+def _guardar_memoria(clave, fragmentos):
+    with _CACHE_LOCK:
+        _CACHE[clave] = fragmentos
+        _CACHE.move_to_end(clave)
+        while len(_CACHE) > MAX_FRAGMENTOS_MEMORIA:
+            _CACHE.popitem(last=False)
+
+
+def _guardar_cache(clave, fragmentos):
+    _guardar_memoria(clave, fragmentos)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        ruta = os.path.join(CACHE_DIR, f"{clave}.json")
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fragmentos, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+    except OSError as e:
+        print(f"   ✗ No se pudo escribir la caché de tablas en disco: {e}")
+
+
+# ===================================================================
+# INGESTA: CACHÉ COLUMNAR DEL LIBRO
+# ===================================================================
+LIBROS_DIR = os.path.join(CACHE_DIR, "libros")
+_vuelos_libro = coalescencia.SingleFlight("tablas-libro", ruta_db=None)
+
+
+def _directorio_libro(file_id, revision) -> str:
+    return os.path.join(LIBROS_DIR, _clave(file_id, revision, None, {"libro": tablas_columnares.VERSION}))
+
+
+def _normalizar_hojas(wb, hojas) -> Dict[str, dict]:
+    """Las hojas pedidas que existen en el libro, leídas por _leer_hoja, con sus coordenadas (valores crudos)."""
+    import mapas
+
+    normalizadas = {}
+    for nombre in hojas:
+        if nombre not in wb.sheetnames:
+            continue
+        ws = wb[nombre]
+        filas, combinaciones, anchos, n_enc = _leer_hoja(ws)
+        normalizadas[nombre] = {
+            "filas": filas, "combinaciones": combinaciones, "anchos": anchos, "n_encabezado": n_enc,
+            "fila0": ws.min_row, "col0": ws.min_column,
+            "coordenadas": mapas.puntos_desde_filas(list(ws.iter_rows(values_only=True))),
+        }
+    return normalizadas
+
+
+def _leer_libro(service, file_id, revision, contenido, hojas) -> tablas_columnares.Libro:
+    descarga = descargas.descargar(service, file_id) if contenido is None else None
+    from openpyxl import load_workbook
+
+    # openpyxl completo (no read_only): el modo de sólo lectura no entrega combinaciones ni anchos
+    try:
+        with metricas.span("excel_lectura"):
+            wb = load_workbook(descarga.abrir() if descarga else io.BytesIO(contenido), data_only=True)
+    finally:
+        # load_workbook (sin read_only) deja el libro entero en memoria: la descarga ya se puede soltar
+        if descarga:
+            descarga.cerrar()
+    try:
+        with metricas.span("excel_ingesta"):
+            normalizadas = _normalizar_hojas(wb, hojas)
+            meta = {"file_id": file_id, "revision": revision, "hojas_libro": wb.sheetnames,
+                    "validacion": validar(normalizadas, wb.sheetnames)}
+    finally:
+        wb.close()
+    if not revision:
+        return tablas_columnares.en_memoria(meta, normalizadas)
+    directorio = _directorio_libro(file_id, revision)
+    shutil.rmtree(directorio, ignore_errors=True)  # libro de la misma revisión sin alguna hoja pedida
+    try:
+        libro = tablas_columnares.guardar(directorio, meta, normalizadas)
+    except OSError as e:
+        print(f"   ✗ No se pudo escribir la caché columnar de tablas: {e}")
+        return tablas_columnares.en_memoria(meta, normalizadas)
+    print(f"   ✓ Tablas.xlsx ingerido ({', '.join(normalizadas) or 'sin hojas del informe'}; formato {libro.meta['formato']}).")
+    return libro
+
+
+def libro_tablas(service, file_id, revision: Optional[str], contenido: Optional[bytes] = None,
+                 hojas: Sequence[str] = ()) -> tablas_columnares.Libro:
+    """
+    Hojas normalizadas del libro (HOJAS_INFORME y las de 'hojas') desde la caché columnar de la
+    revisión. Si no está, o le falta una hoja pedida que el libro sí tiene, descarga y lee el Excel
+    una vez (las llamadas simultáneas del worker esperan a la misma lectura), lo valida y escribe
+    la caché. Sin revisión se lee igual, pero el libro no se guarda.
+    """
+    pedidas = list(dict.fromkeys(tuple(HOJAS_INFORME) + tuple(hojas)))
+    if revision:
+        libro = tablas_columnares.Libro.abrir(_directorio_libro(file_id, revision))
+        if libro is not None and all(libro.tiene(h) or h not in libro.meta["hojas_libro"] for h in pedidas):
+            metricas.cache("tablas_libro", True)
+            return libro
+    metricas.cache("tablas_libro", False)
+    return _vuelos_libro.ejecutar([file_id, revision, pedidas],
+                                  lambda: _leer_libro(service, file_id, revision, contenido, pedidas))
+
+
+def ingerir(service, file_id) -> Dict[str, object]:
+    """
+    Lee Tablas.xlsx una vez por revisión (ver libro_tablas) y devuelve su validación
+    ({"ok", "errores", "avisos", "hojas"}) con la revisión ingerida.
+    """
+    revision = revision_archivo(service, file_id)
+    libro = libro_tablas(service, file_id, revision)
+    return dict(libro.validacion, revision=revision)
+
+
+def obtener_tablas_excel(service, file_id, hojas: List[str], modo_ancho: str = "dividir",
+                         max_columnas: int = MAX_COLUMNAS, estilos: Optional[Dict[str, str]] = None,
+                         contenido: Optional[bytes] = None,
+                         coordenadas_de: Optional[str] = None) -> Dict[str, Optional[List[dict]]]:
+    """
+    Devuelve {hoja: fragmentos} para las hojas pedidas del libro file_id.
+    Las hojas que faltan en la caché de fragmentos se arman desde la caché columnar del libro
+    (libro_tablas): sólo se descarga y lee el Excel (una vez para todas las hojas) si tampoco está ahí.
+    Las hojas que no existen en el libro quedan como None.
+    Con coordenadas_de="Paradas" agrega "coordenadas": [{"codigo", "lat", "lon"}] leídas de esa
+    hoja (ver mapas.puntos_desde_filas), con la misma caché por revisión.
+    """
+    opciones = {"modo": modo_ancho, "max_columnas": max_columnas, "estilos": estilos or {}, "version": VERSION}
+    revision = revision_archivo(service, file_id) if contenido is None else hashlib.md5(contenido).hexdigest()
+    resultado, faltantes = {}, []
+    for hoja in hojas:
+        fragmentos = _leer_cache(_clave(file_id, revision, hoja, opciones)) if revision else None
+        if fragmentos is None:
+            faltantes.append(hoja)
+        else:
+            print(f"   ✓ Tabla '{hoja}' desde caché (revisión {revision}).")
+            resultado[hoja] = fragmentos
+    clave_coordenadas = _clave(file_id, revision, coordenadas_de, {"coordenadas": True}) if coordenadas_de else None
+    if coordenadas_de:
+        coordenadas = _leer_cache(clave_coordenadas) if revision else None
+        if coordenadas is not None:
+            resultado["coordenadas"] = coordenadas
+
+    if faltantes or (coordenadas_de and "coordenadas" not in resultado):
+        # Desde la caché columnar del libro (memory-map); sólo si no está se descarga y lee el Excel
+        libro = libro_tablas(service, file_id, revision, contenido, faltantes + ([coordenadas_de] if coordenadas_de else []))
+        for hoja in faltantes:
+            datos = libro.hoja(hoja)
+            if datos is None:
+                resultado[hoja] = None
+                continue
+            with metricas.span("excel_tabla"):
+                fragmentos = renderizar_filas(datos["filas"], datos["combinaciones"], datos["anchos"],
+                                              datos["n_encabezado"], modo_ancho, max_columnas, estilos=estilos)
+            resultado[hoja] = fragmentos
+            if revision:
+                _guardar_cache(_clave(file_id, revision, hoja, opciones), fragmentos)
+            print(f"   ✓ Tabla '{hoja}' renderizada ({len(fragmentos)} tramo(s)).")
+        if coordenadas_de and "coordenadas" not in resultado:
+            hoja_coordenadas = libro.meta["hojas"].get(coordenadas_de)
+            resultado["coordenadas"] = hoja_coordenadas["coordenadas"] if hoja_coordenadas else []
+            if revision:
+                _guardar_cache(clave_coordenadas, resultado["coordenadas"])
+    return resultado
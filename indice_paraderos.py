@@ -0,0 +1,222 @@
+# indice_paraderos.py
+"""
+Índice local (SQLite) de los paraderos ya procesados, para reutilizar análisis entre proyectos
+y reinspecciones.
+
+- imagenes: md5Checksum de Drive de cada foto vista en /api/list-images (o consultada al analizar).
+- analisis: cada descripción de Gemini, por huella de las fotos + sección + prompt + modelo.
+  Si se piden las mismas fotos con el mismo prompt, /api/analyze-image devuelve la descripción
+  guardada sin descargar las imágenes ni llamar al modelo.
+- inspecciones: cada paradero incluido en un informe generado (código, ubicación, fecha de
+  inspección si el payload la trae, fecha del informe, descripciones y tabla de características),
+  con las huellas de sus fotos por sección. Regenerar el informe de la misma campaña (mismo
+  código, proyecto y fotos) actualiza la inspección en vez de duplicarla.
+
+La huella de una selección de fotos es el SHA-256 de sus md5Checksum ordenados: no depende del
+fileId (una foto copiada a la carpeta de otro proyecto tiene la misma huella) ni del orden.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import almacen_local
+
+DB_POR_DEFECTO = os.environ.get("INDICE_PARADEROS_DB") or os.path.join(tempfile.gettempdir(), "paraderos_indice.sqlite")
+# Cuánto tiempo se confía en el md5 guardado de un fileId antes de volver a consultarlo a Drive
+MD5_VIGENCIA_S = float(os.environ.get("INDICE_MD5_VIGENCIA_S", "600"))
+PREFIJO_ERROR_IA = "Error al generar descripción"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS imagenes (
+    image_id TEXT PRIMARY KEY, md5 TEXT NOT NULL, visto REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS analisis (
+    huella TEXT NOT NULL, seccion TEXT NOT NULL, prompt_hash TEXT NOT NULL, modelo TEXT NOT NULL,
+    codigo TEXT, descripcion TEXT NOT NULL, image_ids TEXT, creado REAL NOT NULL,
+    PRIMARY KEY (huella, seccion, prompt_hash, modelo));
+CREATE INDEX IF NOT EXISTS analisis_codigo ON analisis (codigo, seccion, creado);
+CREATE TABLE IF NOT EXISTS inspecciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, codigo TEXT NOT NULL, proyecto TEXT, ubicacion TEXT,
+    fecha TEXT, registrado REAL NOT NULL, analisis TEXT, tabla TEXT, fecha_informe TEXT, clave TEXT);
+CREATE INDEX IF NOT EXISTS inspecciones_codigo ON inspecciones (codigo, registrado);
+CREATE INDEX IF NOT EXISTS inspecciones_clave ON inspecciones (codigo, clave);
+CREATE TABLE IF NOT EXISTS inspeccion_huellas (
+    inspeccion_id INTEGER NOT NULL, seccion TEXT NOT NULL, huella TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS inspeccion_huellas_huella ON inspeccion_huellas (huella);
+"""
+
+
+def huella_de(md5s: Iterable[str]) -> str:
+    """Huella de una selección de fotos a partir de sus md5Checksum de Drive."""
+    return hashlib.sha256("\n".join(sorted(md5s)).encode("ascii")).hexdigest()
+
+
+def hash_prompt(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class IndiceParaderos:
+    """
+    Acceso al índice. Cada operación abre su propia conexión (sirve desde cualquier hilo y
+    desde varios workers a la vez; el archivo usa WAL). Si SQLite no está disponible el índice
+    queda desactivado: las consultas no encuentran nada y los registros se ignoran.
+    """
+
+    def __init__(self, ruta_db: Optional[str] = DB_POR_DEFECTO):
+        self.ruta_db = ruta_db
+        if self.ruta_db:
+            try:
+                with almacen_local.conexion(self.ruta_db) as con:
+                    con.executescript(_ESQUEMA)
+            except sqlite3.Error as e:
+                print(f"❌ Índice de paraderos: SQLite no disponible ({e}); se desactiva.")
+                self.ruta_db = None
+
+    # ------------------------------------------------------------------
+    # Huellas de imágenes
+    # ------------------------------------------------------------------
+    def recordar_md5(self, md5_por_id: Dict[str, str]):
+        """Guarda los md5Checksum de Drive de un listado ({fileId: md5})."""
+        filas = [(i, m, time.time()) for i, m in md5_por_id.items() if i and m]
+        if not self.ruta_db or not filas:
+            return
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.executemany("INSERT OR REPLACE INTO imagenes VALUES (?, ?, ?)", filas)
+
+    def md5_vigentes(self, image_ids: List[str], vigencia_s: Optional[float] = MD5_VIGENCIA_S) -> Dict[str, str]:
+        """{fileId: md5} de los ids con md5 registrado hace menos de vigencia_s (None: sin límite)."""
+        if not self.ruta_db or not image_ids:
+            return {}
+        marcas = ",".join("?" * len(image_ids))
+        desde = time.time() - vigencia_s if vigencia_s is not None else 0
+        with almacen_local.conexion(self.ruta_db) as con:
+            filas = con.execute(f"SELECT image_id, md5 FROM imagenes WHERE image_id IN ({marcas}) AND visto > ?",
+                                (*image_ids, desde)).fetchall()
+        return dict(filas)
+
+    def huella_conocida(self, image_ids: List[str], vigencia_s: Optional[float] = MD5_VIGENCIA_S) -> Optional[str]:
+        """Huella de las fotos si todas tienen md5 vigente en el índice; si no, None."""
+        md5s = self.md5_vigentes(image_ids, vigencia_s)
+        if not image_ids or len(md5s) < len(set(image_ids)):
+            return None
+        return huella_de(md5s.values())
+
+    # ------------------------------------------------------------------
+    # Análisis
+    # ------------------------------------------------------------------
+    def buscar_analisis(self, huella: str, seccion: str, prompt: str, modelo: str) -> Optional[Dict[str, Any]]:
+        """Análisis guardado para exactamente estas fotos, sección, prompt y modelo."""
+        if not self.ruta_db or not huella:
+            return None
+        with almacen_local.conexion(self.ruta_db) as con:
+            fila = con.execute(
+                "SELECT codigo, descripcion, creado FROM analisis "
+                "WHERE huella = ? AND seccion = ? AND prompt_hash = ? AND modelo = ?",
+                (huella, seccion, hash_prompt(prompt), modelo)).fetchone()
+        if fila is None:
+            return None
+        return {"codigo": fila[0], "description": fila[1], "creado": fila[2]}
+
+    def ultimo_analisis(self, codigo: str, seccion: str) -> Optional[Dict[str, Any]]:
+        """Análisis más reciente del paradero para la sección (con otras fotos o con otro prompt)."""
+        if not self.ruta_db or not codigo:
+            return None
+        with almacen_local.conexion(self.ruta_db) as con:
+            fila = con.execute(
+                "SELECT descripcion, huella, creado FROM analisis WHERE codigo = ? AND seccion = ? "
+                "ORDER BY creado DESC LIMIT 1", (codigo, seccion)).fetchone()
+        if fila is None:
+            return None
+        return {"description": fila[0], "huella": fila[1], "creado": fila[2]}
+
+    def guardar_analisis(self, huella: str, seccion: str, prompt: str, modelo: str,
+                         descripcion: str, codigo: str = None, image_ids: List[str] = None):
+        # Las respuestas de error de la IA no se guardan: se reintentarían desde el índice
+        if not self.ruta_db or not huella or not descripcion or descripcion.startswith(PREFIJO_ERROR_IA):
+            return
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute("INSERT OR REPLACE INTO analisis VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (huella, seccion, hash_prompt(prompt), modelo, codigo, descripcion,
+                         json.dumps(image_ids or []), time.time()))
+
+    # ------------------------------------------------------------------
+    # Inspecciones (paraderos incluidos en informes)
+    # ------------------------------------------------------------------
+    def registrar_informe(self, datos_informe: Dict[str, Any]) -> int:
+        """
+        Registra cada paradero de un payload de generate-report. Devuelve cuántos se guardaron.
+        fecha: la de inspección ("fecha_inspeccion" del paradero o de info_proyecto; None si no viene);
+        fecha_informe: la de hoy. Un paradero ya registrado con el mismo código, proyecto y fotos
+        (otra generación del mismo informe) se actualiza.
+        """
+        if not self.ruta_db:
+            return 0
+        info = datos_informe.get("info_proyecto") or {}
+        proyecto = info.get("proyecto") or info.get("folder_name")
+        fecha_informe = time.strftime("%d/%m/%Y")
+        # Las huellas se calculan antes de abrir la transacción de escritura
+        filas = []
+        for p in datos_informe.get("paraderos") or []:
+            info_paradero = p.get("info_paradero") or {}
+            codigo = (info_paradero.get("codigo") or "").strip()
+            if not codigo:
+                continue
+            analisis = p.get("analisis") or {}
+            # Las fotos se analizaron durante la sesión: sirve cualquier md5 registrado, aunque sea antiguo
+            huellas = {s: self.huella_conocida((a or {}).get("image_ids") or [], vigencia_s=None)
+                       for s, a in analisis.items()}
+            # Sin huella (md5 desconocido) la sección se identifica por sus fileIds
+            fotos = {s: h or sorted((analisis[s] or {}).get("image_ids") or []) for s, h in huellas.items()}
+            clave = hashlib.sha256(json.dumps([proyecto, fotos], sort_keys=True).encode("utf-8")).hexdigest()
+            fecha = info_paradero.get("fecha_inspeccion") or info.get("fecha_inspeccion")
+            filas.append((codigo, clave, fecha, info_paradero.get("ubicacion"), analisis, p.get("tabla") or [], huellas))
+        with almacen_local.conexion(self.ruta_db) as con:
+            for codigo, clave, fecha, ubicacion, analisis, tabla, huellas in filas:
+                valores = (proyecto, ubicacion, fecha, time.time(), json.dumps(analisis, ensure_ascii=False),
+                           json.dumps(tabla, ensure_ascii=False), fecha_informe)
+                previa = con.execute("SELECT id FROM inspecciones WHERE codigo = ? AND clave = ?",
+                                     (codigo, clave)).fetchone()
+                if previa:
+                    inspeccion_id = previa[0]
+                    con.execute("UPDATE inspecciones SET proyecto = ?, ubicacion = ?, fecha = ?, registrado = ?, "
+                                "analisis = ?, tabla = ?, fecha_informe = ? WHERE id = ?", valores + (inspeccion_id,))
+                    con.execute("DELETE FROM inspeccion_huellas WHERE inspeccion_id = ?", (inspeccion_id,))
+                else:
+                    inspeccion_id = con.execute(
+                        "INSERT INTO inspecciones (proyecto, ubicacion, fecha, registrado, analisis, tabla, "
+                        "fecha_informe, codigo, clave) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        valores + (codigo, clave)).lastrowid
+                con.executemany("INSERT INTO inspeccion_huellas VALUES (?, ?, ?)",
+                                [(inspeccion_id, s, h) for s, h in huellas.items() if h])
+        return len(filas)
+
+    def historial(self, codigo: str = None, huella: str = None, limite: int = 20) -> List[Dict[str, Any]]:
+        """Inspecciones de un paradero (por código) o que usaron ciertas fotos (por huella), más recientes primero."""
+        if not self.ruta_db or not (codigo or huella):
+            return []
+        if huella:
+            sql = ("SELECT DISTINCT i.* FROM inspecciones i JOIN inspeccion_huellas h ON h.inspeccion_id = i.id "
+                   "WHERE h.huella = ?" + (" AND i.codigo = ?" if codigo else "") + " ORDER BY i.registrado DESC LIMIT ?")
+            params = (huella, codigo, limite) if codigo else (huella, limite)
+        else:
+            sql = "SELECT * FROM inspecciones WHERE codigo = ? ORDER BY registrado DESC LIMIT ?"
+            params = (codigo, limite)
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.row_factory = sqlite3.Row
+            filas = con.execute(sql, params).fetchall()
+            huellas = {}
+            if filas:
+                marcas = ",".join("?" * len(filas))
+                for i, seccion, h in con.execute(
+                        f"SELECT inspeccion_id, seccion, huella FROM inspeccion_huellas WHERE inspeccion_id IN ({marcas})",
+                        [f["id"] for f in filas]):
+                    huellas.setdefault(i, {})[seccion] = h
+        return [{
+            "id": f["id"], "codigo": f["codigo"], "proyecto": f["proyecto"], "ubicacion": f["ubicacion"],
+            "fecha": f["fecha"], "fecha_informe": f["fecha_informe"], "registrado": f["registrado"], "analisis": json.loads(f["analisis"] or "{}"),
+            "tabla": json.loads(f["tabla"] or "[]"), "huellas": huellas.get(f["id"], {}),
+        } for f in filas]
@@ -2,42 +2,165 @@
 import os
 import io
 import json
-from flask import Flask, request, jsonify, send_file
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from PIL import Image
-import google.generativeai as genai
-import report_generator
+import codec_json
+import coalescencia
+import compresion_http
+import contexto_gemini
+import descargas
+import empaquetado_docx
+import indice_paraderos
+import mapas
+import metricas
+import miniaturas
+import perfilado
+import registros_paraderos
+import subida_drive
+import vigia_drive
+
+# Las dependencias pesadas (googleapiclient, google.generativeai, PIL, report_generator con
+# python-docx/pandas/openpyxl) se importan en la primera petición que las necesita, para que
+# los workers arranquen rápido. precargar() las carga de una vez (p. ej. antes del fork con --preload).
 
 
 # --- CONFIGURACIÓN ---
 app = Flask(__name__)
 CORS(app)
+# JSON con orjson (si está instalado) y gzip en peticiones y respuestas (ver codec_json.py y compresion_http.py)
+codec_json.instalar(app)
+app.wsgi_app = compresion_http.DescompresionGzip(app.wsgi_app)
 informe_data = {}
-# Configuración de APIs
-try:
-    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-    genai.configure(api_key=GEMINI_API_KEY)
-    print("✅ API de Gemini configurada.")
-except Exception as e:
-    print(f"❌ Error configurando la API de Gemini: {e}")
+
+# Desglose de tiempos por etapa en la cabecera Server-Timing: siempre, o sólo si la petición trae "X-Server-Timing: 1"
+METRICAS_SERVER_TIMING = os.environ.get('METRICAS_SERVER_TIMING', '0') == '1'
+
+
+@app.before_request
+def _iniciar_metricas():
+    request.environ['metricas.t0'] = time.perf_counter()
+    if METRICAS_SERVER_TIMING or request.headers.get('X-Server-Timing') == '1':
+        request.environ['metricas.traza'] = metricas.iniciar_traza()
+
+
+@app.after_request
+def _registrar_metricas(response):
+    total = time.perf_counter() - request.environ.get('metricas.t0', time.perf_counter())
+    ruta = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    metricas.observar_http(ruta, request.method, response.status_code, total)
+    if 'metricas.traza' in request.environ:
+        traza = metricas.terminar_traza(request.environ.pop('metricas.traza'))
+        response.headers['Server-Timing'] = metricas.server_timing(traza, total)
+        response.headers['Timing-Allow-Origin'] = '*'
+        response.headers['Access-Control-Expose-Headers'] = 'Server-Timing'
+    return response
+
+
+@app.after_request
+def _comprimir_respuesta(response):
+    return compresion_http.comprimir_respuesta(response, request.headers.get('Accept-Encoding'))
+
+
+@app.teardown_request
+def _cerrar_traza(_error=None):
+    # Si la vista lanzó una excepción no pasa por after_request: la traza no debe quedar en el hilo
+    if 'metricas.traza' in request.environ:
+        metricas.terminar_traza(request.environ.pop('metricas.traza'))
+
+_genai_configurado = False
+_genai_lock = threading.Lock()
+
+
+def obtener_genai():
+    """Importa y configura google.generativeai una sola vez por proceso."""
+    global _genai_configurado
+    import google.generativeai as genai
+    if not _genai_configurado:
+        with _genai_lock:
+            if not _genai_configurado:
+                # Configuración de APIs
+                try:
+                    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    print("✅ API de Gemini configurada.")
+                except Exception as e:
+                    print(f"❌ Error configurando la API de Gemini: {e}")
+                _genai_configurado = True
+    return genai
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
+# Coalescencia de peticiones idénticas concurrentes (dentro del worker y entre workers)
+vuelos_analisis = coalescencia.SingleFlight('analyze-image')
+vuelos_informe = coalescencia.SingleFlight('generate-report')
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Índice de paraderos ya procesados (ver indice_paraderos.py). Con INDICE_REUTILIZAR_ANALISIS=0 se sigue
+# registrando todo, pero /api/analyze-image siempre llama al modelo.
+indice = indice_paraderos.IndiceParaderos()
+INDICE_REUTILIZAR_ANALISIS = os.environ.get('INDICE_REUTILIZAR_ANALISIS', '1') == '1'
+
+# Tablas.xlsx se lee y valida una vez por revisión al listar la carpeta (ver hojas_excel.ingerir);
+# con TABLAS_INGESTA=0 se lee recién al generar el informe.
+TABLAS_INGESTA = os.environ.get('TABLAS_INGESTA', '1') == '1'
+
+# Paraderos guardados en el servidor, para pedir informes por id (ver registros_paraderos.py)
+registros = registros_paraderos.RegistrosParaderos()
+
+# Prefijos fijos de los prompts registrados en la caché de contexto de Gemini (ver contexto_gemini.py)
+contextos = contexto_gemini.ContextosGemini()
+
 # --- FUNCIONES ---
+class ErrorInforme(Exception):
+    """Error al preparar un informe o análisis, con el código HTTP que corresponde devolver."""
+    def __init__(self, mensaje, status=500):
+        super().__init__(mensaje)
+        self.status = status
+
+
+# Credenciales compartidas por todo el worker; el cliente de Drive es uno por hilo
+# (httplib2 no es seguro para usarse desde varios hilos a la vez).
+_drive_creds = None
+_drive_creds_lock = threading.Lock()
+_drive_local = threading.local()
+
+
+def _credenciales_drive():
+    """(credentials, client_email) del Service Account, cargadas una sola vez por proceso; None si faltan."""
+    global _drive_creds
+    if _drive_creds is None:
+        with _drive_creds_lock:
+            if _drive_creds is None:
+                creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+                if not creds_json:
+                    print("❌ GOOGLE_CREDENTIALS no encontrado")
+                    return None
+                from google.oauth2.service_account import Credentials
+                creds_info = json.loads(creds_json)
+                credentials = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+                _drive_creds = (credentials, creds_info.get('client_email'))
+    return _drive_creds
+
+
 def authenticate_google_drive():
     try:
-        creds_json = os.environ.get('GOOGLE_CREDENTIALS')
-        if not creds_json:
-            print("❌ GOOGLE_CREDENTIALS no encontrado")
+        creds = _credenciales_drive()
+        if creds is None:
             return None, None
-        creds_info = json.loads(creds_json)
-        credentials = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-        service = build('drive', 'v3', credentials=credentials)
-        print("✅ Autenticación de Drive exitosa.")
-        return service, creds_info.get('client_email')
+        credentials, client_email = creds
+        service = getattr(_drive_local, "service", None)
+        if service is None:
+            from googleapiclient.discovery import build
+            service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
+            _drive_local.service = service
+            print("✅ Autenticación de Drive exitosa.")
+        return service, client_email
     except Exception as e:
         print(f"❌ Error autenticando Drive: {e}")
         return None, None
@@ -69,36 +192,99 @@ def find_drive_id(service, q: str, include_all_drives: bool = False, drive_id: s
         else:
             params["corpora"] = "allDrives"
 
-    resp = service.files().list(**params).execute()
+    with metricas.span("drive_list"):
+        resp = service.files().list(**params).execute()
     files = resp.get("files", [])
     return files[0]["id"] if files else None
 
 
 def download_image_bytes(service, file_id):
     try:
-        request_download = service.files().get_media(fileId=file_id)
-        file_bytes = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_bytes, request_download)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+        with descargas.descargar(service, file_id) as descarga:
+            contenido = descarga.leer()
         print(f"✅ Imagen {file_id} descargada.")
-        return file_bytes.getvalue()
+        return contenido
     except Exception as e:
         # Aquí es donde ocurría el error si 'service' era una tupla
         print(f"❌ Error en download_image_bytes para {file_id}: {e}")
         return None
 
-def generate_ai_description(prompt, image_list):
+
+def parte_imagen(contenido, file_id=""):
+    """Imagen como parte inline para Gemini, sin decodificarla ni recomprimirla; None si no es una imagen."""
+    from PIL import Image
+    try:
+        with metricas.span("imagen_preproceso"):
+            with Image.open(io.BytesIO(contenido)) as img:  # sólo lee la cabecera
+                formato = img.format
+    except Exception as e:
+        print(f"❌ {file_id} no es una imagen válida: {e}")
+        return None
+    return {"mime_type": Image.MIME.get(formato, "image/jpeg"), "data": contenido}
+
+def generate_ai_description(prompt, image_list, prompt_type=None, codigo_paradero=None):
     try:
-        model = genai.GenerativeModel('models/gemini-1.5-pro-latest')
-        response = model.generate_content([prompt] + image_list)
+        model, textos, con_contexto = modelo_analisis(prompt, prompt_type, codigo_paradero)
+        t0 = time.perf_counter()
+        with metricas.span("gemini"):
+            response = model.generate_content(textos + image_list)
+        contextos.registrar(response, con_contexto, time.perf_counter() - t0)
         print("✅ Descripción de IA generada.")
         return response.text
     except Exception as e:
         print(f"❌ Error en la API de IA: {e}")
         return f"Error al generar descripción: {e}"
 
+def generar_descripcion_en_vivo(prompt, image_list, prompt_type=None, codigo_paradero=None):
+    """Como generate_ai_description, con el modelo en modo streaming: entrega el texto a medida que llega."""
+    model, textos, con_contexto = modelo_analisis(prompt, prompt_type, codigo_paradero)
+    t0 = time.perf_counter()
+    primero = True
+    with metricas.span("gemini"):
+        response = model.generate_content(textos + image_list, stream=True)
+        for fragmento in response:
+            texto = fragmento.text
+            if not texto:
+                continue
+            if primero:
+                metricas.observar("gemini_primer_fragmento", time.perf_counter() - t0)
+                primero = False
+            yield texto
+    contextos.registrar(response, con_contexto, time.perf_counter() - t0)
+    print("✅ Descripción de IA generada (streaming).")
+
+
+def evento_sse(evento, datos):
+    """Un evento de server-sent events con datos JSON."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+def quiere_streaming(data, accept=""):
+    """Streaming de la descripción: "stream": true en el payload o Accept: text/event-stream."""
+    return bool(data.get('stream')) or 'text/event-stream' in (accept or '')
+
+
+def descargar_partes(service, image_ids):
+    """
+    Descarga las fotos y las deja como partes inline para Gemini (sin decodificarlas a PIL).
+    Devuelve (descargas abiertas, partes): cada descarga mantiene su reserva en el presupuesto de
+    memoria del worker hasta que se cierra, después de que el modelo responde.
+    """
+    abiertas, partes = [], []
+    for img_id in image_ids:
+        try:
+            descarga = descargas.descargar(service, img_id)
+        except Exception as e:
+            print(f"❌ Error descargando {img_id}: {e}")
+            continue
+        abiertas.append(descarga)
+        parte = parte_imagen(descarga.leer(), img_id)
+        if parte:
+            partes.append(parte)
+    print(f"✅ {len(partes)} imagen(es) descargadas.")
+    return abiertas, partes
+
+
 def listar_imagenes_de_carpeta(service, carpeta_id):
     try:
         query = f"'{carpeta_id}' in parents and (mimeType contains 'image/') and trashed = false"
@@ -124,6 +310,218 @@ def buscar_carpeta_por_nombre(service, nombre_carpeta):
         print(f"❌ Error buscando carpeta: {e}")
         return None
 
+def precargar():
+    """
+    Carga de una vez las dependencias pesadas y el estado compartido de sólo lectura:
+    módulos, configuración de Gemini, credenciales de Drive y la plantilla base del informe.
+    Pensado para gunicorn --preload (ver gunicorn.conf.py): se ejecuta en el proceso maestro
+    antes del fork, así los workers nacen con todo en memoria (copy-on-write).
+    No abre conexiones de red: los clientes de Drive se crean por hilo dentro de cada worker.
+    """
+    t0 = time.perf_counter()
+    import googleapiclient.discovery  # noqa: F401
+    import googleapiclient.http  # noqa: F401
+    from PIL import Image  # noqa: F401
+    import report_generator
+
+    obtener_genai()
+    try:
+        _credenciales_drive()
+    except Exception as e:
+        print(f"❌ Error precargando credenciales de Drive: {e}")
+    if mapas.MAPAS_LOCALES != "nunca":
+        from matplotlib.backends import backend_agg  # noqa: F401
+    # Plantilla sin logo (la variante con logo necesita Drive y se arma en el primer informe)
+    report_generator.obtener_documento_base()
+    print(f"✅ Precarga lista en {time.perf_counter() - t0:.2f} s.")
+
+# Prompts de /api/analyze-image (compartidos con el modo ASGI, ver asgi.py).
+# ¡CAMBIO CLAVE! El prompt "general" ahora es una plantilla.
+PROMPTS_ANALISIS = {
+    'general': (
+        "Eres un asistente experto en ingeniería de transporte y vialidad, especializado en la evaluación de paraderos de autobuses. Tu tarea es analizar la imagen proporcionada para el paradero con código {codigo_paradero} y generar una descripción técnica y concisa. En tu descripción, debes identificar claramente la presencia y el estado de los siguientes elementos: refugio, andén, banca, señal informativa, demarcación en el pavimento, y si existe o no huella podo táctil. Finalmente, basándote en todos los elementos observados, determina si el paradero parece cumplir o no con el estándar de diseño del DTPM (Directorio de Transporte Público Metropolitano) y justifica brevemente por qué. Formato: Párrafo único y directo. No uses listas ni puntos."
+    ),
+    
+    'refugio_anden': ("Eres un inspector de infraestructura de transporte. Analiza la(s) imagen(es) de un refugio y andén de paradero. "
+    "En tu descripción, evalúa los siguientes puntos clave: "
+    "1. Refugio: Estado general de la estructura, materiales y su limpieza (busca rayados o basura). "
+    "2. Techumbre: Condición y protección que ofrece contra sol y lluvia. "
+    "3. Andén: Estado del pavimento y, muy importante, la presencia o ausencia de baldosas y huellas podo táctiles. "
+    "4. Iluminación: Indica si se observa o no iluminación artificial. "
+    "Genera un párrafo único y conciso que resuma tus hallazgos."),
+    
+    'senal': ("Eres un asistente técnico que describe evidencia visual para un informe. Tu única tarea es describir el estado de la "
+        "señalización y demarcación de un paradero de bus, basándote exclusivamente en la imagen proporcionada. "
+        "1. Sobre la señal (el letrero y su poste): Describe su estado físico. ¿Se ve nuevo, desgastado, dañado o rayado? "
+        "2. Sobre la normativa de la señal: Visualmente, ¿el diseño del letrero (colores, tipografía) parece cumplir con los estándares gráficos del DTPM? "
+        "3. Sobre la demarcación en el pavimento: Describe lo que ves en el suelo. ¿Hay un 'cajón de detención' pintado para el bus? ¿Está visible o desgastado? "
+        "Reglas importantes: No incluyas un título en tu respuesta. No sugieras inspecciones adicionales. Sintetiza todo en un solo párrafo.")
+}
+MODELO_ANALISIS = 'models/gemini-1.5-pro-latest'
+
+# Archivos estáticos esperados dentro de la carpeta del proyecto, en orden de preferencia
+ARCHIVOS_PROYECTO = {
+    "tablas_id": ["Tablas.xlsx"],
+    # Logo: intentamos varias extensiones por si cambia
+    "logo_id": ["logo2.jpg", "logo2.png", "logo.jpg", "logo.png"],
+    # Ubicación(es)
+    "img_ubicacion_proyecto_id": ["ubicacion.png", "ubicacion.jpg"],
+    "img_ubicacion_paradas_id": ["ubicacion_paraderos.png", "ubicacion_paraderos.jpg"],
+}
+FIGURAS_UBICACION = ("img_ubicacion_proyecto_id", "img_ubicacion_paradas_id")
+
+
+def archivos_proyecto():
+    """ARCHIVOS_PROYECTO que hay que buscar en Drive: con MAPAS_LOCALES=siempre las figuras de ubicación se dibujan localmente."""
+    if mapas.MAPAS_LOCALES == "siempre":
+        return {k: v for k, v in ARCHIVOS_PROYECTO.items() if k not in FIGURAS_UBICACION}
+    return ARCHIVOS_PROYECTO
+
+Q_CARPETA = "name = '{0}' and mimeType = 'application/vnd.google-apps.folder'"
+Q_IMAGENES = "'{0}' in parents and mimeType contains 'image/' and trashed = false"
+CAMPOS_IMAGENES = "files(id,name,mimeType,webViewLink,thumbnailLink,md5Checksum)"
+
+
+def prompt_analisis(prompt_type, codigo_paradero):
+    # Insertamos el código del paradero en el prompt si es de tipo 'general'
+    if prompt_type == 'general':
+        return PROMPTS_ANALISIS['general'].format(codigo_paradero=codigo_paradero)
+    return PROMPTS_ANALISIS.get(prompt_type, "Describe la imagen.")
+
+
+def prompt_analisis_fijo(prompt_type, codigo_paradero):
+    """
+    (fijo, variable) del prompt para la caché de contexto: el preámbulo no depende del paradero
+    y el código va aparte en el mensaje. (None, None) si el tipo de prompt no es conocido.
+    """
+    if prompt_type not in PROMPTS_ANALISIS:
+        return None, None
+    if prompt_type == 'general':
+        return (PROMPTS_ANALISIS['general'].format(codigo_paradero="que se indica en el mensaje"),
+                f"Código del paradero: {codigo_paradero}")
+    return PROMPTS_ANALISIS[prompt_type], None
+
+
+def modelo_analisis(prompt, prompt_type=None, codigo_paradero=None):
+    """(modelo, textos, con_contexto) para una llamada de /api/analyze-image (ver contexto_gemini.py)."""
+    fijo, variable = prompt_analisis_fijo(prompt_type, codigo_paradero)
+    return contextos.preparar(obtener_genai(), MODELO_ANALISIS, f"analisis_{prompt_type}", fijo, variable, prompt)
+
+
+def huella_imagenes(service, image_ids):
+    """
+    Huella de las fotos seleccionadas (ver indice_paraderos.huella_de). Usa los md5 vistos en
+    /api/list-images y consulta a Drive sólo los que falten; None si alguno no tiene md5.
+    """
+    md5s = indice.md5_vigentes(image_ids)
+    faltantes = {}
+    for img_id in set(image_ids) - set(md5s):
+        try:
+            with metricas.span("drive_metadata"):
+                meta = service.files().get(fileId=img_id, fields="md5Checksum", supportsAllDrives=True).execute()
+        except Exception as e:
+            print(f"❌ No se pudo leer el md5 de {img_id}: {e}")
+            return None
+        if not meta.get("md5Checksum"):
+            return None
+        faltantes[img_id] = meta["md5Checksum"]
+    indice.recordar_md5(faltantes)
+    return indice_paraderos.huella_de({**md5s, **faltantes}.values())
+
+
+def analisis_desde_indice(huella, prompt_type, prompt, codigo_paradero, reutilizar=True):
+    """
+    Respuesta de /api/analyze-image resuelta con el índice, o (None, extra) si hay que llamar al modelo.
+    'extra' lleva la huella y, si existe, el último análisis del paradero para esa sección.
+    """
+    extra = {'huella': huella}
+    if huella and reutilizar and INDICE_REUTILIZAR_ANALISIS:
+        previo = indice.buscar_analisis(huella, prompt_type, prompt, MODELO_ANALISIS)
+        if previo:
+            print(f"♻️ Análisis '{prompt_type}' reutilizado del índice (fotos sin cambios).")
+            return {'description': previo['description'], 'reutilizado': True, **extra}, extra
+    anterior = indice.ultimo_analisis(codigo_paradero, prompt_type)
+    if anterior:
+        extra['analisis_previo'] = anterior
+    return None, extra
+
+# Manifiesto de carpetas mantenido al día con el feed de cambios de Drive (ver vigia_drive.py)
+vigia = vigia_drive.VigiaDrive(lambda: authenticate_google_drive()[0],
+                               ruta_db=vigia_drive.DB_POR_DEFECTO if vigia_drive.VIGIA_DRIVE else None)
+
+
+def _al_cambiar_archivo(file_id, datos):
+    """
+    Un archivo cambió en Drive: se descarta de la caché de imágenes y de las plantillas (si es un logo)
+    y se actualiza su md5 en el índice.
+    """
+    report_generator = sys.modules.get('report_generator')
+    if report_generator and report_generator.olvidar_imagen(file_id):
+        print(f"♻️ Imagen {file_id} cambió en Drive; se descartó de la caché.")
+    if report_generator and report_generator.olvidar_plantillas(file_id):
+        print(f"♻️ Logo {file_id} cambió en Drive; se descartaron sus plantillas.")
+    if datos and datos.get("md5Checksum"):
+        indice.recordar_md5({file_id: datos["md5Checksum"]})
+
+
+vigia.al_cambiar(_al_cambiar_archivo)
+
+
+def imagen_para_front(f):
+    """Entrada de 'images' en /api/list-images, con la URL de su miniatura (ver /api/miniatura)."""
+    return {"id": f["id"], "name": f["name"], "mimeType": f.get("mimeType"), "webViewLink": f.get("webViewLink"),
+            "miniatura": f"/api/miniatura/{f['id']}"}
+
+
+def ids_por_nombre(archivos, buscar):
+    """drive_file_ids (claves de ARCHIVOS_PROYECTO) resueltos por nombre desde un listado de la carpeta."""
+    por_nombre = {}
+    for a in archivos:
+        por_nombre.setdefault(a.get("name"), a["id"])
+    ids = dict.fromkeys(ARCHIVOS_PROYECTO)
+    for clave, nombres in buscar.items():
+        ids[clave] = next((por_nombre[n] for n in nombres if n in por_nombre), None)
+    return ids
+
+
+def resolver_carpeta(service, folder_name):
+    """folder_id por nombre: desde el manifiesto del vigía si la carpeta ya está registrada, si no en Drive."""
+    return vigia.carpeta_por_nombre(folder_name) or find_drive_id(
+        service, Q_CARPETA.format(folder_name) + " and trashed = false", include_all_drives=True)
+
+# Subidas de informes a la carpeta del proyecto (ver subida_drive.py)
+subidas = subida_drive.GestorSubidas(lambda: authenticate_google_drive()[0])
+
+
+def quiere_subir_a_drive(datos_completos, destino_query=None):
+    """El informe va a la carpeta del proyecto en Drive en vez de descargarse ("destino": "drive" o ?destino=drive)."""
+    destino = datos_completos.pop("destino", None) or destino_query
+    return (destino or "").strip().lower() == "drive"
+
+
+def quiere_perfilar(datos_completos, cabecera=None):
+    """Construcción perfilada (PERFILADO=1, o X-Perfilar: 1 / "perfilar": true si PERFILADO_PERMITIR=1; ver perfilado.py)."""
+    return perfilado.solicitado(datos_completos.pop("perfilar", None), cabecera)
+
+
+def enlaces_perfil(perfil_id):
+    return {"id": perfil_id, "json": f"/api/perfiles/{perfil_id}.json", "folded": f"/api/perfiles/{perfil_id}.folded"}
+
+
+def subir_informe_a_drive(datos_completos, nombre_archivo, contenido):
+    """Encola la subida del informe a la carpeta del proyecto. Devuelve el cuerpo de la respuesta 202."""
+    service, _ = authenticate_google_drive()
+    if not service:
+        raise ErrorInforme("No se pudo autenticar con Drive.", 500)
+    info_proyecto = datos_completos.get("info_proyecto") or {}
+    folder_name = (info_proyecto.get("folder_name") or "").strip()
+    carpeta_id = (info_proyecto.get("folder_id") or (datos_completos.get("drive_file_ids") or {}).get("folder_id")
+                  or (resolver_carpeta(service, folder_name) if folder_name else None))
+    if not carpeta_id:
+        raise ErrorInforme("Para subir el informe a Drive se necesita 'info_proyecto.folder_name' o 'folder_id'.", 400)
+    estado = subidas.encolar(service, contenido, nombre_archivo, carpeta_id, DOCX_MIMETYPE)
+    return {"ok": True, **estado, "estado_url": f"/api/subidas/{estado['file_id']}"}
+
 # --- ENDPOINTS DE LA API ---
      # En main.py
 
@@ -148,81 +546,93 @@ def list_images():
             if not folder_name:
                 return jsonify({"error": "Falta 'folder_name' o 'folder_id'."}), 400
 
-            folder_id = find_drive_id(
-                service,
-                "name = '{0}' and mimeType = 'application/vnd.google-apps.folder'".format(folder_name),
-                include_all_drives=True
-            )
+            folder_id = resolver_carpeta(service, folder_name)
             if not folder_id:
                 return jsonify({"error": f"No se encontró la carpeta '{folder_name}' (o la SA no tiene permisos)."}), 404
 
-        # 3) Listar imágenes dentro de la carpeta (incluye Shared Drives)
-        imgs_q = f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false"
-        resp_imgs = service.files().list(
-            q=imgs_q,
-            fields="files(id,name,mimeType,webViewLink,thumbnailLink)",
-            pageSize=200,
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True
-        ).execute()
-        images = [
-            {
-                "id": f["id"],
-                "name": f["name"],
-                "mimeType": f.get("mimeType"),
-                "webViewLink": f.get("webViewLink")
-            }
-            for f in resp_imgs.get("files", [])
-        ]
-
-        # 4) Resolver archivos estáticos esperados (dentro de la misma carpeta)
-        parent_q = f"'{folder_id}' in parents and trashed = false"
-
-        # Tablas.xlsx
-        tablas_id = find_drive_id(service, f"{parent_q} and name = 'Tablas.xlsx'", include_all_drives=True)
-
-        # Logo: intentamos varias extensiones por si cambia
-        logo_id = (
-            find_drive_id(service, f"{parent_q} and name = 'logo2.jpg'", include_all_drives=True)
-            or find_drive_id(service, f"{parent_q} and name = 'logo2.png'", include_all_drives=True)
-            or find_drive_id(service, f"{parent_q} and name = 'logo.jpg'", include_all_drives=True)
-            or find_drive_id(service, f"{parent_q} and name = 'logo.png'", include_all_drives=True)
-        )
-
-        # Ubicación(es)
-        img_ubicacion_proyecto_id = (
-            find_drive_id(service, f"{parent_q} and name = 'ubicacion.png'", include_all_drives=True)
-            or find_drive_id(service, f"{parent_q} and name = 'ubicacion.jpg'", include_all_drives=True)
-        )
-        img_ubicacion_paradas_id = (
-            find_drive_id(service, f"{parent_q} and name = 'ubicacion_paraderos.png'", include_all_drives=True)
-            or find_drive_id(service, f"{parent_q} and name = 'ubicacion_paraderos.jpg'", include_all_drives=True)
-        )
+        # 3) Listar la carpeta: desde el manifiesto del vigía (sin llamar a Drive si está al día)
+        archivos = vigia.archivos_carpeta(service, folder_id, folder_name or None)
+        if archivos is not None:
+            images = [imagen_para_front(f) for f in archivos if (f.get("mimeType") or "").startswith("image/")]
+            indice.recordar_md5({f["id"]: f.get("md5Checksum") for f in archivos})
+            ids = ids_por_nombre(archivos, archivos_proyecto())
+        else:
+            images, ids = listar_carpeta_drive(service, folder_id)
+        tablas_id = ids["tablas_id"]
         print(f"[/api/list-images] OK folder_id={folder_id} tablas_id={tablas_id} imgs={len(images)}")
 
 
-        # 5) Respuesta (incluye alias 'tablas' para compatibilidad con el front antiguo)
+        # 4) Respuesta (incluye alias 'tablas' para compatibilidad con el front antiguo)
         return jsonify({
             "ok": True,
             "folder_id": folder_id,
             "service_account": sa_email,
             "images": images,
-            "drive_file_ids": {
-                "tablas_id": tablas_id,
-                "logo_id": logo_id,
-                "img_ubicacion_proyecto_id": img_ubicacion_proyecto_id,
-                "img_ubicacion_paradas_id": img_ubicacion_paradas_id
-            },
-            "tablas": tablas_id  # <-- alias legacy
+            "drive_file_ids": ids,
+            "tablas": tablas_id,  # <-- alias legacy
+            "validacion_tablas": validacion_tablas(service, tablas_id),
         }), 200
 
     except Exception as e:
         print(f"❌ /api/list-images error: {e}")
         return jsonify({"error": str(e)}), 500
-    
+
+
+def validacion_tablas(service, tablas_id):
+    """
+    Ingesta de Tablas.xlsx al listar la carpeta: lo lee una vez por revisión (las siguientes llamadas
+    y los informes usan la caché columnar) y devuelve su validación {"ok", "errores", "avisos", "hojas",
+    "revision"}. None si el proyecto no tiene Tablas.xlsx o con TABLAS_INGESTA=0.
+    """
+    if not tablas_id or not TABLAS_INGESTA:
+        return None
+    import hojas_excel
+    try:
+        with metricas.span("tablas_ingesta"):
+            return hojas_excel.ingerir(service, tablas_id)
+    except Exception as e:
+        print(f"❌ No se pudo ingerir Tablas.xlsx ({tablas_id}): {e}")
+        return {"ok": False, "errores": [f"No se pudo leer 'Tablas.xlsx' desde Drive: {e}"], "avisos": [], "hojas": {}}
+
+
+def listar_carpeta_drive(service, folder_id):
+    """Listado directo en Drive (vigía desactivado): (imágenes, drive_file_ids)."""
+    # Imágenes dentro de la carpeta (incluye Shared Drives)
+    # Se recorren todas las páginas: una campaña grande supera las 200 fotos por página
+    images, page_token = [], None
+    while True:
+        with metricas.span("drive_list"):
+            resp_imgs = service.files().list(
+                q=Q_IMAGENES.format(folder_id),
+                fields=f"nextPageToken,{CAMPOS_IMAGENES}",
+                pageSize=200,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute()
+        images.extend(imagen_para_front(f) for f in resp_imgs.get("files", []))
+        indice.recordar_md5({f["id"]: f.get("md5Checksum") for f in resp_imgs.get("files", [])})
+        page_token = resp_imgs.get("nextPageToken")
+        if not page_token:
+            break
+
+    # Archivos estáticos esperados (dentro de la misma carpeta)
+    parent_q = f"'{folder_id}' in parents and trashed = false"
+    ids = dict.fromkeys(ARCHIVOS_PROYECTO)
+    for clave, nombres in archivos_proyecto().items():
+        for nombre in nombres:
+            ids[clave] = find_drive_id(service, f"{parent_q} and name = '{nombre}'", include_all_drives=True)
+            if ids[clave]:
+                break
+    return images, ids
+
 @app.route('/api/analyze-image', methods=['POST'], strict_slashes=False)
 def handle_analyze_image():
-    """Recibe IDs de imagen y datos del paradero, analiza con IA y devuelve una descripción."""
+    """
+    Recibe IDs de imagen y datos del paradero, analiza con IA y devuelve una descripción.
+    Con "stream": true (o Accept: text/event-stream) la descripción llega por server-sent events
+    a medida que el modelo la genera (ver analisis_en_vivo).
+    """
     print("\n--- Petición en /api/analyze-image ---")
     data = request.get_json()
     image_ids = data.get('image_ids', [])
@@ -233,33 +643,7 @@ def handle_analyze_image():
     if not image_ids or not prompt_type:
         return jsonify({'error': 'Faltan image_ids o prompt_type'}), 400
 
-    # ¡CAMBIO CLAVE! El prompt "general" ahora es una plantilla.
-    PROMPTS = {
-        'general': (
-            "Eres un asistente experto en ingeniería de transporte y vialidad, especializado en la evaluación de paraderos de autobuses. Tu tarea es analizar la imagen proporcionada para el paradero con código {codigo_paradero} y generar una descripción técnica y concisa. En tu descripción, debes identificar claramente la presencia y el estado de los siguientes elementos: refugio, andén, banca, señal informativa, demarcación en el pavimento, y si existe o no huella podo táctil. Finalmente, basándote en todos los elementos observados, determina si el paradero parece cumplir o no con el estándar de diseño del DTPM (Directorio de Transporte Público Metropolitano) y justifica brevemente por qué. Formato: Párrafo único y directo. No uses listas ni puntos."
-        ),
-        
-        'refugio_anden': ("Eres un inspector de infraestructura de transporte. Analiza la(s) imagen(es) de un refugio y andén de paradero. "
-        "En tu descripción, evalúa los siguientes puntos clave: "
-        "1. Refugio: Estado general de la estructura, materiales y su limpieza (busca rayados o basura). "
-        "2. Techumbre: Condición y protección que ofrece contra sol y lluvia. "
-        "3. Andén: Estado del pavimento y, muy importante, la presencia o ausencia de baldosas y huellas podo táctiles. "
-        "4. Iluminación: Indica si se observa o no iluminación artificial. "
-        "Genera un párrafo único y conciso que resuma tus hallazgos."),
-        
-        'senal': ("Eres un asistente técnico que describe evidencia visual para un informe. Tu única tarea es describir el estado de la "
-            "señalización y demarcación de un paradero de bus, basándote exclusivamente en la imagen proporcionada. "
-            "1. Sobre la señal (el letrero y su poste): Describe su estado físico. ¿Se ve nuevo, desgastado, dañado o rayado? "
-            "2. Sobre la normativa de la señal: Visualmente, ¿el diseño del letrero (colores, tipografía) parece cumplir con los estándares gráficos del DTPM? "
-            "3. Sobre la demarcación en el pavimento: Describe lo que ves en el suelo. ¿Hay un 'cajón de detención' pintado para el bus? ¿Está visible o desgastado? "
-            "Reglas importantes: No incluyas un título en tu respuesta. No sugieras inspecciones adicionales. Sintetiza todo en un solo párrafo.")
-    }
-
-    # Insertamos el código del paradero en el prompt si es de tipo 'general'
-    if prompt_type == 'general':
-        selected_prompt = PROMPTS['general'].format(codigo_paradero=codigo_paradero)
-    else:
-        selected_prompt = PROMPTS.get(prompt_type, "Describe la imagen.")
+    selected_prompt = prompt_analisis(prompt_type, codigo_paradero)
 
     print(f"Usando prompt para '{prompt_type}': {selected_prompt[:100]}...") # Imprime los primeros 100 caracteres del prompt
 
@@ -267,19 +651,91 @@ def handle_analyze_image():
     if not service:
         return jsonify({'error': 'Fallo en la autenticación con Google Drive'}), 500
 
-    images_for_model = []
-    for img_id in image_ids:
-        image_bytes = download_image_bytes(service, img_id)
-        if image_bytes:
-            img = Image.open(io.BytesIO(image_bytes))
-            images_for_model.append(img)
+    # Mismas fotos y mismo prompt que un análisis anterior: se devuelve sin llamar al modelo
+    # ("reanalizar": true en el payload fuerza la llamada y reemplaza lo guardado)
+    huella = huella_imagenes(service, image_ids)
+    respuesta, extra = analisis_desde_indice(huella, prompt_type, selected_prompt, codigo_paradero,
+                                             reutilizar=not data.get('reanalizar'))
+    if quiere_streaming(data, request.headers.get('Accept')):
+        eventos = analisis_en_vivo(respuesta, extra, image_ids, prompt_type, selected_prompt, codigo_paradero, huella)
+        return Response(eventos, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if respuesta:
+        return jsonify(respuesta)
+
+    def analizar():
+        service, _ = authenticate_google_drive()
+        if not service:
+            raise ErrorInforme('Fallo en la autenticación con Google Drive', 500)
+
+        abiertas, images_for_model = [], []
+        try:
+            abiertas, images_for_model = descargar_partes(service, image_ids)
+            if not images_for_model:
+                raise ErrorInforme('No se pudieron descargar las imágenes seleccionadas', 500)
+
+            description = generate_ai_description(selected_prompt, images_for_model, prompt_type, codigo_paradero)
+        finally:
+            images_for_model.clear()
+            for descarga in abiertas:
+                descarga.cerrar()
+        indice.guardar_analisis(huella, prompt_type, selected_prompt, MODELO_ANALISIS, description,
+                                codigo_paradero, image_ids)
+        return description
+
+    # Reintentos / dobles clics con la misma selección esperan al análisis en curso
+    try:
+        description = vuelos_analisis.ejecutar(
+            {"image_ids": image_ids, "prompt": selected_prompt, "codigo_paradero": codigo_paradero}, analizar
+        )
+    except ErrorInforme as e:
+        return jsonify({'error': str(e)}), e.status
 
-    if not images_for_model:
-        return jsonify({'error': 'No se pudieron descargar las imágenes seleccionadas'}), 500
+    return jsonify({'description': description, **extra})
 
-    description = generate_ai_description(selected_prompt, images_for_model)
 
-    return jsonify({'description': description})
+def analisis_en_vivo(respuesta, extra, image_ids, prompt_type, selected_prompt, codigo_paradero, huella):
+    """
+    Eventos SSE de /api/analyze-image en modo streaming:
+      inicio     {huella, analisis_previo?}                 apenas se recibe la petición
+      fragmento  {texto}                                    cada trozo de texto que entrega el modelo
+      fin        {description, huella, ...}                 texto completo, el que va a /api/save-description
+      error      {error, parcial}                           si algo falla (parcial: el texto recibido hasta ahí)
+    Un análisis reutilizado del índice llega como un solo fragmento. No se coalesce con otras
+    peticiones (cada cliente recibe su propio stream), pero el resultado queda en el índice.
+    """
+    yield evento_sse("inicio", extra)
+    if respuesta:
+        yield evento_sse("fragmento", {"texto": respuesta["description"]})
+        yield evento_sse("fin", respuesta)
+        return
+
+    service, _ = authenticate_google_drive()
+    if not service:
+        yield evento_sse("error", {"error": "Fallo en la autenticación con Google Drive", "parcial": ""})
+        return
+    abiertas, partes, fragmentos = [], [], []
+    try:
+        abiertas, partes = descargar_partes(service, image_ids)
+        if not partes:
+            yield evento_sse("error", {"error": "No se pudieron descargar las imágenes seleccionadas", "parcial": ""})
+            return
+        for texto in generar_descripcion_en_vivo(selected_prompt, partes, prompt_type, codigo_paradero):
+            fragmentos.append(texto)
+            yield evento_sse("fragmento", {"texto": texto})
+    except Exception as e:
+        print(f"❌ Error en la API de IA (streaming): {e}")
+        yield evento_sse("error", {"error": f"Error al generar descripción: {e}", "parcial": "".join(fragmentos)})
+        return
+    finally:
+        partes.clear()
+        for descarga in abiertas:
+            descarga.cerrar()
+
+    description = "".join(fragmentos)
+    indice.guardar_analisis(huella, prompt_type, selected_prompt, MODELO_ANALISIS, description,
+                            codigo_paradero, image_ids)
+    yield evento_sse("fin", {"description": description, **extra})
 
 
 @app.route('/api/save-description', methods=['POST'], strict_slashes=False)
@@ -314,6 +770,53 @@ def save_description():
         return jsonify({'error': str(e)}), 500
 
 
+# SINCRONIZAMOS LAS CARACTERÍSTICAS Y OPCIONES CON EL FRONTEND
+CARACTERISTICAS_TABLA = {
+    "Posee refugio": ["Sí", "No"],
+    "Estándar del refugio": ["DTPM", "No es DTPM", "N.A."],
+    "Estado de conservación del refugio": ["Sin refugio presente", "Deficiente", "Regular", "Bueno"],
+    "Posee basurero": ["Sí", "No"],
+    "Posee señal de parada": ["Sí", "No"],
+    "Señal cumple norma gráfica": ["Sí", "No", "N.A."],
+    "Estado de conservación de la señal": ["Sin señal presente", "Deficiente", "Regular", "Bueno"],
+    "Iluminación": ["Sin iluminación presente", "Deficiente", "Buena"],
+    "Posee andén": ["Sí", "No"],
+    "Estado de conservación del andén": ["Sin andén presente", "Deficiente", "Regular", "Bueno"],
+    "Posee conexión a la vereda": ["Sí", "No"],
+    "Posee huella podo táctil al borde del andén": ["Sí", "No"],
+    "Demarcación del cajón de parada": ["Sí posee", "No posee"]
+}
+
+# EL NUEVO SÚPER PROMPT CON INSTRUCCIONES PARA COMENTARIOS
+_INSTRUCCIONES_TABLA = (
+    "Tu tarea es leer el contexto y rellenar un objeto JSON. Para cada característica de la siguiente lista, elige la opción que mejor la describa.\n"
+    "Lista de características y sus opciones permitidas:\n{opciones_texto}\n"
+    "REGLA ESPECIAL: Para la característica 'Estado de conservación del refugio', el valor en el JSON debe ser un objeto con dos claves: "
+    "'seleccion' (con la opción elegida) y 'comentario' (con una observación MUY BREVE de máximo 5 palabras, como 'Falta limpieza' o 'Estructura en buen estado').\n"
+    "Responde únicamente con un objeto JSON válido, sin explicaciones ni texto adicional."
+)
+PROMPT_TABLA = (
+    "Eres un analista técnico que extrae datos estructurados de informes de inspección. A continuación te entrego el contexto completo "
+    "de un paradero de autobús:\n\n--- CONTEXTO ---\n{contexto}\n\n--- FIN DEL CONTEXTO ---\n\n" + _INSTRUCCIONES_TABLA
+)
+MODELO_TABLA = 'gemini-1.5-pro-latest'
+
+
+def opciones_tabla():
+    opciones_texto = ""
+    for car, opts in CARACTERISTICAS_TABLA.items():
+        opciones_texto += f"- Para '{car}', elige una de estas opciones: {opts}\n"
+    return opciones_texto
+
+
+def prompt_tabla_fijo(contexto):
+    """(fijo, variable) de PROMPT_TABLA para la caché de contexto: el catálogo de opciones es fijo, el contexto va en el mensaje."""
+    fijo = ("Eres un analista técnico que extrae datos estructurados de informes de inspección. En cada mensaje te entrego "
+            "el contexto completo de un paradero de autobús, entre '--- CONTEXTO ---' y '--- FIN DEL CONTEXTO ---'.\n\n"
+            + _INSTRUCCIONES_TABLA.format(opciones_texto=opciones_tabla()))
+    return fijo, f"--- CONTEXTO ---\n{contexto}\n\n--- FIN DEL CONTEXTO ---"
+
+
 @app.route('/api/fill-table', methods=['POST'])
 def fill_table_data():
     print("\n--- Petición recibida en /api/fill-table ---")
@@ -326,43 +829,18 @@ def fill_table_data():
         f"Descripción de Señal y Demarcación: {informe_data['analisis'].get('senal', {}).get('description', 'No disponible.')}"
     )
 
-    # SINCRONIZAMOS LAS CARACTERÍSTICAS Y OPCIONES CON EL FRONTEND
-    caracteristicas_map = {
-        "Posee refugio": ["Sí", "No"],
-        "Estándar del refugio": ["DTPM", "No es DTPM", "N.A."],
-        "Estado de conservación del refugio": ["Sin refugio presente", "Deficiente", "Regular", "Bueno"],
-        "Posee basurero": ["Sí", "No"],
-        "Posee señal de parada": ["Sí", "No"],
-        "Señal cumple norma gráfica": ["Sí", "No", "N.A."],
-        "Estado de conservación de la señal": ["Sin señal presente", "Deficiente", "Regular", "Bueno"],
-        "Iluminación": ["Sin iluminación presente", "Deficiente", "Buena"],
-        "Posee andén": ["Sí", "No"],
-        "Estado de conservación del andén": ["Sin andén presente", "Deficiente", "Regular", "Bueno"],
-        "Posee conexión a la vereda": ["Sí", "No"],
-        "Posee huella podo táctil al borde del andén": ["Sí", "No"],
-        "Demarcación del cajón de parada": ["Sí posee", "No posee"]
-    }
-
-    opciones_texto = ""
-    for car, opts in caracteristicas_map.items():
-        opciones_texto += f"- Para '{car}', elige una de estas opciones: {opts}\n"
-
-    # EL NUEVO SÚPER PROMPT CON INSTRUCCIONES PARA COMENTARIOS
-    prompt_final = (
-        "Eres un analista técnico que extrae datos estructurados de informes de inspección. A continuación te entrego el contexto completo "
-        "de un paradero de autobús:\n\n--- CONTEXTO ---\n{contexto}\n\n--- FIN DEL CONTEXTO ---\n\n"
-        "Tu tarea es leer el contexto y rellenar un objeto JSON. Para cada característica de la siguiente lista, elige la opción que mejor la describa.\n"
-        "Lista de características y sus opciones permitidas:\n{opciones_texto}\n"
-        "REGLA ESPECIAL: Para la característica 'Estado de conservación del refugio', el valor en el JSON debe ser un objeto con dos claves: "
-        "'seleccion' (con la opción elegida) y 'comentario' (con una observación MUY BREVE de máximo 5 palabras, como 'Falta limpieza' o 'Estructura en buen estado').\n"
-        "Responde únicamente con un objeto JSON válido, sin explicaciones ni texto adicional."
-    ).format(contexto=contexto, opciones_texto=opciones_texto)
+    prompt_final = PROMPT_TABLA.format(contexto=contexto, opciones_texto=opciones_tabla())
+    fijo, variable = prompt_tabla_fijo(contexto)
 
     print("Enviando súper prompt final a la IA...")
 
     try:
-        model = genai.GenerativeModel(model_name='gemini-1.5-pro-latest')
-        response = model.generate_content(prompt_final)
+        model, textos, con_contexto = contextos.preparar(obtener_genai(), MODELO_TABLA, "tabla", fijo, variable,
+                                                         prompt_final)
+        t0 = time.perf_counter()
+        with metricas.span("gemini"):
+            response = model.generate_content(textos)
+        contextos.registrar(response, con_contexto, time.perf_counter() - t0)
 
         json_response_text = response.text.strip().replace('```json', '').replace('```', '')
         table_data = json.loads(json_response_text)
@@ -375,10 +853,122 @@ def fill_table_data():
         return jsonify({'error': f'Error al procesar la respuesta de la IA: {e}'}), 500
 
 
+def resolver_archivos_proyecto(service_drive, folder_name, drive_file_ids_payload, buscar_figuras=True):
+    """
+    Resuelve los fileIds de Tablas.xlsx, logo y figuras de ubicación:
+    por nombre dentro de la carpeta del proyecto, o directamente desde los IDs enviados por el front.
+    Con buscar_figuras=False no se buscan las figuras de ubicación (se dibujan con mapas.py).
+    """
+    # Validación flexible: carpeta O ids directos
+    if not folder_name and not drive_file_ids_payload:
+        raise ErrorInforme('Debe indicar "info_proyecto.folder_name" o proveer "drive_file_ids".', 400)
+
+    if folder_name:
+        folder_id = resolver_carpeta(service_drive, folder_name)
+        if not folder_id:
+            raise ErrorInforme(f"No se encontró la carpeta '{folder_name}' en Drive (o no tienes permisos).", 404)
+
+        # Con el vigía activo, un solo listado de la carpeta (o ninguno, si el manifiesto está al día)
+        archivos = vigia.archivos_carpeta(service_drive, folder_id, folder_name)
+        if archivos is not None:
+            buscar = {k: v for k, v in ARCHIVOS_PROYECTO.items() if buscar_figuras or k not in FIGURAS_UBICACION}
+            return {"folder_id": folder_id, **ids_por_nombre(archivos, buscar)}
+
+        parent_q = f"'{folder_id}' in parents"
+        return {
+            "folder_id": folder_id,
+            "tablas_id": find_drive_id(service_drive, f"{parent_q} and name = 'Tablas.xlsx'", include_all_drives=True),
+            "logo_id": find_drive_id(service_drive, f"{parent_q} and name = 'logo2.jpg'", include_all_drives=True),
+            "img_ubicacion_proyecto_id": find_drive_id(service_drive, f"{parent_q} and name = 'ubicacion.png'", include_all_drives=True) if buscar_figuras else None,
+            "img_ubicacion_paradas_id": find_drive_id(service_drive, f"{parent_q} and name = 'ubicacion_paraderos.png'", include_all_drives=True) if buscar_figuras else None,
+        }
+
+    # Ramal por IDs directos desde el front (no toques Drive)
+    return {
+        "tablas_id": drive_file_ids_payload.get("tablas_id"),
+        "logo_id": drive_file_ids_payload.get("logo_id"),
+        "img_ubicacion_proyecto_id": drive_file_ids_payload.get("img_ubicacion_proyecto_id"),
+        "img_ubicacion_paradas_id": drive_file_ids_payload.get("img_ubicacion_paradas_id"),
+    }
+
+
+def construir_informe_docx(datos_completos, service_drive):
+    """Resuelve los archivos del proyecto, genera el informe y lo serializa. Devuelve (nombre_archivo, bytes)."""
+    info_proyecto = (datos_completos.get("info_proyecto") or {})
+    folder_name = (info_proyecto.get("folder_name") or "").strip()
+    drive_file_ids_payload = (datos_completos.get("drive_file_ids") or {})
+
+    print(f"[generate-report] folder_name='{folder_name}' | drive_file_ids_keys={list(drive_file_ids_payload.keys())}")
+    vigia.asegurar_iniciado()  # también descarta de la caché las fotos que cambien en Drive
+    modo_mapas = datos_completos.get("mapas_locales") or mapas.MAPAS_LOCALES
+    ids = resolver_archivos_proyecto(service_drive, folder_name, drive_file_ids_payload,
+                                     buscar_figuras=modo_mapas != "siempre")
+
+    import report_generator
+
+    # Llamada al generador: pásale SIEMPRE el paquete de IDs resueltos
+    document = report_generator.crear_informe_paraderos(
+        datos_informe=datos_completos,
+        service_drive=service_drive,
+        drive_file_ids={k: v for k, v in ids.items() if k != "folder_id"},
+    )
+    if not document:
+        raise ErrorInforme('No se pudo generar el documento.', 500)
+
+    file_stream = io.BytesIO()
+    with metricas.span("docx_save"):
+        empaquetado_docx.guardar(document, file_stream)
+    metricas.sumar_bytes("docx_generado", file_stream.tell())
+    try:
+        print(f"🗂️ {indice.registrar_informe(datos_completos)} paraderos registrados en el índice.")
+    except Exception as e:
+        print(f"❌ No se pudo registrar el informe en el índice de paraderos: {e}")
+    nombre_archivo = f"Informe_{info_proyecto.get('proyecto', 'Proyecto')}.docx"
+    return nombre_archivo, file_stream.getvalue()
+
+
+def construir_informe(datos_completos, construir, perfilar=False):
+    """
+    Ejecuta construir() -> (nombre_archivo, bytes) compartiendo la construcción con peticiones
+    iguales, o sola y perfilada si se pidió. Devuelve (nombre_archivo, bytes, id del perfil o None).
+    """
+    if not perfilar:
+        return (*vuelos_informe.ejecutar(datos_completos, construir), None)
+    info_proyecto = datos_completos.get("info_proyecto") or {}
+    etiqueta = f"{info_proyecto.get('proyecto', 'Proyecto')} ({len(datos_completos.get('paraderos') or [])} paraderos)"
+    with perfilado.Perfil(etiqueta) as perfil:
+        nombre_archivo, contenido = construir()
+    return nombre_archivo, contenido, perfil.id
+
+
+def resolver_paraderos(datos_completos):
+    """Reemplaza en el payload las referencias a paraderos guardados por sus registros (ver registros_paraderos.py)."""
+    if not datos_completos.get("paraderos"):
+        return
+    try:
+        datos_completos["paraderos"] = registros.resolver(datos_completos["paraderos"])
+    except registros_paraderos.ErrorRegistro as e:
+        raise ErrorInforme(str(e), e.status)
+
+
+def mezclar_analisis_guardado(datos_completos):
+    """Agrega a cada paradero las descripciones guardadas con /api/save-description."""
+    # Supongamos que guardaste las descripciones en informe_data['analisis'] por tipo
+    analisis_guardado = informe_data.get('analisis') or {}
+
+    # Si quieres que aplique a TODOS los paraderos:
+    for p in (datos_completos.get("paraderos") or []):
+        base = p.get("analisis") or {}
+        # lo guardado pisa lo generado por IA
+        p["analisis"] = {**base, **analisis_guardado}
+
+
 @app.route('/api/generate-report', methods=['POST'])
 def generate_report():
     """
     Llama al generador de informes y devuelve el archivo .docx para su descarga.
+    Con "destino": "drive" (o ?destino=drive) lo sube a la carpeta del proyecto y responde 202
+    con el enlace de Drive; el avance se consulta en /api/subidas/<file_id>.
     """
     try:
         print("Solicitud para generar informe recibida.")
@@ -386,104 +976,442 @@ def generate_report():
         datos_completos = request.get_json(force=True) or {}
         if not datos_completos:
             return jsonify({'error': 'No se recibieron datos para generar el informe.'}), 400
-        # Supongamos que guardaste las descripciones en informe_data['analisis'] por tipo
-        analisis_guardado = (informe_data.get('analisis') if 'informe_data' in globals() else {}) or {}
+        resolver_paraderos(datos_completos)
+        mezclar_analisis_guardado(datos_completos)
+        a_drive = quiere_subir_a_drive(datos_completos, request.args.get("destino"))
+        perfilar = quiere_perfilar(datos_completos, request.headers.get("X-Perfilar"))
+
+        def construir():
+            service_drive, _ = authenticate_google_drive()
+            return construir_informe_docx(datos_completos, service_drive)
+
+        # Dobles clics en "Generar informe" comparten la misma construcción (salvo si se perfila)
+        nombre_archivo, contenido, perfil_id = construir_informe(datos_completos, construir, perfilar)
+
+        if a_drive:
+            # El enlace se conoce antes de subir: el cliente no espera la subida
+            cuerpo = subir_informe_a_drive(datos_completos, nombre_archivo, contenido)
+            if perfil_id:
+                cuerpo["perfil"] = enlaces_perfil(perfil_id)
+            return jsonify(cuerpo), 202
+
+        print(f"✅ Enviando el archivo '{nombre_archivo}' para descarga.")
+        respuesta = send_file(
+            io.BytesIO(contenido),
+            as_attachment=True,
+            download_name=nombre_archivo,
+            mimetype=DOCX_MIMETYPE
+        )
+        if perfil_id:
+            respuesta.headers["X-Perfil"] = perfil_id
+            respuesta.headers["Access-Control-Expose-Headers"] = "X-Perfil"
+        return respuesta
 
-        # Si quieres que aplique a TODOS los paraderos:
-        for p in (datos_completos.get("paraderos") or []):
-            base = p.get("analisis") or {}
-            # lo guardado pisa lo generado por IA
-            p["analisis"] = {**base, **analisis_guardado}
+    except ErrorInforme as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        print(f"❌ Error en /api/generate-report: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        info_proyecto = (datos_completos.get("info_proyecto") or {})
-        folder_name = (info_proyecto.get("folder_name") or "").strip()
-        drive_file_ids = (datos_completos.get("drive_file_ids") or {})
 
-        service_drive, _ = authenticate_google_drive()
+def archivos_sin_drive(datos_completos):
+    """
+    fileIds de Tablas.xlsx y de las figuras de ubicación para la vista previa, sin llamar a Drive:
+    los del payload o, si faltan, los del manifiesto del vigía (sólo si está al día).
+    Devuelve (ids, sin_tablas); sin_tablas es True si se sabe que el informe no tendrá Tablas.xlsx.
+    """
+    payload = datos_completos.get("drive_file_ids") or {}
+    claves = ("tablas_id",) + FIGURAS_UBICACION
+    ids = {clave: payload.get(clave) or payload.get(corta)
+           for clave, corta in zip(claves, ("tablas", "ubicacion_proyecto", "ubicacion_paradas"))}
+    folder_name = ((datos_completos.get("info_proyecto") or {}).get("folder_name") or "").strip()
+    listado = None
+    if folder_name and not all(ids.values()):
+        listado = vigia.manifiesto(vigia.carpeta_por_nombre(folder_name))
+        if listado is not None:
+            encontrados = ids_por_nombre(listado, {k: ARCHIVOS_PROYECTO[k] for k in claves})
+            ids = {k: v or encontrados[k] for k, v in ids.items()}
+    return ids, not ids["tablas_id"] and (not folder_name or listado is not None)
+
+
+@app.route('/api/preview-report', methods=['POST'])
+def preview_report():
+    """
+    Vista previa HTML del informe con el mismo payload que /api/generate-report: misma estructura,
+    numeración de capítulos, figuras y cuadros, con miniaturas en lugar de las fotos (ver vista_previa.py).
+    No descarga nada de Drive ni arma el .docx.
+    """
+    try:
+        datos_completos = request.get_json(force=True) or {}
+        if not datos_completos:
+            return jsonify({'error': 'No se recibieron datos para la vista previa.'}), 400
+        resolver_paraderos(datos_completos)
+        mezclar_analisis_guardado(datos_completos)
 
-        # Log mínimo para depurar:
-        print(f"[generate-report] folder_name='{folder_name}' | drive_file_ids_keys={list(drive_file_ids.keys())}")
+        import vista_previa
 
+        tam, _ = miniaturas.validar(request.args.get("tam") or vista_previa.TAM_MINIATURA, None)
+        ids, sin_tablas = archivos_sin_drive(datos_completos)
+        with metricas.span("vista_previa"):
+            pagina = vista_previa.renderizar(datos_completos, ids["img_ubicacion_proyecto_id"],
+                                             ids["img_ubicacion_paradas_id"], sin_tablas=sin_tablas, tam=tam)
+        return Response(pagina, mimetype='text/html')
 
-        # 4. Ahora la validación funcionará
-        if not folder_name and not drive_file_ids:
-            # Si no hay carpeta ni IDs directos, no se puede seguir
-            return jsonify({'error': 'Debe indicar "info_proyecto.folder_name" o proveer "drive_file_ids".'}), 400
+    except (ErrorInforme, miniaturas.ErrorMiniatura) as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        print(f"❌ Error en /api/preview-report: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        # 0) Autenticación y preparación de inputs
-        service_drive, _ = authenticate_google_drive()
 
-        info_proyecto = (datos_completos.get("info_proyecto") or {})
-        folder_name = (info_proyecto.get("folder_name") or "").strip()
-        drive_file_ids_payload = (datos_completos.get("drive_file_ids") or {})
+# --- GENERACIÓN DE INFORMES EN LOTE ---
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+# Carpeta local bajo la que se permite escribir los ZIP de lote (modo "output_dir")
+BATCH_OUTPUT_ROOT = os.environ.get('BATCH_OUTPUT_ROOT') or os.path.join(tempfile.gettempdir(), 'informes_lote')
 
-        print(f"[generate-report] folder_name='{folder_name}' | drive_file_ids_keys={list(drive_file_ids_payload.keys())}")
 
-        # 1) Validación flexible: carpeta O ids directos
-        if not folder_name and not drive_file_ids_payload:
-            return jsonify({'error': 'Debe indicar "info_proyecto.folder_name" o proveer "drive_file_ids".'}), 400
+class _SalidaZipEnStreaming(io.RawIOBase):
+    """Archivo de sólo escritura (no posicionable) que acumula lo que zipfile escribe para ir enviándolo."""
+    def __init__(self):
+        super().__init__()
+        self._partes = []
 
-        # 2) Resolver IDs por el ramal correspondiente
-        logo_id = tablas_id = img_ubicacion_proyecto_id = img_ubicacion_paradas_id = None
+    def writable(self):
+        return True
 
-        if folder_name:
-            folder_id = find_drive_id(
-                service_drive,
-                "name = '{0}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false".format(folder_name),
-                include_all_drives=True,
-            )
-            if not folder_id:
-                return jsonify({'error': f"No se encontró la carpeta '{folder_name}' en Drive (o no tienes permisos)."}), 404
+    def write(self, b):
+        self._partes.append(bytes(b))
+        return len(b)
 
-            parent_q = f"'{folder_id}' in parents"
-            tablas_id = find_drive_id(service_drive, f"{parent_q} and name = 'Tablas.xlsx'", include_all_drives=True)
-            logo_id = find_drive_id(service_drive, f"{parent_q} and name = 'logo2.jpg'", include_all_drives=True)
-            img_ubicacion_proyecto_id = find_drive_id(service_drive, f"{parent_q} and name = 'ubicacion.png'", include_all_drives=True)
-            img_ubicacion_paradas_id = find_drive_id(service_drive, f"{parent_q} and name = 'ubicacion_paraderos.png'", include_all_drives=True)
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
 
-        else:
-            # Ramal por IDs directos desde el front (no toques Drive)
-            tablas_id = (drive_file_ids_payload or {}).get("tablas_id")
-            logo_id = (drive_file_ids_payload or {}).get("logo_id")
-            img_ubicacion_proyecto_id = (drive_file_ids_payload or {}).get("img_ubicacion_proyecto_id")
-            img_ubicacion_paradas_id = (drive_file_ids_payload or {}).get("img_ubicacion_paradas_id")
-
-        # 4) Llamada al generador: pásale SIEMPRE el paquete de IDs resueltos
-        document = report_generator.crear_informe_paraderos(
-            datos_informe=datos_completos,
-            service_drive=service_drive,
-            drive_file_ids={
-                "logo_id": logo_id,
-                "tablas_id": tablas_id,
-                "img_ubicacion_proyecto_id": img_ubicacion_proyecto_id,
-                "img_ubicacion_paradas_id": img_ubicacion_paradas_id,
-            }
-        )
 
-        if document:
-            file_stream = io.BytesIO()
-            document.save(file_stream)
-            file_stream.seek(0)
+def _normalizar_proyecto_lote(proyecto):
+    """Un elemento del lote puede ser un payload completo, {'folder_name': ...} o sólo el nombre de la carpeta."""
+    if isinstance(proyecto, str):
+        proyecto = {"folder_name": proyecto}
+    if "info_proyecto" not in proyecto and "folder_name" in proyecto:
+        nombre = proyecto["folder_name"]
+        proyecto = {**proyecto, "info_proyecto": {"folder_name": nombre, "proyecto": nombre}}
+    return proyecto
 
-            info_proyecto = datos_completos.get("info_proyecto", {})
-            nombre_archivo = f"Informe_{info_proyecto.get('proyecto', 'Proyecto')}.docx"
 
-            print(f"✅ Enviando el archivo '{nombre_archivo}' para descarga.")
+def _generar_lote(proyectos, workers, destino):
+    """
+    Construye los informes en paralelo y los va agregando al ZIP 'destino' a medida que terminan.
+    Es un generador: después de cada informe entrega el estado [(nombre, ok, detalle), ...] hasta ese momento.
+    Las construcciones comparten credenciales de Drive, la caché de imágenes y la plantilla del worker.
+    """
+    resumen = []
+    nombres_usados = set()
 
-            return send_file(
-                file_stream,
-                as_attachment=True,
-                download_name=nombre_archivo,
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            )
-        else:
-            return jsonify({'error': 'No se pudo generar el documento.'}), 500
+    def construir(proyecto):
+        resolver_paraderos(proyecto)
+        service_drive, _ = authenticate_google_drive()
+        return construir_informe_docx(proyecto, service_drive)
+
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as zf, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lote') as pool:
+        futuros = {pool.submit(construir, p): i for i, p in enumerate(proyectos)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                nombre, contenido = futuro.result()
+                base, ext = os.path.splitext(nombre)
+                k = 2
+                while nombre in nombres_usados:
+                    nombre = f"{base}_{k}{ext}"
+                    k += 1
+                nombres_usados.add(nombre)
+                # El .docx ya es un zip comprimido: se guarda sin volver a comprimir
+                zf.writestr(nombre, contenido)
+                resumen.append({"indice": i, "archivo": nombre, "ok": True, "bytes": len(contenido)})
+                print(f"✅ [lote] Informe {i} listo: {nombre}")
+            except Exception as e:
+                resumen.append({"indice": i, "ok": False, "error": str(e)})
+                print(f"❌ [lote] Informe {i} falló: {e}")
+            yield resumen
+        zf.writestr("resumen_lote.json", json.dumps(sorted(resumen, key=lambda r: r["indice"]), ensure_ascii=False, indent=2))
+    yield resumen
+
+
+@app.route('/api/generate-reports-batch', methods=['POST'])
+def generate_reports_batch():
+    """
+    Genera informes para varios proyectos en paralelo.
+    Payload: {"proyectos": [payload | {"folder_name": ...} | "nombre carpeta", ...],
+              "workers": n (opcional), "output_dir": "subcarpeta" (opcional)}
+    Sin output_dir devuelve un ZIP en streaming; con output_dir lo escribe en disco
+    (bajo BATCH_OUTPUT_ROOT) y responde con el resumen.
+    Nota: a diferencia de /api/generate-report, no se mezclan las descripciones guardadas
+    en /api/save-description, porque cada proyecto trae las suyas.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        proyectos = [_normalizar_proyecto_lote(p) for p in (data.get("proyectos") or [])]
+        if not proyectos:
+            return jsonify({'error': 'Falta la lista "proyectos".'}), 400
+        workers = max(1, min(int(data.get("workers") or BATCH_MAX_WORKERS), BATCH_MAX_WORKERS, len(proyectos)))
+        print(f"[lote] {len(proyectos)} proyectos con {workers} workers.")
+
+        output_dir = (data.get("output_dir") or "").strip()
+        if output_dir:
+            carpeta = os.path.realpath(os.path.join(BATCH_OUTPUT_ROOT, output_dir))
+            if not carpeta.startswith(os.path.realpath(BATCH_OUTPUT_ROOT) + os.sep):
+                return jsonify({'error': 'output_dir debe ser una subcarpeta relativa.'}), 400
+            os.makedirs(carpeta, exist_ok=True)
+            ruta_zip = os.path.join(carpeta, f"Informes_{time.strftime('%Y%m%d_%H%M%S')}.zip")
+            with open(ruta_zip, 'wb') as f:
+                resumen = []
+                for resumen in _generar_lote(proyectos, workers, f):
+                    pass
+            return jsonify({'ok': True, 'zip': ruta_zip, 'informes': sorted(resumen, key=lambda r: r["indice"])}), 200
+
+        def stream():
+            salida = _SalidaZipEnStreaming()
+            for _ in _generar_lote(proyectos, workers, salida):
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+            datos = salida.vaciar()
+            if datos:
+                yield datos
+
+        return Response(
+            stream(),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="Informes_{time.strftime("%Y%m%d_%H%M%S")}.zip"'},
+        )
+
+    except Exception as e:
+        print(f"❌ Error en /api/generate-reports-batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/coalescencia', methods=['GET'])
+def coalescencia_stats():
+    """Cuántas peticiones idénticas se resolvieron esperando una ejecución en curso."""
+    return jsonify({
+        'analyze_image': vuelos_analisis.estadisticas(),
+        'generate_report': vuelos_informe.estadisticas(),
+    })
 
+def miniatura_de(service, file_id, tam, formato, md5=None):
+    """(bytes, etag, mimetype) de la miniatura de una foto (ver miniaturas.py)."""
+    report_generator = sys.modules.get('report_generator')
+    return miniaturas.obtener(service, file_id, tam, formato, md5=md5,
+                              original_en_cache=report_generator.imagen_en_cache if report_generator else None)
 
+
+@app.route('/api/miniatura/<file_id>', methods=['GET'])
+def miniatura(file_id):
+    """
+    Miniatura de una foto para el selector. Query: ?tam=s|m|l (160/320/640 px), &formato=jpeg|webp
+    (por omisión, webp si el navegador lo acepta). Responde 304 si el If-None-Match coincide.
+    """
+    try:
+        tam, formato = miniaturas.validar(request.args.get('tam'), request.args.get('formato')
+                                          or miniaturas.formato_preferido(request.headers.get('Accept')))
+        # Con el md5 ya conocido, el navegador revalida sin que se toque Drive ni el disco
+        md5 = indice.md5_vigentes([file_id], vigencia_s=None).get(file_id)
+        etiqueta = miniaturas.etag(file_id, md5, tam, formato) if md5 else None
+        if etiqueta is None or not request.if_none_match.contains(etiqueta):
+            service, _ = authenticate_google_drive()
+            if not service:
+                return jsonify({'error': 'No se pudo autenticar con Drive.'}), 500
+            contenido, etiqueta, mime = miniatura_de(service, file_id, tam, formato, md5)
+        if request.if_none_match.contains(etiqueta):
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(contenido, mimetype=mime)
+        respuesta.set_etag(etiqueta)
+        respuesta.headers['Cache-Control'] = miniaturas.CACHE_CONTROL
+        respuesta.headers['Vary'] = 'Accept'
+        return respuesta
+    except miniaturas.ErrorMiniatura as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
-        print(f"❌ Error en /api/generate-report: {e}")
+        print(f"❌ Error en /api/miniatura: {e}")
         return jsonify({'error': str(e)}), 500
 
+
+MINIATURAS_MAX_LOTE = int(os.environ.get('MINIATURAS_MAX_LOTE', '100'))
+
+
+@app.route('/api/miniaturas', methods=['POST'])
+def miniaturas_lote():
+    """
+    Varias miniaturas en una sola petición, para llenar el selector de una vez.
+    Payload: {"ids": [...], "tam": "s", "formato": "webp", "etags": {id: etag que ya tiene el navegador}}
+    Respuesta: {"miniaturas": {id: {"etag", "mimeType", "data": base64} | {"etag", "sin_cambios": true}
+                              | {"error"}}}
+    """
+    import base64
+
+    data = request.get_json(force=True) or {}
+    ids = list(dict.fromkeys(data.get('ids') or []))
+    if not ids:
+        return jsonify({'error': "Falta la lista 'ids'."}), 400
+    if len(ids) > MINIATURAS_MAX_LOTE:
+        return jsonify({'error': f"Máximo {MINIATURAS_MAX_LOTE} miniaturas por petición."}), 400
+    try:
+        tam, formato = miniaturas.validar(data.get('tam'), data.get('formato')
+                                          or miniaturas.formato_preferido(request.headers.get('Accept')))
+    except miniaturas.ErrorMiniatura as e:
+        return jsonify({'error': str(e)}), e.status
+    conocidos = data.get('etags') or {}
+    md5s = indice.md5_vigentes(ids, vigencia_s=None)
+
+    def una(file_id):
+        if file_id in md5s and conocidos.get(file_id) == miniaturas.etag(file_id, md5s[file_id], tam, formato):
+            return {'etag': conocidos[file_id], 'sin_cambios': True}
+        try:
+            service, _ = authenticate_google_drive()
+            contenido, etiqueta, mime = miniatura_de(service, file_id, tam, formato, md5s.get(file_id))
+        except Exception as e:
+            return {'error': str(e)}
+        if conocidos.get(file_id) == etiqueta:
+            return {'etag': etiqueta, 'sin_cambios': True}
+        return {'etag': etiqueta, 'mimeType': mime, 'data': base64.b64encode(contenido).decode('ascii')}
+
+    # Cada hilo usa su propio cliente de Drive (authenticate_google_drive es por hilo)
+    with ThreadPoolExecutor(max_workers=min(8, len(ids)), thread_name_prefix='miniaturas') as pool:
+        resultado = dict(zip(ids, pool.map(una, ids)))
+    return jsonify({'tam': tam, 'formato': formato, 'miniaturas': resultado})
+
+
+@app.route('/api/subidas/<file_id>', methods=['GET'])
+def estado_subida(file_id):
+    """Avance de la subida de un informe a Drive (ver "destino": "drive" en /api/generate-report)."""
+    estado = subidas.estado(file_id)
+    if estado is None:
+        return jsonify({'error': f"No hay una subida registrada para '{file_id}'."}), 404
+    return jsonify(estado)
+
+@app.route('/api/historial-paradero', methods=['GET'])
+def historial_paradero():
+    """
+    Inspecciones anteriores registradas en el índice, de cualquier proyecto.
+    Query: ?codigo=PA1234 y/o ?huella=<huella de /api/analyze-image>, &limite=20 (máx. 200).
+    """
+    codigo = (request.args.get('codigo') or '').strip()
+    huella = (request.args.get('huella') or '').strip()
+    if not codigo and not huella:
+        return jsonify({'error': "Falta 'codigo' o 'huella'."}), 400
+    try:
+        limite = max(1, min(int(request.args.get('limite', 20)), 200))
+    except ValueError:
+        return jsonify({'error': "'limite' debe ser un entero."}), 400
+    inspecciones = indice.historial(codigo=codigo or None, huella=huella or None, limite=limite)
+    return jsonify({'codigo': codigo or None, 'huella': huella or None, 'inspecciones': inspecciones})
+
+@app.route('/api/paraderos', methods=['POST'])
+def guardar_paraderos():
+    """
+    Guarda (o reemplaza) paraderos completos para usarlos después por id en /api/generate-report.
+    Payload: {"paraderos": [{"id": "...", "info_paradero": {...}, "analisis": {...}, "tabla": [...]}, ...]}
+    ("id" es opcional: si falta se genera uno). Respuesta: {"paraderos": [{"id", "version"}, ...]}
+    """
+    data = request.get_json(force=True) or {}
+    paraderos = data.get('paraderos')
+    if not isinstance(paraderos, list) or not paraderos:
+        return jsonify({'error': 'Falta la lista "paraderos".'}), 400
+    try:
+        return jsonify({'paraderos': registros.guardar(paraderos)})
+    except registros_paraderos.ErrorRegistro as e:
+        return jsonify({'error': str(e)}), e.status
+
+
+@app.route('/api/paraderos/<paradero_id>', methods=['GET', 'PATCH', 'DELETE'])
+def paradero_guardado(paradero_id):
+    """
+    GET: el registro y su versión (también en el ETag). PATCH: aplica un JSON Merge Patch con los
+    cambios; con If-Match: <version> responde 409 si el registro cambió entretanto. DELETE: lo borra.
+    """
+    try:
+        if request.method == 'DELETE':
+            if not registros.eliminar(paradero_id):
+                return jsonify({'error': f"No existe el paradero '{paradero_id}'."}), 404
+            return jsonify({'id': paradero_id, 'eliminado': True})
+        if request.method == 'PATCH':
+            esperada = (request.headers.get('If-Match') or '').removeprefix('W/').strip('"') or None
+            if esperada is not None and not esperada.isdigit():
+                return jsonify({'error': 'If-Match debe ser la versión (un entero).'}), 400
+            resultado = registros.parchear(paradero_id, request.get_json(force=True),
+                                           int(esperada) if esperada else None)
+        else:
+            guardado = registros.obtener([paradero_id]).get(paradero_id)
+            if guardado is None:
+                return jsonify({'error': f"No existe el paradero '{paradero_id}'."}), 404
+            resultado = {'id': paradero_id, 'version': guardado[1], 'paradero': guardado[0]}
+        respuesta = jsonify(resultado)
+        respuesta.set_etag(str(resultado['version']))
+        return respuesta
+    except registros_paraderos.ErrorRegistro as e:
+        return jsonify({'error': str(e)}), e.status
+
+
+@app.route('/api/perfiles', methods=['GET'])
+def perfiles():
+    """Perfiles de informes guardados en este servidor (ver perfilado.py), más recientes primero."""
+    return jsonify({'perfiles': [{**p, **enlaces_perfil(p["id"])} for p in perfilado.listar()]}), 200
+
+
+@app.route('/api/perfiles/<nombre>', methods=['GET'])
+def descargar_perfil(nombre):
+    """<id>.json (resumen de memoria y CPU) o <id>.folded (pilas para flamegraph.pl / speedscope)."""
+    perfil_id, _, extension = nombre.partition(".")
+    ruta = perfilado.ruta(perfil_id, extension)
+    if not ruta:
+        return jsonify({'error': f"No existe el perfil '{nombre}'."}), 404
+    return send_file(ruta, as_attachment=True, download_name=nombre,
+                     mimetype='application/json' if extension == 'json' else 'text/plain')
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Métricas del worker en formato Prometheus: etapas, peticiones, bytes, cachés y coalescencia."""
+    extra = [
+        ("paraderos_cache_tasa_aciertos", "gauge", "Fracción de consultas resueltas desde cada caché.",
+         [((("cache", c),), t) for c, t in sorted(metricas.tasa_aciertos().items())]),
+        ("paraderos_coalescencia_total", "counter", "Llamadas a cada endpoint coalescido, por resultado.",
+         [((("endpoint", nombre), ("resultado", k)), v)
+          for nombre, vuelos in (("analyze-image", vuelos_analisis), ("generate-report", vuelos_informe))
+          for k, v in vuelos.estadisticas().items() if k in ("llamadas", "ejecutadas", "coalescidas")]),
+    ]
+    presupuesto = descargas.presupuesto.estadisticas()
+    extra.append(("paraderos_descargas_memoria_bytes", "gauge",
+                  "Presupuesto de memoria para descargas de Drive: en uso, pico y total.",
+                  [((("estado", k.replace("_bytes", "")),), presupuesto[k]) for k in ("en_uso_bytes", "pico_bytes", "total_bytes")]))
+    extra.append(("paraderos_descargas_presupuesto_total", "counter",
+                  "Reservas del presupuesto de descargas: total, las que esperaron y las que vencieron el plazo.",
+                  [((("resultado", k),), presupuesto[k]) for k in ("reservas", "esperas", "excedidos")]))
+    if vigia.ruta_db:
+        stats = vigia.estadisticas()
+        extra.append(("paraderos_vigia_drive_atraso_segundos", "gauge",
+                      "Segundos desde la última lectura completa del feed de cambios de Drive.",
+                      [((), stats["atraso_s"])] if stats["atraso_s"] is not None else []))
+        extra.append(("paraderos_vigia_drive_total", "counter", "Actividad del vigía de Drive en este worker.",
+                      [((("evento", k),), stats[k]) for k in ("sondeos", "cambios_aplicados", "desalojos", "errores")]))
+    gemini = contextos.estadisticas()
+    extra.append(("paraderos_gemini_llamadas_total", "counter", "Llamadas a Gemini con y sin caché de contexto.",
+                  [((("contexto", "si"),), gemini["llamadas_con_contexto"]),
+                   ((("contexto", "no"),), gemini["llamadas_sin_contexto"])]))
+    extra.append(("paraderos_gemini_tokens_entrada_total", "counter",
+                  "Tokens de entrada enviados a Gemini; en_cache: los servidos desde la caché de contexto (ahorrados).",
+                  [((("tipo", "total"),), gemini["tokens_entrada"]), ((("tipo", "en_cache"),), gemini["tokens_en_cache"])]))
+    if gemini["latencia_ahorrada_s"] is not None:
+        extra.append(("paraderos_gemini_latencia_ahorrada_segundos", "gauge",
+                      "Latencia media sin caché de contexto menos la latencia media con ella.",
+                      [((), gemini["latencia_ahorrada_s"])]))
+    if 'report_generator' in sys.modules:
+        report_generator = sys.modules['report_generator']
+        extra.append(("paraderos_cache_imagenes_bytes", "gauge", "Bytes en la caché de imágenes de Drive.",
+                      [((), report_generator._CACHE_IMAGENES_BYTES)]))
+    return Response(metricas.exportar(extra), mimetype='text/plain; version=0.0.4')
+
 @app.route("/api/gem-health")
 def gem_health():
     try:
@@ -0,0 +1,257 @@
+# mapas.py
+"""
+Figuras de ubicación generadas localmente (matplotlib, backend Agg), para no depender de
+ubicacion.png / ubicacion_paraderos.png exportados a mano en Drive.
+
+- Coordenadas de cada paradero desde el payload (info_paradero.lat/lon, latitud/longitud o
+  "coordenadas": "lat, lon") o desde las columnas Latitud/Longitud de la hoja "Paradas".
+- Proyección local equirectangular en metros (exacta de sobra a escala de comuna), con
+  etiquetas por código, barra de escala y flecha de norte; PNG a resolución de impresión.
+- El PNG se guarda en caché (memoria y disco) por hash de las coordenadas y opciones:
+  el mismo conjunto de paraderos no se vuelve a dibujar.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import almacen_local
+import metricas
+
+# "auto": se dibuja sólo si falta la figura en Drive; "siempre": se prefiere la local; "nunca": sólo Drive
+MAPAS_LOCALES = os.environ.get("MAPAS_LOCALES", "auto")
+DPI_IMPRESION = int(os.environ.get("MAPAS_DPI", "300"))
+CACHE_DIR = os.environ.get("CACHE_MAPAS_DIR") or os.path.join(tempfile.gettempdir(), "paraderos_mapas")
+MAX_MAPAS_MEMORIA = 32
+VERSION_DIBUJO = 1  # subir si cambia el dibujo, para invalidar la caché en disco
+
+METROS_POR_GRADO_LAT = 110_574.0
+METROS_POR_GRADO_LON = 111_320.0
+
+_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+Punto = Tuple[str, float, float]  # (etiqueta, lat, lon)
+
+
+# ===================================================================
+# COORDENADAS
+# ===================================================================
+def _numero(valor) -> Optional[float]:
+    """Float desde número o texto ("-33,45" o "-33.45"); None si no es una coordenada."""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        numero = float(valor)
+    else:
+        texto = str(valor).strip().replace(",", ".")
+        try:
+            numero = float(texto)
+        except ValueError:
+            return None
+    return numero if math.isfinite(numero) else None
+
+
+def coordenadas_de(datos: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lon) de un dict con lat/lon, latitud/longitud, lng o 'coordenadas': 'lat, lon'."""
+    lat = _numero(datos.get("lat", datos.get("latitud")))
+    lon = _numero(datos.get("lon", datos.get("lng", datos.get("longitud"))))
+    if (lat is None or lon is None) and isinstance(datos.get("coordenadas"), str):
+        texto = datos["coordenadas"].strip()
+        # Una sola coma y sin ';' separa lat y lon ("-33.45,-70.66"); si no, la coma es decimal ("-33,45 -70,66")
+        separaciones = [r",\s*"] if texto.count(",") == 1 and ";" not in texto else []
+        for separador in separaciones + [r"[;\s]+|,\s+"]:
+            numeros = [_numero(p) for p in re.split(separador, texto)]
+            if len(numeros) == 2 and None not in numeros:
+                lat, lon = numeros
+                break
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def puntos_desde_payload(paraderos: Sequence[Dict[str, Any]]) -> List[Punto]:
+    puntos = []
+    for p in paraderos:
+        info = p.get("info_paradero") or p.get("infoParadero") or {}
+        coords = coordenadas_de(info) or coordenadas_de(p)
+        if coords:
+            codigo = info.get("codigo") or p.get("codigo") or p.get("codigo_paradero") or "S/C"
+            puntos.append((str(codigo), coords[0], coords[1]))
+    return puntos
+
+
+def _normalizar(texto) -> str:
+    texto = str(texto or "").strip().lower()
+    return texto.translate(str.maketrans("áéíóú", "aeiou"))
+
+
+def puntos_desde_filas(filas: Sequence[Sequence[Any]], max_encabezado: int = 3) -> List[Dict[str, Any]]:
+    """
+    Coordenadas desde las filas de una hoja (valores crudos): busca en las primeras filas un
+    encabezado con columnas de latitud y longitud, y toma el código de la columna Código/Paradero
+    (o de la primera). Devuelve [{"codigo", "lat", "lon"}]; [] si la hoja no tiene coordenadas.
+    """
+    for i, encabezado in enumerate(filas[:max_encabezado]):
+        nombres = [_normalizar(c) for c in encabezado]
+        col_lat = next((j for j, n in enumerate(nombres) if n in ("lat", "latitud")), None)
+        col_lon = next((j for j, n in enumerate(nombres) if n in ("lon", "lng", "long", "longitud")), None)
+        if col_lat is None or col_lon is None:
+            continue
+        col_cod = next((j for j, n in enumerate(nombres) if n in ("codigo", "código", "paradero", "parada")), 0)
+        puntos = []
+        for fila in filas[i + 1:]:
+            if max(col_lat, col_lon, col_cod) >= len(fila):
+                continue
+            coords = coordenadas_de({"lat": fila[col_lat], "lon": fila[col_lon]})
+            if coords and fila[col_cod] not in (None, ""):
+                puntos.append({"codigo": str(fila[col_cod]).strip(), "lat": coords[0], "lon": coords[1]})
+        return puntos
+    return []
+
+
+def combinar_puntos(paraderos: Sequence[Dict[str, Any]], desde_hoja: Sequence[Dict[str, Any]]) -> List[Punto]:
+    """
+    Puntos de los paraderos del informe: las coordenadas del payload mandan; para los demás se
+    usan las de la hoja "Paradas". Si ningún paradero del informe está en la hoja, se usa la hoja completa.
+    """
+    puntos = puntos_desde_payload(paraderos)
+    hoja = {p["codigo"]: (p["lat"], p["lon"]) for p in desde_hoja or []}
+    if not hoja:
+        return puntos
+    con_coordenadas = {p[0] for p in puntos}
+    codigos = [str((p.get("info_paradero") or {}).get("codigo") or p.get("codigo") or "") for p in paraderos]
+    extra = [(c, *hoja[c]) for c in codigos if c in hoja and c not in con_coordenadas]
+    if not puntos and not extra:
+        return [(c, lat, lon) for c, (lat, lon) in hoja.items()]
+    return puntos + extra
+
+
+# ===================================================================
+# DIBUJO
+# ===================================================================
+def _escala_redonda(metros: float) -> float:
+    """Largo 'redondo' (1, 2 o 5 x 10^n m) cercano a 'metros'."""
+    if metros <= 0:
+        return 100.0
+    base = 10 ** math.floor(math.log10(metros))
+    return max(f * base for f in (1, 2, 5) if f * base <= metros) if metros >= base else base
+
+
+def _texto_escala(metros: float) -> str:
+    return f"{metros / 1000:g} km" if metros >= 1000 else f"{metros:g} m"
+
+
+def _dibujar(puntos: Sequence[Punto], destacado: Optional[Punto], titulo: Optional[str], dpi: int) -> bytes:
+    import io
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    todos = list(puntos) + ([destacado] if destacado else [])
+    lat0 = sum(p[1] for p in todos) / len(todos)
+    lon0 = sum(p[2] for p in todos) / len(todos)
+    k_lon = METROS_POR_GRADO_LON * math.cos(math.radians(lat0))
+
+    def xy(p):
+        return (p[2] - lon0) * k_lon, (p[1] - lat0) * METROS_POR_GRADO_LAT
+
+    # Figure + FigureCanvasAgg directos (sin pyplot): sin estado global, se puede usar desde varios hilos
+    fig = Figure(figsize=(6.5, 4.6), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0.02, 0.02, 0.96, 0.90 if titulo else 0.96])
+    ax.set_facecolor("#F4F4EF")
+    ax.set_aspect("equal")
+    ax.grid(True, color="white", linewidth=1.2)
+    ax.tick_params(left=False, bottom=False, labelleft=False, labelbottom=False)
+    for borde in ax.spines.values():
+        borde.set_color("#9A9A9A")
+
+    if puntos:
+        xs, ys = zip(*(xy(p) for p in puntos))
+        ax.scatter(xs, ys, s=46, color="#C0392B", edgecolors="white", linewidths=1.0, zorder=3)
+        for p, x, y in zip(puntos, xs, ys):
+            ax.annotate(p[0], (x, y), xytext=(5, 5), textcoords="offset points", fontsize=7, zorder=4,
+                        bbox={"boxstyle": "round,pad=0.2", "fc": "white", "ec": "#C0392B", "lw": 0.6, "alpha": 0.9})
+    if destacado:
+        x, y = xy(destacado)
+        ax.scatter([x], [y], s=160, marker="*", color="#1F4E79", edgecolors="white", linewidths=1.0, zorder=5)
+        ax.annotate(destacado[0], (x, y), xytext=(7, -12), textcoords="offset points", fontsize=8,
+                    fontweight="bold", color="#1F4E79", zorder=6)
+
+    # Encuadre con margen (mínimo 300 m de lado para que un solo punto no quede en un mapa vacío)
+    xs_t, ys_t = zip(*(xy(p) for p in todos))
+    dx, dy = max(xs_t) - min(xs_t), max(ys_t) - min(ys_t)
+    proporcion = 6.5 / 4.6
+    media = max(dy / 2, dx / 2 / proporcion, 150.0) * 1.2  # media altura del encuadre, en metros
+    cx, cy = (max(xs_t) + min(xs_t)) / 2, (max(ys_t) + min(ys_t)) / 2
+    ax.set_xlim(cx - media * proporcion, cx + media * proporcion)
+    ax.set_ylim(cy - media, cy + media)
+
+    # Barra de escala (abajo a la izquierda) y norte (arriba a la derecha), en coordenadas de datos
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    largo = _escala_redonda((x1 - x0) / 5)
+    bx, by = x0 + (x1 - x0) * 0.04, y0 + (y1 - y0) * 0.05
+    ax.plot([bx, bx + largo], [by, by], color="black", linewidth=2.5, solid_capstyle="butt", zorder=6)
+    for xt in (bx, bx + largo):
+        ax.plot([xt, xt], [by - (y1 - y0) * 0.008, by + (y1 - y0) * 0.008], color="black", linewidth=1, zorder=6)
+    ax.text(bx + largo / 2, by + (y1 - y0) * 0.02, _texto_escala(largo), ha="center", va="bottom", fontsize=7, zorder=6)
+    nx, ny = x1 - (x1 - x0) * 0.05, y1 - (y1 - y0) * 0.16
+    ax.annotate("N", xy=(nx, ny + (y1 - y0) * 0.10), xytext=(nx, ny), ha="center", va="top", fontsize=9,
+                fontweight="bold", arrowprops={"arrowstyle": "-|>", "color": "black", "lw": 1.2}, zorder=6)
+    if titulo:
+        fig.suptitle(titulo, fontsize=10, fontweight="bold", y=0.97)
+
+    salida = io.BytesIO()
+    fig.savefig(salida, format="png", dpi=dpi)
+    return salida.getvalue()
+
+
+def _clave(puntos, destacado, titulo, dpi) -> str:
+    # Coordenadas redondeadas a ~1 cm: diferencias de formato no cambian la clave
+    base = json.dumps([VERSION_DIBUJO, [(p[0], round(p[1], 7), round(p[2], 7)) for p in puntos],
+                       destacado and (destacado[0], round(destacado[1], 7), round(destacado[2], 7)), titulo, dpi],
+                      ensure_ascii=False)
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def mapa_ubicacion(puntos: Sequence[Punto], destacado: Optional[Punto] = None, titulo: Optional[str] = None,
+                   dpi: int = DPI_IMPRESION) -> Optional[bytes]:
+    """
+    PNG con los puntos (etiqueta, lat, lon) y, opcionalmente, un punto destacado (el proyecto).
+    None si no hay ningún punto. Usa la caché en memoria y en disco por hash de coordenadas.
+    """
+    if not puntos and not destacado:
+        return None
+    clave = _clave(puntos, destacado, titulo, dpi)
+    with _CACHE_LOCK:
+        png = _CACHE.get(clave)
+        if png is not None:
+            _CACHE.move_to_end(clave)
+            metricas.cache("mapas", True)
+            return png
+
+    ruta = os.path.join(CACHE_DIR, f"{clave}.png")
+    try:
+        with open(ruta, "rb") as f:
+            png = f.read()
+        metricas.cache("mapas", True)
+    except OSError:
+        metricas.cache("mapas", False)
+        with metricas.span("mapa_dibujo"):
+            png = _dibujar(puntos, destacado, titulo, dpi)
+        try:
+            almacen_local.escribir_atomico(ruta, png)
+        except OSError as e:
+            print(f"   ✗ No se pudo escribir la caché de mapas en disco: {e}")
+    with _CACHE_LOCK:
+        _CACHE[clave] = png
+        while len(_CACHE) > MAX_MAPAS_MEMORIA:
+            _CACHE.popitem(last=False)
+    return png
@@ -0,0 +1,211 @@
+# metricas.py
+"""
+Instrumentación liviana en proceso: tramos (spans) por etapa, bytes transferidos y aciertos de caché.
+
+- span("drive_download"): mide la duración de un bloque y la suma al histograma de la etapa.
+- sumar_bytes("drive_descarga", n) / cache("imagenes", acierto): contadores.
+- Etapas: cronómetro para código lineal (capítulos del informe), cada siguiente() cierra el tramo anterior.
+- exportar(): todo en formato de texto de Prometheus (GET /api/metrics).
+- iniciar_traza() / terminar_traza(): tramos de la petición en curso, para la cabecera Server-Timing.
+- escuchar_etapas(): aviso al cerrar cada tramo del contexto actual (perfilado.py mide la memoria ahí).
+
+Las métricas son por proceso: con varios workers de gunicorn, cada scrape ve el worker que atendió.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Límites de los buckets en segundos (desde un find_drive_id hasta un informe completo)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_histogramas: Dict[Tuple[str, Tuple], List] = {}  # (métrica, etiquetas) -> [cuentas por bucket..., suma, n]
+_contadores: Dict[Tuple[str, Tuple], float] = {}
+_AYUDA = {
+    "paraderos_etapa_segundos": ("histogram", "Duración de cada etapa (Drive, Gemini, capítulos del informe, guardado)."),
+    "paraderos_http_segundos": ("histogram", "Duración de las peticiones HTTP por ruta."),
+    "paraderos_bytes_total": ("counter", "Bytes procesados por tipo (descargas de Drive, informes generados...)."),
+    "paraderos_cache_total": ("counter", "Consultas a cada caché según resultado (hit/miss)."),
+}
+
+_traza: contextvars.ContextVar = contextvars.ContextVar("traza_metricas", default=None)
+_oyente: contextvars.ContextVar = contextvars.ContextVar("oyente_etapas", default=None)
+
+
+def _observar(metrica: str, segundos: float, etiquetas: Tuple):
+    clave = (metrica, etiquetas)
+    with _lock:
+        h = _histogramas.get(clave)
+        if h is None:
+            h = _histogramas[clave] = [0] * (len(BUCKETS) + 2)
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                h[i] += 1
+                break
+        h[-2] += segundos
+        h[-1] += 1
+
+
+def observar(etapa: str, segundos: float):
+    """Registra la duración de una etapa (histograma y traza de la petición en curso)."""
+    _observar("paraderos_etapa_segundos", segundos, (("etapa", etapa),))
+    traza = _traza.get()
+    if traza is not None:
+        traza.append((etapa, segundos))
+    oyente = _oyente.get()
+    if oyente is not None:
+        oyente(etapa, segundos)
+
+
+def observar_http(ruta: str, metodo: str, status: int, segundos: float):
+    _observar("paraderos_http_segundos", segundos, (("ruta", ruta), ("metodo", metodo), ("status", str(status))))
+
+
+@contextmanager
+def span(etapa: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - t0)
+
+
+def _sumar(metrica: str, etiquetas: Tuple, valor: float):
+    with _lock:
+        _contadores[(metrica, etiquetas)] = _contadores.get((metrica, etiquetas), 0) + valor
+
+
+def sumar_bytes(tipo: str, n: int):
+    _sumar("paraderos_bytes_total", (("tipo", tipo),), n)
+
+
+def cache(nombre: str, acierto: bool):
+    _sumar("paraderos_cache_total", (("cache", nombre), ("resultado", "hit" if acierto else "miss")), 1)
+
+
+class Etapas:
+    """Tramos consecutivos: cada siguiente(nombre) cierra el anterior. terminar() cierra el último."""
+
+    def __init__(self, prefijo: str):
+        self.prefijo = prefijo
+        self._actual: Optional[str] = None
+        self._t0 = 0.0
+
+    def siguiente(self, nombre: str):
+        ahora = time.perf_counter()
+        if self._actual is not None:
+            observar(f"{self.prefijo}.{self._actual}", ahora - self._t0)
+        self._actual, self._t0 = nombre, ahora
+
+    def terminar(self):
+        if self._actual is not None:
+            observar(f"{self.prefijo}.{self._actual}", time.perf_counter() - self._t0)
+            self._actual = None
+
+
+# --- Traza por petición (cabecera Server-Timing) ---
+def iniciar_traza():
+    """Empieza a acumular los tramos de la petición actual (contexto del hilo / tarea)."""
+    return _traza.set([])
+
+
+def terminar_traza(token=None) -> List[Tuple[str, float]]:
+    traza = _traza.get() or []
+    if token is not None:
+        _traza.reset(token)
+    else:
+        _traza.set(None)
+    return traza
+
+
+def escuchar_etapas(funcion: Callable[[str, float], None]):
+    """funcion(etapa, segundos) se llama al cerrar cada tramo del contexto actual. Devuelve el token para dejar de escuchar."""
+    return _oyente.set(funcion)
+
+
+def dejar_de_escuchar(token):
+    _oyente.reset(token)
+
+
+def server_timing(traza: Iterable[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Valor de la cabecera Server-Timing, sumando los tramos repetidos de una misma etapa."""
+    agregado: Dict[str, List[float]] = {}
+    for etapa, segundos in traza:
+        a = agregado.setdefault(etapa, [0.0, 0])
+        a[0] += segundos
+        a[1] += 1
+    partes = [f'{e.replace(".", "-")};dur={s * 1000:.1f};desc="x{n}"' for e, (s, n) in agregado.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+# --- Exportación ---
+def _etiquetas(etiquetas: Tuple) -> str:
+    if not etiquetas:
+        return ""
+    texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas)
+    return "{" + texto + "}"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def exportar(extra: Iterable[Tuple[str, str, str, Iterable[Tuple[Tuple, float]]]] = ()) -> str:
+    """
+    Texto en formato de exposición de Prometheus (text/plain; version=0.0.4).
+    extra: métricas calculadas al vuelo, como (nombre, tipo, ayuda, [(etiquetas, valor), ...]).
+    """
+    with _lock:
+        histogramas = {k: list(v) for k, v in _histogramas.items()}
+        contadores = dict(_contadores)
+
+    lineas = []
+    vistos = set()
+
+    def cabecera(nombre, tipo, ayuda):
+        if nombre not in vistos:
+            vistos.add(nombre)
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+    for (nombre, etiquetas), h in sorted(histogramas.items()):
+        cabecera(nombre, *_AYUDA[nombre])
+        acumulado = 0
+        for limite, cuenta in zip(BUCKETS, h):
+            acumulado += cuenta
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', repr(float(limite))),))} {acumulado}")
+        lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {h[-1]}")
+        lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {h[-2]:.6f}")
+        lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {h[-1]}")
+
+    for (nombre, etiquetas), valor in sorted(contadores.items()):
+        cabecera(nombre, *_AYUDA[nombre])
+        lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+
+    for nombre, tipo, ayuda, muestras in extra:
+        cabecera(nombre, tipo, ayuda)
+        for etiquetas, valor in muestras:
+            lineas.append(f"{nombre}{_etiquetas(tuple(etiquetas))} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
+
+
+def tasa_aciertos() -> Dict[str, float]:
+    """{caché: fracción de hits} con lo registrado hasta ahora."""
+    with _lock:
+        contadores = dict(_contadores)
+    tasas: Dict[str, List[float]] = {}
+    for (nombre, etiquetas), valor in contadores.items():
+        if nombre == "paraderos_cache_total":
+            e = dict(etiquetas)
+            t = tasas.setdefault(e["cache"], [0, 0])
+            t[0 if e["resultado"] == "hit" else 1] += valor
+    return {c: h / (h + m) for c, (h, m) in tasas.items() if h + m}
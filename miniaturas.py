@@ -0,0 +1,144 @@
+# miniaturas.py
+"""
+Miniaturas de las fotos de Drive para el selector de imágenes del front.
+
+- Tamaños fijos (lado mayor en px): TAMANOS. Formatos: JPEG o WebP.
+- Origen, en orden: la foto original si ya está en la caché de imágenes del worker (no se
+  descarga nada); el thumbnailLink de Drive pedido al tamaño justo (unos KB); y si no hay
+  thumbnailLink, el original descargado y reducido con Pillow (draft de JPEG: se decodifica
+  directamente a 1/2, 1/4 u 1/8 de la resolución).
+- Caché en disco por fileId + md5Checksum + tamaño + formato. El ETag se arma con los mismos
+  datos: si el md5 ya se conoce (visto en /api/list-images), un If-None-Match se responde con
+  304 sin tocar Drive ni el disco.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from typing import Optional, Tuple
+
+import almacen_local
+import descargas
+import metricas
+
+TAMANOS = {"s": 160, "m": 320, "l": 640}
+FORMATOS = {"jpeg": ("JPEG", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+            "webp": ("WEBP", "image/webp", {"quality": 75, "method": 4})}
+CACHE_DIR = os.environ.get("CACHE_MINIATURAS_DIR") or os.path.join(tempfile.gettempdir(), "paraderos_miniaturas")
+CACHE_CONTROL = os.environ.get("MINIATURAS_CACHE_CONTROL", "private, max-age=86400")
+VERSION = 1  # subir si cambia la forma de generar las miniaturas, para invalidar la caché en disco
+
+
+class ErrorMiniatura(Exception):
+    """Parámetros inválidos o foto que no se pudo leer, con el código HTTP que corresponde."""
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def validar(tam: str, formato: str) -> Tuple[str, str]:
+    tam, formato = (tam or "m").lower(), (formato or "jpeg").lower().replace("jpg", "jpeg")
+    if tam not in TAMANOS:
+        raise ErrorMiniatura(f"Tamaño '{tam}' no soportado; use uno de {', '.join(TAMANOS)}.")
+    if formato not in FORMATOS:
+        raise ErrorMiniatura(f"Formato '{formato}' no soportado; use jpeg o webp.")
+    return tam, formato
+
+
+def formato_preferido(accept: str) -> str:
+    """webp si el navegador lo acepta; si no, jpeg."""
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+def etag(file_id: str, md5: str, tam: str, formato: str) -> str:
+    """ETag (sin comillas) de la miniatura; cambia si la foto cambia en Drive."""
+    return hashlib.sha1(f"{file_id}:{md5}:{tam}:{formato}:{VERSION}".encode()).hexdigest()[:20]
+
+
+def _ruta(file_id: str, md5: str, tam: str, formato: str) -> str:
+    return os.path.join(CACHE_DIR, f"{etag(file_id, md5, tam, formato)}.{formato}")
+
+
+def _reducir(contenido: bytes, lado: int, formato: str) -> bytes:
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(contenido)) as img:
+        img.draft("RGB", (lado, lado))  # sólo JPEG: decodifica a escala reducida
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((lado, lado), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        nombre, _, opciones = FORMATOS[formato]
+        salida = io.BytesIO()
+        img.save(salida, nombre, **opciones)
+    return salida.getvalue()
+
+
+def _desde_thumbnail_link(service, enlace: str, lado: int) -> Optional[bytes]:
+    """Miniatura generada por Drive al tamaño pedido (el sufijo =s220 del enlace fija el lado mayor)."""
+    base = enlace.rsplit("=s", 1)[0] if "=s" in enlace.rsplit("/", 1)[-1] else enlace
+    with metricas.span("drive_miniatura"):
+        resp, contenido = service._http.request(f"{base}=s{lado}")
+    if resp.status != 200:
+        print(f"   ✗ thumbnailLink respondió {resp.status}; se genera desde el original.")
+        return None
+    metricas.sumar_bytes("drive_miniatura", len(contenido))
+    return contenido
+
+
+def _metadatos(service, file_id: str):
+    from googleapiclient.errors import HttpError
+    try:
+        with metricas.span("drive_metadata"):
+            return service.files().get(fileId=file_id, fields="id,mimeType,md5Checksum,modifiedTime,thumbnailLink",
+                                       supportsAllDrives=True).execute()
+    except HttpError as e:
+        raise ErrorMiniatura(f"No se encontró la imagen '{file_id}' en Drive.", 404 if e.resp.status == 404 else 502)
+
+
+def obtener(service, file_id: str, tam: str, formato: str, md5: Optional[str] = None,
+            original_en_cache=None) -> Tuple[bytes, str, str]:
+    """
+    (bytes, etag, mimetype) de la miniatura. md5: el md5Checksum si ya se conoce (evita pedir
+    metadatos cuando está en disco). original_en_cache(file_id) -> bytes | None: la caché de
+    imágenes del worker.
+    """
+    tam, formato = validar(tam, formato)
+    lado, mime = TAMANOS[tam], FORMATOS[formato][1]
+    meta = None
+    if md5 is None:
+        meta = _metadatos(service, file_id)
+        md5 = meta.get("md5Checksum") or meta.get("modifiedTime") or ""
+    ruta = _ruta(file_id, md5, tam, formato)
+    try:
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+        metricas.cache("miniaturas", True)
+        return contenido, etag(file_id, md5, tam, formato), mime
+    except OSError:
+        metricas.cache("miniaturas", False)
+
+    with metricas.span("miniatura"):
+        origen = original_en_cache(file_id) if original_en_cache else None
+        if origen is None:
+            meta = meta or _metadatos(service, file_id)
+            if not (meta.get("mimeType") or "").startswith("image/"):
+                raise ErrorMiniatura(f"'{file_id}' no es una imagen.", 415)
+            if meta.get("thumbnailLink"):
+                origen = _desde_thumbnail_link(service, meta["thumbnailLink"], lado)
+        # Descargado, el original cuenta contra el presupuesto de descargas hasta que se reduce
+        descarga = descargas.descargar(service, file_id) if origen is None else None
+        try:
+            contenido = _reducir(descarga.leer() if descarga else origen, lado, formato)
+        except Exception as e:
+            raise ErrorMiniatura(f"No se pudo leer la imagen '{file_id}': {e}", 415)
+        finally:
+            if descarga:
+                descarga.cerrar()
+
+    try:
+        almacen_local.escribir_atomico(ruta, contenido)
+    except OSError as e:
+        print(f"   ✗ No se pudo escribir la caché de miniaturas en disco: {e}")
+    return contenido, etag(file_id, md5, tam, formato), mime
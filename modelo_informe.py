@@ -0,0 +1,232 @@
+# modelo_informe.py
+"""
+Estructura del informe de paraderos como una secuencia de bloques, compartida por el .docx
+(report_generator.crear_informe_paraderos) y la vista previa HTML (vista_previa.py).
+
+bloques() recorre el payload y entrega, en el orden del documento, dicts {"tipo": ..., ...}:
+
+- capitulo    {"numero", "titulo"}: título de capítulo (reinicia la numeración de figuras y cuadros)
+- paradero    {"numero", "codigo", "titulo"}: subtítulo 3.i de cada paradero
+- texto       {"texto"}
+- espacio     párrafo vacío
+- salto       salto de página
+- figura      {"descripcion", "fuente", "file_id"} (imagen de Drive) o {..., "mapa": {"puntos", "destacado"}}
+- evidencia   {"titulo", "seccion"}: tabla de evidencia fotográfica (seccion: image_ids + description)
+- cuadro      {"descripcion", "fuente", "headers", "filas"}
+- cuadro_df   {"descripcion", "fuente", "df", "opciones"} (opciones del motor de tablas)
+- cuadro_excel {"descripcion", "fuente", "hoja"}: hoja de Tablas.xlsx
+
+Los textos, el orden y los datos de cada bloque salen de aquí, y la numeración de figuras y cuadros
+de siguiente_figura() / siguiente_cuadro(): los dos formatos no pueden quedar distintos.
+"""
+
+from typing import Any, Dict, Iterator, Optional, Set
+
+import mapas
+import resumen_cumplimiento
+
+SECCIONES_EVIDENCIA = [
+    ("general", "Imagen general del paradero"),
+    ("refugio_anden", "Evidencia Fotográfica de Refugio y Andén"),
+    ("senal", "Evidencia Fotográfica de Señal y Demarcación"),
+]
+FUENTE_EXCEL = "Elaboración Propia en base DTPM - RED movilidad - Terreno"
+FUENTE_INSPECCION = "Elaboración Propia en base a inspección en terreno"
+DESCRIPCION_POR_OMISION = "No hay descripción disponible."
+ERROR_SIN_TABLAS = "[ERROR: No se recibió 'tablas_id' para cargar las tablas desde Drive.]"
+
+
+# --- Numeración de figuras y cuadros ---
+def nuevo_estado():
+    return {"capitulo": 1, "figura": 1, "cuadro": 1}
+
+
+def cambiar_capitulo(estado, nuevo_capitulo):
+    estado["capitulo"] = nuevo_capitulo
+    estado["figura"] = 1
+    estado["cuadro"] = 1
+
+
+def siguiente_figura(estado, descripcion) -> str:
+    """Etiqueta "Figura c.n. descripción" de la próxima figura (y avanza el contador)."""
+    etiqueta = f"Figura {estado['capitulo']}.{estado['figura']}. {descripcion}"
+    estado["figura"] += 1
+    return etiqueta
+
+
+def siguiente_cuadro(estado, descripcion) -> str:
+    """Etiqueta "Cuadro c.n. descripción" del próximo cuadro (y avanza el contador)."""
+    num_cuadro = int(estado.get("cuadro", 1))
+    etiqueta = f"Cuadro {estado.get('capitulo', 0)}.{num_cuadro}. {descripcion.strip()}"
+    estado["cuadro"] = num_cuadro + 1
+    return etiqueta
+
+
+# --- Datos del payload ---
+def titulo_portada(info_proyecto) -> str:
+    return (
+        f"MEJORAMIENTO DE PARADAS DE TRANSPORTE PÚBLICO\n"
+        f"MEDIDA DE MITIGACIÓN {(info_proyecto.get('mitigacion') or '').upper()} {(info_proyecto.get('estudio') or '').upper()}\n"
+        f"{(info_proyecto.get('proyecto') or '').upper()}\n"
+        f"{(info_proyecto.get('comuna') or '').upper()}\n"
+    )
+
+
+def codigo_y_ubicacion(paradero: Dict[str, Any]):
+    info_paradero = paradero.get("info_paradero") or paradero.get("infoParadero") or {}
+    # Fallbacks por si vinieran en otro nivel / nombres antiguos
+    codigo = (
+        info_paradero.get("codigo")
+        or paradero.get("codigo")
+        or paradero.get("codigo_paradero")
+        or "S/C"
+    )
+    ubicacion = (
+        info_paradero.get("ubicacion")
+        or paradero.get("ubicacion")
+        or paradero.get("ubicacion_paradero")
+        or "Sin ubicación"
+    )
+    return codigo, ubicacion
+
+
+def usa_mapas(datos_informe, img_ubicacion_proyecto_id=None, img_ubicacion_paradas_id=None):
+    """(mapa_proyecto, mapa_paradas): qué figuras de ubicación se dibujan localmente (mapas.py)."""
+    modo_mapas = datos_informe.get("mapas_locales") or mapas.MAPAS_LOCALES
+    return (modo_mapas == "siempre" or (modo_mapas == "auto" and not img_ubicacion_proyecto_id),
+            modo_mapas == "siempre" or (modo_mapas == "auto" and not img_ubicacion_paradas_id))
+
+
+def bloques(datos_informe,
+            img_ubicacion_proyecto_id=None,
+            img_ubicacion_paradas_id=None,
+            hojas: Optional[Set[str]] = None,
+            error_tablas: Optional[str] = None,
+            coordenadas_hoja=None,
+    ) -> Iterator[Dict[str, Any]]:
+    """
+    Bloques del informe, desde el capítulo 1 (la portada viene de la plantilla).
+    hojas: hojas de Tablas.xlsx con datos; None si no se conocen (la vista previa no descarga el
+    Excel y las da por presentes). coordenadas_hoja: coordenadas de la hoja "Paradas" para los mapas.
+    """
+    info_proyecto = datos_informe.get("info_proyecto", {})
+    nombre_proyecto = info_proyecto.get("proyecto", "[Nombre del Proyecto]")
+    paraderos = datos_informe.get("paraderos", []) or []
+    mapa_proyecto, mapa_paradas = usa_mapas(datos_informe, img_ubicacion_proyecto_id, img_ubicacion_paradas_id)
+    puntos_paradas = mapas.combinar_puntos(paraderos, coordenadas_hoja) if (mapa_proyecto or mapa_paradas) else []
+    coordenadas_proyecto = mapas.coordenadas_de(info_proyecto)
+    punto_proyecto = (nombre_proyecto, *coordenadas_proyecto) if coordenadas_proyecto else None
+
+    def con_hoja(hoja):
+        return hojas is None or hoja in hojas
+
+    # ==========================================================
+    # CAPÍTULO 1: ANTECEDENTES
+    # ==========================================================
+    yield {"tipo": "capitulo", "numero": 1, "titulo": "1. ANTECEDENTES"}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": f"El presente estudio, tiene por objetivo dar cumplimiento a la medida de mitigación {info_proyecto.get('mitigacion', '[mitigacion]')} del {info_proyecto.get('estudio', '[estudio]')} aprobado para {info_proyecto.get('proyecto', '[proyecto]')}. Las mitigaciones que se abordan a continuación tienen relación con el mantenimiento y reparación de la infraestructura y elementos de las paradas de transporte público, según lo estipulado en el {info_proyecto.get('estudio', '[estudio]')} aprobado mediante Resolución Exenta {info_proyecto.get('resolucion', '[resolucion]')}, con fecha {info_proyecto.get('fecha', '[fecha]')}, en la comuna {info_proyecto.get('comuna', '[comuna]')}."}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": f"Respecto a las medidas de mitigación mencionadas, se expone lo siguiente en el {info_proyecto.get('estudio', '[estudio]')} aprobado:"}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": info_proyecto.get('medida_mitigacion', '[medida_mitigacion]')}
+    yield {"tipo": "salto"}
+
+    # ==========================================================
+    # CAPÍTULO 2: DESCRIPCIÓN DEL PROYECTO
+    # ==========================================================
+    yield {"tipo": "capitulo", "numero": 2, "titulo": "2. DESCRIPCIÓN DEL PROYECTO"}
+    yield {"tipo": "texto", "texto": f"El proyecto {info_proyecto.get('proyecto', '[nombre_proyecto]')}, se ubica en {info_proyecto.get('ubi_proyecto', '[ubi_proyecto]')}, comuna de {info_proyecto.get('comuna', '[comuna]')}, {info_proyecto.get('region', '[region]')}. En la siguiente figura N°2.1, se podrá visualizar la ubicación del proyecto:"}
+    yield {"tipo": "espacio"}
+    if mapa_proyecto and punto_proyecto:
+        yield {"tipo": "figura", "descripcion": "Ubicación del Proyecto", "fuente": "Elaboración Propia",
+               "mapa": {"puntos": puntos_paradas, "destacado": punto_proyecto}}
+    elif img_ubicacion_proyecto_id:
+        yield {"tipo": "figura", "descripcion": "Ubicación del Proyecto",
+               "fuente": "Elaboración Propia en base a Google Earth", "file_id": img_ubicacion_proyecto_id}
+    yield {"tipo": "salto"}
+
+    # ==========================================================
+    # CAPÍTULO 3: INSPECCIÓN DE PARADEROS (VERSIÓN DETALLADA)
+    # ==========================================================
+    yield {"tipo": "capitulo", "numero": 3, "titulo": "3. INSPECCIÓN Y DESCRIPCIÓN DE PARADEROS INVOLUCRADOS"}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": "En este apartado se reporta la situación actual de las paradas en estudio, catastradas en las visitas a terreno. En la figura siguiente se muestra la ubicación actual de cada paradero:"}
+    if mapa_paradas and puntos_paradas:
+        yield {"tipo": "figura", "descripcion": "Ubicación Paradas de Transporte Público en Estudio",
+               "fuente": "Elaboración Propia", "mapa": {"puntos": puntos_paradas, "destacado": None}}
+    elif img_ubicacion_paradas_id:
+        yield {"tipo": "figura", "descripcion": "Ubicación Paradas de Transporte Público en Estudio",
+               "fuente": "Elaboración Propia en base a Google Earth", "file_id": img_ubicacion_paradas_id}
+
+    # --- Sub-capítulos de la sección 3: uno por paradero ---
+    for i, paradero in enumerate(paraderos, start=1):
+        yield {"tipo": "salto"}
+        codigo, ubicacion = codigo_y_ubicacion(paradero)
+        analisis = paradero.get("analisis") or {}
+        yield {"tipo": "paradero", "numero": i, "codigo": codigo, "titulo": f"3.{i} {codigo} - {ubicacion}"}
+        yield {"tipo": "espacio"}
+
+        # Tablas de evidencia (no se crean si la sección no tiene fotos)
+        for clave, titulo in SECCIONES_EVIDENCIA:
+            seccion = analisis.get(clave) or {}
+            if seccion.get("image_ids"):
+                yield {"tipo": "evidencia", "titulo": titulo, "seccion": seccion}
+            yield {"tipo": "salto"}
+
+        # Características (desde los datos almacenados)
+        filas = [[str(fila.get("caracteristica", "")).strip(),
+                  str(fila.get("cumplimiento", "")).strip(),
+                  str(fila.get("observacion", "")).strip()]
+                 for fila in paradero.get("tabla", []) or []]
+        if filas:
+            yield {"tipo": "cuadro", "descripcion": "Tabla de Características del Paradero",
+                   "fuente": "Elaboración Propia", "headers": ["Característica", "Cumplimiento", "Observación"],
+                   "filas": filas}
+
+    # ==========================================================
+    # CAPÍTULO 4: INFORMACIÓN DE PARADAS
+    # ==========================================================
+    yield {"tipo": "salto"}
+    yield {"tipo": "capitulo", "numero": 4, "titulo": "4. INFORMACIÓN DE PARADAS DE TRANSPORTE PÚBLICO"}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": "En la siguiente tabla se reportan los servicios de bus que utilizan cada parada en estudio, con su respectivo destino:"}
+    yield {"tipo": "espacio"}
+    if con_hoja("Paradas"):
+        yield {"tipo": "cuadro_excel", "hoja": "Paradas", "descripcion": "Información de Paradas de Transporte Público",
+               "fuente": FUENTE_EXCEL}
+    else:
+        yield {"tipo": "texto", "texto": error_tablas or "[ERROR: 'Tablas.xlsx' no tiene la hoja 'Paradas' o está vacía.]"}
+
+    # ==========================================================
+    # CAPÍTULO 5: MEDIDA DE MITIGACIÓN
+    # ==========================================================
+    yield {"tipo": "salto"}
+    yield {"tipo": "capitulo", "numero": 5, "titulo": "5. MEDIDA DE MITIGACIÓN"}
+    yield {"tipo": "espacio"}
+    yield {"tipo": "texto", "texto": f"En función de la información recopilada en terreno, se presenta una tabla resumen con las mejoras a ejecutar de acuerdo con lo indicado en la aprobación del {info_proyecto.get('estudio', '[estudio]')} aprobado mediante {info_proyecto.get('resolucion', '[resolucion]')}. El cuadro que se presenta a continuación, indica un resumen con el estado de los paraderos revisados en la minuta y posteriormente se mencionan los elementos que requieren intervención."}
+    yield {"tipo": "espacio"}
+
+    # El resumen se calcula desde las tablas de características de los paraderos;
+    # la hoja "Resumen" de Tablas.xlsx queda como respaldo ("resumen_cumplimiento": "excel" la fuerza)
+    resumen = None
+    if datos_informe.get("resumen_cumplimiento", "calculado") != "excel":
+        resumen = resumen_cumplimiento.calcular_resumen(paraderos)
+    if resumen is not None and not resumen["por_paradero"].empty:
+        yield {"tipo": "cuadro_df", "df": resumen_cumplimiento.cuadro_paraderos(resumen),
+               "descripcion": "Resumen estado de Paraderos", "fuente": FUENTE_INSPECCION,
+               "opciones": {"alineaciones": ["center", "center", "center", "left", "center"],
+                            "anchos": [1300, 1300, 1300, 4260, 1200],
+                            "formateadores": {4: resumen_cumplimiento.formato_porcentaje}}}
+        yield {"tipo": "espacio"}
+        yield {"tipo": "texto", "texto": "A continuación, se indica para cada elemento la cantidad de paraderos que cumplen con el estándar y los paraderos en que se requiere intervención:"}
+        yield {"tipo": "espacio"}
+        yield {"tipo": "cuadro_df", "df": resumen_cumplimiento.cuadro_elementos(resumen),
+               "descripcion": "Elementos que requieren intervención", "fuente": FUENTE_INSPECCION,
+               "opciones": {"alineaciones": ["left", "center", "center", "center", "center", "left"],
+                            "anchos": [2600, 900, 900, 900, 900, 3160]}}
+    elif con_hoja("Resumen"):
+        yield {"tipo": "cuadro_excel", "hoja": "Resumen", "descripcion": "Resumen estado de Paraderos",
+               "fuente": FUENTE_EXCEL}
+    else:
+        yield {"tipo": "texto", "texto": error_tablas or "[ERROR: 'Tablas.xlsx' no tiene la hoja 'Resumen' o está vacía.]"}
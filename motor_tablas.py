@@ -0,0 +1,300 @@
+# motor_tablas.py
+"""
+Motor de tablas de alto rendimiento para python-docx.
+
+En vez de crear la tabla con document.add_table() y luego recorrer fila por fila
+(table.add_row(), cell.paragraphs[0], estilos, etc.), arma el elemento <w:tbl> completo
+como texto en una sola pasada, a partir de plantillas de fila y celda ya preparadas,
+y lo inserta en el cuerpo del documento con un único parse_xml.
+
+Acepta los datos por filas (listas/tuplas/dicts), por columnas (dict o lista de columnas)
+o como DataFrame, sin pasar por pandas cuando los datos ya vienen en listas.
+
+construir_tabla_html() arma la misma tabla (mismos datos, textos de celda y combinaciones) como
+<table> para la vista previa del informe.
+"""
+
+import html
+import math
+import sys
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.table import Table
+
+# Ancho útil de la página carta con márgenes por defecto (6.5") en twips (dxa)
+ANCHO_UTIL_DXA = 9360
+
+ALINEACIONES = {"izquierda": "left", "centro": "center", "derecha": "right", "justificado": "both"}
+
+_CARACTERES_INVALIDOS = {c: None for c in range(32) if c not in (9, 10, 13)}
+
+# --- Plantillas de XML (se formatean con str.format / concatenación) ---
+_TBL_INICIO = (
+    '<w:tbl %s><w:tblPr><w:tblStyle w:val="{estilo}"/><w:tblW w:w="0" w:type="auto"/>{layout}'
+    '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" '
+    'w:noHBand="0" w:noVBand="1"/></w:tblPr>' % nsdecls("w")
+)
+_TBL_FIN = "</w:tbl>"
+_TR_ENCABEZADO = "<w:tr><w:trPr><w:tblHeader/></w:trPr>"
+_TR = "<w:tr>"
+_TR_FIN = "</w:tr>"
+_SHD = '<w:shd w:val="clear" w:color="auto" w:fill="{color}"/>'
+
+
+def texto_celda(valor: Any) -> str:
+    """Convierte un valor a texto de celda: None/NaN/NaT/NA -> '', floats enteros sin '.0'."""
+    if isinstance(valor, str):
+        return valor
+    if valor is None:
+        return ""
+    if isinstance(valor, (float, np.floating)):
+        if math.isnan(valor):
+            return ""
+        if float(valor).is_integer():
+            return str(int(valor))
+        return str(valor)
+    pd = sys.modules.get("pandas")  # NaT y NA sólo pueden venir de pandas, si ya está importado
+    if pd is not None and not pd.api.types.is_list_like(valor) and pd.isna(valor):
+        return ""
+    return str(valor)
+
+
+def _runs(texto: str) -> str:
+    """XML de los runs para un texto (los saltos de línea se convierten en <w:br/>)."""
+    if not texto:
+        return ""
+    texto = escape(texto.translate(_CARACTERES_INVALIDOS))
+    if "\n" in texto:
+        texto = '</w:t><w:br/><w:t xml:space="preserve">'.join(texto.split("\n"))
+    return f'<w:r><w:t xml:space="preserve">{texto}</w:t></w:r>'
+
+
+def _plantilla_celda(estilo_id: str, alineacion: Optional[str], ancho: Optional[int], shd: str) -> str:
+    """
+    Plantilla de una celda con los marcadores {span}, {vmerge} y {runs}.
+    Se construye una vez por columna y luego sólo se rellena el texto.
+    """
+    tcw = f'<w:tcW w:w="{ancho}" w:type="dxa"/>' if ancho else ""
+    jc = f'<w:jc w:val="{alineacion}"/>' if alineacion else ""
+    shd = shd.replace("{", "{{").replace("}", "}}")
+    return (
+        f"<w:tc><w:tcPr>{tcw}{{span}}{{vmerge}}{shd}</w:tcPr>"
+        f'<w:p><w:pPr><w:pStyle w:val="{estilo_id}"/>{jc}</w:pPr>{{runs}}</w:p></w:tc>'
+    )
+
+
+def _normalizar_datos(headers, filas, columnas, df) -> Tuple[List[List[str]], List[List[Any]]]:
+    """Devuelve (filas de encabezado, filas de datos) como listas de listas."""
+    if df is not None:
+        if headers is None:
+            headers = [str(c) for c in df.columns]
+        # Conversión columnar de una sola vez (sin iterrows)
+        columnas = [df[c].tolist() for c in df.columns]
+        filas = None
+
+    if headers is None:
+        headers = []
+    if headers and isinstance(headers[0], (list, tuple)):
+        filas_encabezado = [[texto_celda(h) for h in fila] for fila in headers]
+    else:
+        filas_encabezado = [[texto_celda(h) for h in headers]] if headers else []
+    n_cols = max((len(f) for f in filas_encabezado), default=0)
+
+    if columnas is not None:
+        if isinstance(columnas, dict):
+            if not filas_encabezado:
+                filas_encabezado = [[str(k) for k in columnas]]
+                n_cols = len(columnas)
+            columnas = list(columnas.values())
+        filas = list(zip(*columnas)) if columnas else []
+
+    datos = []
+    claves = filas_encabezado[-1] if filas_encabezado else []
+    for fila in filas or []:
+        if isinstance(fila, dict):
+            valores = [fila.get(h, "") for h in claves]
+        else:
+            valores = list(fila)
+        # Alinea longitud de fila a columnas
+        if n_cols:
+            if len(valores) < n_cols:
+                valores += [""] * (n_cols - len(valores))
+            elif len(valores) > n_cols:
+                valores = valores[:n_cols]
+        datos.append(valores)
+    if not n_cols and datos:
+        n_cols = max(len(f) for f in datos)
+        datos = [f + [""] * (n_cols - len(f)) for f in datos]
+    return filas_encabezado, datos
+
+
+def construir_tabla_xml(
+    headers: Optional[Sequence] = None,
+    filas: Optional[Sequence] = None,
+    columnas: Optional[Any] = None,
+    df=None,
+    estilo_id: str = "MHOTabla",
+    estilo_celda_id: str = "MHOTableCell",
+    estilo_encabezado_id: str = "MHOTableHeader",
+    color_encabezado: Optional[str] = "D9D9D9",
+    alineaciones: Optional[Sequence[Optional[str]]] = None,
+    anchos: Optional[Sequence[int]] = None,
+    combinaciones: Optional[Sequence[Sequence[int]]] = None,
+    formateadores: Optional[Dict[int, Callable[[Any], str]]] = None,
+) -> str:
+    """
+    Construye el XML de un <w:tbl> completo.
+
+    - headers: lista de títulos, o lista de filas de encabezado (para encabezados de varias filas).
+    - filas / columnas / df: datos por filas, por columnas (dict o lista) o un DataFrame.
+    - alineaciones: por columna ('left'/'center'/'right'/'both' o 'izquierda'/'centro'/...);
+      None deja la alineación del estilo de párrafo.
+    - anchos: ancho de cada columna en twips (dxa); si se indica, la tabla usa layout fijo.
+    - combinaciones: celdas combinadas como (fila, columna, n_filas, n_columnas), con las
+      coordenadas contadas sobre la tabla completa (encabezados incluidos).
+    - formateadores: {índice de columna: función valor -> texto} para números, fechas, etc.
+    """
+    filas_encabezado, datos = _normalizar_datos(headers, filas, columnas, df)
+    n_cols = max([len(f) for f in filas_encabezado] + [len(f) for f in datos[:1]] + [0])
+    if n_cols == 0:
+        return ""
+
+    alineaciones = [ALINEACIONES.get(a, a) for a in (alineaciones or [])]
+    alineaciones += [None] * (n_cols - len(alineaciones))
+    layout_fijo = bool(anchos)
+    if anchos:
+        anchos = list(anchos) + [0] * (n_cols - len(anchos))
+    else:
+        anchos = [ANCHO_UTIL_DXA // n_cols] * n_cols
+
+    # Plantillas por columna (encabezado y cuerpo)
+    shd = _SHD.format(color=color_encabezado) if color_encabezado else ""
+    tpl_enc = [_plantilla_celda(estilo_encabezado_id, "center", anchos[j], shd) for j in range(n_cols)]
+    tpl_cel = [_plantilla_celda(estilo_celda_id, alineaciones[j], anchos[j], "") for j in range(n_cols)]
+
+    # Mapa de celdas combinadas: origen -> (n_filas, n_cols); cubiertas -> 'continue'/'skip'
+    origen, cubiertas = {}, {}
+    for (fila, col, n_f, n_c) in combinaciones or []:
+        origen[(fila, col)] = (n_f, n_c)
+        for df_ in range(n_f):
+            for dc in range(n_c):
+                if df_ == 0 and dc == 0:
+                    continue
+                # La primera columna de las filas siguientes lleva vMerge=continue; el resto se omite
+                cubiertas[(fila + df_, col + dc)] = ("continue", n_c) if dc == 0 else ("skip", 0)
+
+    formateadores = formateadores or {}
+    partes = [_TBL_INICIO.format(estilo=estilo_id, layout='<w:tblLayout w:type="fixed"/>' if layout_fijo else "")]
+    partes.append("<w:tblGrid>")
+    partes.extend(f'<w:gridCol w:w="{w}"/>' for w in anchos)
+    partes.append("</w:tblGrid>")
+
+    # Para el camino rápido, cada plantilla se parte en (antes, después) del texto
+    partidas_enc = [t.format(span="", vmerge="", runs="\x00").split("\x00") for t in tpl_enc]
+    partidas_cel = [t.format(span="", vmerge="", runs="\x00").split("\x00") for t in tpl_cel]
+
+    n_enc = len(filas_encabezado)
+    sin_combinaciones = not origen
+    for i, fila in enumerate(filas_encabezado + datos):
+        es_enc = i < n_enc
+        plantillas = tpl_enc if es_enc else tpl_cel
+        partes.append(_TR_ENCABEZADO if es_enc else _TR)
+        if sin_combinaciones:
+            # Camino rápido: sin combinaciones, sólo se rellena el texto
+            partidas = partidas_enc if es_enc else partidas_cel
+            for j in range(n_cols):
+                valor = fila[j] if j < len(fila) else ""
+                texto = formateadores[j](valor) if (not es_enc and j in formateadores) else texto_celda(valor)
+                antes, despues = partidas[j]
+                partes.append(antes + _runs(texto) + despues)
+        else:
+            for j in range(n_cols):
+                cubierta = cubiertas.get((i, j))
+                if cubierta and cubierta[0] == "skip":
+                    continue
+                if cubierta:
+                    span = f'<w:gridSpan w:val="{cubierta[1]}"/>' if cubierta[1] > 1 else ""
+                    partes.append(plantillas[j].format(span=span, vmerge='<w:vMerge/>', runs=""))
+                    continue
+                span = vmerge = ""
+                if (i, j) in origen:
+                    n_f, n_c = origen[(i, j)]
+                    if n_c > 1:
+                        span = f'<w:gridSpan w:val="{n_c}"/>'
+                    if n_f > 1:
+                        vmerge = '<w:vMerge w:val="restart"/>'
+                valor = fila[j] if j < len(fila) else ""
+                texto = formateadores[j](valor) if (not es_enc and j in formateadores) else texto_celda(valor)
+                partes.append(plantillas[j].format(span=span, vmerge=vmerge, runs=_runs(texto)))
+        partes.append(_TR_FIN)
+    partes.append(_TBL_FIN)
+    return "".join(partes)
+
+
+def construir_tabla_html(
+    headers: Optional[Sequence] = None,
+    filas: Optional[Sequence] = None,
+    columnas: Optional[Any] = None,
+    df=None,
+    alineaciones: Optional[Sequence[Optional[str]]] = None,
+    combinaciones: Optional[Sequence[Sequence[int]]] = None,
+    formateadores: Optional[Dict[int, Callable[[Any], str]]] = None,
+    **_,
+) -> str:
+    """
+    La tabla de construir_tabla_xml() como <table> HTML (estilos y anchos quedan a cargo del CSS;
+    las demás opciones de Word se ignoran).
+    """
+    filas_encabezado, datos = _normalizar_datos(headers, filas, columnas, df)
+    n_cols = max([len(f) for f in filas_encabezado] + [len(f) for f in datos[:1]] + [0])
+    if n_cols == 0:
+        return ""
+    alineaciones = [ALINEACIONES.get(a, a) for a in (alineaciones or [])]
+    alineaciones = [("justify" if a == "both" else a) for a in alineaciones] + [None] * n_cols
+
+    origen, cubiertas = {}, set()
+    for (fila, col, n_f, n_c) in combinaciones or []:
+        origen[(fila, col)] = (n_f, n_c)
+        cubiertas.update((fila + i, col + j) for i in range(n_f) for j in range(n_c) if i or j)
+
+    formateadores = formateadores or {}
+    n_enc = len(filas_encabezado)
+    partes = ["<table>"]
+    for i, fila in enumerate(filas_encabezado + datos):
+        es_enc = i < n_enc
+        etiqueta = "th" if es_enc else "td"
+        partes.append("<tr>")
+        for j in range(n_cols):
+            if (i, j) in cubiertas:
+                continue
+            valor = fila[j] if j < len(fila) else ""
+            texto = formateadores[j](valor) if (not es_enc and j in formateadores) else texto_celda(valor)
+            atributos = ""
+            if (i, j) in origen:
+                n_f, n_c = origen[(i, j)]
+                atributos += f' rowspan="{n_f}"' if n_f > 1 else ""
+                atributos += f' colspan="{n_c}"' if n_c > 1 else ""
+            if not es_enc and alineaciones[j]:
+                atributos += f' style="text-align:{alineaciones[j]}"'
+            partes.append(f"<{etiqueta}{atributos}>{html.escape(texto).replace(chr(10), '<br>')}</{etiqueta}>")
+        partes.append("</tr>")
+    partes.append("</table>")
+    return "".join(partes)
+
+
+def insertar_tabla_xml(document, xml: str) -> Optional[Table]:
+    """Inserta un <w:tbl> (en texto) al final del cuerpo del documento y devuelve la Table."""
+    if not xml:
+        return None
+    tbl = parse_xml(xml)
+    document.element.body._insert_tbl(tbl)
+    return Table(tbl, document._body)
+
+
+def insertar_tabla(document, headers=None, filas=None, columnas=None, df=None, **opciones) -> Optional[Table]:
+    """Construye la tabla con construir_tabla_xml() y la agrega al documento."""
+    return insertar_tabla_xml(document, construir_tabla_xml(headers, filas, columnas, df, **opciones))
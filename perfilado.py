@@ -0,0 +1,264 @@
+# perfilado.py
+"""
+Perfilado opcional de la construcción de informes: memoria (tracemalloc) y CPU (muestreo de pilas).
+
+Se activa para todas las peticiones con PERFILADO=1. Con PERFILADO_PERMITIR=1 también se puede pedir
+por petición con la cabecera "X-Perfilar: 1" (o "perfilar": true en el payload) en
+/api/generate-report; sin esa variable el pedido del cliente se ignora, porque un informe perfilado
+es varias veces más lento y se construye de a uno. Cada informe perfilado deja en PERFILADO_DIR dos
+archivos (GET /api/perfiles los lista):
+
+- <id>.json: duración; memoria por etapa (portada, cada capítulo, guardado del .docx) con el pico
+  de Python (tracemalloc) y el RSS del proceso al cerrarla; las PERFILADO_TOP trazas que retenían
+  más memoria en la etapa de mayor consumo; y el tiempo propio / acumulado de las funciones más
+  pesadas, siempre con las de FUNCIONES_DESTACADAS.
+- <id>.folded: las pilas muestreadas en formato "collapsed" (una línea "f1;f2;f3 n"), para
+  flamegraph.pl, speedscope o inferno.
+
+El muestreo es de tiempo de pared: un hilo lee cada PERFILADO_INTERVALO_MS la pila del hilo que
+construye el informe (sys._current_frames), así que también muestra las esperas a Drive. tracemalloc
+mide todo el proceso y sólo ve la memoria de Python (lxml y PIL reservan la suya aparte: para eso
+está el RSS), y los informes perfilados se construyen de a uno y sin coalescencia con otras
+peticiones. Se conservan los últimos PERFILADO_MAX perfiles.
+
+Perfilar cuesta: tracemalloc guarda PERFILADO_MARCOS marcos por asignación y un informe perfilado
+tarda varias veces lo normal (más marcos, trazas más completas y más lentitud).
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import metricas
+
+ACTIVO = os.environ.get("PERFILADO", "0") == "1"
+PERMITIR = os.environ.get("PERFILADO_PERMITIR", "0") == "1"  # deja que cada petición lo pida
+DIR = os.environ.get("PERFILADO_DIR") or os.path.join(tempfile.gettempdir(), "paraderos_perfiles")
+INTERVALO_S = float(os.environ.get("PERFILADO_INTERVALO_MS", "5")) / 1000
+MARCOS = int(os.environ.get("PERFILADO_MARCOS", "6"))
+TOP = int(os.environ.get("PERFILADO_TOP", "30"))
+MAX_PERFILES = int(os.environ.get("PERFILADO_MAX", "20"))
+
+FUNCIONES_DESTACADAS = (
+    "report_generator.crear_informe_paraderos", "report_generator.crear_tabla_evidencia",
+    "report_generator.agregar_tabla_formateada", "report_generator.definir_estilos_base",
+    "report_generator.agregar_imagen_con_formato_drive", "report_generator.agregar_tabla_excel",
+    "empaquetado_docx.guardar",
+)
+# Tramos de metricas que cierran una etapa de memoria (los de Drive ocurren dentro de los capítulos)
+_ETAPAS = ("informe.", "docx_save")
+_MB = 1024 * 1024
+
+_turno = threading.Lock()  # tracemalloc es de todo el proceso: un perfil a la vez
+
+
+def solicitado(*valores) -> bool:
+    """True si PERFILADO=1, o si PERFILADO_PERMITIR=1 y alguno de los valores (cabecera, clave del payload) lo pide."""
+    if ACTIVO:
+        return True
+    return PERMITIR and any(str(v).strip().lower() in ("1", "true", "si", "sí") for v in valores if v is not None)
+
+
+def _rss_mb() -> Optional[float]:
+    """RSS actual del proceso (Linux); None donde no hay /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _nombre_marco(marco) -> str:
+    codigo = marco.f_code
+    return f"{marco.f_globals.get('__name__', '?')}.{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+
+class _Muestreador(threading.Thread):
+    """Cuenta las pilas del hilo 'hilo_id' cada 'intervalo' segundos, sin sus 'externos' marcos más externos."""
+
+    def __init__(self, hilo_id: int, intervalo: float, externos: int = 0):
+        super().__init__(name="perfilado-cpu", daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.externos = externos
+        self.pilas: Counter = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while marco is not None:
+                pila.append(_nombre_marco(marco))
+                marco = marco.f_back
+            pila = pila[::-1][self.externos:]
+            if pila:
+                self.pilas[";".join(pila)] += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+
+
+def _funciones(pilas: Counter, segundos_por_muestra: float) -> List[Dict[str, Any]]:
+    """Tiempo propio (arriba de la pila) y acumulado (en cualquier nivel) de cada función."""
+    propio, acumulado = Counter(), Counter()
+    for pila, n in pilas.items():
+        marcos = pila.split(";")
+        propio[marcos[-1]] += n
+        for nombre in set(marcos):
+            acumulado[nombre] += n
+    elegidas = [f for f, _ in acumulado.most_common(TOP)]
+    elegidas += [f for f in FUNCIONES_DESTACADAS if f not in elegidas]
+    return [{"funcion": f, "acumulado_s": round(acumulado[f] * segundos_por_muestra, 3),
+             "propio_s": round(propio[f] * segundos_por_muestra, 3), "muestras": acumulado[f]}
+            for f in elegidas]
+
+
+def _asignaciones(snapshot) -> List[Dict[str, Any]]:
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+    return [{"kb": round(e.size / 1024, 1), "bloques": e.count,
+             "traza": [f"{m.filename}:{m.lineno}" for m in reversed(e.traceback)]}
+            for e in snapshot.statistics("traceback")[:TOP]]
+
+
+class Perfil:
+    """
+    with Perfil("Proyecto X") as perfil: ... perfila el bloque en el hilo actual y al salir escribe
+    <perfil.id>.json y <perfil.id>.folded en PERFILADO_DIR (también si el bloque falla).
+    """
+
+    def __init__(self, etiqueta: str = ""):
+        self.id = uuid.uuid4().hex[:16]
+        self.etiqueta = etiqueta
+        self.etapas: List[Dict[str, Any]] = []
+        self._snapshot = None
+        self._memoria_snapshot = -1
+
+    def __enter__(self):
+        _turno.acquire()
+        try:
+            self._detener_tracemalloc = not tracemalloc.is_tracing()
+            if self._detener_tracemalloc:
+                tracemalloc.start(MARCOS)
+            tracemalloc.reset_peak()
+            self._inicio = time.time()
+            self._t0 = time.perf_counter()
+            self._token = metricas.escuchar_etapas(self._al_cerrar_etapa)
+            # Las pilas empiezan en la función que abrió el with (sin servidor, Flask, etc.)
+            externos, marco = 0, sys._getframe(2)
+            while marco is not None:
+                externos, marco = externos + 1, marco.f_back
+            self._muestreador = _Muestreador(threading.get_ident(), INTERVALO_S, externos)
+            self._muestreador.start()
+        except BaseException:
+            _turno.release()
+            raise
+        return self
+
+    def _al_cerrar_etapa(self, etapa: str, segundos: float):
+        if not etapa.startswith(_ETAPAS):
+            return
+        actual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.etapas.append({"etapa": etapa, "segundos": round(segundos, 3), "pico_python_mb": round(pico / _MB, 1),
+                            "python_al_cerrar_mb": round(actual / _MB, 1), "rss_mb": _rss_mb()})
+        # Las trazas se toman donde más memoria queda retenida (p. ej. el documento ya armado)
+        if actual > self._memoria_snapshot:
+            self._memoria_snapshot = actual
+            self._snapshot = (etapa, tracemalloc.take_snapshot())
+
+    def __exit__(self, tipo, error, tb):
+        try:
+            duracion = time.perf_counter() - self._t0
+            self._muestreador.detener()
+            metricas.dejar_de_escuchar(self._token)
+            _, pico = tracemalloc.get_traced_memory()
+            if self._detener_tracemalloc:
+                tracemalloc.stop()
+            self._guardar(duracion, max([pico / _MB] + [e["pico_python_mb"] for e in self.etapas]), error)
+        except Exception as e:
+            print(f"❌ No se pudo guardar el perfil {self.id}: {e}")
+        finally:
+            _turno.release()
+        return False
+
+    def _guardar(self, duracion: float, pico_mb: float, error):
+        pilas = self._muestreador.pilas
+        muestras = sum(pilas.values())
+        etapa_snapshot, snapshot = self._snapshot or (None, None)
+        resumen = {
+            "id": self.id,
+            "etiqueta": self.etiqueta,
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._inicio)),
+            "segundos": round(duracion, 3),
+            "error": str(error) if error else None,
+            "pico_python_mb": round(pico_mb, 1),
+            "rss_mb": _rss_mb(),
+            "intervalo_ms": INTERVALO_S * 1000,
+            "muestras": muestras,
+            "etapas": self.etapas,
+            "asignaciones_etapa": etapa_snapshot,
+            "asignaciones": _asignaciones(snapshot),
+            "funciones": _funciones(pilas, duracion / muestras if muestras else 0.0),
+        }
+        os.makedirs(DIR, exist_ok=True)
+        with open(os.path.join(DIR, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            f.writelines(f"{pila} {n}\n" for pila, n in pilas.most_common())
+        # El .json se escribe al final: listar() sólo ve perfiles completos
+        temporal = os.path.join(DIR, f".{self.id}.json")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, os.path.join(DIR, f"{self.id}.json"))
+        print(f"🔬 Perfil {self.id}: {duracion:.1f} s, pico Python {pico_mb:.0f} MB, RSS {resumen['rss_mb']} MB.")
+        _podar()
+
+
+def _podar():
+    try:
+        perfiles = sorted((n for n in os.listdir(DIR) if n.endswith(".json") and not n.startswith(".")),
+                          key=lambda n: os.path.getmtime(os.path.join(DIR, n)), reverse=True)
+    except OSError:
+        return
+    for nombre in perfiles[MAX_PERFILES:]:
+        for extension in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(DIR, nombre[:-len(".json")] + extension))
+            except OSError:
+                pass
+
+
+def ruta(perfil_id: str, extension: str) -> Optional[str]:
+    """Ruta del archivo de un perfil (extension: "json" o "folded"); None si no existe o el id no es válido."""
+    if extension not in ("json", "folded") or len(perfil_id) != 16 or not all(c in "0123456789abcdef" for c in perfil_id):
+        return None
+    camino = os.path.join(DIR, f"{perfil_id}.{extension}")
+    return camino if os.path.exists(camino) else None
+
+
+def listar() -> List[Dict[str, Any]]:
+    """Perfiles guardados (más recientes primero), sin el detalle de asignaciones y funciones."""
+    try:
+        nombres = [n for n in os.listdir(DIR) if n.endswith(".json") and not n.startswith(".")]
+    except OSError:
+        return []
+    perfiles = []
+    for nombre in nombres:
+        try:
+            with open(os.path.join(DIR, nombre), encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            continue
+        perfiles.append({k: datos.get(k) for k in ("id", "etiqueta", "inicio", "segundos", "error",
+                                                   "pico_python_mb", "rss_mb", "muestras")})
+    return sorted(perfiles, key=lambda p: p["inicio"] or "", reverse=True)
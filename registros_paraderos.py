@@ -0,0 +1,147 @@
+# registros_paraderos.py
+"""
+Registros de paraderos guardados en el servidor, para que /api/generate-report los reciba por id.
+
+Una campaña grande se sube una vez (POST /api/paraderos) y después el front envía sólo los
+cambios de cada paradero (PATCH /api/paraderos/<id>, JSON Merge Patch, RFC 7386: las claves
+presentes reemplazan, null borra, los objetos se combinan y las listas se reemplazan enteras).
+
+En el payload del informe, cada elemento de "paraderos" puede ser:
+- el paradero completo, como siempre;
+- un id ("PA-0001") o {"ref": id}: el registro guardado;
+- {"ref": id, "cambios": {...}}: el registro con un merge patch que se aplica sólo a ese informe.
+
+Cada registro lleva una versión que sube con cada cambio; un PATCH con "If-Match: <version>" se
+rechaza con 409 si otro cliente lo modificó antes. SQLite (REGISTROS_PARADEROS_DB) compartido por
+los workers, una conexión por operación. REGISTROS_PARADEROS_DB tiene que apuntar a un disco
+persistente (un volumen montado): el directorio temporal se borra en cada reinicio del contenedor y
+las referencias dejarían de existir. Sin esa variable /api/paraderos y las referencias responden 503;
+los informes con paraderos completos funcionan igual.
+"""
+
+import copy
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import almacen_local
+import codec_json
+
+DB_POR_DEFECTO = os.environ.get("REGISTROS_PARADEROS_DB") or None
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS paraderos (
+    id TEXT PRIMARY KEY, datos BLOB NOT NULL, version INTEGER NOT NULL, actualizado REAL NOT NULL);
+"""
+
+
+class ErrorRegistro(Exception):
+    """Registro inexistente, en conflicto o mal formado, con el código HTTP que corresponde."""
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def aplicar_parche(destino: Any, parche: Any) -> Any:
+    """JSON Merge Patch (RFC 7386). No modifica destino: devuelve el resultado."""
+    if not isinstance(parche, dict):
+        return copy.deepcopy(parche)
+    resultado = dict(destino) if isinstance(destino, dict) else {}
+    for clave, valor in parche.items():
+        if valor is None:
+            resultado.pop(clave, None)
+        else:
+            resultado[clave] = aplicar_parche(resultado.get(clave), valor)
+    return resultado
+
+
+class RegistrosParaderos:
+    def __init__(self, ruta_db: Optional[str] = DB_POR_DEFECTO):
+        self.ruta_db = ruta_db
+        if not self.ruta_db:
+            print("⚠️ REGISTROS_PARADEROS_DB no está definida: /api/paraderos queda desactivado.")
+            return
+        with self._conexion() as con:
+            con.executescript(_ESQUEMA)
+
+    def _conexion(self):
+        if not self.ruta_db:
+            raise ErrorRegistro("Los paraderos guardados no están habilitados en este servidor "
+                                "(falta REGISTROS_PARADEROS_DB en un disco persistente).", 503)
+        return almacen_local.conexion(self.ruta_db)
+
+    def guardar(self, paraderos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Crea o reemplaza registros completos. Cada paradero puede traer su "id" (si no, se genera uno).
+        Devuelve [{"id", "version"}] en el mismo orden.
+        """
+        filas, resultado = [], []
+        for p in paraderos:
+            if not isinstance(p, dict):
+                raise ErrorRegistro("Cada paradero debe ser un objeto JSON.")
+            datos = {k: v for k, v in p.items() if k != "id"}
+            filas.append((str(p.get("id") or uuid.uuid4().hex), codec_json.dumps(datos)))
+        ahora = time.time()
+        with self._conexion() as con:
+            for paradero_id, datos in filas:
+                fila = con.execute("SELECT version FROM paraderos WHERE id = ?", (paradero_id,)).fetchone()
+                version = (fila[0] if fila else 0) + 1
+                con.execute("INSERT OR REPLACE INTO paraderos VALUES (?, ?, ?, ?)", (paradero_id, datos, version, ahora))
+                resultado.append({"id": paradero_id, "version": version})
+        return resultado
+
+    def obtener(self, ids: List[str]) -> Dict[str, Tuple[Dict[str, Any], int]]:
+        """{id: (datos, version)} de los ids que existen."""
+        encontrados = {}
+        unicos = list(dict.fromkeys(ids))
+        with self._conexion() as con:
+            for i in range(0, len(unicos), 500):  # límite de parámetros de SQLite
+                lote = unicos[i:i + 500]
+                filas = con.execute(f"SELECT id, datos, version FROM paraderos WHERE id IN ({','.join('?' * len(lote))})",
+                                    lote).fetchall()
+                encontrados.update({i_: (codec_json.loads(d), v) for i_, d, v in filas})
+        return encontrados
+
+    def parchear(self, paradero_id: str, parche: Dict[str, Any], version_esperada: Optional[int] = None) -> Dict[str, Any]:
+        """Aplica un merge patch al registro y devuelve {"id", "version"}."""
+        if not isinstance(parche, dict):
+            raise ErrorRegistro("El parche debe ser un objeto JSON (merge patch).")
+        with self._conexion() as con:
+            con.execute("BEGIN IMMEDIATE")  # lectura y escritura sin que otro worker se cruce
+            fila = con.execute("SELECT datos, version FROM paraderos WHERE id = ?", (paradero_id,)).fetchone()
+            if fila is None:
+                raise ErrorRegistro(f"No existe el paradero '{paradero_id}'.", 404)
+            if version_esperada is not None and fila[1] != version_esperada:
+                raise ErrorRegistro(f"El paradero '{paradero_id}' va en la versión {fila[1]}, no en la "
+                                    f"{version_esperada}: vuelva a leerlo antes de modificarlo.", 409)
+            datos = aplicar_parche(codec_json.loads(fila[0]), parche)
+            con.execute("UPDATE paraderos SET datos = ?, version = ?, actualizado = ? WHERE id = ?",
+                        (codec_json.dumps(datos), fila[1] + 1, time.time(), paradero_id))
+        return {"id": paradero_id, "version": fila[1] + 1}
+
+    def eliminar(self, paradero_id: str) -> bool:
+        with self._conexion() as con:
+            return con.execute("DELETE FROM paraderos WHERE id = ?", (paradero_id,)).rowcount > 0
+
+    def resolver(self, paraderos: List[Any]) -> List[Dict[str, Any]]:
+        """Lista de "paraderos" de un informe con las referencias reemplazadas por los registros guardados."""
+        refs = [p if isinstance(p, str) else p.get("ref") for p in paraderos
+                if isinstance(p, str) or (isinstance(p, dict) and "ref" in p)]
+        if not refs:
+            return paraderos
+        guardados = self.obtener(refs)
+        faltantes = [r for r in refs if r not in guardados]
+        if faltantes:
+            raise ErrorRegistro(f"No existen los paraderos: {', '.join(map(str, faltantes[:20]))}.", 404)
+        resueltos = []
+        for p in paraderos:
+            if isinstance(p, str):
+                p = {"ref": p}
+            if isinstance(p, dict) and "ref" in p:
+                datos = guardados[p["ref"]][0]
+                # Copia superficial: el mismo id puede aparecer dos veces y el informe reasigna claves del paradero
+                resueltos.append(aplicar_parche(datos, p["cambios"]) if p.get("cambios") else dict(datos))
+            else:
+                resueltos.append(p)
+        return resueltos
@@ -2,28 +2,133 @@
 
 # --- IMPORTACIONES ---
 import io
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime #
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.enum.section import WD_ORIENT, WD_SECTION
-from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
-from googleapiclient.http import MediaIoBaseDownload
-import pandas as pd
 from typing import List, Any, Dict
-import numpy as np
+
+import descargas
+import empaquetado_docx
+import hojas_excel
+import metricas
+import mapas
+import modelo_informe
+import motor_tablas
 
 # ===================================================================
 # FUNCIONES DE ESTILO Y FORMATO
 # ===================================================================
-document = Document()
 LOGO_DRIVE_FILE_ID = None
 IMG_UBICACION_PROYECTO_ID = None
 IMG_UBICACION_PARADAS_ID = None
 
 
+FUENTE_MHO = "Arial Narrow"
+
+# Registro de estilos con nombre. Se definen una sola vez por documento (en la plantilla)
+# y los helpers sólo referencian el nombre, sin formato directo en cada run/párrafo.
+# nombre -> (tipo, basado_en, opciones)
+ESTILOS_MHO = {
+    "MHO Normal":           (WD_STYLE_TYPE.PARAGRAPH, "Normal", {"tamano": 11, "alineacion": WD_PARAGRAPH_ALIGNMENT.JUSTIFY}),
+    "MHO Espacio":          (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"interlineado": Pt(12), "sin_espacios": True}),
+    "MHO Caption":          (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 9, "negrita": True, "alineacion": WD_PARAGRAPH_ALIGNMENT.CENTER, "sin_espacios": True}),
+    "MHO Fuente":           (WD_STYLE_TYPE.PARAGRAPH, "MHO Caption", {"tamano": 8}),
+    "MHO Table Cell":       (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 9, "alineacion": WD_PARAGRAPH_ALIGNMENT.CENTER, "sin_espacios": True}),
+    "MHO Table Header":     (WD_STYLE_TYPE.PARAGRAPH, "MHO Table Cell", {"negrita": True}),
+    "MHO Lista Viñeta":     (WD_STYLE_TYPE.PARAGRAPH, "List Bullet", {"tamano": 11, "alineacion": WD_PARAGRAPH_ALIGNMENT.JUSTIFY, "interlineado": Pt(12), "sin_espacios": True}),
+    "MHO Lista Número":     (WD_STYLE_TYPE.PARAGRAPH, "List Number", {"tamano": 11, "alineacion": WD_PARAGRAPH_ALIGNMENT.JUSTIFY, "interlineado": Pt(12), "sin_espacios": True}),
+    "MHO Portada Título":   (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 11, "negrita": True, "alineacion": WD_PARAGRAPH_ALIGNMENT.CENTER, "interlineado": Pt(22)}),
+    "MHO Portada Contacto": (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 8, "alineacion": WD_PARAGRAPH_ALIGNMENT.CENTER}),
+    "MHO Encabezado":       (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 8, "alineacion": WD_PARAGRAPH_ALIGNMENT.LEFT}),
+    "MHO Pie":              (WD_STYLE_TYPE.PARAGRAPH, "MHO Normal", {"tamano": 7, "alineacion": WD_PARAGRAPH_ALIGNMENT.LEFT, "interlineado": Pt(10)}),
+    "MHO Negrita":          (WD_STYLE_TYPE.CHARACTER, "Default Paragraph Font", {"negrita": True}),
+    "MHO Tabla":            (WD_STYLE_TYPE.TABLE, "Table Grid", {"celda_centrada": True}),
+}
+
+
+def _fijar_fuente(rpr, fuente):
+    """Fija la fuente en todas las escrituras (incl. Asia Oriental) y quita las fuentes de tema que la anulan."""
+    rfonts = rpr.get_or_add_rFonts()
+    for attr in ('w:asciiTheme', 'w:hAnsiTheme', 'w:eastAsiaTheme', 'w:cstheme'):
+        rfonts.attrib.pop(qn(attr), None)
+    for attr in ('w:ascii', 'w:hAnsi', 'w:eastAsia', 'w:cs'):
+        rfonts.set(qn(attr), fuente)
+
+
+def registrar_estilos(document):
+    """Crea (si no existen) los estilos del registro ESTILOS_MHO en el documento."""
+    styles = document.styles
+    existentes = {s.name for s in styles}
+    for nombre, (tipo, basado_en, opc) in ESTILOS_MHO.items():
+        if nombre in existentes:
+            continue
+        style = styles.add_style(nombre, tipo)
+        if basado_en in existentes or basado_en in ESTILOS_MHO:
+            style.base_style = styles[basado_en]
+        existentes.add(nombre)
+
+        if tipo == WD_STYLE_TYPE.TABLE:
+            if opc.get("celda_centrada"):
+                # Alineación vertical centrada para todas las celdas, definida una vez en el estilo
+                tcPr = OxmlElement('w:tcPr')
+                v_align = OxmlElement('w:vAlign')
+                v_align.set(qn('w:val'), 'center')
+                tcPr.append(v_align)
+                style.element.append(tcPr)
+            continue
+
+        style.font.name = FUENTE_MHO
+        _fijar_fuente(style.element.get_or_add_rPr(), FUENTE_MHO)
+        style.font.color.rgb = RGBColor(0, 0, 0)
+        if "tamano" in opc:
+            style.font.size = Pt(opc["tamano"])
+        if "negrita" in opc:
+            style.font.bold = opc["negrita"]
+
+        if tipo == WD_STYLE_TYPE.PARAGRAPH:
+            style.quick_style = True
+            p_fmt = style.paragraph_format
+            if "alineacion" in opc:
+                p_fmt.alignment = opc["alineacion"]
+            if "interlineado" in opc:
+                p_fmt.line_spacing = opc["interlineado"]
+            if opc.get("sin_espacios"):
+                p_fmt.space_before = Pt(0)
+                p_fmt.space_after = Pt(0)
+
+
+# styleId por nombre de estilo. La búsqueda por nombre de python-docx recorre todos los estilos
+# en cada llamada; como todos los informes salen de la misma plantilla, basta resolverla una vez.
+_IDS_ESTILO: Dict[str, str] = {}
+
+
+def id_estilo(document, nombre):
+    style_id = _IDS_ESTILO.get(nombre)
+    if style_id is None:
+        style_id = _IDS_ESTILO[nombre] = document.styles[nombre].style_id
+    return style_id
+
+
+def agregar_parrafo(document, texto="", estilo="MHO Normal", contenedor=None):
+    """Agrega un párrafo con estilo (por styleId) al documento o al contenedor indicado (p. ej. una celda)."""
+    p = (contenedor or document).add_paragraph(texto)
+    p._p.style = id_estilo(document, estilo)
+    return p
+
+
+def fijar_estilo(document, paragraph, estilo):
+    """Asigna un estilo a un párrafo ya existente (p. ej. el primero de una celda)."""
+    paragraph._p.style = id_estilo(document, estilo)
+
+
 def definir_estilos_base(document):
 
     # Define una función interna para no repetir código
@@ -36,71 +141,278 @@ def definir_estilos_base(document):
         font.color.rgb = RGBColor(0, 0, 0)
         p_fmt = style.paragraph_format
         p_fmt.alignment = alineacion
-        # Asegura compatibilidad con fuentes de Asia Oriental
-        rpr = style.element.rPr
-        rpr.rFonts.set(qn('w:eastAsia'), fuente)
+        # Asegura compatibilidad con fuentes de Asia Oriental (y anula las fuentes de tema)
+        _fijar_fuente(style.element.rPr, fuente)
 
     # Aplicamos los estilos a los títulos que usaremos
-    aplicar_estilo("Heading 1", "Arial Narrow", 11, True)
-    aplicar_estilo("Heading 2", "Arial Narrow", 11, True)
-    aplicar_estilo("Heading 3", "Arial Narrow", 11, True,alineacion=WD_PARAGRAPH_ALIGNMENT.JUSTIFY)
-    aplicar_estilo("Heading 4", "Arial Narrow", 9, True,alineacion=WD_PARAGRAPH_ALIGNMENT.CENTER)
+    aplicar_estilo("Heading 1", FUENTE_MHO, 11, True, alineacion=WD_PARAGRAPH_ALIGNMENT.LEFT)
+    aplicar_estilo("Heading 2", FUENTE_MHO, 11, True, alineacion=WD_PARAGRAPH_ALIGNMENT.LEFT)
+    aplicar_estilo("Heading 3", FUENTE_MHO, 11, True, alineacion=WD_PARAGRAPH_ALIGNMENT.LEFT)
+    aplicar_estilo("Heading 4", FUENTE_MHO, 9, True, alineacion=WD_PARAGRAPH_ALIGNMENT.CENTER)
+
+    registrar_estilos(document)
+
+# ===================================================================
+# PLANTILLA PRECOMPILADA (portada, índice, encabezado y pie)
+# ===================================================================
+CONTACTO_PORTADA = "Avenida Presidente Riesco 5335 Oficina 606, Las Condes \nTeléfono: (56 2) 2 657 16 25\ncontacto@mho.cl - www.mho.cl"
+CONTACTO_PIE = "Presidente Riesco 5335 Of. 606, Las Condes \nTeléfono: (56 2) 2 657 1625 \ncontacto@mho.cl \nwww.mho.cl"
+
+MARCADOR_TITULO = "{{TITULO_PORTADA}}"
+MARCADOR_FECHA = "{{FECHA_PORTADA}}"
+MARCADOR_ENCABEZADO = "{{ENCABEZADO_PROYECTO}}"
+
+# Plantillas serializadas (.docx en bytes) por imagen corporativa: (logo_id, contacto_portada, contacto_pie).
+# Se construyen una vez por worker y cada informe las clona en memoria.
+_PLANTILLAS: Dict[tuple, bytes] = {}
+_PLANTILLAS_LOCK = threading.Lock()
+MAX_PLANTILLAS = 32
+
+
+def _agregar_borde_tabla(table, lado):
+    """Agrega un borde simple (sz 6, negro) en el lado indicado ('top'/'bottom') de la tabla."""
+    tbl = table._tbl
+    tblPr = tbl.tblPr
+    if tblPr is None:
+        tblPr = OxmlElement('w:tblPr')
+        tbl.insert(0, tblPr)
+    tblBorders = OxmlElement('w:tblBorders')
+    borde = OxmlElement(f'w:{lado}')
+    borde.set(qn('w:val'), 'single')
+    borde.set(qn('w:sz'), '6')
+    borde.set(qn('w:color'), '000000')
+    tblBorders.append(borde)
+    tblPr.append(tblBorders)
+
+
+def construir_plantilla(service_drive=None, logo_id=None, contacto_portada=CONTACTO_PORTADA, contacto_pie=CONTACTO_PIE):
+    """
+    Construye el esqueleto fijo del informe (estilos, portada, índice, encabezado y pie)
+    Devuelve (bytes del .docx, logo_ok), donde logo_ok indica si el logo se pudo insertar.
+    Los textos propios de cada proyecto quedan como marcadores (MARCADOR_*).
+    """
+    document = Document()
+    definir_estilos_base(document)
+
+    # --- PORTADA ---
+    for _ in range(6): document.add_paragraph()
+
+    agregar_parrafo(document, estilo="MHO Portada Título").add_run(MARCADOR_TITULO)
+
+    for _ in range(8): document.add_paragraph()
+    p_fecha = document.add_paragraph()
+    p_fecha.add_run(MARCADOR_FECHA, style="MHO Negrita")
+    p_fecha.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    for _ in range(2): document.add_paragraph()
+    agregar_parrafo(document, estilo="MHO Portada Contacto").add_run(contacto_portada)
+
+    document.add_page_break()
+
+    # --- ÍNDICE (Placeholder) ---
+    agregar_titulo(document, "ÍNDICE GENERAL")
+    section_main = document.add_section(WD_SECTION.NEW_PAGE)
+
+    # --- ENCABEZADO ---
+    header = section_main.header
+    header.is_linked_to_previous = False
+    table_h = header.add_table(rows=1, cols=2, width=Inches(6.5))
+    _agregar_borde_tabla(table_h, 'bottom')
+
+    # Celda izquierda: nombre del proyecto
+    p1_h = table_h.cell(0, 0).paragraphs[0]
+    fijar_estilo(document, p1_h, "MHO Encabezado")
+    p1_h.add_run(MARCADOR_ENCABEZADO)
+
+    # Celda derecha: número de página
+    p2_h = table_h.cell(0, 1).paragraphs[0]
+    fijar_estilo(document, p2_h, "MHO Encabezado")
+    p2_h.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+    run2_h = p2_h.add_run()
+    fldChar1 = OxmlElement('w:fldChar'); fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText = OxmlElement('w:instrText'); instrText.text = "PAGE"
+    fldChar2 = OxmlElement('w:fldChar'); fldChar2.set(qn('w:fldCharType'), 'end')
+    run2_h._r.append(fldChar1); run2_h._r.append(instrText); run2_h._r.append(fldChar2)
+
+    # --- PIE DE PÁGINA ---
+    footer = section_main.footer
+    footer.is_linked_to_previous = False
+    table_f = footer.add_table(rows=1, cols=2, width=Inches(6.5))
+    _agregar_borde_tabla(table_f, 'top')
+
+    # Celda izquierda: Logo desde Google Drive
+    p_img = table_f.cell(0, 0).paragraphs[0]
+    logo_ok = True
+    if logo_id:
+        logo_ok = agregar_imagen_simple_drive(document=None, paragraph=p_img, service_drive=service_drive, file_id=logo_id, width_inch=0.65)
+    p_img.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+
+    # Celda derecha: texto de contacto
+    p_txt = table_f.cell(0, 1).paragraphs[0]
+    fijar_estilo(document, p_txt, "MHO Pie")
+    p_txt.add_run(contacto_pie)
+
+    buffer = io.BytesIO()
+    empaquetado_docx.guardar(document, buffer)
+    return buffer.getvalue(), logo_ok
+
+
+def obtener_documento_base(service_drive=None, logo_id=None, contacto_portada=CONTACTO_PORTADA, contacto_pie=CONTACTO_PIE):
+    """
+    Devuelve un Document nuevo clonado desde la plantilla en caché para esta imagen corporativa.
+    La plantilla se construye sólo la primera vez (por worker) para cada combinación de logo y contacto.
+    """
+    clave = (logo_id, contacto_portada, contacto_pie)
+    plantilla = _PLANTILLAS.get(clave)
+    metricas.cache("plantillas", plantilla is not None)
+    if plantilla is None:
+        with _PLANTILLAS_LOCK:
+            plantilla = _PLANTILLAS.get(clave)
+            if plantilla is None:
+                print(f"   - Construyendo plantilla base (logo={logo_id})...")
+                plantilla, logo_ok = construir_plantilla(service_drive, logo_id, contacto_portada, contacto_pie)
+                # Si el logo falló no se guarda: el siguiente informe lo reintenta.
+                if logo_ok:
+                    if len(_PLANTILLAS) >= MAX_PLANTILLAS:
+                        _PLANTILLAS.pop(next(iter(_PLANTILLAS)))
+                    _PLANTILLAS[clave] = plantilla
+    return Document(io.BytesIO(plantilla))
+
+
+def olvidar_plantillas(logo_id) -> bool:
+    """Descarta las plantillas armadas con ese logo (cambió en Drive). Devuelve True si había alguna."""
+    with _PLANTILLAS_LOCK:
+        claves = [clave for clave in _PLANTILLAS if clave[0] == logo_id]
+        for clave in claves:
+            del _PLANTILLAS[clave]
+    return bool(claves)
+
+
+def rellenar_plantilla(document, valores: Dict[str, str]):
+    """Reemplaza los marcadores de la plantilla (cuerpo y encabezados) por los textos del proyecto."""
+    parrafos = list(document.paragraphs)
+    for section in document.sections:
+        for table in section.header.tables:
+            for cell in table._cells:
+                parrafos.extend(cell.paragraphs)
+    for p in parrafos:
+        for run in p.runs:
+            if run.text in valores:
+                run.text = valores[run.text]
+
+
+# ===================================================================
+# CACHÉ DE IMÁGENES DE DRIVE (compartida entre informes del mismo worker)
+# ===================================================================
+# Por omisión la mitad del presupuesto de descargas (las entradas conservan su reserva en él);
+# nunca más que el presupuesto entero
+MAX_CACHE_IMAGENES_BYTES = min(
+    int(float(os.environ.get("CACHE_IMAGENES_MB", descargas.PRESUPUESTO_BYTES / descargas.MB / 2)) * descargas.MB),
+    descargas.PRESUPUESTO_BYTES)
+# file_id -> (bytes, reserva en el presupuesto de descargas): los bytes cacheados siguen contando
+_CACHE_IMAGENES: "OrderedDict[str, tuple]" = OrderedDict()
+_CACHE_IMAGENES_BYTES = 0
+_CACHE_IMAGENES_LOCK = threading.Lock()
+
+
+def _soltar_imagenes(faltan: int):
+    """Saca entradas de la caché (las más antiguas primero) hasta soltar 'faltan' bytes (y sus reservas)."""
+    global _CACHE_IMAGENES_BYTES
+    with _CACHE_IMAGENES_LOCK:
+        while faltan > 0 and _CACHE_IMAGENES:
+            _, (viejo, reserva) = _CACHE_IMAGENES.popitem(last=False)
+            _CACHE_IMAGENES_BYTES -= len(viejo)
+            faltan -= len(viejo)
+            reserva.devolver()
+
+
+# Si una descarga no tiene cupo, la caché cede primero el suyo
+descargas.presupuesto.liberar_con(_soltar_imagenes)
+
+
+def descargar_imagen_drive(service_drive, file_id) -> bytes:
+    """
+    Descarga un archivo de Drive (logo, fotos, figuras) pasando por una caché LRU en memoria,
+    limitada a CACHE_IMAGENES_MB. Es segura para usarla desde varios hilos a la vez.
+    Las entradas conservan su reserva en el presupuesto de descargas (descargas.py) hasta que salen.
+    """
+    global _CACHE_IMAGENES_BYTES
+    with _CACHE_IMAGENES_LOCK:
+        entrada = _CACHE_IMAGENES.get(file_id)
+        if entrada is not None:
+            _CACHE_IMAGENES.move_to_end(file_id)
+    metricas.cache("imagenes", entrada is not None)
+    if entrada is not None:
+        return entrada[0]
+
+    with descargas.descargar(service_drive, file_id) as descarga:
+        contenido = descarga.leer()
+        if len(contenido) > MAX_CACHE_IMAGENES_BYTES:
+            return contenido
+        reserva = descarga.ceder()
+
+    with _CACHE_IMAGENES_LOCK:
+        if file_id in _CACHE_IMAGENES:
+            reserva.devolver()
+            return contenido
+        _CACHE_IMAGENES[file_id] = (contenido, reserva)
+        _CACHE_IMAGENES_BYTES += len(contenido)
+        exceso = _CACHE_IMAGENES_BYTES - MAX_CACHE_IMAGENES_BYTES
+    if exceso > 0:
+        _soltar_imagenes(exceso)
+    return contenido
+
+
+def imagen_en_cache(file_id):
+    """Bytes de un archivo si ya están en la caché de imágenes (sin descargar); si no, None."""
+    with _CACHE_IMAGENES_LOCK:
+        entrada = _CACHE_IMAGENES.get(file_id)
+    return entrada[0] if entrada else None
+
+
+def olvidar_imagen(file_id) -> bool:
+    """Saca un archivo de la caché de imágenes (cambió en Drive). Devuelve True si estaba."""
+    global _CACHE_IMAGENES_BYTES
+    with _CACHE_IMAGENES_LOCK:
+        entrada = _CACHE_IMAGENES.pop(file_id, None)
+        if entrada is not None:
+            _CACHE_IMAGENES_BYTES -= len(entrada[0])
+            entrada[1].devolver()
+    return entrada is not None
+
 
 def agregar_imagen_con_formato_drive(document, service_drive, file_id, descripcion, estado, fuente="Fuente: Elaboración propia."):
     print(f"   - Agregando imagen con formato: {descripcion}")
-    capitulo = estado["capitulo"]
-    num_figura = estado["figura"]
-    etiqueta = f"Figura {capitulo}.{num_figura}. {descripcion}"
+    etiqueta = modelo_informe.siguiente_figura(estado, descripcion)
 
     # --- Título de la figura ---
-    p_titulo = document.add_paragraph()
-    p_titulo.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    p_titulo.paragraph_format.space_before = Pt(0) 
-    p_titulo.paragraph_format.space_after  = Pt(0)  
-    run_titulo = p_titulo.add_run(etiqueta)
-    run_titulo.font.name = "Arial Narrow"
-    run_titulo.font.size = Pt(9)
-    run_titulo.bold = True
+    agregar_parrafo(document, etiqueta, "MHO Caption")
 
     # --- Imagen ---
     try:
-        request = service_drive.files().get_media(fileId=file_id)
-        file_bytes = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_bytes, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        file_bytes.seek(0)
-
-        p_img = document.add_paragraph()
-        p_img.paragraph_format.space_before = Pt(0) 
-        p_img.paragraph_format.space_after  = Pt(0)
+        file_bytes = io.BytesIO(descargar_imagen_drive(service_drive, file_id))
+
+        p_img = agregar_parrafo(document, estilo="MHO Caption")
         p_img.add_run().add_picture(file_bytes, width=Inches(5.3))
-        p_img.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
     except Exception as e:
         document.add_paragraph(f"[Error al cargar imagen ID: {file_id}]")
         print(f"   ✗ Error: No se pudo agregar la imagen {file_id}. Error: {e}")
 
     # --- Fuente de la figura ---
-    p_fuente = document.add_paragraph()
-    p_fuente.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    run_fuente = p_fuente.add_run(fuente)
-    run_fuente.font.name = "Arial Narrow"
-    run_fuente.font.size = Pt(9)
-    run_fuente.italic = False
-    run_fuente.bold = True
+    # Mismo formato que el título (9 pt, negrita, centrado), a diferencia de la fuente de los cuadros
+    agregar_parrafo(document, fuente, "MHO Caption")
 
-    estado["figura"] += 1 # Incrementar contador para la siguiente figura
+def agregar_figura(document, contenido: bytes, descripcion, estado, fuente="Fuente: Elaboración propia."):
+    """Como agregar_imagen_con_formato_drive, para una imagen ya en memoria (p. ej. un mapa de mapas.py)."""
+    print(f"   - Agregando figura: {descripcion}")
+    agregar_parrafo(document, modelo_informe.siguiente_figura(estado, descripcion), "MHO Caption")
+    p_img = agregar_parrafo(document, estilo="MHO Caption")
+    p_img.add_run().add_picture(io.BytesIO(contenido), width=Inches(5.3))
+    agregar_parrafo(document, fuente, "MHO Caption")
 
 def agregar_imagen_simple_drive(document, service_drive, file_id, width_inch=6.0, paragraph=None):
     try:
-        request = service_drive.files().get_media(fileId=file_id)
-        file_bytes = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_bytes, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        file_bytes.seek(0)
+        file_bytes = io.BytesIO(descargar_imagen_drive(service_drive, file_id))
 
         # Si no se nos da un párrafo, creamos uno nuevo en el documento.
         if paragraph is None:
@@ -111,8 +423,10 @@ def agregar_imagen_simple_drive(document, service_drive, file_id, width_inch=6.0
         paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
         print(f"   ✓ Imagen simple {file_id} agregada.")
+        return True
     except Exception as e:
         print(f"   ✗ Advertencia: No se pudo agregar la imagen simple {file_id}. Error: {e}")
+        return False
 def aplicar_color_celda(celda, color_hex="D9D9D9"):
     """Pone un color de fondo a una celda de la tabla."""
     tc_pr = celda._tc.get_or_add_tcPr()
@@ -122,6 +436,20 @@ def aplicar_color_celda(celda, color_hex="D9D9D9"):
     shd.set(qn('w:fill'), color_hex)
     tc_pr.append(shd)
 
+COLUMNAS_CARACTERISTICAS = ['Característica', 'Cumplimiento', 'Observación']
+
+
+def _insertar_tabla_mho(document, **opciones):
+    """Inserta una tabla con el motor de tablas usando los estilos MHO del documento."""
+    return motor_tablas.insertar_tabla(
+        document,
+        estilo_id=id_estilo(document, "MHO Tabla"),
+        estilo_celda_id=id_estilo(document, "MHO Table Cell"),
+        estilo_encabezado_id=id_estilo(document, "MHO Table Header"),
+        **opciones,
+    )
+
+
 def agregar_tabla_formateada(
     document,
     descripcion: str,
@@ -130,6 +458,7 @@ def agregar_tabla_formateada(
     tabla_data: List[Dict[str, Any]] = None,
     headers: List[str] = None,
     rows: List[Any] = None,
+    **opciones_tabla,
 ):
     """
     Crea una tabla con formato avanzado en el documento.
@@ -138,175 +467,119 @@ def agregar_tabla_formateada(
       - headers/rows: encabezados + filas (listas o dicts)
 
     Requisitos:
-      - estado: dict con 'capitulo' y 'cuadro' (se incrementa 'cuadro' al final)
+      - estado: dict con 'capitulo' y 'cuadro' (se incrementa 'cuadro')
+    Las opciones extra (alineaciones, anchos, combinaciones, formateadores, ...) pasan al motor de tablas.
     """
 
     # -------------------- Etiqueta y título --------------------
-    capitulo = estado.get("capitulo", 0)
-    num_cuadro = estado.get("cuadro", 1)
-    etiqueta = f"Cuadro {capitulo}.{num_cuadro}. {descripcion.strip()}"
+    agregar_parrafo(document, modelo_informe.siguiente_cuadro(estado, descripcion), "MHO Caption")
 
-    p_titulo = document.add_paragraph()
-    p_titulo.paragraph_format.space_before = Pt(0)  # sin espacio
-    p_titulo.paragraph_format.space_after  = Pt(0)  # sin espacio
-    p_titulo.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    run_titulo = p_titulo.add_run(etiqueta)
-    run_titulo.font.name = "Arial Narrow"
-    run_titulo.font.size = Pt(9)
-    run_titulo.bold = True
-
-    # -------------------- Construcción del DataFrame --------------------
+    # -------------------- Normalización de columnas (sin DataFrame) --------------------
     # Caso A: tabla_data (lista de dicts)
     if tabla_data is not None:
         if isinstance(tabla_data, dict):
             tabla_data = [tabla_data]
-        df = pd.DataFrame(tabla_data)
-        if not df.empty:
-            # normaliza y renombra columnas
-            df.columns = [str(c).strip().lower() for c in df.columns]
-            rename_map = {
-                'caracteristica': 'Característica',
-                'cumplimiento':  'Cumplimiento',
-                'observacion':   'Observación',
-            }
-            df = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
-            order = [c for c in ['Característica', 'Cumplimiento', 'Observación'] if c in df.columns]
-            if order:
-                df = df[order]
-        else:
-            df = pd.DataFrame(columns=['Característica', 'Cumplimiento', 'Observación'])
+        rename_map = {
+            'caracteristica': 'Característica',
+            'cumplimiento':  'Cumplimiento',
+            'observacion':   'Observación',
+        }
+        # normaliza y renombra claves, conservando el orden de aparición
+        registros = [
+            {rename_map.get(str(k).strip().lower(), str(k).strip().lower()): v for k, v in fila.items()}
+            for fila in tabla_data
+        ]
+        cols = list(dict.fromkeys(k for fila in registros for k in fila))
+        order = [c for c in COLUMNAS_CARACTERISTICAS if c in cols]
+        if order:
+            cols = order
+        rows = registros
 
     # Caso B: headers/rows
     else:
-        cols: List[str] = [str(c) for c in (headers or [])]
-        rows_list: List[List[Any]] = []
-        for r in (rows or []):
-            if isinstance(r, dict):
-                row_vals = [r.get(h, "") for h in cols]
-            else:
-                row_vals = list(r)
-                # Alinea longitud de fila a columnas
-                if len(row_vals) < len(cols):
-                    row_vals += [""] * (len(cols) - len(row_vals))
-                elif len(row_vals) > len(cols):
-                    row_vals = row_vals[:len(cols)]
-            # Limpia None
-            row_vals = ["" if v is None else v for v in row_vals]
-            rows_list.append(row_vals)
-
-        df = pd.DataFrame.from_records(rows_list, columns=cols)
-
-        # Si no vino nada, crea DF vacío con columnas estándar
-        if df.empty:
-            df = pd.DataFrame(columns=['Característica', 'Cumplimiento', 'Observación'])
-
-    # Si sigue vacío y sin columnas, crea estructura mínima
-    if df.empty and df.columns.size == 0:
-        df = pd.DataFrame(columns=['Característica', 'Cumplimiento', 'Observación'])
+        cols = [str(c) for c in (headers or [])]
+
+    # Si no vino nada, crea estructura mínima con columnas estándar
+    if not cols:
+        cols = list(COLUMNAS_CARACTERISTICAS)
 
     # -------------------- Crear tabla Word --------------------
-    ncols = len(df.columns)
-    if ncols == 0:
-        # Evita tabla sin columnas
-        df = pd.DataFrame(columns=['Característica', 'Cumplimiento', 'Observación'])
-        ncols = 3
-
-    table = document.add_table(rows=1, cols=ncols)
-    table.style = 'Table Grid'  # usa tu estilo si tienes uno definido
-
-    # --- Encabezados ---
-    hdr_cells = table.rows[0].cells
-    for j, col_name in enumerate(df.columns):
-        p = hdr_cells[j].paragraphs[0]
-        p.paragraph_format.space_before = Pt(0)   # sin espacios extra
-        p.paragraph_format.space_after  = Pt(0)
-        p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        run = p.add_run(str(col_name))
-        run.font.name = "Arial Narrow"
-        run.font.size = Pt(9)
-        run.bold = True
-        hdr_cells[j].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-        try:
-            aplicar_color_celda(hdr_cells[j])  # si tienes la función utilitaria
-        except NameError:
-            pass
-
-    # --- Filas ---
-    for _, row_data in df.iterrows():
-        row_cells = table.add_row().cells
-        for j, val in enumerate(row_data):
-            p = row_cells[j].paragraphs[0]
-            p.paragraph_format.space_before = Pt(0)   # sin espacios extra
-            p.paragraph_format.space_after  = Pt(0)
-            p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            run = p.add_run("" if (pd.isna(val)) else str(val))
-            run.font.name = "Arial Narrow"
-            run.font.size = Pt(9)
-            run.bold = False
-            row_cells[j].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+    # El motor alinea la longitud de cada fila a las columnas y limpia None/NaN
+    table = _insertar_tabla_mho(document, headers=cols, filas=rows or [], **opciones_tabla)
 
     # -------------------- Fuente --------------------
-    p_fuente = document.add_paragraph()
-    p_fuente.paragraph_format.space_before = Pt(0)  # sin espacio
-    p_fuente.paragraph_format.space_after  = Pt(0)  # sin espacio
-    p_fuente.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    run_fuente = p_fuente.add_run(fuente)
-    run_fuente.font.name = "Arial Narrow"
-    run_fuente.font.size = Pt(8)
-    run_fuente.bold = True
-
-    # -------------------- Actualiza estado --------------------
-    estado["cuadro"] = int(estado.get("cuadro", 1)) + 1
+    agregar_parrafo(document, fuente, "MHO Fuente")
 
     # Log útil para depurar
-    print("   ✓ Tabla formateada creada. Filas:", len(df.index), "| Cols:", list(df.columns))
-                                                                                 
+    print("   ✓ Tabla formateada creada. Filas:", len(table.rows) - 1, "| Cols:", cols)
+    return table
+
 def agregar_tabla_desde_df(document, df, descripcion, estado, fuente, **kwargs):
     """
-    Función adaptada de tu ejemplo para crear una tabla directamente desde un DataFrame.
+    Crea una tabla directamente desde un DataFrame (conversión columnar, sin iterrows).
+    Las opciones extra (alineaciones, anchos, combinaciones, formateadores, ...) pasan al motor de tablas.
     """
-    # Esta función sería una adaptación de tu función 'agregar_tabla' original
-    # para asegurar que maneja el formato, colores, y combinaciones que necesitas.
-    # Por simplicidad aquí usamos una versión más directa.
-
     print(f"   - Creando tabla desde DataFrame: {descripcion}")
-    capitulo = estado["capitulo"]
-    num_cuadro = estado["cuadro"]
-    etiqueta = f"Cuadro {capitulo}.{num_cuadro}. {descripcion.strip()}"
 
     # Título de la tabla
-    agregar_texto(document, etiqueta).runs[0].bold = True
+    agregar_parrafo(document, modelo_informe.siguiente_cuadro(estado, descripcion), "MHO Caption")
 
-    # Crear tabla
-    table = document.add_table(rows=1, cols=len(df.columns))
-    table.style = 'Table Grid'
+    # Tabla (encabezados en negrita, sin color de fondo)
+    kwargs.setdefault("color_encabezado", None)
+    table = _insertar_tabla_mho(document, df=df, **kwargs)
 
-    # Encabezados
-    hdr_cells = table.rows[0].cells
-    for i, col_name in enumerate(df.columns):
-        hdr_cells[i].text = str(col_name)
-        hdr_cells[i].paragraphs[0].runs[0].bold = True
+    # Fuente
+    agregar_parrafo(document, fuente, "MHO Fuente")
+    return table
 
-    # Contenido
-    for _, row_data in df.iterrows():
-        row_cells = table.add_row().cells
-        for i, val in enumerate(row_data):
-            row_cells[i].text = str(val if not pd.isna(val) else "")
+def _cambiar_orientacion(document, horizontal):
+    """Abre una sección nueva (en página nueva) con la orientación pedida."""
+    section = document.add_section(WD_SECTION.NEW_PAGE)
+    ancho, alto = section.page_width, section.page_height
+    if horizontal != (ancho > alto):
+        section.page_width, section.page_height = alto, ancho
+    section.orientation = WD_ORIENT.LANDSCAPE if horizontal else WD_ORIENT.PORTRAIT
+    return section
+
+
+def agregar_tabla_excel(document, fragmentos, descripcion, estado, fuente):
+    """
+    Inserta como cuadro una hoja de Tablas.xlsx ya renderizada por hojas_excel (uno o más tramos).
+    Los tramos marcados como horizontales van en una sección apaisada.
+    """
+    horizontal = any(f.get("horizontal") for f in fragmentos)
+    if horizontal:
+        _cambiar_orientacion(document, True)
+
+    agregar_parrafo(document, modelo_informe.siguiente_cuadro(estado, descripcion), "MHO Caption")
+    for k, fragmento in enumerate(fragmentos):
+        if k:
+            agregar_espacio(document)  # separa los tramos (dos tablas seguidas se fusionarían)
+        motor_tablas.insertar_tabla_xml(document, fragmento["xml"])
+    agregar_parrafo(document, fuente, "MHO Fuente")
+
+    if horizontal:
+        _cambiar_orientacion(document, False)
+    print(f"   ✓ Tabla Excel '{descripcion}' agregada ({len(fragmentos)} tramo(s)).")
+
+
+def _estilos_tabla(document):
+    """styleIds MHO para los fragmentos renderizados por hojas_excel."""
+    return {
+        "estilo_id": id_estilo(document, "MHO Tabla"),
+        "estilo_celda_id": id_estilo(document, "MHO Table Cell"),
+        "estilo_encabezado_id": id_estilo(document, "MHO Table Header"),
+    }
 
-    # Fuente
-    document.add_paragraph(fuente).runs[0].font.size = Pt(8)
 
-    estado["cuadro"] += 1
 def read_excel_from_drive(service, file_id):
     """Descarga un archivo Excel de Drive y lo carga en un DataFrame de Pandas."""
     if not file_id: return None
     try:
-        request = service.files().get_media(fileId=file_id)
-        file_bytes = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_bytes, request)
-        # ... (lógica del downloader)
-        file_bytes.seek(0)
-        return pd.read_excel(file_bytes)
+        import pandas as pd
+        # Un libro grande queda en un temporal en disco y pandas lo lee desde ahí
+        with descargas.descargar(service, file_id) as descarga:
+            return pd.read_excel(descarga.abrir())
     except Exception as e:
         print(f"Error al leer Excel desde Drive (ID: {file_id}): {e}")
         return None
@@ -319,21 +592,21 @@ def crear_tabla_evidencia(document, service_drive, titulo_tabla, seccion_analisi
 
     # Extraer datos de la sección
     image_ids = seccion_analisis.get("image_ids", [])
-    description = seccion_analisis.get("description", "No hay descripción disponible.")
+    description = seccion_analisis.get("description", modelo_informe.DESCRIPCION_POR_OMISION)
 
     if not image_ids:
         return # No crear la tabla si no hay imágenes
 
     # Crear tabla de 1 columna
     table = document.add_table(rows=1, cols=1)
-    table.style = 'Table Grid'
+    table._tbl.tblStyle_val = id_estilo(document, "MHO Tabla")
     table.columns[0].width = Inches(6.5)
 
     # Fila 1: Título con color
     cell_titulo = table.rows[0].cells[0]
     cell_titulo.text = ''
     cell_titulo.paragraphs[0].runs[0].bold = True
-    p_titulo = cell_titulo.add_paragraph(titulo_tabla, style="Heading 3")
+    p_titulo = agregar_parrafo(document, titulo_tabla, "Heading 3", contenedor=cell_titulo)
     p_titulo.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
     aplicar_color_celda(cell_titulo) # Asumiendo que tienes la función aplicar_color_celda
 
@@ -348,76 +621,77 @@ def crear_tabla_evidencia(document, service_drive, titulo_tabla, seccion_analisi
     # Fila final: Descripción
     cell_desc = table.add_row().cells[0]
     cell_desc.text = '' # 1. Limpia el párrafo por defecto
-    p_desc = cell_desc.add_paragraph(description, style="Normal")
-    p_desc.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-
-def cambiar_capitulo(estado, nuevo_capitulo):
-    estado["capitulo"] = nuevo_capitulo
-    estado["figura"] = 1
-    estado["cuadro"] = 1
+    agregar_parrafo(document, description, "MHO Normal", contenedor=cell_desc)
 
 def agregar_titulo(document, texto, estilo="Heading 1"):
-    p = document.add_paragraph(style=estilo)
-    run = p.add_run(texto)
-    run.font.name = "Arial Narrow"
-    run._element.rPr.rFonts.set(qn('w:eastAsia'), "Arial Narrow")
-    run.font.size = Pt(11)
-    run.font.color.rgb = RGBColor(0, 0, 0)
-    p.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-    return p
+    return agregar_parrafo(document, texto, estilo)
 
 def agregar_subtitulo(document, texto, estilo="Heading 2"):
-    p = document.add_paragraph(style=estilo)
-    run = p.add_run(texto)
-    run.font.name = "Arial Narrow"
-    run._element.rPr.rFonts.set(qn('w:eastAsia'), "Arial Narrow")
-    run.font.size = Pt(11)
-    run.font.color.rgb = RGBColor(0, 0, 0)
-    p.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-    return p
+    return agregar_parrafo(document, texto, estilo)
 
 def agregar_subsub(document, texto, estilo="Heading 3"):
-    p = document.add_paragraph(style=estilo)
-    run = p.add_run(texto)
-    run.font.name = "Arial Narrow"
-    run._element.rPr.rFonts.set(qn('w:eastAsia'), "Arial Narrow")
-    run.font.size = Pt(11)
-    run.font.color.rgb = RGBColor(0, 0, 0)
-    p.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-    return p
+    return agregar_parrafo(document, texto, estilo)
 
-def agregar_texto(document, texto, estilo="Normal"):
-    p = document.add_paragraph(style=estilo)
-    run = p.add_run(texto)
-    run.font.name = "Arial Narrow"
-    run._element.rPr.rFonts.set(qn('w:eastAsia'), "Arial Narrow")
-    run.font.size = Pt(11)
-    run.font.color.rgb = RGBColor(0, 0, 0)
-    p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-    run.italic = False
-    return p
+def agregar_texto(document, texto, estilo="MHO Normal"):
+    return agregar_parrafo(document, texto, estilo)
 
-def agregar_lista(document, items, estilo='bullet', fuente="Arial Narrow", tamano=11, interlineado=Pt(12)):
+def agregar_lista(document, items, estilo='bullet', fuente=FUENTE_MHO, tamano=11, interlineado=Pt(12)):
 
-    estilo_word = 'List Bullet' if estilo == 'bullet' else 'List Number'
+    estilo_word = 'MHO Lista Viñeta' if estilo == 'bullet' else 'MHO Lista Número'
+    # Sólo se aplica formato directo si se pide algo distinto a lo que ya define el estilo
+    personalizado = (fuente != FUENTE_MHO, tamano != 11, interlineado != Pt(12))
 
     for item in items:
-        p = document.add_paragraph(style=estilo_word)
+        p = agregar_parrafo(document, estilo=estilo_word)
         run = p.add_run(item)
-        run.font.name = fuente
-        run._element.rPr.rFonts.set(qn('w:eastAsia'), fuente)
-        run.font.size = Pt(tamano)
-        p.paragraph_format.line_spacing = interlineado
-        p.paragraph_format.space_after = Pt(0)
-        p.paragraph_format.space_before = Pt(0)
-        p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        if personalizado[0]:
+            run.font.name = fuente
+            run._element.rPr.rFonts.set(qn('w:eastAsia'), fuente)
+        if personalizado[1]:
+            run.font.size = Pt(tamano)
+        if personalizado[2]:
+            p.paragraph_format.line_spacing = interlineado
 
 def agregar_espacio(document, cantidad=1):
     for _ in range(cantidad):
-        p = document.add_paragraph()
-        p.paragraph_format.space_after = Pt(0)
-        p.paragraph_format.space_before = Pt(0)
-        p.paragraph_format.line_spacing = Pt(12)
+        agregar_parrafo(document, estilo="MHO Espacio")
+def agregar_bloque(document, bloque, estado, service_drive, tablas_excel, etapas=None):
+    """Agrega al documento un bloque de modelo_informe.bloques()."""
+    tipo = bloque["tipo"]
+    if tipo == "capitulo":
+        print(f"   - Creando capítulo: {bloque['titulo']}")
+        modelo_informe.cambiar_capitulo(estado, bloque["numero"])
+        if etapas is not None:
+            etapas.siguiente(f"capitulo_{bloque['numero']}")
+        agregar_titulo(document, bloque["titulo"])
+    elif tipo == "paradero":
+        print(f"   -> Procesando Paradero N°{bloque['numero']}: {bloque['codigo']}")
+        agregar_subtitulo(document, bloque["titulo"])
+    elif tipo == "texto":
+        agregar_texto(document, bloque["texto"])
+    elif tipo == "espacio":
+        agregar_espacio(document)
+    elif tipo == "salto":
+        document.add_page_break()
+    elif tipo == "figura" and "mapa" in bloque:
+        agregar_figura(document, mapas.mapa_ubicacion(bloque["mapa"]["puntos"], destacado=bloque["mapa"]["destacado"]),
+                       descripcion=bloque["descripcion"], estado=estado, fuente=bloque["fuente"])
+    elif tipo == "figura":
+        agregar_imagen_con_formato_drive(document, service_drive, bloque["file_id"], descripcion=bloque["descripcion"],
+                                         estado=estado, fuente=bloque["fuente"])
+    elif tipo == "evidencia":
+        crear_tabla_evidencia(document, service_drive, bloque["titulo"], bloque["seccion"])
+    elif tipo == "cuadro":
+        agregar_tabla_formateada(document, descripcion=bloque["descripcion"], estado=estado, fuente=bloque["fuente"],
+                                 headers=bloque["headers"], rows=bloque["filas"])
+    elif tipo == "cuadro_df":
+        agregar_tabla_desde_df(document, bloque["df"], bloque["descripcion"], estado, bloque["fuente"], **bloque["opciones"])
+    elif tipo == "cuadro_excel":
+        agregar_tabla_excel(document, tablas_excel[bloque["hoja"]], bloque["descripcion"], estado=estado, fuente=bloque["fuente"])
+    else:
+        raise ValueError(f"Bloque de informe desconocido: {tipo}")
+
+
 # ===================================================================
 # FUNCIÓN PRINCIPAL PARA CREAR EL INFORME
 # ===================================================================
@@ -432,9 +706,9 @@ def crear_informe_paraderos(datos_informe,
     ):
     try:
         print("🚀 Iniciando la generación del informe...")
-        document = Document()
-        estado_informe = {"capitulo": 1, "figura": 1, "cuadro": 1}
-        definir_estilos_base(document)
+        etapas = metricas.Etapas("informe")
+        etapas.siguiente("portada")
+        estado_informe = modelo_informe.nuevo_estado()
 
         # --- DATOS DEL PROYECTO ---
         
@@ -446,312 +720,53 @@ def crear_informe_paraderos(datos_informe,
         img_ubicacion_paradas_id = drive_file_ids.get("img_ubicacion_paradas_id") or img_ubicacion_paradas_id
 
         drive_ids = datos_informe.get("drive_file_ids", {})
-        logo_id = drive_ids.get("logo")
-        tablas_id = drive_ids.get("tablas")
-        img_ubicacion_proyecto_id = drive_ids.get("ubicacion_proyecto")
-        img_ubicacion_paradas_id = drive_ids.get("ubicacion_paradas")
+        logo_id = drive_ids.get("logo") or logo_id
+        tablas_id = drive_ids.get("tablas") or tablas_id
+        img_ubicacion_proyecto_id = drive_ids.get("ubicacion_proyecto") or img_ubicacion_proyecto_id
+        img_ubicacion_paradas_id = drive_ids.get("ubicacion_paradas") or img_ubicacion_paradas_id
         info_proyecto = datos_informe.get("info_proyecto", {})
         nombre_proyecto = info_proyecto.get("proyecto", "[Nombre del Proyecto]")
-        comuna = info_proyecto.get("comuna", "[Comuna]")
-        estudio = info_proyecto.get("estudio", "[Tipo de Estudio]")
-        mitigacion = info_proyecto.get("mitigacion", "[N° Mitigación]")
-        resolucion = info_proyecto.get("resolucion", "[N° Resolución]")
-        fecha = info_proyecto.get("fecha", "[Fecha Resolución]")
-        medida_mitigacion = info_proyecto.get("medida_mitigacion", "[Descripción de la Medida]")
-        ubi_proyecto = info_proyecto.get("ubi_proyecto", "[Ubicación del Proyecto]")
-        region = info_proyecto.get("region", "[Región]")
-
-        # ==========================================================
-        # PORTADA (Lógica integrada de tu ejemplo)
-        # ==========================================================
-        print("   - Creando portada...")
-
-        # Espaciado vertical inicial
-        for _ in range(6): document.add_paragraph()
-
-        # Título principal
-        titulo = document.add_paragraph()
-        titulo_run = titulo.add_run(
-            f"MEJORAMIENTO DE PARADAS DE TRANSPORTE PÚBLICO\n"
-            f"MEDIDA DE MITIGACIÓN {(info_proyecto.get('mitigacion') or '').upper()} {(info_proyecto.get('estudio') or '').upper()}\n"
-            f"{(info_proyecto.get('proyecto') or '').upper()}\n"
-            f"{(info_proyecto.get('comuna') or '').upper()}\n"
-        )
-        titulo_run.bold = True
-        titulo_run.font.size = Pt(11)
-        titulo_run.font.name = "Arial Narrow"
-        titulo.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        titulo.paragraph_format.line_spacing = Pt(22)
-
-        # Espaciado y fecha automática
-        for _ in range(8): document.add_paragraph()
-        fecha_actual = datetime.now().strftime("%B %Y").upper() # Genera "AGOSTO 2025"
-        p_fecha = document.add_paragraph()
-        p_fecha.add_run(fecha_actual).bold = True
-        p_fecha.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Información de la empresa
-        for _ in range(2): document.add_paragraph()
-        p_empresa = document.add_paragraph()
-        p_empresa.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        run_empresa = p_empresa.add_run("Avenida Presidente Riesco 5335 Oficina 606, Las Condes \nTeléfono: (56 2) 2 657 16 25\ncontacto@mho.cl - www.mho.cl")
-        run_empresa.font.name = "Arial Narrow"
-        run_empresa.font.size = Pt(8)
-
-        document.add_page_break()
-
-        # --- ÍNDICE (Placeholder) ---
-        agregar_titulo(document, "ÍNDICE GENERAL")
-        print("   ✓ Portada e Índice creados.")
-        section_main = document.add_section(WD_SECTION.NEW_PAGE)
-
-        # ==========================================================
-            # ENCABEZADO PERSONALIZADO (Tu código integrado)
-            # ==========================================================
-        print("   - Creando encabezado...")
-        header = section_main.header
-        header.is_linked_to_previous = False
-
-        table_h = header.add_table(rows=1, cols=2, width=Inches(6.5))
-
-        # Borde inferior para la tabla del encabezado
-        tbl_h = table_h._tbl
-        tblPr_h = tbl_h.tblPr
-        if tblPr_h is None:
-            tblPr_h = OxmlElement('w:tblPr')
-            tbl_h.insert(0, tblPr_h)
-        tblBorders_h = OxmlElement('w:tblBorders')
-        bottom_h = OxmlElement('w:bottom')
-        bottom_h.set(qn('w:val'), 'single')
-        bottom_h.set(qn('w:sz'), '6')
-        bottom_h.set(qn('w:color'), '000000')
-        tblBorders_h.append(bottom_h)
-        tblPr_h.append(tblBorders_h)
-
-        # Celda izquierda: nombre del proyecto
-        cell1_h = table_h.cell(0, 0)
-        p1_h = cell1_h.paragraphs[0]
-        p1_h.add_run(f"Informe de Paradero - {nombre_proyecto}").font.size = Pt(8)
-
-        # Celda derecha: número de página
-        cell2_h = table_h.cell(0, 1)
-        p2_h = cell2_h.paragraphs[0]
-        p2_h.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-        run2_h = p2_h.add_run()
-        run2_h.font.size = Pt(8)
-
-        # Añadir campo de NÚMERO DE PÁGINA
-        fldChar1 = OxmlElement('w:fldChar'); fldChar1.set(qn('w:fldCharType'), 'begin')
-        instrText = OxmlElement('w:instrText'); instrText.text = "PAGE"
-        fldChar2 = OxmlElement('w:fldChar'); fldChar2.set(qn('w:fldCharType'), 'end')
-        run2_h._r.append(fldChar1); run2_h._r.append(instrText); run2_h._r.append(fldChar2)
-
-        # ==========================================================
-        # PIE DE PÁGINA PERSONALIZADO
-        # ==========================================================
-        print("   - Creando pie de página...")
-        footer = section_main.footer
-        footer.is_linked_to_previous = False
-
-        table_f = footer.add_table(rows=1, cols=2, width=Inches(6.5))
-
-        # Borde superior para la tabla del pie de página
-        tbl_f = table_f._tbl
-        tblPr_f = tbl_f.tblPr
-        if tblPr_f is None:
-            tblPr_f = OxmlElement('w:tblPr')
-            tbl_f.insert(0, tblPr_f)
-        tblBorders_f = OxmlElement('w:tblBorders')
-        top_f = OxmlElement('w:top')
-        top_f.set(qn('w:val'), 'single')
-        top_f.set(qn('w:sz'), '6')
-        top_f.set(qn('w:color'), '000000')
-        tblBorders_f.append(top_f)
-        tblPr_f.append(tblBorders_f)
-
-        # Celda izquierda: Logo desde Google Drive
-        cell_img = table_f.cell(0, 0)
-        p_img = cell_img.paragraphs[0]
-        if logo_id: agregar_imagen_simple_drive(document=None, paragraph=p_img, service_drive=service_drive, file_id=logo_id, width_inch=0.65)
-        p_img.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-
-        # Celda derecha: texto de contacto
-        cell_txt = table_f.cell(0, 1)
-        texto_footer = "Presidente Riesco 5335 Of. 606, Las Condes \nTeléfono: (56 2) 2 657 1625 \ncontacto@mho.cl \nwww.mho.cl"
-        p_txt = cell_txt.paragraphs[0]
-        p_txt.add_run(texto_footer).font.size = Pt(7)
-        p_txt.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-        p_txt.paragraph_format.line_spacing = Pt(10)
-
-        # ==========================================================
-        # CAPÍTULO 1: ANTECEDENTES
-        # ==========================================================
-        print("   - Creando Capítulo 1: Antecedentes...")
-        cambiar_capitulo(estado_informe, 1)
-        agregar_titulo(document, "1. ANTECEDENTES")
-        agregar_espacio(document)
-        agregar_texto(document, f"El presente estudio, tiene por objetivo dar cumplimiento a la medida de mitigación {info_proyecto.get('mitigacion', '[mitigacion]')} del {info_proyecto.get('estudio', '[estudio]')} aprobado para {info_proyecto.get('proyecto', '[proyecto]')}. Las mitigaciones que se abordan a continuación tienen relación con el mantenimiento y reparación de la infraestructura y elementos de las paradas de transporte público, según lo estipulado en el {info_proyecto.get('estudio', '[estudio]')} aprobado mediante Resolución Exenta {info_proyecto.get('resolucion', '[resolucion]')}, con fecha {info_proyecto.get('fecha', '[fecha]')}, en la comuna {info_proyecto.get('comuna', '[comuna]')}.")
-        agregar_espacio(document)
-        agregar_texto(document, f"Respecto a las medidas de mitigación mencionadas, se expone lo siguiente en el {info_proyecto.get('estudio', '[estudio]')} aprobado:")
-        agregar_espacio(document)
-        agregar_texto(document, info_proyecto.get('medida_mitigacion', '[medida_mitigacion]'))
-        document.add_page_break()
 
         # ==========================================================
-        # CAPÍTULO 2: DESCRIPCIÓN DEL PROYECTO
+        # PORTADA, ÍNDICE, ENCABEZADO Y PIE (desde la plantilla)
         # ==========================================================
-        print("   - Creando Capítulo 2: Descripción del Proyecto...")
-        cambiar_capitulo(estado_informe, 2)
-        agregar_titulo(document, "2. DESCRIPCIÓN DEL PROYECTO")
-        agregar_texto(document, f"El proyecto {info_proyecto.get('proyecto', '[nombre_proyecto]')}, se ubica en {info_proyecto.get('ubi_proyecto', '[ubi_proyecto]')}, comuna de {info_proyecto.get('comuna', '[comuna]')}, {info_proyecto.get('region', '[region]')}. En la siguiente figura N°2.1, se podrá visualizar la ubicación del proyecto:")
-        agregar_espacio(document)
-        if img_ubicacion_proyecto_id: agregar_imagen_con_formato_drive(document, service_drive, img_ubicacion_proyecto_id, descripcion="Ubicación del Proyecto", estado=estado_informe, fuente="Elaboración Propia en base a Google Earth")
-        document.add_page_break()
-
-        # ==========================================================
-        # CAPÍTULO 3: INSPECCIÓN DE PARADEROS (VERSIÓN DETALLADA)
-        # ==========================================================
-        print("   - Creando Capítulo 3: Inspección de Paraderos...")
-        cambiar_capitulo(estado_informe, 3)
-        agregar_titulo(document, "3. INSPECCIÓN Y DESCRIPCIÓN DE PARADEROS INVOLUCRADOS")
-        agregar_espacio(document)
-        agregar_texto(document, "En este apartado se reporta la situación actual de las paradas en estudio, catastradas en las visitas a terreno. En la figura siguiente se muestra la ubicación actual de cada paradero:")
-        if img_ubicacion_paradas_id:
-            agregar_imagen_con_formato_drive(
-                document, service_drive, img_ubicacion_paradas_id, 
-                descripcion="Ubicación Paradas de Transporte Público en Estudio",
-                estado=estado_informe,
-                fuente="Elaboración Propia en base a Google Earth"
-            )
-
-
-        # --- Bucle para cada paradero (sub-capítulos de la sección 3) ---
-        paraderos = datos_informe.get("paraderos", []) or []
-        for i, paradero in enumerate(paraderos, start=1):
-            document.add_page_break()
-
-            info_paradero = paradero.get("info_paradero") or paradero.get("infoParadero") or {}
-            # Fallbacks por si vinieran en otro nivel / nombres antiguos
-            codigo = (
-                info_paradero.get("codigo")
-                or paradero.get("codigo")
-                or paradero.get("codigo_paradero")
-                or "S/C"
-            )
-            ubicacion = (
-                info_paradero.get("ubicacion")
-                or paradero.get("ubicacion")
-                or paradero.get("ubicacion_paradero")
-                or "Sin ubicación"
-            )
-            analisis = paradero.get("analisis") or {}
-
-            print(f"   -> Procesando Paradero N°{i}: {codigo}")
-
-            # Subtítulo
-            agregar_subtitulo(document, f"3.{i} {codigo} - {ubicacion}")
-            agregar_espacio(document)
-
-            # Tabla 1: Imagen General
-            crear_tabla_evidencia(document, service_drive, "Imagen general del paradero", analisis.get("general", {}))
-            document.add_page_break()
-
-            # Tabla 2: Refugio y Andén
-            crear_tabla_evidencia(document, service_drive, "Evidencia Fotográfica de Refugio y Andén", analisis.get("refugio_anden", {}))
-            document.add_page_break()
-
-            # Tabla 3: Señal y Demarcación
-            crear_tabla_evidencia(document, service_drive, "Evidencia Fotográfica de Señal y Demarcación", analisis.get("senal", {}))
-            document.add_page_break()
-            
-            # Tabla 4: Características (desde los datos almacenados)
-            filas = []
-            for fila in paradero.get("tabla", []) or []:
-                filas.append([
-                    str(fila.get("caracteristica", "")).strip(),
-                    str(fila.get("cumplimiento", "")).strip(),
-                    str(fila.get("observacion", "")).strip(),
-                ])
-
-            if filas:
-                headers = ["Característica", "Cumplimiento", "Observación"]
-                agregar_tabla_formateada(
-                    document,
-                    descripcion="Tabla de Características del Paradero",
-                    estado=estado_informe,
-                    fuente="Elaboración Propia",
-                    headers=headers,
-                    rows=filas
-                )
-
-
-        # ==========================================================
-        # CAPÍTULO 4: INFORMACIÓN DE PARADAS
-        # ==========================================================
-        print("   - Creando Capítulo 4: Información de Paradas...")
-        document.add_page_break()
-        cambiar_capitulo(estado_informe, 4)
-        agregar_titulo(document, "4. INFORMACIÓN DE PARADAS DE TRANSPORTE PÚBLICO")
-        agregar_espacio(document)
-        agregar_texto(document, "En la siguiente tabla se reportan los servicios de bus que utilizan cada parada en estudio, con su respectivo destino:")
-        agregar_espacio(document)
-
+        document = obtener_documento_base(service_drive, logo_id=logo_id)
+        rellenar_plantilla(document, {
+            MARCADOR_TITULO: modelo_informe.titulo_portada(info_proyecto),
+            MARCADOR_FECHA: datetime.now().strftime("%B %Y").upper(),  # Genera "AGOSTO 2025"
+            MARCADOR_ENCABEZADO: f"Informe de Paradero - {nombre_proyecto}",
+        })
+        print("   ✓ Portada, índice, encabezado y pie listos (plantilla).")
+
+        # Figuras de ubicación dibujadas localmente (mapas.py) cuando no vienen de Drive o se piden siempre
+        mapa_proyecto, mapa_paradas = modelo_informe.usa_mapas(datos_informe, img_ubicacion_proyecto_id, img_ubicacion_paradas_id)
+
+        # Las hojas "Paradas" y "Resumen" (y las coordenadas de "Paradas", si hacen falta para los mapas)
+        # se leen juntas (una descarga) y quedan en caché por revisión
+        tablas_excel, error_tablas = {}, None
         if tablas_id:
             try:
-                req = service_drive.files().get_media(fileId=tablas_id)  # IDs, no nombres
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, req)
-                done = False
-                while not done:
-                    status, done = downloader.next_chunk()
-                fh.seek(0)
-
-                # Lee directamente desde el buffer en memoria
-                df_resumen = pd.read_excel(fh, sheet_name="Paradas")  # ajusta nombre de hoja si corresponde
-                agregar_imagen_con_formato_drive(document, df_resumen,
-                                       "Información de Paradas de Transporte Público",
-                                       estado=estado_informe,
-                                       fuente="Elaboración Propia en base DTPM - RED movilidad - Terreno")
+                tablas_excel = hojas_excel.obtener_tablas_excel(
+                    service_drive, tablas_id, ["Paradas", "Resumen"],
+                    modo_ancho=datos_informe.get("modo_tablas_anchas", "dividir"),
+                    estilos=_estilos_tabla(document),
+                    coordenadas_de="Paradas" if (mapa_proyecto or mapa_paradas) else None,
+                )
             except Exception as e:
-                agregar_texto(document, f"[ERROR: No se pudo leer 'Tablas.xlsx' desde Drive. Detalle: {e}]")
+                error_tablas = f"[ERROR: No se pudo leer 'Tablas.xlsx' desde Drive. Detalle: {e}]"
         else:
-            agregar_texto(document, "[ERROR: No se recibió 'tablas_id' para cargar las tablas desde Drive.]")
+            error_tablas = modelo_informe.ERROR_SIN_TABLAS
 
+        # Capítulos 1 a 5: la estructura (textos, figuras, cuadros) viene de modelo_informe,
+        # la misma que usa la vista previa HTML
+        for bloque in modelo_informe.bloques(
+                datos_informe, img_ubicacion_proyecto_id, img_ubicacion_paradas_id,
+                hojas={h for h in ("Paradas", "Resumen") if tablas_excel.get(h)},
+                error_tablas=error_tablas, coordenadas_hoja=tablas_excel.get("coordenadas")):
+            agregar_bloque(document, bloque, estado_informe, service_drive, tablas_excel, etapas)
 
-        # ==========================================================
-        # CAPÍTULO 5: MEDIDA DE MITIGACIÓN
-        # ==========================================================
-        print("   - Creando Capítulo 5: Medida de Mitigación...")
-        document.add_page_break()
-        cambiar_capitulo(estado_informe, 5)
-        # Corregimos el error de tipeo de 'regar_titulo' a 'agregar_titulo'
-        agregar_titulo(document, "5. MEDIDA DE MITIGACIÓN")
-        agregar_espacio(document)
-        agregar_texto(document, f"En función de la información recopilada en terreno, se presenta una tabla resumen con las mejoras a ejecutar de acuerdo con lo indicado en la aprobación del {info_proyecto.get('estudio', '[estudio]')} aprobado mediante {info_proyecto.get('resolucion', '[resolucion]')}. El cuadro que se presenta a continuación, indica un resumen con el estado de los paraderos revisados en la minuta y posteriormente se mencionan los elementos que requieren intervención.")
-        agregar_espacio(document)
-
-        if tablas_id:
-            try:
-                req = service_drive.files().get_media(fileId=tablas_id)  # IDs, no nombres
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, req)
-                done = False
-                while not done:
-                    status, done = downloader.next_chunk()
-                fh.seek(0)
-
-                # Lee directamente desde el buffer en memoria
-                df_resumen = pd.read_excel(fh, sheet_name="Resumen")  # ajusta nombre de hoja si corresponde
-                agregar_imagen_con_formato_drive(document, df_resumen,
-                                       "Resumen estado de Paraderos",
-                                       estado=estado_informe,
-                                       fuente="Elaboración Propia en base DTPM - RED movilidad - Terreno")
-            except Exception as e:
-                agregar_texto(document, f"[ERROR: No se pudo leer 'Tablas.xlsx' desde Drive. Detalle: {e}]")
-        else:
-            agregar_texto(document, "[ERROR: No se recibió 'tablas_id' para cargar las tablas desde Drive.]")
-            
         # --- FINALIZACIÓN ---
+        etapas.terminar()
         print("✅ Informe generado en memoria.")
         return document
 
@@ -0,0 +1,118 @@
+# resumen_cumplimiento.py
+"""
+Resumen de cumplimiento del capítulo 5, calculado desde las tablas de características de cada
+paradero (filas Característica/Cumplimiento/Observación de /api/fill-table).
+
+Todas las filas de todos los paraderos se pasan a un DataFrame largo (una fila por paradero y
+característica) y cada respuesta se convierte en un puntaje con un solo map sobre la columna:
+    1   cumple ("Sí", "DTPM", "Bueno", "Buena", "Sí posee")
+    0.5 cumple parcialmente ("Regular")
+    0   no cumple ("No", "No es DTPM", "Deficiente", "No posee", "Sin iluminación presente")
+    NaN no aplica o sin respuesta reconocible ("N.A.", "Sin refugio presente", ...: la ausencia
+        del elemento ya queda evaluada en "Posee refugio", "Posee señal de parada", etc.)
+Desde ahí, conteos por característica, paraderos a intervenir y puntaje por paradero salen de
+operaciones por columna (map, crosstab, groupby, unstack) sin recorrer las filas en Python.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+PUNTAJES = {
+    "sí": 1.0, "si": 1.0, "dtpm": 1.0, "bueno": 1.0, "buena": 1.0, "sí posee": 1.0, "si posee": 1.0,
+    "regular": 0.5,
+    "no": 0.0, "no es dtpm": 0.0, "deficiente": 0.0, "no posee": 0.0, "sin iluminación presente": 0.0,
+}
+ESTADOS = ["Cumple", "Parcial", "No cumple", "No aplica"]
+
+
+def codigo_de(paradero: Dict[str, Any]) -> str:
+    """Código del paradero, con los mismos respaldos que el capítulo 3 del informe."""
+    info = paradero.get("info_paradero") or paradero.get("infoParadero") or {}
+    return str(info.get("codigo") or paradero.get("codigo") or paradero.get("codigo_paradero") or "S/C")
+
+
+def tabla_larga(paraderos: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Filas 'tabla' de todos los paraderos: codigo, caracteristica, cumplimiento, observacion, puntaje, estado."""
+    tablas = [[f for f in (p.get("tabla") or []) if isinstance(f, dict)] for p in paraderos]
+    df = pd.DataFrame.from_records([f for t in tablas for f in t],
+                                   columns=["caracteristica", "cumplimiento", "observacion"])
+    # Cada paradero aporta len(tabla) filas, en orden: el código se repite en bloque
+    n_filas = np.fromiter(map(len, tablas), dtype=np.int64, count=len(tablas))
+    df.insert(0, "codigo", np.repeat(np.array([codigo_de(p) for p in paraderos], dtype=object), n_filas))
+
+    df["caracteristica"] = df["caracteristica"].fillna("").astype(str).str.strip()
+    df = df[df["caracteristica"] != ""].reset_index(drop=True)
+    df["puntaje"] = df["cumplimiento"].fillna("").astype(str).str.strip().str.lower().map(PUNTAJES)
+    puntaje = df["puntaje"].to_numpy()
+    df["estado"] = np.select([puntaje == 1, puntaje > 0, puntaje == 0], ESTADOS[:3], ESTADOS[3])
+    return df
+
+
+def calcular_resumen(paraderos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Devuelve:
+      - matriz: puntaje por paradero (filas) y característica (columnas), en el orden de llegada
+      - conteos: por característica, cuántos paraderos cumplen, cumplen parcialmente, no cumplen o no aplica
+      - intervenciones: por característica, los códigos de los paraderos que requieren intervención
+      - por_paradero: elementos evaluados, elementos a intervenir (cantidad y nombres) y % de cumplimiento
+    """
+    largo = tabla_larga(paraderos)
+    codigos = pd.unique(largo["codigo"])
+    caracteristicas = pd.unique(largo["caracteristica"])
+
+    # Un código repetido (paradero informado dos veces) se promedia
+    matriz = (largo.groupby(["codigo", "caracteristica"], sort=False)["puntaje"].mean()
+              .unstack("caracteristica").reindex(index=codigos, columns=caracteristicas))
+
+    conteos = (pd.crosstab(pd.Categorical(largo["caracteristica"], categories=caracteristicas),
+                           pd.Categorical(largo["estado"], categories=ESTADOS), dropna=False)
+               .rename_axis(index="caracteristica", columns=None))
+
+    a_intervenir = largo[largo["puntaje"] < 1].drop_duplicates(["caracteristica", "codigo"])
+    intervenciones = (a_intervenir.groupby("caracteristica", sort=False)["codigo"].agg(", ".join)
+                      .reindex(caracteristicas, fill_value=""))
+
+    valores = matriz.to_numpy(dtype=float)
+    evaluados = np.isfinite(valores)
+    requiere = np.nan_to_num(valores, nan=1.0) < 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        porcentaje = np.where(evaluados.any(axis=1), np.nansum(valores, axis=1) / evaluados.sum(axis=1), np.nan)
+    # Nombres de los elementos a intervenir por paradero: producto matricial booleano x texto (True * "x" == "x")
+    nombres = np.array([f"{c}; " for c in caracteristicas], dtype=object)
+    elementos = requiere.astype(object) @ nombres if len(nombres) else np.full(len(codigos), "", dtype=object)
+    por_paradero = pd.DataFrame({
+        "codigo": codigos,
+        "evaluados": evaluados.sum(axis=1),
+        "a_intervenir": requiere.sum(axis=1),
+        "elementos_a_intervenir": pd.Series(elementos, dtype=object).str.rstrip("; ").to_numpy(),
+        "cumplimiento": porcentaje,
+    })
+    return {"matriz": matriz, "conteos": conteos, "intervenciones": intervenciones, "por_paradero": por_paradero}
+
+
+def formato_porcentaje(valor) -> str:
+    return "" if valor is None or pd.isna(valor) else f"{valor:.0%}"
+
+
+def cuadro_paraderos(resumen: Dict[str, Any]) -> pd.DataFrame:
+    """Cuadro 'Resumen estado de Paraderos' (una fila por paradero) listo para agregar_tabla_desde_df."""
+    df = resumen["por_paradero"]
+    return pd.DataFrame({
+        "Paradero": df["codigo"],
+        "Elementos evaluados": df["evaluados"],
+        "Elementos a intervenir": df["a_intervenir"],
+        "Detalle": df["elementos_a_intervenir"],
+        "% cumplimiento": df["cumplimiento"],
+    })
+
+
+def cuadro_elementos(resumen: Dict[str, Any]) -> pd.DataFrame:
+    """Cuadro de cumplimiento por elemento, con los paraderos que requieren intervención."""
+    conteos = resumen["conteos"]
+    return pd.DataFrame({
+        "Característica": conteos.index.astype(str),
+        **{estado: conteos[estado].to_numpy() for estado in ESTADOS},
+        "Paraderos a intervenir": resumen["intervenciones"].to_numpy(),
+    })
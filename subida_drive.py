@@ -0,0 +1,197 @@
+# subida_drive.py
+"""
+Subida reanudable de informes a la carpeta del proyecto en Drive.
+
+- El fileId se conoce antes de subir: el del informe anterior con el mismo nombre en la carpeta
+  (se sube como versión nueva) o uno reservado con files.generateIds. Así /api/generate-report
+  responde de inmediato con el enlace de Drive y la subida sigue en un hilo de fondo.
+- Se sube por tramos de SUBIDA_CHUNK_MB (Drive exige múltiplos de 256 KiB). Ante un error
+  transitorio (5xx, 429, error de red) se reintenta con espera exponencial, hasta SUBIDA_REINTENTOS
+  veces seguidas: googleapiclient le pregunta a Drive cuántos bytes recibió y sigue desde ahí.
+- El estado de cada subida queda en SQLite, compartido por los workers (GET /api/subidas/<file_id>).
+  Un informe idéntico (mismo contenido, nombre y carpeta) en curso o ya subido no se vuelve a subir.
+  Una subida en curso que no avanza en SUBIDA_ABANDONO_S (el worker murió) se da por fallida.
+"""
+
+import hashlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import almacen_local
+import metricas
+
+FRAGMENTO_MINIMO = 256 * 1024
+CHUNK_BYTES = max(FRAGMENTO_MINIMO,
+                  int(float(os.environ.get("SUBIDA_CHUNK_MB", "8")) * 1024 * 1024) // FRAGMENTO_MINIMO * FRAGMENTO_MINIMO)
+REINTENTOS = int(os.environ.get("SUBIDA_REINTENTOS", "5"))
+MAX_PARALELAS = int(os.environ.get("SUBIDA_MAX_PARALELAS", "2"))
+# Una subida viva actualiza su fila tras cada tramo y cada reintento: por defecto, cuatro tramos a 64 KiB/s
+# más la espera máxima entre reintentos sin noticias
+ABANDONO_S = float(os.environ.get("SUBIDA_ABANDONO_S", 4 * (CHUNK_BYTES / (64 * 1024) + 30)))
+DB_POR_DEFECTO = os.environ.get("SUBIDAS_DB") or os.path.join(tempfile.gettempdir(), "paraderos_subidas.sqlite")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS subidas (
+    file_id TEXT PRIMARY KEY, carpeta_id TEXT NOT NULL, nombre TEXT NOT NULL, sha256 TEXT NOT NULL,
+    tamano INTEGER NOT NULL, subidos INTEGER NOT NULL DEFAULT 0, estado TEXT NOT NULL,
+    reintentos INTEGER NOT NULL DEFAULT 0, error TEXT, creado REAL NOT NULL, actualizado REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS subidas_destino ON subidas (carpeta_id, nombre, sha256);
+"""
+
+
+def enlace(file_id: str) -> str:
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def es_transitorio(error: Exception) -> bool:
+    """Errores que vale la pena reintentar: 5xx y 429 de Drive, o fallas de red."""
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or error.resp.status == 429
+    import httplib2
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+
+def preparar_destino(service, carpeta_id: str, nombre: str):
+    """(file_id, existente): el informe anterior con ese nombre en la carpeta, o un id nuevo reservado."""
+    nombre_q = nombre.replace("\\", "\\\\").replace("'", "\\'")
+    with metricas.span("drive_list"):
+        resp = service.files().list(
+            q=f"'{carpeta_id}' in parents and name = '{nombre_q}' and trashed = false",
+            fields="files(id)", pageSize=1, supportsAllDrives=True, includeItemsFromAllDrives=True,
+        ).execute()
+    if resp.get("files"):
+        return resp["files"][0]["id"], True
+    with metricas.span("drive_metadata"):
+        ids = service.files().generateIds(count=1, space="drive").execute()["ids"]
+    return ids[0], False
+
+
+def subir(service, contenido: bytes, file_id: str, nombre: str, carpeta_id: str, existente: bool,
+          mimetype: str, chunk_bytes: int = CHUNK_BYTES, reintentos: int = REINTENTOS,
+          al_avanzar: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Sube contenido como file_id por tramos (sesión reanudable). al_avanzar(subidos, reintentos)
+    se llama después de cada tramo confirmado y de cada reintento. Devuelve los metadatos del archivo.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    media = MediaIoBaseUpload(io.BytesIO(contenido), mimetype=mimetype, chunksize=chunk_bytes, resumable=True)
+    if existente:
+        peticion = service.files().update(fileId=file_id, media_body=media, fields="id,name,webViewLink",
+                                          supportsAllDrives=True)
+    else:
+        peticion = service.files().create(body={"id": file_id, "name": nombre, "parents": [carpeta_id]},
+                                          media_body=media, fields="id,name,webViewLink", supportsAllDrives=True)
+    seguidos, total_reintentos, respuesta = 0, 0, None
+    with metricas.span("drive_upload"):
+        while respuesta is None:
+            try:
+                progreso, respuesta = peticion.next_chunk()
+            except Exception as e:
+                if not es_transitorio(e) or seguidos >= reintentos:
+                    raise
+                seguidos += 1
+                total_reintentos += 1
+                espera = min(30.0, 2 ** seguidos) * (0.5 + random.random() / 2)
+                print(f"⚠️ Subida de '{nombre}': error transitorio ({e}); reintento {seguidos}/{reintentos} en {espera:.1f} s.")
+                if al_avanzar:
+                    al_avanzar(peticion.resumable_progress, total_reintentos)
+                time.sleep(espera)
+                continue
+            seguidos = 0
+            if al_avanzar:
+                al_avanzar(progreso.resumable_progress if progreso else len(contenido), total_reintentos)
+    metricas.sumar_bytes("drive_subida", len(contenido))
+    return respuesta
+
+
+class GestorSubidas:
+    """
+    Cola de subidas de fondo del worker (MAX_PARALELAS a la vez) con su estado en SQLite.
+    obtener_servicio: función sin argumentos que devuelve un cliente de Drive para el hilo que la llama.
+    """
+
+    def __init__(self, obtener_servicio: Callable[[], Any], ruta_db: str = DB_POR_DEFECTO,
+                 max_paralelas: int = MAX_PARALELAS):
+        self.obtener_servicio = obtener_servicio
+        self.ruta_db = ruta_db
+        self.max_paralelas = max_paralelas
+        self._pool = None
+        self._pid_pool = None
+        self._lock = threading.Lock()
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.executescript(_ESQUEMA)
+
+    def _ejecutor(self):
+        # El pool se crea en el worker (no en el maestro de gunicorn --preload, sus hilos no sobreviven al fork)
+        with self._lock:
+            if self._pid_pool != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_paralelas, thread_name_prefix="subida")
+                self._pid_pool = os.getpid()
+            return self._pool
+
+    def _actualizar(self, file_id: str, **campos):
+        asignaciones = ", ".join(f"{k} = ?" for k in campos)
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute(f"UPDATE subidas SET {asignaciones}, actualizado = ? WHERE file_id = ?",
+                        (*campos.values(), time.time(), file_id))
+
+    def encolar(self, service, contenido: bytes, nombre: str, carpeta_id: str, mimetype: str) -> Dict[str, Any]:
+        """Reserva el destino, deja la subida en cola y devuelve su estado (con el enlace de Drive)."""
+        sha = hashlib.sha256(contenido).hexdigest()
+        with almacen_local.conexion(self.ruta_db) as con:
+            # Las que quedaron a medias en un worker que murió no se reanudan solas: fallidas, y se vuelve a encolar
+            con.execute("UPDATE subidas SET estado = 'error', error = 'Subida abandonada (el worker se detuvo).' "
+                        "WHERE estado IN ('en_cola', 'subiendo') AND actualizado < ?", (time.time() - ABANDONO_S,))
+            fila = con.execute(
+                "SELECT file_id FROM subidas WHERE carpeta_id = ? AND nombre = ? AND sha256 = ? "
+                "AND estado IN ('en_cola', 'subiendo', 'completada') ORDER BY creado DESC LIMIT 1",
+                (carpeta_id, nombre, sha)).fetchone()
+        if fila:
+            print(f"♻️ '{nombre}' ya está subido o subiéndose a Drive ({fila[0]}).")
+            return self.estado(fila[0])
+
+        file_id, existente = preparar_destino(service, carpeta_id, nombre)
+        ahora = time.time()
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute("INSERT OR REPLACE INTO subidas (file_id, carpeta_id, nombre, sha256, tamano, subidos, estado, "
+                        "reintentos, error, creado, actualizado) VALUES (?, ?, ?, ?, ?, 0, 'en_cola', 0, NULL, ?, ?)",
+                        (file_id, carpeta_id, nombre, sha, len(contenido), ahora, ahora))
+        self._ejecutor().submit(self._subir, contenido, file_id, nombre, carpeta_id, existente, mimetype)
+        print(f"☁️ '{nombre}' en cola para subir a Drive ({len(contenido) / 1e6:.1f} MB, "
+              f"{'versión nueva' if existente else 'archivo nuevo'} {file_id}).")
+        return self.estado(file_id)
+
+    def _subir(self, contenido, file_id, nombre, carpeta_id, existente, mimetype):
+        try:
+            self._actualizar(file_id, estado="subiendo")
+            service = self.obtener_servicio()
+            if service is None:
+                raise RuntimeError("No se pudo autenticar con Drive.")
+            subir(service, contenido, file_id, nombre, carpeta_id, existente, mimetype,
+                  al_avanzar=lambda subidos, reintentos: self._actualizar(file_id, subidos=subidos, reintentos=reintentos))
+            self._actualizar(file_id, estado="completada", subidos=len(contenido))
+            print(f"✅ '{nombre}' subido a Drive: {enlace(file_id)}")
+        except Exception as e:
+            self._actualizar(file_id, estado="error", error=str(e))
+            print(f"❌ Falló la subida de '{nombre}' a Drive: {e}")
+
+    def estado(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.row_factory = sqlite3.Row
+            fila = con.execute("SELECT * FROM subidas WHERE file_id = ?", (file_id,)).fetchone()
+        if fila is None:
+            return None
+        return {
+            "file_id": fila["file_id"], "nombre": fila["nombre"], "carpeta_id": fila["carpeta_id"],
+            "webViewLink": enlace(fila["file_id"]), "estado": fila["estado"], "bytes": fila["tamano"],
+            "subidos": fila["subidos"], "reintentos": fila["reintentos"], "error": fila["error"],
+        }
@@ -0,0 +1,170 @@
+# tablas_columnares.py
+"""
+Caché columnar en disco de las hojas de Tablas.xlsx ya normalizadas (textos de celda formateados,
+combinaciones, anchos y filas de encabezado), para armar los cuadros del informe sin volver a
+descargar ni leer el Excel.
+
+Cada libro (file_id + revisión) es una carpeta con libro.json (metadatos de cada hoja y la
+validación) y un archivo por hoja con sus celdas por columnas:
+
+- Con pyarrow instalado: Arrow IPC sin comprimir (.arrow), una columna de texto por columna de la hoja.
+- Sin pyarrow: la misma disposición que Arrow usa para el texto (.col): los desplazamientos int64
+  y después los bytes UTF-8 de todas las celdas, columna tras columna.
+
+En los dos casos el archivo se abre con memory-map: sólo se leen las páginas de las columnas que se
+usan y los workers comparten la caché de páginas del sistema. La carpeta se escribe en un temporal
+y se renombra al final, así que nunca se ve un libro a medio escribir.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # dependencia opcional
+    pa = None
+
+FORMATO = "arrow" if pa is not None else "col"
+VERSION = 1  # subir si cambia la normalización de las hojas, para invalidar la caché
+
+
+# --- Arrow IPC ---
+def _escribir_arrow(ruta: str, columnas: List[List[str]]):
+    tabla = pa.table({str(j): pa.array(c, type=pa.string()) for j, c in enumerate(columnas)})
+    with pa.OSFile(ruta, "wb") as destino, pa.ipc.new_file(destino, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+
+
+def _leer_arrow(ruta: str, indices: Sequence[int]) -> List[List[str]]:
+    with pa.memory_map(ruta, "r") as origen:
+        tabla = pa.ipc.open_file(origen).read_all()
+        return [tabla.column(j).to_pylist() for j in indices]
+
+
+# --- Desplazamientos + UTF-8 (sin pyarrow) ---
+def _escribir_col(ruta: str, columnas: List[List[str]]):
+    datos = [c.encode("utf-8") for columna in columnas for c in columna]
+    desplazamientos = np.zeros(len(datos) + 1, dtype="<i8")
+    np.cumsum([len(d) for d in datos], out=desplazamientos[1:])
+    with open(ruta, "wb") as f:
+        f.write(desplazamientos.tobytes())
+        f.write(b"".join(datos))
+
+
+def _leer_col(ruta: str, n_filas: int, n_columnas: int, indices: Sequence[int]) -> List[List[str]]:
+    with open(ruta, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        base = (n_filas * n_columnas + 1) * 8  # los datos empiezan después de los desplazamientos
+        columnas = []
+        for j in indices:
+            o = np.frombuffer(mapa, dtype="<i8", count=n_filas + 1, offset=j * n_filas * 8).tolist()
+            bloque = mapa[base + o[0]:base + o[-1]]
+            columnas.append([bloque[a - o[0]:b - o[0]].decode("utf-8") for a, b in zip(o, o[1:])])
+        return columnas
+    finally:
+        mapa.close()
+
+
+# ===================================================================
+# LIBRO
+# ===================================================================
+class Libro:
+    """
+    Hojas normalizadas de un libro. Libro.abrir(directorio) lee la caché en disco (las celdas se
+    leen con memory-map al pedir cada hoja); Libro(meta, hojas) es un libro sólo en memoria.
+    """
+
+    def __init__(self, meta: Dict[str, Any], hojas: Optional[Dict[str, Dict[str, Any]]] = None,
+                 directorio: Optional[str] = None):
+        self.meta = meta
+        self._hojas = hojas
+        self.directorio = directorio
+
+    @classmethod
+    def abrir(cls, directorio: str) -> Optional["Libro"]:
+        """El libro guardado en 'directorio'; None si no existe o es de otra versión o formato."""
+        try:
+            with open(os.path.join(directorio, "libro.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != VERSION or (meta.get("formato") == "arrow" and pa is None):
+            return None
+        return cls(meta, directorio=directorio)
+
+    @property
+    def validacion(self) -> Dict[str, Any]:
+        return self.meta.get("validacion") or {}
+
+    def tiene(self, nombre: str) -> bool:
+        return nombre in self.meta["hojas"]
+
+    def columnas(self, nombre: str, indices: Optional[Sequence[int]] = None) -> List[List[str]]:
+        """Celdas de la hoja por columnas (todas, o sólo las de 'indices')."""
+        info = self.meta["hojas"][nombre]
+        indices = range(info["n_columnas"]) if indices is None else indices
+        if self._hojas is not None:
+            filas = self._hojas[nombre]["filas"]
+            return [[f[j] for f in filas] for j in indices]
+        ruta = os.path.join(self.directorio, info["archivo"])
+        if self.meta["formato"] == "arrow":
+            return _leer_arrow(ruta, indices)
+        return _leer_col(ruta, info["n_filas"], info["n_columnas"], indices)
+
+    def hoja(self, nombre: str) -> Optional[Dict[str, Any]]:
+        """{"filas", "combinaciones", "anchos", "n_encabezado", ...} de la hoja; None si el libro no la tiene."""
+        if not self.tiene(nombre):
+            return None
+        info = dict(self.meta["hojas"][nombre])
+        info["filas"] = [list(f) for f in zip(*self.columnas(nombre))] if info["n_columnas"] else []
+        info["combinaciones"] = [tuple(c) for c in info["combinaciones"]]
+        return info
+
+
+def _archivo(k: int) -> str:
+    return f"hoja{k}.{FORMATO}"
+
+
+def en_memoria(meta: Dict[str, Any], hojas: Dict[str, Dict[str, Any]]) -> Libro:
+    """
+    Libro sin caché en disco (p. ej. si no se conoce la revisión). hojas: {nombre: {"filas": [[str]]
+    (todas del mismo largo), "combinaciones", "anchos", "n_encabezado", ...}}; las demás claves de
+    cada hoja y de 'meta' se guardan tal cual.
+    """
+    meta = dict(meta, version=VERSION, formato=FORMATO, hojas={})
+    for k, (nombre, hoja) in enumerate(hojas.items()):
+        filas = hoja["filas"]
+        meta["hojas"][nombre] = dict({c: v for c, v in hoja.items() if c != "filas"}, archivo=_archivo(k),
+                                     n_filas=len(filas), n_columnas=len(filas[0]) if filas else 0)
+    return Libro(meta, hojas)
+
+
+def guardar(directorio: str, meta: Dict[str, Any], hojas: Dict[str, Dict[str, Any]]) -> Libro:
+    """Como en_memoria(), pero escribe el libro en 'directorio' y lo devuelve abierto desde disco."""
+    libro = en_memoria(meta, hojas)
+    padre = os.path.dirname(directorio)
+    os.makedirs(padre, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=".libro-", dir=padre)
+    try:
+        for nombre, hoja in hojas.items():
+            info = libro.meta["hojas"][nombre]
+            columnas = [[f[j] for f in hoja["filas"]] for j in range(info["n_columnas"])]
+            (_escribir_arrow if FORMATO == "arrow" else _escribir_col)(os.path.join(temporal, info["archivo"]), columnas)
+        with open(os.path.join(temporal, "libro.json"), "w", encoding="utf-8") as f:
+            json.dump(libro.meta, f, ensure_ascii=False)
+        try:
+            os.rename(temporal, directorio)
+        except OSError:
+            shutil.rmtree(temporal, ignore_errors=True)  # otro worker lo escribió primero: se usa el suyo
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    return Libro.abrir(directorio) or libro
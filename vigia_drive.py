@@ -0,0 +1,327 @@
+# vigia_drive.py
+"""
+Vigía de cambios de Drive: mantiene al día un manifiesto local de las carpetas de proyecto.
+
+- La primera vez que se pide una carpeta (/api/list-images, generate-report) se lista completa
+  una sola vez y queda registrada en el manifiesto (SQLite, compartido por todos los workers).
+- Un hilo de fondo sigue el feed changes.list de Drive desde un startPageToken y aplica cada
+  cambio a las carpetas registradas: fotos nuevas, reemplazadas, renombradas, movidas o borradas.
+  El token se guarda en el mismo archivo: al reiniciar se continúa desde donde quedó.
+- Sólo un worker a la vez consulta Drive (lease en SQLite, como en coalescencia.py); todos leen
+  la bitácora de cambios para descartar sus cachés locales (bytes de imágenes, etc.).
+- Mientras el último sondeo exitoso tenga menos de VIGIA_MAX_ATRASO_S, las carpetas registradas
+  se responden desde el manifiesto sin llamar a Drive. Si el vigía se atrasa (Drive caído, worker
+  muerto), manifiesto() devuelve None y se vuelve a listar en Drive.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import almacen_local
+import metricas
+
+VIGIA_DRIVE = os.environ.get("VIGIA_DRIVE", "1") == "1"
+DB_POR_DEFECTO = os.environ.get("VIGIA_DB") or os.path.join(tempfile.gettempdir(), "paraderos_vigia.sqlite")
+INTERVALO_S = float(os.environ.get("VIGIA_INTERVALO_S", "15"))
+MAX_ATRASO_S = float(os.environ.get("VIGIA_MAX_ATRASO_S", "120"))
+RETENCION_BITACORA_S = 3600
+
+MIME_CARPETA = "application/vnd.google-apps.folder"
+CAMPOS_ARCHIVO = "id,name,mimeType,parents,trashed,md5Checksum,webViewLink,thumbnailLink,modifiedTime"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS carpetas (folder_id TEXT PRIMARY KEY, nombre TEXT, sincronizada REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS carpetas_nombre ON carpetas (nombre);
+CREATE TABLE IF NOT EXISTS archivos (
+    file_id TEXT NOT NULL, carpeta_id TEXT NOT NULL, datos TEXT NOT NULL, PRIMARY KEY (carpeta_id, file_id));
+CREATE INDEX IF NOT EXISTS archivos_file_id ON archivos (file_id);
+CREATE TABLE IF NOT EXISTS bitacora (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, file_id TEXT NOT NULL, datos TEXT, momento REAL NOT NULL);
+"""
+
+
+def _datos(archivo: Dict[str, Any]) -> str:
+    return json.dumps({k: archivo.get(k) for k in CAMPOS_ARCHIVO.split(",")}, ensure_ascii=False)
+
+
+class VigiaDrive:
+    """
+    - obtener_servicio: función sin argumentos que devuelve un cliente de Drive (googleapiclient)
+      para el hilo que la llama; None si no hay credenciales.
+    - ruta_db: archivo SQLite compartido (None desactiva el vigía: manifiesto() siempre devuelve None).
+    """
+
+    def __init__(self, obtener_servicio: Callable[[], Any], ruta_db: Optional[str] = DB_POR_DEFECTO,
+                 intervalo_s: float = INTERVALO_S, max_atraso_s: float = MAX_ATRASO_S):
+        self.obtener_servicio = obtener_servicio
+        self.ruta_db = ruta_db
+        self.intervalo_s = intervalo_s
+        self.max_atraso_s = max_atraso_s
+        self._sufijo = uuid.uuid4().hex[:8]
+        self._oyentes: List[Callable[[str, Optional[Dict[str, Any]]], None]] = []
+        self._pid_hilo = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._ultima_seq = 0
+        self._stats = {"sondeos": 0, "cambios_aplicados": 0, "errores": 0, "desalojos": 0}
+        if self.ruta_db:
+            try:
+                with almacen_local.conexion(self.ruta_db) as con:
+                    con.executescript(_ESQUEMA)
+                    fila = con.execute("SELECT MAX(seq) FROM bitacora").fetchone()
+                    self._ultima_seq = fila[0] or 0
+            except sqlite3.Error as e:
+                print(f"❌ Vigía de Drive: SQLite no disponible ({e}); se desactiva.")
+                self.ruta_db = None
+
+    @property
+    def _dueno(self):
+        return f"{os.getpid()}-{self._sufijo}"
+
+    # ------------------------------------------------------------------
+    # Hilo de fondo
+    # ------------------------------------------------------------------
+    def al_cambiar(self, fn: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """
+        Registra fn(file_id, datos), que se llama en cada worker por cada archivo que cambió en Drive.
+        datos son los metadatos nuevos (CAMPOS_ARCHIVO), o None si el archivo se borró.
+        """
+        self._oyentes.append(fn)
+
+    def asegurar_iniciado(self):
+        """Arranca el hilo en este proceso si no está corriendo (después de un fork hay que arrancarlo de nuevo)."""
+        if not self.ruta_db or self._pid_hilo == os.getpid():
+            return
+        with self._lock:
+            if self._pid_hilo == os.getpid():
+                return
+            self._pid_hilo = os.getpid()
+            self._parar.clear()
+            threading.Thread(target=self._bucle, name="vigia-drive", daemon=True).start()
+
+    def detener(self):
+        self._parar.set()
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            try:
+                if self._tomar_lease():
+                    self.sondear()
+                self._desalojar_cambiados()
+            except Exception as e:
+                with self._lock:
+                    self._stats["errores"] += 1
+                print(f"❌ Vigía de Drive: {e}")
+            self._parar.wait(self.intervalo_s)
+
+    def _tomar_lease(self) -> bool:
+        ahora = time.time()
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute("BEGIN IMMEDIATE")
+            fila = con.execute("SELECT valor FROM estado WHERE clave = 'lider'").fetchone()
+            if fila:
+                dueno, expira = json.loads(fila[0])
+                if dueno != self._dueno and expira > ahora:
+                    return False
+            lease = json.dumps([self._dueno, ahora + 3 * self.intervalo_s])
+            con.execute("INSERT OR REPLACE INTO estado VALUES ('lider', ?)", (lease,))
+        return True
+
+    # ------------------------------------------------------------------
+    # Feed de cambios
+    # ------------------------------------------------------------------
+    def _leer_estado(self, clave):
+        with almacen_local.conexion(self.ruta_db) as con:
+            fila = con.execute("SELECT valor FROM estado WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def sondear(self) -> int:
+        """Aplica los cambios pendientes del feed de Drive. Devuelve cuántos cambios se leyeron."""
+        service = self.obtener_servicio()
+        if service is None:
+            return 0
+        token = self._leer_estado("page_token")
+        if token is None:
+            self._iniciar_token(service)
+            return 0
+
+        leidos = 0
+        while True:
+            with metricas.span("drive_changes"):
+                resp = service.changes().list(
+                    pageToken=token, pageSize=1000, spaces="drive",
+                    includeItemsFromAllDrives=True, supportsAllDrives=True,
+                    fields=f"nextPageToken,newStartPageToken,changes(fileId,removed,file({CAMPOS_ARCHIVO}))",
+                ).execute()
+            cambios = resp.get("changes", [])
+            token = resp.get("nextPageToken") or resp.get("newStartPageToken")
+            # Cada página se aplica junto con su token: si el proceso muere, no se pierde ni se repite nada
+            with almacen_local.conexion(self.ruta_db) as con:
+                aplicados = self._aplicar(con, cambios)
+                con.execute("INSERT OR REPLACE INTO estado VALUES ('page_token', ?)", (token,))
+                if "newStartPageToken" in resp:
+                    con.execute("INSERT OR REPLACE INTO estado VALUES ('ultimo_sondeo', ?)", (str(time.time()),))
+                    con.execute("DELETE FROM bitacora WHERE momento < ?", (time.time() - RETENCION_BITACORA_S,))
+            leidos += len(cambios)
+            with self._lock:
+                self._stats["cambios_aplicados"] += aplicados
+            if "newStartPageToken" in resp or not token:
+                break
+        with self._lock:
+            self._stats["sondeos"] += 1
+        if leidos:
+            print(f"👀 Vigía de Drive: {leidos} cambios leídos.")
+        return leidos
+
+    def _iniciar_token(self, service):
+        """Primer arranque (o base nueva): el feed se sigue desde ahora."""
+        with metricas.span("drive_changes"):
+            token = service.changes().getStartPageToken(supportsAllDrives=True).execute()["startPageToken"]
+        with almacen_local.conexion(self.ruta_db) as con:
+            con.execute("INSERT OR IGNORE INTO estado VALUES ('page_token', ?)", (token,))
+            con.execute("INSERT OR REPLACE INTO estado VALUES ('ultimo_sondeo', ?)", (str(time.time()),))
+        print(f"👀 Vigía de Drive: siguiendo cambios desde el token {token}.")
+
+    def _aplicar(self, con, cambios) -> int:
+        """Actualiza el manifiesto con una página de cambios. Devuelve cuántos tocaron carpetas registradas."""
+        carpetas = {f for (f,) in con.execute("SELECT folder_id FROM carpetas")}
+        aplicados = 0
+        for cambio in cambios:
+            file_id = cambio.get("fileId")
+            archivo = cambio.get("file") or {}
+            if not file_id:
+                continue
+            eliminado = cambio.get("removed") or archivo.get("trashed")
+            if archivo.get("mimeType") == MIME_CARPETA and file_id in carpetas:
+                if eliminado:
+                    con.execute("DELETE FROM carpetas WHERE folder_id = ?", (file_id,))
+                    con.execute("DELETE FROM archivos WHERE carpeta_id = ?", (file_id,))
+                else:
+                    con.execute("UPDATE carpetas SET nombre = ? WHERE folder_id = ?", (archivo.get("name"), file_id))
+                aplicados += 1
+                continue
+            # Se actualiza en las carpetas registradas donde sigue estando (conserva su posición) y se saca del resto
+            padres = [] if eliminado else [p for p in archivo.get("parents") or [] if p in carpetas]
+            datos = None if eliminado else _datos(archivo)
+            marcas = ",".join("?" * len(padres))
+            cur = con.execute(f"DELETE FROM archivos WHERE file_id = ? AND carpeta_id NOT IN ({marcas})",
+                              (file_id, *padres))
+            tocados = cur.rowcount
+            for padre in padres:
+                cur = con.execute("UPDATE archivos SET datos = ? WHERE carpeta_id = ? AND file_id = ?", (datos, padre, file_id))
+                if not cur.rowcount:
+                    con.execute("INSERT INTO archivos VALUES (?, ?, ?)", (file_id, padre, datos))
+                tocados += 1
+            if tocados:
+                aplicados += 1
+            con.execute("INSERT INTO bitacora (file_id, datos, momento) VALUES (?, ?, ?)", (file_id, datos, time.time()))
+        return aplicados
+
+    def _desalojar_cambiados(self):
+        """Avisa a los oyentes de este worker de los archivos que cambiaron desde la última vez."""
+        with almacen_local.conexion(self.ruta_db) as con:
+            filas = con.execute("SELECT seq, file_id, datos FROM bitacora WHERE seq > ? ORDER BY seq",
+                                (self._ultima_seq,)).fetchall()
+        if not filas:
+            return
+        self._ultima_seq = filas[-1][0]
+        # Si un archivo cambió varias veces, basta con avisar su último estado
+        ultimos = {f: d for _, f, d in filas}
+        for file_id, datos in ultimos.items():
+            datos = json.loads(datos) if datos else None
+            for fn in self._oyentes:
+                try:
+                    fn(file_id, datos)
+                except Exception as e:
+                    print(f"❌ Vigía de Drive: error desalojando {file_id}: {e}")
+        with self._lock:
+            self._stats["desalojos"] += len(filas)
+
+    # ------------------------------------------------------------------
+    # Manifiesto
+    # ------------------------------------------------------------------
+    def fresco(self) -> bool:
+        """True si el feed se leyó completo hace menos de max_atraso_s."""
+        if not self.ruta_db:
+            return False
+        ultimo = self._leer_estado("ultimo_sondeo")
+        return ultimo is not None and time.time() - float(ultimo) < self.max_atraso_s
+
+    def carpeta_por_nombre(self, nombre: str) -> Optional[str]:
+        """folder_id de una carpeta registrada con ese nombre (si el manifiesto está al día)."""
+        if not nombre or not self.fresco():
+            return None
+        with almacen_local.conexion(self.ruta_db) as con:
+            fila = con.execute("SELECT folder_id FROM carpetas WHERE nombre = ? ORDER BY sincronizada DESC LIMIT 1",
+                               (nombre,)).fetchone()
+        return fila[0] if fila else None
+
+    def manifiesto(self, folder_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Archivos de la carpeta según el manifiesto; None si no está registrada o el vigía está atrasado."""
+        if not folder_id or not self.fresco():
+            metricas.cache("manifiesto_drive", False)
+            return None
+        with almacen_local.conexion(self.ruta_db) as con:
+            if con.execute("SELECT 1 FROM carpetas WHERE folder_id = ?", (folder_id,)).fetchone() is None:
+                metricas.cache("manifiesto_drive", False)
+                return None
+            filas = con.execute("SELECT datos FROM archivos WHERE carpeta_id = ? ORDER BY rowid", (folder_id,)).fetchall()
+        metricas.cache("manifiesto_drive", True)
+        return [json.loads(d) for (d,) in filas]
+
+    def sincronizar_carpeta(self, service, folder_id: str, nombre: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Lista la carpeta completa en Drive, la registra en el manifiesto y devuelve sus archivos."""
+        archivos, page_token = [], None
+        while True:
+            with metricas.span("drive_list"):
+                resp = service.files().list(
+                    q=f"'{folder_id}' in parents and trashed = false",
+                    fields=f"nextPageToken,files({CAMPOS_ARCHIVO})", pageSize=1000, pageToken=page_token,
+                    supportsAllDrives=True, includeItemsFromAllDrives=True,
+                ).execute()
+            archivos.extend(a for a in resp.get("files", []) if not a.get("trashed"))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+        if self.ruta_db:
+            with almacen_local.conexion(self.ruta_db) as con:
+                con.execute("INSERT OR REPLACE INTO carpetas VALUES (?, ?, ?)", (folder_id, nombre, time.time()))
+                con.execute("DELETE FROM archivos WHERE carpeta_id = ?", (folder_id,))
+                con.executemany("INSERT INTO archivos VALUES (?, ?, ?)", [(a["id"], folder_id, _datos(a)) for a in archivos])
+        return archivos
+
+    def archivos_carpeta(self, service, folder_id: str, nombre: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Archivos de la carpeta: desde el manifiesto si está al día; si no, se lista en Drive y se registra.
+        None si el vigía está desactivado (el llamador lista en Drive como siempre).
+        """
+        if not self.ruta_db:
+            return None
+        self.asegurar_iniciado()
+        archivos = self.manifiesto(folder_id)
+        if archivos is not None:
+            return archivos
+        # El token se toma antes de listar: un cambio ocurrido durante el listado llega igual por el feed
+        if self._leer_estado("page_token") is None:
+            self._iniciar_token(service)
+        return self.sincronizar_carpeta(service, folder_id, nombre)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["activo"] = self._pid_hilo == os.getpid()
+        stats["fresco"] = self.fresco()
+        if self.ruta_db:
+            ultimo = self._leer_estado("ultimo_sondeo")
+            stats["atraso_s"] = round(time.time() - float(ultimo), 1) if ultimo else None
+            with almacen_local.conexion(self.ruta_db) as con:
+                stats["carpetas"] = con.execute("SELECT COUNT(*) FROM carpetas").fetchone()[0]
+                stats["archivos"] = con.execute("SELECT COUNT(*) FROM archivos").fetchone()[0]
+        return stats
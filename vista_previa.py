@@ -0,0 +1,117 @@
+# vista_previa.py
+"""
+Vista previa HTML del informe, sin armar el .docx.
+
+Recorre los mismos bloques que report_generator (modelo_informe.bloques), con la misma numeración
+de capítulos, figuras y cuadros, y los escribe como HTML liviano:
+
+- Las fotos van como <img> a /api/miniatura/<id>?tam=VISTA_PREVIA_TAM (el navegador las pide
+  a medida que se ven y salen de la caché de miniaturas): aquí no se descarga nada de Drive.
+- Los mapas de ubicación no se dibujan: queda un recuadro con la figura y los paraderos que tendrá.
+- Tablas.xlsx no se lee: sus cuadros llevan la etiqueta definitiva y un aviso en lugar de los datos
+  (si el proyecto no tiene Tablas.xlsx, el mismo texto de error que el .docx).
+
+Los cuadros de características y de resumen se arman completos con motor_tablas.construir_tabla_html
+(mismas celdas y formatos que en el .docx).
+"""
+
+import html
+import os
+
+import modelo_informe
+import motor_tablas
+
+TAM_MINIATURA = os.environ.get("VISTA_PREVIA_TAM", "m")
+
+_ESTILO = """
+body{font-family:"Arial Narrow",Arial,sans-serif;font-size:11pt;max-width:52em;margin:2em auto;padding:0 1em;color:#222}
+h1{font-size:14pt;margin-top:1.5em}h2{font-size:12pt;margin-top:1.2em}
+p{white-space:pre-line;text-align:justify}
+.portada{text-align:center;font-weight:bold;white-space:pre-line;border-bottom:2px solid #999;padding-bottom:1em}
+.salto{border:0;border-top:1px dashed #ccc;margin:1.5em 0}
+.etiqueta{font-size:9pt;font-weight:bold;text-align:center;margin-bottom:.3em}
+.fuente{font-size:8pt;text-align:left;margin-top:.2em}
+figure{margin:1em 0;text-align:center}figure .fuente{text-align:center;font-weight:bold;font-size:9pt}
+table{border-collapse:collapse;width:100%;font-size:9pt}th,td{border:1px solid #999;padding:2px 4px}
+th{background:#d9d9d9}
+table.evidencia td{text-align:center}table.evidencia td.descripcion{text-align:justify;white-space:pre-line}
+img{max-width:100%}
+.pendiente{border:1px dashed #999;background:#f6f6f6;padding:1em;text-align:center;font-size:9pt;color:#555}
+"""
+
+
+def _miniatura(file_id, tam):
+    return (f'<img loading="lazy" alt="{html.escape(file_id)}" '
+            f'src="/api/miniatura/{html.escape(file_id)}?tam={tam}">')
+
+
+def _cuadro(etiqueta, cuerpo, fuente):
+    return (f'<p class="etiqueta">{html.escape(etiqueta)}</p>{cuerpo}'
+            f'<p class="fuente">{html.escape(fuente)}</p>')
+
+
+def html_bloque(bloque, estado, tam=TAM_MINIATURA) -> str:
+    """HTML de un bloque de modelo_informe.bloques() (avanza la numeración igual que el .docx)."""
+    tipo = bloque["tipo"]
+    if tipo == "capitulo":
+        modelo_informe.cambiar_capitulo(estado, bloque["numero"])
+        return f'<h1 id="capitulo-{bloque["numero"]}">{html.escape(bloque["titulo"])}</h1>'
+    if tipo == "paradero":
+        return f'<h2 id="paradero-{bloque["numero"]}">{html.escape(bloque["titulo"])}</h2>'
+    if tipo == "texto":
+        return f"<p>{html.escape(str(bloque['texto']))}</p>"
+    if tipo == "espacio":
+        return ""
+    if tipo == "salto":
+        return '<hr class="salto">'
+    if tipo == "figura":
+        etiqueta = modelo_informe.siguiente_figura(estado, bloque["descripcion"])
+        if "mapa" in bloque:
+            cuerpo = (f'<div class="pendiente">Mapa de ubicación con {len(bloque["mapa"]["puntos"])} paradero(s); '
+                      f'se dibuja al generar el informe.</div>')
+        else:
+            cuerpo = _miniatura(bloque["file_id"], "l")
+        return (f'<figure><p class="etiqueta">{html.escape(etiqueta)}</p>{cuerpo}'
+                f'<p class="fuente">{html.escape(bloque["fuente"])}</p></figure>')
+    if tipo == "evidencia":
+        seccion = bloque["seccion"]
+        filas = "".join(f"<tr><td>{_miniatura(i, tam)}</td></tr>" for i in seccion.get("image_ids", []))
+        descripcion = seccion.get("description", modelo_informe.DESCRIPCION_POR_OMISION)
+        return (f'<table class="evidencia"><tr><th>{html.escape(bloque["titulo"])}</th></tr>{filas}'
+                f'<tr><td class="descripcion">{html.escape(str(descripcion))}</td></tr></table>')
+    if tipo == "cuadro":
+        etiqueta = modelo_informe.siguiente_cuadro(estado, bloque["descripcion"])
+        return _cuadro(etiqueta, motor_tablas.construir_tabla_html(headers=bloque["headers"], filas=bloque["filas"]),
+                       bloque["fuente"])
+    if tipo == "cuadro_df":
+        etiqueta = modelo_informe.siguiente_cuadro(estado, bloque["descripcion"])
+        return _cuadro(etiqueta, motor_tablas.construir_tabla_html(df=bloque["df"], **bloque["opciones"]),
+                       bloque["fuente"])
+    if tipo == "cuadro_excel":
+        etiqueta = modelo_informe.siguiente_cuadro(estado, bloque["descripcion"])
+        aviso = (f'<div class="pendiente">Se completa con la hoja "{html.escape(bloque["hoja"])}" de Tablas.xlsx '
+                 f'al generar el informe.</div>')
+        return _cuadro(etiqueta, aviso, bloque["fuente"])
+    raise ValueError(f"Bloque de informe desconocido: {tipo}")
+
+
+def renderizar(datos_informe, img_ubicacion_proyecto_id=None, img_ubicacion_paradas_id=None,
+               sin_tablas=False, tam=TAM_MINIATURA) -> str:
+    """
+    Página HTML completa con la vista previa del informe. sin_tablas: el informe no tendrá
+    Tablas.xlsx (sus cuadros van como el aviso de error del .docx); si no, se dan por presentes.
+    """
+    info_proyecto = datos_informe.get("info_proyecto", {})
+    estado = modelo_informe.nuevo_estado()
+    partes = [
+        '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">',
+        f"<title>Vista previa - {html.escape(str(info_proyecto.get('proyecto', 'Informe')))}</title>",
+        f"<style>{_ESTILO}</style></head><body>",
+        f'<div class="portada">{html.escape(modelo_informe.titulo_portada(info_proyecto))}</div>',
+    ]
+    bloques = modelo_informe.bloques(datos_informe, img_ubicacion_proyecto_id, img_ubicacion_paradas_id,
+                                     hojas=set() if sin_tablas else None,
+                                     error_tablas=modelo_informe.ERROR_SIN_TABLAS if sin_tablas else None)
+    partes.extend(html_bloque(b, estado, tam) for b in bloques)
+    partes.append("</body></html>")
+    return "".join(partes)